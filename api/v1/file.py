@@ -0,0 +1,23 @@
+import mimetypes
+from fastapi import APIRouter,Depends
+from fastapi.responses import FileResponse
+from services import LocalStorageService,get_local_storage_service
+
+router = APIRouter(prefix='/files',tags=['files'])
+
+@router.get('/{file_name:path}',include_in_schema=False)
+async def download(
+    file_name:str,
+    expires:int,
+    disposition:str,
+    signature:str,
+    service:LocalStorageService=Depends(get_local_storage_service)
+):
+    # the server sends the file with 'sendfile' when it supports it, ranges can be requested
+    path = service.open_signed(file_name,expires,disposition,signature)
+    content_type,_ = mimetypes.guess_type(path.name)
+    return FileResponse(
+        path,
+        media_type=content_type or 'application/octet-stream',
+        headers={'Content-Disposition':disposition}
+    )
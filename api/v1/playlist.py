@@ -1,12 +1,15 @@
+import logging
 from typing import Sequence
-from fastapi import APIRouter,HTTPException,status,Depends,Query
+from fastapi import APIRouter,HTTPException,status,Depends,Query,Response
 from schemas import (
+    TrackDownloadSchema,
     PlaylistCreateSchema,
-    PlaylistUpdateSchema,
+    PlaylistStatsSchema,
     PlaylistSchema,
     PlaylistPrivateUpdateSchema,
     UserSchema,
-    ExistencialQuerySchema
+    ExistencialQuerySchema,
+    PlayRegisteredSchema
 )
 from services import (
     UserService,
@@ -16,12 +19,56 @@ from services import (
     get_playlist_service,
     get_current_user,
     get_track_service,
-    get_user_service
+    get_user_service,
+    StorageService,
+    get_storage_service,
+    PlayCounter,
+    get_playlist_play_counter,
+    get_current_username
 )
 from settings import ENVIRONMENT
+from tools import timeout,decode_cursor,set_next_cursor,NEXT_CURSOR_HEADER
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix='/playlists',tags=['playlists'])
 
+async def _stats_response(
+    playlist_id:str,
+    counters:PlaylistStatsSchema | None,
+    counters_only:bool,
+    service:PlaylistService
+) -> PlaylistSchema | PlaylistStatsSchema:
+    '''
+    Docstring for _stats_response
+    
+    :param counters: result of a counters update over the playlist
+    :type counters: PlaylistStatsSchema | None
+    :param counters_only: if True the counters are returned without loading the whole playlist
+    :type counters_only: bool
+    :rtype: PlaylistSchema | PlaylistStatsSchema
+    '''
+    if not counters:
+        db_playlist = await service.get_by_id(playlist_id)
+        if not db_playlist:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f'No playlist with id {playlist_id} was found'
+            )
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail='operation failed'
+        )
+    if counters_only:
+        return counters
+    db_playlist = await service.get_by_id(playlist_id)
+    if not db_playlist:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f'No playlist with id {playlist_id} was found'
+        )
+    return db_playlist
+
 @router.post(
     '/create',
     status_code=status.HTTP_201_CREATED,
@@ -46,19 +93,27 @@ async def create(
     response_model=Sequence[PlaylistSchema]
 )
 async def get_playlists(
+    response:Response,
     page:int=Query(0,description='page of results',ge=0),
+    cursor:str=Query('',description=f'cursor of the next page from the {NEXT_CURSOR_HEADER} header, replaces page'),
     limit:int=Query(1,description='limit of results',ge=1,le=ENVIRONMENT.MAX_LIMIT_ALLOWED),
     pattern:str=Query('',description='pattern to search'),
     search_mode:PlaylistSearchMode=Query(PlaylistSearchMode.BOTH,description='mode to search playlists'),
     service:PlaylistService=Depends(get_playlist_service)
 ):
+    after = decode_cursor(cursor)
     if len(pattern) != 0:
-        return await service.search_playlists(pattern,limit,page*limit,search_mode)
-    
-    return await service.get(
-        limit,
-        page*limit
-    )
+        playlists = await service.search_playlists(pattern,limit,page*limit,search_mode,after)
+    else:
+        playlists = await service.get(
+            limit,
+            page*limit,
+            after
+        )
+    # ranked results are not ordered by id, so they can only be paged with 'page'
+    if len(pattern) == 0 or search_mode != PlaylistSearchMode.RANKED:
+        set_next_cursor(response,playlists,limit)
+    return playlists
 
 @router.get(
     '/search/{playlist_name}',
@@ -103,12 +158,16 @@ async def get_user_playlists(
     response_model=Sequence[PlaylistSchema]
 )
 async def get_my_playlists(
+    response:Response,
     page:int=Query(0,description='page of results',ge=0),
+    cursor:str=Query('',description=f'cursor of the next page from the {NEXT_CURSOR_HEADER} header, replaces page'),
     limit:int=Query(1,description='limit of results',ge=1,le=ENVIRONMENT.MAX_LIMIT_ALLOWED),
     user:UserSchema=Depends(get_current_user),
     service:PlaylistService=Depends(get_playlist_service)
 ):
-    return await service.get_user_playlists(user.id,page*limit,limit)
+    playlists = await service.get_user_playlists(user.id,page*limit,limit,decode_cursor(cursor))
+    set_next_cursor(response,playlists,limit)
+    return playlists
 
 @router.get(
     '/{playlist_id}',
@@ -127,6 +186,41 @@ async def get_playlist(
         )
     return db_playlist
 
+@router.get(
+    '/{playlist_id}/downloads',
+    status_code=status.HTTP_200_OK,
+    response_model=Sequence[TrackDownloadSchema]
+)
+@timeout(ENVIRONMENT.URL_DOWNLOAD_TIMEOUT)
+async def get_playlist_downloads(
+    playlist_id:str,
+    page:int=Query(0,description='page of results',ge=0),
+    limit:int=Query(ENVIRONMENT.MAX_LIMIT_ALLOWED,description='limit of results',ge=1,le=ENVIRONMENT.MAX_LIMIT_ALLOWED),
+    service:PlaylistService=Depends(get_playlist_service),
+    track_service:TrackService=Depends(get_track_service),
+    cloud_service:StorageService=Depends(get_storage_service)
+):
+    tracks = await track_service.get_track_files_on_playlist(playlist_id,limit,page*limit)
+    if len(tracks) == 0:
+        db_playlist = await service.get_by_id(playlist_id)
+        if not db_playlist:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f'No playlist with id {playlist_id} was found'
+            )
+        return []
+    await track_service.release_connection()
+    try:
+        return await cloud_service.get_files(tracks)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f'An unexpected error has ocurred'
+        )
+
 @router.put(
     '/{playlist_id}',
     status_code=status.HTTP_202_ACCEPTED,
@@ -193,99 +287,30 @@ async def liked(
 @router.put(
     '/{playlist_id}/stats/likes',
     status_code=status.HTTP_202_ACCEPTED,
-    response_model=PlaylistSchema
+    response_model=PlaylistSchema | PlaylistStatsSchema
 )
 async def add_like_to_playlist(
     playlist_id:str,
+    counters_only:bool=Query(False,description='return only the new counters of the playlist'),
     user:UserSchema=Depends(get_current_user),
     service:PlaylistService=Depends(get_playlist_service)
 ):
-    db_playlist = await service.get_by_id(playlist_id)
-
-    if not db_playlist:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f'No playlist with id {playlist_id} was found'
-        )
-    
-    result = await service.add_like_from_user_to_playlist(user.id,playlist_id)
-
-    if not result:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail='operation failed'
-        )
-    
-    update_data:PlaylistUpdateSchema = PlaylistUpdateSchema(
-        likes=db_playlist.likes + 1,
-        dislikes=db_playlist.dislikes,
-        loves=db_playlist.loves,
-        plays=db_playlist.plays
-    )
-
-    db_playlist = await service.update(
-        playlist_id,
-        update_data,
-        name=db_playlist.name,
-        author_id=db_playlist.author_id,
-        description=db_playlist.description
-    )
-
-    if not db_playlist:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail='An unexpected error has ocurred while updata playlist info'
-        )
-    return db_playlist
+    counters = await service.add_like_from_user_to_playlist(user.id,playlist_id)
+    return await _stats_response(playlist_id,counters,counters_only,service)
 
 @router.delete(
     '/{playlist_id}/stats/likes',
     status_code=status.HTTP_202_ACCEPTED,
-    response_model=PlaylistSchema
+    response_model=PlaylistSchema | PlaylistStatsSchema
 )
 async def remove_like_from_playlist(
     playlist_id:str,
+    counters_only:bool=Query(False,description='return only the new counters of the playlist'),
     user:UserSchema=Depends(get_current_user),
     service:PlaylistService=Depends(get_playlist_service)
 ):
-    db_playlist = await service.get_by_id(playlist_id)
-
-    if not db_playlist:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f'No playlist with id {playlist_id} was found'
-        )
-    
-    result = await service.remove_like_from_user_to_playlist(user.id,playlist_id)
-
-    if not result:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail='operation failed'
-        )
-    
-    update_data:PlaylistUpdateSchema = PlaylistUpdateSchema(
-        likes=db_playlist.likes - 1,
-        dislikes=db_playlist.dislikes,
-        loves=db_playlist.loves,
-        plays=db_playlist.plays
-    )
-
-    db_playlist = await service.update(
-        playlist_id,
-        update_data,
-        name=db_playlist.name,
-        author_id=db_playlist.author_id,
-        description=db_playlist.description
-    )
-
-    if not db_playlist:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail='An unexpected error has ocurred while update playlist info'
-        )
-    
-    return db_playlist
+    counters = await service.remove_like_from_user_to_playlist(user.id,playlist_id)
+    return await _stats_response(playlist_id,counters,counters_only,service)
 
 @router.get(
     '/{playlist_id}/stats/dislikes',
@@ -310,100 +335,30 @@ async def disliked(
 @router.put(
     '/{playlist_id}/stats/dislikes',
     status_code=status.HTTP_202_ACCEPTED,
-    response_model=PlaylistSchema
+    response_model=PlaylistSchema | PlaylistStatsSchema
 )
 async def add_dislike_to_playlist(
     playlist_id:str,
+    counters_only:bool=Query(False,description='return only the new counters of the playlist'),
     user:UserSchema=Depends(get_current_user),
     service:PlaylistService=Depends(get_playlist_service)
 ):
-    db_playlist = await service.get_by_id(playlist_id)
-
-    if not db_playlist:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f'No playlist with id {playlist_id} was found'
-        )
-    
-    result = await service.add_dislike_from_user_to_playlist(user.id,playlist_id)
-
-    if not result:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail='operation failed'
-        )
-    
-    update_data:PlaylistUpdateSchema = PlaylistUpdateSchema(
-        likes=db_playlist.likes,
-        dislikes=db_playlist.dislikes + 1,
-        loves=db_playlist.loves,
-        plays=db_playlist.plays
-    )
-
-    db_playlist = await service.update(
-        playlist_id,
-        update_data,
-        name=db_playlist.name,
-        author_id=db_playlist.author_id,
-        description=db_playlist.description
-    )
-
-    if not db_playlist:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail='An unexpected error has ocurred while update playlist info'
-        )
-    
-    return db_playlist
+    counters = await service.add_dislike_from_user_to_playlist(user.id,playlist_id)
+    return await _stats_response(playlist_id,counters,counters_only,service)
 
 @router.delete(
     '/{playlist_id}/stats/dislikes',
     status_code=status.HTTP_202_ACCEPTED,
-    response_model=PlaylistSchema
+    response_model=PlaylistSchema | PlaylistStatsSchema
 )
 async def remove_dislike_from_playlist(
     playlist_id:str,
+    counters_only:bool=Query(False,description='return only the new counters of the playlist'),
     user:UserSchema=Depends(get_current_user),
     service:PlaylistService=Depends(get_playlist_service)
 ):
-    db_playlist = await service.get_by_id(playlist_id)
-
-    if not db_playlist:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f'No playlist with id {playlist_id} was found'
-        )
-    
-    result = await service.remove_dislike_from_user_to_playlist(user.id,playlist_id)
-
-    if not result:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail='operation failed'
-        )
-    
-    update_data:PlaylistUpdateSchema = PlaylistUpdateSchema(
-        likes=db_playlist.likes,
-        dislikes=db_playlist.dislikes - 1,
-        loves=db_playlist.loves,
-        plays=db_playlist.plays
-    )
-
-    db_playlist = await service.update(
-        playlist_id,
-        update_data,
-        name=db_playlist.name,
-        author_id=db_playlist.author_id,
-        description=db_playlist.description
-    )
-
-    if not db_playlist:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail='An unexpected error has ocurred while update playlist info'
-        )
-    
-    return db_playlist
+    counters = await service.remove_dislike_from_user_to_playlist(user.id,playlist_id)
+    return await _stats_response(playlist_id,counters,counters_only,service)
 
 @router.get(
     '/{playlist_id}/stats/loves',
@@ -428,140 +383,48 @@ async def loved(
 @router.put(
     '/{playlist_id}/stats/loves',
     status_code=status.HTTP_202_ACCEPTED,
-    response_model=PlaylistSchema
+    response_model=PlaylistSchema | PlaylistStatsSchema
 )
 async def add_love_to_playlist(
     playlist_id:str,
+    counters_only:bool=Query(False,description='return only the new counters of the playlist'),
     user:UserSchema=Depends(get_current_user),
     service:PlaylistService=Depends(get_playlist_service)
 ):
-    db_playlist = await service.get_by_id(playlist_id)
-
-    if not db_playlist:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f'No playlist with id {playlist_id} was found'
-        )
-    
-    result = await service.add_love_from_user_to_playlist(user.id,playlist_id)
-
-    if not result:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail='operation failed'
-        )
-    
-    update_data:PlaylistUpdateSchema = PlaylistUpdateSchema(
-        likes=db_playlist.likes,
-        dislikes=db_playlist.dislikes,
-        loves=db_playlist.loves + 1,
-        plays=db_playlist.plays
-    )
-
-    db_playlist = await service.update(
-        playlist_id,
-        update_data,
-        name=db_playlist.name,
-        author_id=db_playlist.author_id,
-        description=db_playlist.description
-    )
-
-    if not db_playlist:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail='An unexpected error has ocurred while update playlist info'
-        )
-    
-    return db_playlist
+    counters = await service.add_love_from_user_to_playlist(user.id,playlist_id)
+    return await _stats_response(playlist_id,counters,counters_only,service)
 
 @router.delete(
     '/{playlist_id}/stats/loves',
     status_code=status.HTTP_202_ACCEPTED,
-    response_model=PlaylistSchema
+    response_model=PlaylistSchema | PlaylistStatsSchema
 )
 async def remove_love_from_playlist(
     playlist_id:str,
+    counters_only:bool=Query(False,description='return only the new counters of the playlist'),
     user:UserSchema=Depends(get_current_user),
     service:PlaylistService=Depends(get_playlist_service)
 ):
-    db_playlist = await service.get_by_id(playlist_id)
-
-    if not db_playlist:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f'No playlist with id {playlist_id} was found'
-        )
-    
-    result = await service.remove_love_from_user_to_playlist(user.id,playlist_id)
-
-    if not result:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail='operation failed'
-        )
-    
-    update_data:PlaylistUpdateSchema = PlaylistUpdateSchema(
-        likes=db_playlist.likes,
-        dislikes=db_playlist.dislikes,
-        loves=db_playlist.loves - 1,
-        plays=db_playlist.plays
-    )
-
-    db_playlist = await service.update(
-        playlist_id,
-        update_data,
-        name=db_playlist.name,
-        author_id=db_playlist.author_id,
-        description=db_playlist.description
-    )
-
-    if not db_playlist:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail='An unexpected error has ocurred while update playlist info'
-        )
-    
-    return db_playlist
+    counters = await service.remove_love_from_user_to_playlist(user.id,playlist_id)
+    return await _stats_response(playlist_id,counters,counters_only,service)
 
 @router.put(
     '/{playlist_id}/stats/plays',
     status_code=status.HTTP_202_ACCEPTED,
-    response_model=PlaylistSchema
+    response_model=PlaylistSchema | PlaylistStatsSchema | PlayRegisteredSchema
 )
 async def add_play_to_playlist(
     playlist_id:str,
+    counters_only:bool=Query(False,description='return only the new counters of the playlist'),
+    username:str | None=Depends(get_current_username),
+    play_counter:PlayCounter | None=Depends(get_playlist_play_counter),
     service:PlaylistService=Depends(get_playlist_service)
 ):
-    db_playlist = await service.get_by_id(playlist_id)
-
-    if not db_playlist:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f'No playlist with id {playlist_id} was found'
-        )
-    
-    update_data:PlaylistUpdateSchema = PlaylistUpdateSchema(
-        likes=db_playlist.likes,
-        dislikes=db_playlist.dislikes,
-        loves=db_playlist.loves,
-        plays=db_playlist.plays + 1
-    )
-
-    db_playlist = await service.update(
-        playlist_id,
-        update_data,
-        name=db_playlist.name,
-        author_id=db_playlist.author_id,
-        description=db_playlist.description
-    )
-
-    if not db_playlist:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail='An unexpected error has ocurred while update playlist info'
-        )
-    
-    return db_playlist
+    # buffered plays are written later in batches, the database is not touched here
+    if play_counter and play_counter.record(playlist_id,username):
+        return PlayRegisteredSchema(id=playlist_id,pending=play_counter.pending(playlist_id))
+    counters = await service.add_play(playlist_id)
+    return await _stats_response(playlist_id,counters,counters_only,service)
 
 @router.put(
     '/{playlist_id}/tracks',
@@ -1,35 +1,316 @@
 import logging
+import mimetypes
 from hashlib import sha256
-from typing import Sequence
+from typing import IO,Sequence
 from pathlib import Path
-from fastapi import APIRouter,HTTPException,status,Depends,Query,UploadFile,File
+from fastapi import APIRouter,HTTPException,status,Depends,Query,Header,UploadFile,File,Response,Request
+from fastapi.responses import FileResponse,RedirectResponse
+from models import BlobStatus
 from schemas import (
+    BlobSchema,
     TrackDownloadSchema,
     TrackSchema,
     TrackUploadSchema,
+    TrackUploadedSchema,
     UserSchema,
-    TrackUpdateSchema,
+    TrackStatsSchema,
     TrackPrivateUpdateSchema,
-    ExistencialQuerySchema
+    ExistencialQuerySchema,
+    PlayRegisteredSchema,
+    TrackPreflightSchema,
+    TrackPreflightResultSchema,
+    UploadSessionCreateSchema,
+    UploadSessionSchema,
+    TrackIngestionSchema
 )
 from services import (
     TrackService,
     get_track_service,
     get_current_user,
-    BackBlazeB2Service,
-    get_backblazeb2_service,
+    StorageService,
+    get_storage_service,
     PlaylistService,
     get_playlist_service,
-    TrackSearchMode
+    TrackSearchMode,
+    PlayCounter,
+    get_track_play_counter,
+    get_current_username,
+    UploadSessionService,
+    get_upload_session_service,
+    FileValidationResult,
+    StorageJobService,
+    get_storage_job_service,
+    CachedFileResponse,
+    get_track_file_cache,
+    stage_file,
+    remove_staged_file
 )
 from settings import ENVIRONMENT
-from tools import timeout
+from tools import (
+    timeout,
+    decode_cursor,
+    set_next_cursor,
+    content_disposition,
+    NEXT_CURSOR_HEADER,
+    UPLOAD_OFFSET_HEADER,
+    CONTENT_SHA256_HEADER
+)
 
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix='/tracks',tags=['tracks'])
 
+async def _stats_response(
+    track_id:str,
+    counters:TrackStatsSchema | None,
+    counters_only:bool,
+    service:TrackService
+) -> TrackSchema | TrackStatsSchema:
+    '''
+    Docstring for _stats_response
+    
+    :param counters: result of a counters update over the track
+    :type counters: TrackStatsSchema | None
+    :param counters_only: if True the counters are returned without loading the whole track
+    :type counters_only: bool
+    :rtype: TrackSchema | TrackStatsSchema
+    '''
+    if not counters:
+        db_track = await service.get_by_id(track_id)
+        if not db_track:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f'No track with id {track_id} was found'
+            )
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail='operation failed'
+        )
+    if counters_only:
+        return counters
+    db_track = await service.get_by_id(track_id)
+    if not db_track:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f'No track with id {track_id} was found'
+        )
+    return db_track
+
+def _check_ready(db_track:TrackSchema) -> None:
+    '''
+    Docstring for _check_ready
+
+    rejects the download of a track whose file is not stored
+    
+    :type db_track: TrackSchema
+    '''
+    if db_track.status == BlobStatus.PROCESSING:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail='The file of the track is still being stored, try again later'
+        )
+    if db_track.status == BlobStatus.FAILED:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail='The file of the track could not be stored, it must be uploaded again'
+        )
+
+async def _reject_known_content(content_hash:str,user_id:str,track_service:TrackService) -> None:
+    '''
+    Docstring for _reject_known_content
+
+    rejects a file the user already uploaded, before any of its bytes is sent to the storage
+    
+    :param content_hash: SHA-256 of the file
+    :type content_hash: str
+    :param user_id: id of the user uploading the file
+    :type user_id: str
+    :type track_service: TrackService
+    '''
+    db_track = await track_service.get_by_content_hash(content_hash,user_id)
+    if db_track:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f'The track already exists with id {db_track.id}'
+        )
+
+async def _share_stored_content(
+    track:TrackUploadSchema,
+    user_id:str,
+    track_service:TrackService
+) -> TrackSchema | None:
+    '''
+    Docstring for _share_stored_content
+
+    :type track: TrackUploadSchema
+    :param user_id: id of the user who uploaded the file
+    :type user_id: str
+    :type track_service: TrackService
+    :return: the new track if its content is already stored, it is shared and not sent to
+    the storage again
+    :rtype: TrackSchema | None
+    '''
+    if await track_service.get_blob(track.content_hash):
+        return await track_service.create(track,uploaded_by=user_id)
+    return None
+
+async def _save_stored_track(
+    track:TrackUploadSchema,
+    cloud_response:TrackUploadedSchema,
+    user_id:str,
+    track_service:TrackService,
+    job_service:StorageJobService
+) -> TrackSchema:
+    '''
+    Docstring for _save_stored_track
+
+    saves the track of a file just stored, a stored copy no track uses is removed in background
+    
+    :type track: TrackUploadSchema
+    :param cloud_response: the stored file
+    :type cloud_response: TrackUploadedSchema
+    :param user_id: id of the user who uploaded the file
+    :type user_id: str
+    :rtype: TrackSchema
+    '''
+    try:
+        db_track = await track_service.create(
+            track,
+            BlobSchema(
+                content_hash=track.content_hash,
+                file_id=cloud_response.id,
+                file_name=cloud_response.filename,
+                size=cloud_response.size
+            ),
+            uploaded_by=user_id
+        )
+    except BaseException:
+        await job_service.remove_file(cloud_response.id,cloud_response.filename)
+        raise
+    if not db_track or db_track.file_id != cloud_response.id:
+        # the track was not created, or another upload stored the same content first
+        await job_service.remove_file(cloud_response.id,cloud_response.filename)
+    if not db_track:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail='The track already exists'
+        )
+    return db_track
+
+async def _store_track(
+    file:IO[bytes],
+    track_name:str,
+    author_name:str,
+    validation_result:FileValidationResult,
+    user_id:str,
+    track_service:TrackService,
+    cloud_service:StorageService,
+    job_service:StorageJobService
+) -> TrackSchema:
+    '''
+    Docstring for _store_track
+
+    saves a validated file as a track. A content already stored is shared with the new track
+    and not sent to the storage again, a stored copy no track uses is removed in background
+    
+    :param file: the validated file
+    :type file: IO[bytes]
+    :type track_name: str
+    :type author_name: str
+    :type validation_result: FileValidationResult
+    :param user_id: id of the user who uploaded the file
+    :type user_id: str
+    :rtype: TrackSchema
+    '''
+    track = TrackUploadSchema(
+        name=f'{track_name}{validation_result.extension}',
+        author_name=author_name,
+        content_hash=validation_result.hash
+    )
+    db_track = await _share_stored_content(track,user_id,track_service)
+    if db_track:
+        return db_track
+    # the content is new, or its last track was deleted since it was found
+    await track_service.release_connection()
+    cloud_response = await cloud_service.store_file(file,validation_result)
+    return await _save_stored_track(track,cloud_response,user_id,track_service,job_service)
+
+async def _ingest_track(
+    file:IO[bytes],
+    track_name:str,
+    author_name:str,
+    validation_result:FileValidationResult,
+    user_id:str,
+    track_service:TrackService,
+    job_service:StorageJobService
+) -> TrackSchema:
+    '''
+    Docstring for _ingest_track
+
+    saves a validated file as a track without waiting for the storage. A new content is kept
+    on the local disk and stored by a background job, the track is 'PROCESSING' until then.
+    A content already stored, or being stored, is shared with the new track
+    
+    :param file: the validated file
+    :type file: IO[bytes]
+    :type track_name: str
+    :type author_name: str
+    :type validation_result: FileValidationResult
+    :param user_id: id of the user who uploaded the file
+    :type user_id: str
+    :rtype: TrackSchema
+    '''
+    track = TrackUploadSchema(
+        name=f'{track_name}{validation_result.extension}',
+        author_name=author_name,
+        content_hash=validation_result.hash
+    )
+    if await track_service.get_blob(validation_result.hash):
+        db_track = await track_service.create(track,uploaded_by=user_id)
+        if db_track:
+            return db_track
+    await track_service.release_connection()
+    payload = await stage_file(file,validation_result)
+    try:
+        db_track = await track_service.create_processing(
+            track,
+            validation_result.size,
+            payload,
+            uploaded_by=user_id
+        )
+    except BaseException:
+        await remove_staged_file(payload)
+        raise
+    if not db_track or db_track.status != BlobStatus.PROCESSING:
+        # no job was queued to store the file
+        await remove_staged_file(payload)
+    if not db_track:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail='The track already exists'
+        )
+    job_service.notify()
+    return db_track
+
+async def _ingestion_response(db_track:TrackSchema,job_service:StorageJobService) -> TrackIngestionSchema:
+    '''
+    Docstring for _ingestion_response
+    
+    :type db_track: TrackSchema
+    :type job_service: StorageJobService
+    :return: the state of the ingestion of the track
+    :rtype: TrackIngestionSchema
+    '''
+    job = await job_service.get_store_file_job(db_track.id)
+    return TrackIngestionSchema(
+        id=db_track.id,
+        status=db_track.status,
+        attempts=job.attempts if job else 0,
+        error=job.last_error if job else None,
+        track=db_track
+    )
+
 @router.post(
     '/upload',
     status_code=status.HTTP_201_CREATED,
@@ -42,41 +323,316 @@ async def upload_track(
     data:UploadFile = File(...),
     current_user:UserSchema=Depends(get_current_user),
     track_service:TrackService=Depends(get_track_service),
-    cloud_service:BackBlazeB2Service=Depends(get_backblazeb2_service)
+    cloud_service:StorageService=Depends(get_storage_service),
+    job_service:StorageJobService=Depends(get_storage_job_service)
 ):
-    cloud_response = None
     try:
-        cloud_response,content_hash = await cloud_service.upload_file(data,track_name)
-        track = TrackUploadSchema(
-            name=cloud_response.filename,
-            author_name=author_name,
-            file_id=cloud_response.id,
-            content_hash=content_hash
+        # the connection used to get the user is not needed during the validation
+        await track_service.release_connection()
+        validation_result = await cloud_service.validate_file(data)
+        await _reject_known_content(validation_result.hash,current_user.id,track_service)
+        return await _store_track(
+            data.file,
+            track_name,
+            author_name,
+            validation_result,
+            current_user.id,
+            track_service,
+            cloud_service,
+            job_service
+        )
+    except HTTPException:
+        raise
+    except Exception as ex:
+        logger.error(ex)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail='An unexpected error has ocurred'
+        )
+    finally:
+        await data.close()
+
+@router.put(
+    '/upload/raw',
+    status_code=status.HTTP_201_CREATED,
+    response_model=TrackSchema
+)
+@timeout(ENVIRONMENT.UPLOAD_TIMEOUT)
+async def upload_raw_track(
+    request:Request,
+    track_name:str,
+    author_name:str,
+    file_name:str=Query(...,description='name of the file in the device, its extension must match its content'),
+    content_hash:str=Header(
+        ...,
+        alias=CONTENT_SHA256_HEADER,
+        description='SHA-256 of the file in hex, the file is rejected if it does not match',
+        pattern='^[0-9a-f]{64}$'
+    ),
+    current_user:UserSchema=Depends(get_current_user),
+    track_service:TrackService=Depends(get_track_service),
+    cloud_service:StorageService=Depends(get_storage_service),
+    job_service:StorageJobService=Depends(get_storage_job_service)
+):
+    '''
+    Docstring for upload_raw_track
+
+    uploads the file as the raw body of the request. Its bytes are checked and sent to the
+    storage as they arrive, without a temporary copy. A content already stored is checked
+    but not sent again
+    '''
+    content_length = request.headers.get('content-length')
+    if content_length is None:
+        raise HTTPException(
+            status_code=status.HTTP_411_LENGTH_REQUIRED,
+            detail='The size of the file must be given in the Content-Length header'
+        )
+    validator = cloud_service.stream_validator(
+        int(content_length),
+        content_hash,
+        Path(file_name).suffix
+    )
+    track = TrackUploadSchema(
+        name=f'{track_name}{validator.extension}',
+        author_name=author_name,
+        content_hash=content_hash
+    )
+    try:
+        await _reject_known_content(content_hash,current_user.id,track_service)
+        blob = await track_service.get_blob(content_hash)
+        await track_service.release_connection()
+        if blob:
+            # the body is still read, the hash alone does not prove the client has the file
+            async for _ in validator.validate(request.stream()):
+                pass
+            db_track = await track_service.create(track,uploaded_by=current_user.id)
+            if db_track:
+                return db_track
+            # the content was deleted while the body was read, it must be sent again
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail='The content was removed during the upload, try again'
             )
-        db_track = await track_service.create(
+        cloud_response,_ = await cloud_service.store_stream(request.stream(),validator)
+        return await _save_stored_track(
             track,
-            size=cloud_response.size,
-            uploaded_by=current_user.id
+            cloud_response,
+            current_user.id,
+            track_service,
+            job_service
         )
-        if not db_track:
-            await cloud_service.remove_file(cloud_response.id,cloud_response.filename)
+    except HTTPException:
+        raise
+    except Exception as ex:
+        logger.error(ex)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail='An unexpected error has ocurred'
+        )
+
+@router.post(
+    '/ingestions',
+    status_code=status.HTTP_202_ACCEPTED,
+    response_model=TrackIngestionSchema
+)
+@timeout(ENVIRONMENT.UPLOAD_TIMEOUT)
+async def ingest_track(
+    response:Response,
+    track_name:str,
+    author_name:str,
+    data:UploadFile = File(...),
+    current_user:UserSchema=Depends(get_current_user),
+    track_service:TrackService=Depends(get_track_service),
+    cloud_service:StorageService=Depends(get_storage_service),
+    job_service:StorageJobService=Depends(get_storage_job_service)
+):
+    try:
+        await track_service.release_connection()
+        validation_result = await cloud_service.validate_file(data)
+        await _reject_known_content(validation_result.hash,current_user.id,track_service)
+        db_track = await _ingest_track(
+            data.file,
+            track_name,
+            author_name,
+            validation_result,
+            current_user.id,
+            track_service,
+            job_service
+        )
+        response.headers['Location'] = f'{ENVIRONMENT.GLOBAL_API_PREFIX}/tracks/ingestions/{db_track.id}'
+        return await _ingestion_response(db_track,job_service)
+    except HTTPException:
+        raise
+    except Exception as ex:
+        logger.error(ex)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail='An unexpected error has ocurred'
+        )
+    finally:
+        await data.close()
+
+@router.get(
+    '/ingestions/{track_id}',
+    status_code=status.HTTP_200_OK,
+    response_model=TrackIngestionSchema
+)
+async def get_ingestion(
+    track_id:str,
+    current_user:UserSchema=Depends(get_current_user),
+    track_service:TrackService=Depends(get_track_service),
+    job_service:StorageJobService=Depends(get_storage_job_service)
+):
+    db_track = await track_service.get_by_id(track_id)
+    if not db_track or db_track.uploaded_by != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f'No ingestion with id {track_id} was found'
+        )
+    return await _ingestion_response(db_track,job_service)
+
+@router.post(
+    '/upload/preflight',
+    status_code=status.HTTP_200_OK,
+    response_model=TrackPreflightResultSchema
+)
+async def upload_preflight(
+    preflight:TrackPreflightSchema,
+    current_user:UserSchema=Depends(get_current_user),
+    track_service:TrackService=Depends(get_track_service)
+):
+    known = await track_service.find_content(preflight.content_hash,current_user.id)
+    if not known:
+        return TrackPreflightResultSchema(exists=False)
+    blob,track_id = known
+    if blob.size != preflight.size:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail='The size does not match the content hash'
+        )
+    return TrackPreflightResultSchema(exists=True,track_id=track_id)
+
+@router.post(
+    '/uploads',
+    status_code=status.HTTP_201_CREATED,
+    response_model=UploadSessionSchema
+)
+async def create_upload_session(
+    response:Response,
+    track_name:str,
+    author_name:str,
+    file_name:str=Query(...,description='name of the file in the device, its extension must match its content'),
+    size:int=Query(...,description='size of the file in bytes',gt=0),
+    current_user:UserSchema=Depends(get_current_user),
+    service:UploadSessionService=Depends(get_upload_session_service)
+):
+    session = await service.open_session(
+        UploadSessionCreateSchema(
+            track_name=track_name,
+            author_name=author_name,
+            file_name=file_name,
+            size=size
+        ),
+        current_user.id
+    )
+    response.headers[UPLOAD_OFFSET_HEADER] = str(session.received)
+    return session
+
+@router.get(
+    '/uploads/{session_id}',
+    status_code=status.HTTP_200_OK,
+    response_model=UploadSessionSchema
+)
+async def get_upload_session(
+    session_id:str,
+    response:Response,
+    current_user:UserSchema=Depends(get_current_user),
+    service:UploadSessionService=Depends(get_upload_session_service)
+):
+    session = await service.get_session(session_id,current_user.id)
+    response.headers[UPLOAD_OFFSET_HEADER] = str(session.received)
+    return session
+
+@router.put(
+    '/uploads/{session_id}',
+    status_code=status.HTTP_200_OK,
+    response_model=UploadSessionSchema
+)
+@timeout(ENVIRONMENT.UPLOAD_TIMEOUT)
+async def upload_chunk(
+    session_id:str,
+    request:Request,
+    response:Response,
+    offset:int=Query(...,description='position of the chunk in the file, must be the bytes already received',ge=0),
+    current_user:UserSchema=Depends(get_current_user),
+    service:UploadSessionService=Depends(get_upload_session_service)
+):
+    # the connection used to get the user is not needed while the chunk arrives
+    await service.release_connection()
+    data = bytearray()
+    async for part in request.stream():
+        data.extend(part)
+        if len(data) > ENVIRONMENT.UPLOAD_SESSION_MAX_CHUNK:
             raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail='The track already exists'
+                status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+                detail=f'Chunks can not be larger than {ENVIRONMENT.UPLOAD_SESSION_MAX_CHUNK} bytes'
+            )
+    session = await service.append(session_id,current_user.id,offset,bytes(data))
+    response.headers[UPLOAD_OFFSET_HEADER] = str(session.received)
+    return session
+
+@router.post(
+    '/uploads/{session_id}/finalize',
+    status_code=status.HTTP_201_CREATED,
+    response_model=TrackSchema
+)
+@timeout(ENVIRONMENT.UPLOAD_TIMEOUT)
+async def finalize_upload_session(
+    session_id:str,
+    current_user:UserSchema=Depends(get_current_user),
+    service:UploadSessionService=Depends(get_upload_session_service),
+    track_service:TrackService=Depends(get_track_service),
+    cloud_service:StorageService=Depends(get_storage_service),
+    job_service:StorageJobService=Depends(get_storage_job_service)
+):
+    session,validation_result = await service.finalize(session_id,current_user.id)
+    try:
+        await _reject_known_content(validation_result.hash,current_user.id,track_service)
+        await service.release_connection()
+        with open(service.file_path(session_id),'rb') as file:
+            await cloud_service.check_file_type(file,validation_result.extension)
+            db_track = await _store_track(
+                file,
+                session.track_name,
+                session.author_name,
+                validation_result,
+                current_user.id,
+                track_service,
+                cloud_service,
+                job_service
             )
+        await service.close_session(session_id)
         return db_track
     except HTTPException:
         raise
     except Exception as ex:
-        if cloud_response:
-            await cloud_service.remove_file(cloud_response.id,cloud_response.filename)
         logger.error(ex)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail='An unexpected error has ocurred'
         )
-    finally:
-        await data.close()
+
+@router.delete(
+    '/uploads/{session_id}',
+    status_code=status.HTTP_204_NO_CONTENT
+)
+async def delete_upload_session(
+    session_id:str,
+    current_user:UserSchema=Depends(get_current_user),
+    service:UploadSessionService=Depends(get_upload_session_service)
+):
+    await service.get_session(session_id,current_user.id)
+    await service.close_session(session_id)
 
 @router.get(
     '',
@@ -84,21 +640,30 @@ async def upload_track(
     response_model=Sequence[TrackSchema]
 )
 async def get_tracks(
+    response:Response,
     playlist_id:str=Query('',description='playlist from where tracks will retrieved'),
     pattern:str=Query('',description='text to search in tracks'),
     search_mode:TrackSearchMode=Query(TrackSearchMode.BOTH,description='where the pattern will be searched'),
     page:int=Query(0,description='page of results',ge=0),
+    cursor:str=Query('',description=f'cursor of the next page from the {NEXT_CURSOR_HEADER} header, replaces page'),
     limit:int=Query(1,description='limit of results',ge=1,le=ENVIRONMENT.MAX_LIMIT_ALLOWED),
     service:TrackService=Depends(get_track_service),
     playlist_service:PlaylistService=Depends(get_playlist_service)
 ):
+    after = decode_cursor(cursor)
     if len(playlist_id) == 0:
         if len(pattern) == 0:
-            return await service.get(
+            tracks = await service.get(
                 limit,
-                page*limit
+                page*limit,
+                after
             )
-        return await service.search_tracks(pattern,limit,page*limit,search_mode)
+        else:
+            tracks = await service.search_tracks(pattern,limit,page*limit,search_mode,after)
+        # ranked results are not ordered by id, so they can only be paged with 'page'
+        if len(pattern) == 0 or search_mode != TrackSearchMode.RANKED:
+            set_next_cursor(response,tracks,limit)
+        return tracks
     
     db_playlist = await playlist_service.get_by_id(playlist_id)
     if not db_playlist:
@@ -108,9 +673,12 @@ async def get_tracks(
         )
     
     if len(pattern) == 0:
-        return await service.get_tracks_on_playlist(playlist_id,limit,page*limit)
-    
-    return await service.search_tracks_on_playlist(playlist_id,pattern,limit,page*limit,search_mode)
+        tracks = await service.get_tracks_on_playlist(playlist_id,limit,page*limit,after)
+    else:
+        tracks = await service.search_tracks_on_playlist(playlist_id,pattern,limit,page*limit,search_mode,after)
+    if len(pattern) == 0 or search_mode != TrackSearchMode.RANKED:
+        set_next_cursor(response,tracks,limit)
+    return tracks
 
 @router.get(
     '/mytracks',
@@ -118,15 +686,21 @@ async def get_tracks(
     response_model=Sequence[TrackSchema]
 )
 async def get_my_tracks(
+    response:Response,
     text:str=Query('',description='text to search in names'),
     page:int=Query(0,description='page of results',ge=0),
+    cursor:str=Query('',description=f'cursor of the next page from the {NEXT_CURSOR_HEADER} header, replaces page'),
     limit:int=Query(1,description='limit of results',ge=1,le=ENVIRONMENT.MAX_LIMIT_ALLOWED),
     user:UserSchema=Depends(get_current_user),
     service:TrackService=Depends(get_track_service)
 ):
+    after = decode_cursor(cursor)
     if len(text) > 0:
-        return await service.get_tracks_from_user_with_name_like(user.id,text,limit,page*limit)
-    return await service.get_tracks_uploaded_by(user.id,limit,page*limit)
+        tracks = await service.get_tracks_from_user_with_name_like(user.id,text,limit,page*limit,after)
+    else:
+        tracks = await service.get_tracks_uploaded_by(user.id,limit,page*limit,after)
+    set_next_cursor(response,tracks,limit)
+    return tracks
 
 @router.get(
     '/{track_id}',
@@ -154,7 +728,7 @@ async def get_track(
 async def get_track_url(
     track_id:str,
     service:TrackService=Depends(get_track_service),
-    cloud_service:BackBlazeB2Service=Depends(get_backblazeb2_service)
+    cloud_service:StorageService=Depends(get_storage_service)
 ):
     db_track = await service.get_by_id(track_id)
     if not db_track:
@@ -162,6 +736,8 @@ async def get_track_url(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f'No track with id "{track_id}" was found'
         )
+    _check_ready(db_track)
+    await service.release_connection()
     try:
         cloud_track = await cloud_service.get_file(db_track)
     
@@ -182,6 +758,45 @@ async def get_track_url(
             detail=f'An unexpected error has ocurred'
         )
 
+@router.get(
+    '/{track_id}/stream',
+    response_class=FileResponse,
+    status_code=status.HTTP_200_OK
+)
+@timeout(ENVIRONMENT.STREAM_TIMEOUT)
+async def stream_track(
+    track_id:str,
+    service:TrackService=Depends(get_track_service),
+    cloud_service:StorageService=Depends(get_storage_service)
+):
+    db_track = await service.get_by_id(track_id)
+    if not db_track:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f'No track with id "{track_id}" was found'
+        )
+    _check_ready(db_track)
+    await service.release_connection()
+    media_type,_ = mimetypes.guess_type(db_track.name)
+    headers = {
+        'Content-Disposition':content_disposition(db_track.name),
+        # the content of a track never changes
+        'ETag':f'"{db_track.content_hash}"'
+    }
+    path = cloud_service.local_path(db_track.file_name)
+    if path:
+        return FileResponse(path,headers=headers,media_type=media_type)
+    cache = get_track_file_cache()
+    if not cache or db_track.size > cache.max_size:
+        download = await cloud_service.get_file(db_track)
+        return RedirectResponse(download.url,status_code=status.HTTP_307_TEMPORARY_REDIRECT)
+
+    async def fill(target:IO[bytes]) -> None:
+        await cloud_service.download_file(db_track.file_name,target)
+
+    path = await cache.acquire(db_track.content_hash,fill)
+    return CachedFileResponse(cache,db_track.content_hash,path,headers=headers,media_type=media_type)
+
 @router.get(
     '/{track_id}/stats/likes',
     status_code=status.HTTP_200_OK,
@@ -204,98 +819,30 @@ async def liked(
 @router.put(
     '/{track_id}/stats/likes',
     status_code=status.HTTP_202_ACCEPTED,
-    response_model=TrackSchema
+    response_model=TrackSchema | TrackStatsSchema
 )
 async def add_like_to_track(
     track_id:str,
+    counters_only:bool=Query(False,description='return only the new counters of the track'),
     user:UserSchema=Depends(get_current_user),
     service:TrackService=Depends(get_track_service)
 ):
-    db_track = await service.get_by_id(track_id)
-    if not db_track:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f'No track with id {track_id} was found'
-        )
-    
-    result = await service.add_like_from_user_to_track(user.id,track_id)
-    if not result:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail='operation failed'
-        )
-    
-    update_data:TrackUpdateSchema = TrackUpdateSchema(
-        likes=db_track.likes + 1,
-        dislikes=db_track.dislikes,
-        loves=db_track.loves,
-        plays=db_track.plays
-    )
-
-    db_track = await service.update(
-        track_id,
-        update_data,
-        name=db_track.name,
-        author_name=db_track.author_name,
-        size=db_track.size,
-        file_id=db_track.file_id,
-        content_hash=db_track.content_hash,
-        uploaded_by=db_track.uploaded_by
-    )
-    if not db_track:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail='An unexpected error has ocurred while update track info'
-        )
-    return db_track
+    counters = await service.add_like_from_user_to_track(user.id,track_id)
+    return await _stats_response(track_id,counters,counters_only,service)
 
 @router.delete(
     '/{track_id}/stats/likes',
     status_code=status.HTTP_202_ACCEPTED,
-    response_model=TrackSchema
+    response_model=TrackSchema | TrackStatsSchema
 )
 async def remove_like_from_track(
     track_id:str,
+    counters_only:bool=Query(False,description='return only the new counters of the track'),
     user:UserSchema=Depends(get_current_user),
     service:TrackService=Depends(get_track_service)
 ):
-    db_track = await service.get_by_id(track_id)
-    if not db_track:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f'No track with id {track_id} was found'
-        )
-    result = await service.remove_like_from_user_to_track(user.id,track_id)
-
-    if not result:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=result
-        )
-    
-    update_data:TrackUpdateSchema = TrackUpdateSchema(
-        likes=db_track.likes - 1,
-        dislikes=db_track.dislikes,
-        loves=db_track.loves,
-        plays=db_track.plays
-    )
-
-    db_track = await service.update(
-        track_id,
-        update_data,
-        name=db_track.name,
-        author_name=db_track.author_name,
-        size=db_track.size,
-        file_id=db_track.file_id,
-        content_hash=db_track.content_hash,
-        uploaded_by=db_track.uploaded_by
-    )
-    if not db_track:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail='An unexpected error has ocurred while update track info'
-        )
-    return db_track
+    counters = await service.remove_like_from_user_to_track(user.id,track_id)
+    return await _stats_response(track_id,counters,counters_only,service)
 
 @router.get(
     '/{track_id}/stats/dislikes',
@@ -318,97 +865,30 @@ async def disliked(
 @router.put(
     '/{track_id}/stats/dislikes',
     status_code=status.HTTP_202_ACCEPTED,
-    response_model=TrackSchema
+    response_model=TrackSchema | TrackStatsSchema
 )
 async def add_dislike_to_track(
     track_id:str,
+    counters_only:bool=Query(False,description='return only the new counters of the track'),
     user:UserSchema=Depends(get_current_user),
     service:TrackService=Depends(get_track_service)
 ):
-    db_track = await service.get_by_id(track_id)
-    if not db_track:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f'No track with id {track_id} was found'
-        )
-    result = await service.add_dislike_from_user_to_track(user.id,track_id)
-    if not result:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail='operation failed'
-        )
-    
-    update_data:TrackUpdateSchema = TrackUpdateSchema(
-        likes=db_track.likes,
-        dislikes=db_track.dislikes + 1,
-        loves=db_track.loves,
-        plays=db_track.plays
-    )
-
-    db_track = await service.update(
-        track_id,
-        update_data,
-        name=db_track.name,
-        author_name=db_track.author_name,
-        size=db_track.size,
-        file_id=db_track.file_id,
-        content_hash=db_track.content_hash,
-        uploaded_by=db_track.uploaded_by
-    )
-    if not db_track:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail='An unexpected error has ocurred while update track info'
-        )
-    return db_track
+    counters = await service.add_dislike_from_user_to_track(user.id,track_id)
+    return await _stats_response(track_id,counters,counters_only,service)
 
 @router.delete(
     '/{track_id}/stats/dislikes',
     status_code=status.HTTP_202_ACCEPTED,
-    response_model=TrackSchema
+    response_model=TrackSchema | TrackStatsSchema
 )
 async def remove_dislike_from_track(
     track_id:str,
+    counters_only:bool=Query(False,description='return only the new counters of the track'),
     user:UserSchema=Depends(get_current_user),
     service:TrackService=Depends(get_track_service)
 ):
-    db_track = await service.get_by_id(track_id)
-    if not db_track:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f'No track with id {track_id} was found'
-        )
-    
-    result = await service.remove_dislike_from_user_to_track(user.id,track_id)
-    if not result:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail='operation failed'
-        )
-    
-    update_data:TrackUpdateSchema = TrackUpdateSchema(
-        likes=db_track.likes,
-        dislikes=db_track.dislikes - 1,
-        loves=db_track.loves,
-        plays=db_track.plays
-    )
-
-    db_track = await service.update(
-        track_id,
-        update_data,
-        name=db_track.name,
-        author_name=db_track.author_name,
-        size=db_track.size,
-        file_id=db_track.file_id,
-        content_hash=db_track.content_hash,
-        uploaded_by=db_track.uploaded_by
-    )
-    if not db_track:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail='An unexpected error has ocurred while update track info'
-        )
-    return db_track
+    counters = await service.remove_dislike_from_user_to_track(user.id,track_id)
+    return await _stats_response(track_id,counters,counters_only,service)
 
 @router.get(
     '/{track_id}/stats/loves',
@@ -431,136 +911,48 @@ async def loved(
 @router.put(
     '/{track_id}/stats/loves',
     status_code=status.HTTP_202_ACCEPTED,
-    response_model=TrackSchema
+    response_model=TrackSchema | TrackStatsSchema
 )
 async def add_love_to_track(
     track_id:str,
+    counters_only:bool=Query(False,description='return only the new counters of the track'),
     user:UserSchema=Depends(get_current_user),
     service:TrackService=Depends(get_track_service)
 ):
-    db_track = await service.get_by_id(track_id)
-    if not db_track:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f'No track with id {track_id} was found'
-        )
-    result = await service.add_love_from_user_to_track(user.id,track_id)
-    if not result:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail='operation failed'
-        )
-    
-    update_data:TrackUpdateSchema = TrackUpdateSchema(
-        likes=db_track.likes,
-        dislikes=db_track.dislikes,
-        loves=db_track.loves + 1,
-        plays=db_track.plays
-    )
-
-    db_track = await service.update(
-        track_id,
-        update_data,
-        name=db_track.name,
-        author_name=db_track.author_name,
-        size=db_track.size,
-        file_id=db_track.file_id,
-        content_hash=db_track.content_hash,
-        uploaded_by=db_track.uploaded_by
-    )
-    if not db_track:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail='An unexpected error has ocurred while update track info'
-        )
-    return db_track
+    counters = await service.add_love_from_user_to_track(user.id,track_id)
+    return await _stats_response(track_id,counters,counters_only,service)
 
 @router.delete(
     '/{track_id}/stats/loves',
     status_code=status.HTTP_202_ACCEPTED,
-    response_model=TrackSchema
+    response_model=TrackSchema | TrackStatsSchema
 )
 async def remove_love_from_track(
     track_id:str,
+    counters_only:bool=Query(False,description='return only the new counters of the track'),
     user:UserSchema=Depends(get_current_user),
     service:TrackService=Depends(get_track_service)
 ):
-    db_track = await service.get_by_id(track_id)
-    if not db_track:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f'No track with id {track_id} was found'
-        )
-    result = await service.remove_love_from_user_to_track(user.id,track_id)
-    if not result:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail='operation failed'
-        )
-    
-    update_data:TrackUpdateSchema = TrackUpdateSchema(
-        likes=db_track.likes,
-        dislikes=db_track.dislikes,
-        loves=db_track.loves - 1,
-        plays=db_track.plays
-    )
-
-    db_track = await service.update(
-        track_id,
-        update_data,
-        name=db_track.name,
-        author_name=db_track.author_name,
-        size=db_track.size,
-        file_id=db_track.file_id,
-        content_hash=db_track.content_hash,
-        uploaded_by=db_track.uploaded_by
-    )
-    if not db_track:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail='An unexpected error has ocurred while update track info'
-        )
-    return db_track
+    counters = await service.remove_love_from_user_to_track(user.id,track_id)
+    return await _stats_response(track_id,counters,counters_only,service)
 
 @router.put(
     '/{track_id}/stats/plays',
-    response_model=TrackSchema,
-    status_code=status.HTTP_202_ACCEPTED
+    status_code=status.HTTP_202_ACCEPTED,
+    response_model=TrackSchema | TrackStatsSchema | PlayRegisteredSchema
 )
 async def add_play(
     track_id:str,
+    counters_only:bool=Query(False,description='return only the new counters of the track'),
+    username:str | None=Depends(get_current_username),
+    play_counter:PlayCounter | None=Depends(get_track_play_counter),
     service:TrackService=Depends(get_track_service)
 ):
-    db_track = await service.get_by_id(track_id)
-    if not db_track:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f'no track with id {track_id} was found'
-        )
-    
-    update_data:TrackUpdateSchema = TrackUpdateSchema(
-        likes=db_track.likes,
-        dislikes=db_track.dislikes,
-        loves=db_track.loves,
-        plays=db_track.plays + 1
-    )
-
-    db_track = await service.update(
-        track_id,
-        update_data,
-        name=db_track.name,
-        author_name=db_track.author_name,
-        size=db_track.size,
-        file_id=db_track.file_id,
-        content_hash=db_track.content_hash,
-        uploaded_by=db_track.uploaded_by
-    )
-    if not db_track:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail='An unexpected error has ocurred while update track info'
-        )
-    return db_track
+    # buffered plays are written later in batches, the database is not touched here
+    if play_counter and play_counter.record(track_id,username):
+        return PlayRegisteredSchema(id=track_id,pending=play_counter.pending(track_id))
+    counters = await service.add_play(track_id)
+    return await _stats_response(track_id,counters,counters_only,service)
 
 @router.put(
     '/{track_id}',
@@ -572,7 +964,6 @@ async def update(
     track_id:str,
     update_data:TrackPrivateUpdateSchema,
     service:TrackService=Depends(get_track_service),
-    cloud_service:BackBlazeB2Service=Depends(get_backblazeb2_service),
     current_user:UserSchema=Depends(get_current_user),
 ):
     db_track = await service.get_by_id(track_id)
@@ -581,9 +972,6 @@ async def update(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f'No track with id "{track_id}" was found'
         )
-    
-    file_id = db_track.file_id
-    file_name = db_track.name
 
     if current_user.id != db_track.uploaded_by:
         raise HTTPException(
@@ -591,52 +979,15 @@ async def update(
             detail='Only can modify data of your uploaded tracks'
         )
     
-    extension = Path(db_track.name).suffix
-    file_name = Path(db_track.name).name
-    cloud_response = None
-
-    try:
-        file_id = db_track.file_id
-        cloud_response = await cloud_service.rename_file(
-            db_track.file_id,
-            file_name,
-            f'{update_data.name}{extension}'
-        )
-
-        update_data.name = f'{update_data.name}{extension}'
-
-        db_track = await service.private_update(
-            track_id,
-            update_data,
-            size=cloud_response.size,
-            file_id=cloud_response.id,
-            content_hash=db_track.content_hash,
-            uploaded_by=current_user.id,
-            likes=db_track.likes,
-            dislikes=db_track.dislikes,
-            loves=db_track.loves,
-            plays=db_track.plays
-        )
-        if not db_track:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail='An unexpected error has ocurred while updating track info'
-            )
-        return db_track
-    except HTTPException:
-        raise
-    except Exception as e:
-        if cloud_response:
-            cloud_response = await cloud_service.rename_file(
-                file_id,
-                f'{update_data.name}{extension}',
-                file_name
-            )
-        logger.error(e)
+    # the stored file is named after its content, so only the track changes
+    update_data.name = f'{update_data.name}{Path(db_track.name).suffix}'
+    db_track = await service.private_update(track_id,update_data)
+    if not db_track:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail='An unexpected error has ocurred'
+            detail='An unexpected error has ocurred while updating track info'
         )
+    return db_track
 
 
 @router.delete(
@@ -648,7 +999,7 @@ async def delete(
     track_id:str,
     service:TrackService=Depends(get_track_service),
     current_user:UserSchema=Depends(get_current_user),
-    cloud_service:BackBlazeB2Service=Depends(get_backblazeb2_service)
+    job_service:StorageJobService=Depends(get_storage_job_service)
 ):
     db_track = await service.get_by_id(track_id)
     if not db_track:
@@ -661,16 +1012,13 @@ async def delete(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="a track can only be deleted by it's uploader"
         )
-    cloud_deleted = await cloud_service.remove_file(db_track.file_id,db_track.name)
-    if not cloud_deleted:
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail='The track was not deleted from cloud'
-        )
-    deleted = await service.delete(track_id)
+    deleted,blob = await service.remove(track_id)
     if not deleted:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail='An unexpected error has ocurred while deleting'
         )
+    # the removal of the stored file was queued with the deletion of its last track
+    if blob:
+        job_service.notify()
     return {'message':'data deleted successfully'}
\ No newline at end of file
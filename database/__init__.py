@@ -1 +1 @@
-from .session import BaseModel,ENGINE,get_database_session
\ No newline at end of file
+from .session import BaseModel,ENGINE,AsyncSessionLocal,get_database_session,release_connection
\ No newline at end of file
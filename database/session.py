@@ -24,10 +24,25 @@ AsyncSessionLocal = async_sessionmaker(
 # create the base model for the models of database
 BaseModel = declarative_base()
 
-# dependency to get the database session
+# dependency to get the database session, it takes a connection from the pool on its
+# first query and gives it back when the transaction ends, see 'release_connection'
 async def get_database_session():
     async with AsyncSessionLocal() as session:
         try:
             yield session
         finally:
-            await session.close()
\ No newline at end of file
+            await session.close()
+
+async def release_connection(session:AsyncSession) -> None:
+    '''
+    Docstring for release_connection
+
+    ends the transaction opened by the previous queries of the session, so its connection
+    goes back to the pool, for example while waiting for the cloud storage. The next query
+    takes a connection again, and the loaded instances stay usable because the sessions do
+    not expire them on commit
+
+    :type session: AsyncSession
+    '''
+    if session.in_transaction():
+        await session.commit()
\ No newline at end of file
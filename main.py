@@ -1,24 +1,125 @@
-from fastapi import FastAPI,status
+from fastapi import FastAPI,Depends,status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from fastapi.openapi.docs import get_swagger_ui_html
 from fastapi.openapi.utils import get_openapi
+from contextlib import asynccontextmanager
 import logging
+import re
 
 from api.v1.user import router as UserRouter
 from api.v1.playlist import router as PlaylistRouter
 from api.v1.track import router as TrackRouter
+from api.v1.file import router as FileRouter
+from services import (
+    start_storage_service,
+    stop_storage_service,
+    storage_service_ready,
+    StorageService,
+    get_storage_service,
+    start_play_counters,
+    stop_play_counters,
+    start_search_indexes,
+    stop_search_indexes,
+    start_content_hash_filter,
+    stop_content_hash_filter,
+    start_track_file_cache,
+    stop_track_file_cache,
+    get_track_file_cache,
+    start_storage_job_runner,
+    stop_storage_job_runner,
+    StorageJobService,
+    get_storage_job_service,
+    require_stats_token,
+    UploadAdmissionController,
+    UploadAdmissionMiddleware,
+    MULTIPART_OVERHEAD,
+    IdempotencyMiddleware,
+    start_idempotency_store,
+    stop_idempotency_store,
+    get_idempotency_store
+)
 from settings import ENVIRONMENT
+from tools import NEXT_CURSOR_HEADER,UPLOAD_OFFSET_HEADER,IDEMPOTENT_REPLAYED_HEADER
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app:FastAPI):
+    await start_storage_service()
+    await start_play_counters()
+    await start_search_indexes()
+    await start_content_hash_filter()
+    await start_track_file_cache()
+    await start_storage_job_runner()
+    await start_idempotency_store()
+    try:
+        yield
+    finally:
+        await stop_idempotency_store()
+        await stop_storage_job_runner()
+        await stop_track_file_cache()
+        await stop_content_hash_filter()
+        await stop_search_indexes()
+        await stop_play_counters()
+        await stop_storage_service()
+
 app = FastAPI(
     title='ThePLaylist API',
     description='API for ThePlaylist social network',
     version=ENVIRONMENT.API_VERSION,
     docs_url=None,
-    redoc_url=None
+    redoc_url=None,
+    lifespan=lifespan
+)
+
+# uploads admitted by this worker at once
+upload_admission = UploadAdmissionController(
+    ENVIRONMENT.UPLOAD_MAX_CONCURRENT,
+    ENVIRONMENT.UPLOAD_MAX_CONCURRENT_PER_USER,
+    ENVIRONMENT.UPLOAD_MAX_BYTES_IN_FLIGHT,
+    ENVIRONMENT.UPLOAD_RETRY_AFTER
+)
+
+# added before CORS so its rejections still carry the CORS headers
+app.add_middleware(
+    UploadAdmissionMiddleware,
+    controller=upload_admission,
+    routes=[
+        (
+            'POST',
+            re.escape(f'{ENVIRONMENT.GLOBAL_API_PREFIX}/tracks/upload'),
+            ENVIRONMENT.MAX_TRACK_SIZE + MULTIPART_OVERHEAD
+        ),
+        (
+            'POST',
+            re.escape(f'{ENVIRONMENT.GLOBAL_API_PREFIX}/tracks/ingestions'),
+            ENVIRONMENT.MAX_TRACK_SIZE + MULTIPART_OVERHEAD
+        ),
+        (
+            'PUT',
+            re.escape(f'{ENVIRONMENT.GLOBAL_API_PREFIX}/tracks/upload/raw'),
+            ENVIRONMENT.MAX_TRACK_SIZE
+        ),
+        (
+            'PUT',
+            re.escape(f'{ENVIRONMENT.GLOBAL_API_PREFIX}/tracks/uploads/') + '[^/]+',
+            ENVIRONMENT.UPLOAD_SESSION_MAX_CHUNK
+        )
+    ]
+)
+
+# added after the admission control, so a replayed upload is never rejected by it
+app.add_middleware(
+    IdempotencyMiddleware,
+    routes=[
+        ('POST',re.escape(f'{ENVIRONMENT.GLOBAL_API_PREFIX}/tracks/upload'),False),
+        ('PUT',re.escape(f'{ENVIRONMENT.GLOBAL_API_PREFIX}/tracks/upload/raw'),False),
+        ('POST',re.escape(f'{ENVIRONMENT.GLOBAL_API_PREFIX}/tracks/ingestions'),False),
+        ('POST',re.escape(f'{ENVIRONMENT.GLOBAL_API_PREFIX}/playlists/create'),True),
+        ('PUT',re.escape(f'{ENVIRONMENT.GLOBAL_API_PREFIX}/') + '(tracks|playlists)/[^/]+/stats/(likes|dislikes|loves)',True)
+    ]
 )
 
 app.add_middleware(
@@ -26,12 +127,14 @@ app.add_middleware(
     allow_origins=ENVIRONMENT.ALLOWED_ORIGINS,
     allow_credentials=ENVIRONMENT.ALLOWED_CREDENTIALS,
     allow_methods=ENVIRONMENT.ALLOWED_METHODS,
-    allow_headers=ENVIRONMENT.ALLOWED_HEADERS
+    allow_headers=ENVIRONMENT.ALLOWED_HEADERS,
+    expose_headers=[NEXT_CURSOR_HEADER,UPLOAD_OFFSET_HEADER,IDEMPOTENT_REPLAYED_HEADER]
 )
 
 app.include_router(UserRouter,prefix=ENVIRONMENT.GLOBAL_API_PREFIX)
 app.include_router(PlaylistRouter,prefix=ENVIRONMENT.GLOBAL_API_PREFIX)
 app.include_router(TrackRouter,prefix=ENVIRONMENT.GLOBAL_API_PREFIX)
+app.include_router(FileRouter,prefix=ENVIRONMENT.GLOBAL_API_PREFIX)
 
 @app.exception_handler(404)
 async def not_found(request,exc):
@@ -54,6 +157,41 @@ async def rate_limit_exceded(request,exc):
         content={'message':'Too many requests'}
     )
 
+@app.get('/ready',include_in_schema=False)
+async def readiness():
+    if not storage_service_ready():
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={'ready':False}
+        )
+    return {'ready':True}
+
+@app.get('/storage-jobs',include_in_schema=False,dependencies=[Depends(require_stats_token)])
+async def storage_jobs(service:StorageJobService=Depends(get_storage_job_service)):
+    return await service.status()
+
+@app.get('/upload-validation',include_in_schema=False,dependencies=[Depends(require_stats_token)])
+async def upload_validation(service:StorageService=Depends(get_storage_service)):
+    return service.validation_pool.stats()
+
+@app.get('/upload-admission',include_in_schema=False,dependencies=[Depends(require_stats_token)])
+async def upload_admission_stats():
+    return upload_admission.stats()
+
+@app.get('/idempotency',include_in_schema=False,dependencies=[Depends(require_stats_token)])
+async def idempotency():
+    store = get_idempotency_store()
+    if not store:
+        return {'enabled':False}
+    return {'enabled':True,**store.stats()}
+
+@app.get('/stream-cache',include_in_schema=False,dependencies=[Depends(require_stats_token)])
+async def stream_cache():
+    cache = get_track_file_cache()
+    if not cache:
+        return {'enabled':False}
+    return {'enabled':True,**cache.stats()}
+
 @app.get('/docs',include_in_schema=False)
 async def swagger_ui_html_with_cookie_support():
     return get_swagger_ui_html(
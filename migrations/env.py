@@ -8,7 +8,7 @@ from sqlalchemy.ext.asyncio import async_engine_from_config
 from alembic import context
 
 from database import BaseModel
-from models import User,Playlist,Track
+from models import User,Playlist,Blob,Track,UploadSession,StorageJob
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
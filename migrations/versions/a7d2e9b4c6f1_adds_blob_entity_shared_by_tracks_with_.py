@@ -0,0 +1,57 @@
+"""adds 'Blob' entity shared by tracks with the same content
+
+Revision ID: a7d2e9b4c6f1
+Revises: f3a9c6d1e4b8
+Create Date: 2026-10-17 10:12:48.530117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d2e9b4c6f1'
+down_revision: Union[str, Sequence[str], None] = 'f3a9c6d1e4b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('blobs',
+    sa.Column('content_hash', sa.String(), nullable=False),
+    sa.Column('file_id', sa.String(), nullable=False),
+    sa.Column('file_name', sa.String(), nullable=False),
+    sa.Column('size', sa.BigInteger(), nullable=False),
+    sa.Column('references', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('content_hash'),
+    sa.UniqueConstraint('file_id')
+    )
+    # the files stored before keep the name of their track, one track per content
+    op.execute(
+        'INSERT INTO blobs (content_hash, file_id, file_name, size, "references") '
+        'SELECT content_hash, file_id, name, size, 1 FROM tracks'
+    )
+    op.add_column('tracks', sa.Column('file_name', sa.String(), nullable=True))
+    op.execute('UPDATE tracks SET file_name = name')
+    op.alter_column('tracks', 'file_name', nullable=False)
+    op.drop_index(op.f('ix_tracks_content_hash'), table_name='tracks')
+    op.create_index(op.f('ix_tracks_content_hash'), 'tracks', ['content_hash'], unique=False)
+    op.drop_index(op.f('ix_tracks_file_id'), table_name='tracks')
+    op.create_index(op.f('ix_tracks_file_id'), 'tracks', ['file_id'], unique=False)
+    op.create_foreign_key('tracks_content_hash_fkey', 'tracks', 'blobs', ['content_hash'], ['content_hash'])
+    op.create_unique_constraint('uq_tracks_uploaded_by_content_hash', 'tracks', ['uploaded_by', 'content_hash'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_tracks_uploaded_by_content_hash', 'tracks', type_='unique')
+    op.drop_constraint('tracks_content_hash_fkey', 'tracks', type_='foreignkey')
+    op.drop_index(op.f('ix_tracks_file_id'), table_name='tracks')
+    op.create_index(op.f('ix_tracks_file_id'), 'tracks', ['file_id'], unique=True)
+    op.drop_index(op.f('ix_tracks_content_hash'), table_name='tracks')
+    op.create_index(op.f('ix_tracks_content_hash'), 'tracks', ['content_hash'], unique=True)
+    op.drop_column('tracks', 'file_name')
+    op.drop_table('blobs')
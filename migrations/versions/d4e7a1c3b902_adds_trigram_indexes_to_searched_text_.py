@@ -0,0 +1,35 @@
+"""adds trigram indexes to searched text fields of 'Track', 'Playlist' and 'User' entities
+
+Revision ID: d4e7a1c3b902
+Revises: c92694dc99ed
+Create Date: 2026-10-16 10:12:41.318205
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4e7a1c3b902'
+down_revision: Union[str, Sequence[str], None] = 'c92694dc99ed'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index('ix_tracks_name_trgm', 'tracks', ['name'], unique=False, postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_tracks_author_name_trgm', 'tracks', ['author_name'], unique=False, postgresql_using='gin', postgresql_ops={'author_name': 'gin_trgm_ops'})
+    op.create_index('ix_playlists_name_trgm', 'playlists', ['name'], unique=False, postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_users_username_trgm', 'users', ['username'], unique=False, postgresql_using='gin', postgresql_ops={'username': 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_users_username_trgm', table_name='users', postgresql_using='gin')
+    op.drop_index('ix_playlists_name_trgm', table_name='playlists', postgresql_using='gin')
+    op.drop_index('ix_tracks_author_name_trgm', table_name='tracks', postgresql_using='gin')
+    op.drop_index('ix_tracks_name_trgm', table_name='tracks', postgresql_using='gin')
@@ -0,0 +1,57 @@
+"""adds full text search vectors to 'Track' and 'Playlist' entities
+
+Revision ID: e81f5b2d6a47
+Revises: d4e7a1c3b902
+Create Date: 2026-10-16 12:03:55.870114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from models.playlist import SEARCH_VECTOR_DDL
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e81f5b2d6a47'
+down_revision: Union[str, Sequence[str], None] = 'd4e7a1c3b902'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('tracks', sa.Column(
+        'search_vector',
+        postgresql.TSVECTOR(),
+        sa.Computed(
+            "setweight(to_tsvector('simple'::regconfig, coalesce(name, '')), 'A') || "
+            "setweight(to_tsvector('simple'::regconfig, coalesce(author_name, '')), 'B')",
+            persisted=True
+        ),
+        nullable=True
+    ))
+    op.create_index('ix_tracks_search_vector', 'tracks', ['search_vector'], unique=False, postgresql_using='gin')
+
+    op.add_column('playlists', sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+    # the triggers are the ones 'create_all' installs, kept in a single place
+    for statement in SEARCH_VECTOR_DDL:
+        op.execute(statement)
+    # fills the existing playlists through the trigger
+    op.execute('UPDATE playlists SET search_vector = NULL')
+    op.create_index('ix_playlists_search_vector', 'playlists', ['search_vector'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_playlists_search_vector', table_name='playlists', postgresql_using='gin')
+    op.execute('DROP TRIGGER IF EXISTS users_playlists_search_vector_update ON users')
+    op.execute('DROP TRIGGER IF EXISTS playlists_search_vector_update ON playlists')
+    op.execute('DROP FUNCTION IF EXISTS users_playlists_search_vector_trigger()')
+    op.execute('DROP FUNCTION IF EXISTS playlists_search_vector_trigger()')
+    op.execute('DROP FUNCTION IF EXISTS playlist_search_vector(text, text, text)')
+    op.drop_column('playlists', 'search_vector')
+    op.drop_index('ix_tracks_search_vector', table_name='tracks', postgresql_using='gin')
+    op.drop_column('tracks', 'search_vector')
@@ -1,3 +1,7 @@
 from .user import User
 from .playlist import Playlist
-from .track import Track
\ No newline at end of file
+from .blob import Blob,BlobStatus
+from .track import Track
+from .upload_session import UploadSession
+from .storage_job import StorageJob,StorageJobKind,StorageJobStatus
+from .idempotency_key import IdempotencyKey
\ No newline at end of file
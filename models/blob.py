@@ -0,0 +1,29 @@
+from enum import StrEnum
+from sqlalchemy import String,BigInteger,Integer
+from sqlalchemy.orm import mapped_column,Mapped
+from database import BaseModel
+
+class BlobStatus(StrEnum):
+    READY = 'ready'
+    # received and kept on the local disk until a background job stores it
+    PROCESSING = 'processing'
+    # the background job gave up storing it
+    FAILED = 'failed'
+
+class Blob(BaseModel):
+    '''
+    Docstring for Blob
+
+    file stored once per content, named after its content hash and shared by every track
+    with that content. 'references' counts those tracks, the file is removed with the last one.
+    The location of a blob that is not 'READY' is a placeholder
+    '''
+
+    __tablename__ = 'blobs'
+
+    content_hash:Mapped[String] = mapped_column(String,primary_key=True)
+    file_id:Mapped[String] = mapped_column(String,unique=True,nullable=False)
+    file_name:Mapped[String] = mapped_column(String,nullable=False)
+    size:Mapped[BigInteger] = mapped_column(BigInteger,nullable=False)
+    references:Mapped[Integer] = mapped_column(Integer,nullable=False,default=0)
+    status:Mapped[String] = mapped_column(String,nullable=False,default=BlobStatus.READY,server_default=BlobStatus.READY)
@@ -0,0 +1,20 @@
+from sqlalchemy import String,Integer,DateTime,JSON,LargeBinary
+from sqlalchemy.orm import mapped_column,Mapped
+from database import BaseModel
+
+class IdempotencyKey(BaseModel):
+    '''
+    Docstring for IdempotencyKey
+
+    response of a request sent with an 'Idempotency-Key' header, replayed to the retries of
+    the request until it expires. 'status_code' is null while the request is running
+    '''
+
+    __tablename__ = 'idempotency_keys'
+
+    key:Mapped[String] = mapped_column(String,primary_key=True)
+    fingerprint:Mapped[String] = mapped_column(String,nullable=False)
+    status_code:Mapped[Integer] = mapped_column(Integer,nullable=True)
+    headers:Mapped[JSON] = mapped_column(JSON,nullable=True)
+    body:Mapped[LargeBinary] = mapped_column(LargeBinary,nullable=True)
+    expires_at:Mapped[DateTime] = mapped_column(DateTime(timezone=True),nullable=False,index=True)
@@ -1,4 +1,5 @@
-from sqlalchemy import String,BigInteger,ForeignKey,Column,Table
+from sqlalchemy import String,BigInteger,ForeignKey,Column,Table,Index,DDL,event
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import mapped_column,Mapped,relationship
 from database import BaseModel
 
@@ -31,6 +32,11 @@ class Playlist(BaseModel):
     '''
 
     __tablename__ = 'playlists'
+    __table_args__ = (
+        # trigram index, it serves the 'ILIKE %text%' searches
+        Index('ix_playlists_name_trgm','name',postgresql_using='gin',postgresql_ops={'name':'gin_trgm_ops'}),
+        Index('ix_playlists_search_vector','search_vector',postgresql_using='gin'),
+    )
     
     id:Mapped[String] = mapped_column(String,primary_key=True)
     name:Mapped[String] = mapped_column(String,nullable=False)
@@ -39,6 +45,8 @@ class Playlist(BaseModel):
     plays:Mapped[BigInteger] = mapped_column(BigInteger,default=0)
     description:Mapped[String] = mapped_column(String,nullable=True)
     loves:Mapped[BigInteger] = mapped_column(BigInteger,default=0)
+    # full text document of the ranked search, maintained by the triggers in 'SEARCH_VECTOR_DDL'
+    search_vector:Mapped[TSVECTOR] = mapped_column(TSVECTOR,nullable=True,deferred=True)
 
     author_id:Mapped[String] = mapped_column(String,ForeignKey('users.id',ondelete='CASCADE'),nullable=False,index=True)
     author = relationship('User',back_populates='playlists',lazy='selectin')
@@ -66,4 +74,54 @@ class Playlist(BaseModel):
         'User',
         back_populates='playlists_loves',
         secondary=playlists_loves
-    )
\ No newline at end of file
+    )
+
+# the document of a playlist includes the username of its author, that lives in another
+# table, so it cannot be a generated column and is kept up to date by triggers
+SEARCH_VECTOR_DDL = (
+    """
+    CREATE OR REPLACE FUNCTION playlist_search_vector(name text, description text, username text)
+    RETURNS tsvector LANGUAGE sql IMMUTABLE AS $$
+        SELECT setweight(to_tsvector('simple'::regconfig, coalesce(name, '')), 'A')
+            || setweight(to_tsvector('simple'::regconfig, coalesce(username, '')), 'B')
+            || setweight(to_tsvector('simple'::regconfig, coalesce(description, '')), 'C')
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION playlists_search_vector_trigger()
+    RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        NEW.search_vector := playlist_search_vector(
+            NEW.name,
+            NEW.description,
+            (SELECT username FROM users WHERE id = NEW.author_id)
+        );
+        RETURN NEW;
+    END
+    $$
+    """,
+    """
+    CREATE TRIGGER playlists_search_vector_update
+    BEFORE INSERT OR UPDATE OF name, description, author_id, search_vector ON playlists
+    FOR EACH ROW EXECUTE FUNCTION playlists_search_vector_trigger()
+    """,
+    """
+    CREATE OR REPLACE FUNCTION users_playlists_search_vector_trigger()
+    RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF NEW.username IS DISTINCT FROM OLD.username THEN
+            UPDATE playlists SET search_vector = NULL WHERE author_id = NEW.id;
+        END IF;
+        RETURN NULL;
+    END
+    $$
+    """,
+    """
+    CREATE TRIGGER users_playlists_search_vector_update
+    AFTER UPDATE OF username ON users
+    FOR EACH ROW EXECUTE FUNCTION users_playlists_search_vector_trigger()
+    """
+)
+
+for statement in SEARCH_VECTOR_DDL:
+    event.listen(Playlist.__table__,'after_create',DDL(statement).execute_if(dialect='postgresql'))
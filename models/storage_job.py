@@ -0,0 +1,39 @@
+from enum import StrEnum
+from sqlalchemy import String,Integer,DateTime,JSON
+from sqlalchemy.orm import mapped_column,Mapped
+from database import BaseModel
+
+class StorageJobKind(StrEnum):
+    # removes a stored file no track references anymore
+    REMOVE_FILE = 'remove_file'
+    # stores a file received by an ingestion and kept on the local disk
+    STORE_FILE = 'store_file'
+
+class StorageJobStatus(StrEnum):
+    PENDING = 'pending'
+    DONE = 'done'
+    # gave up after the max number of attempts
+    FAILED = 'failed'
+
+class StorageJob(BaseModel):
+    '''
+    Docstring for StorageJob
+
+    storage operation run in the background after the request that asked for it, it is
+    written in the same transaction as the change that makes it needed so it is never lost.
+    'idempotency_key' keeps the same operation from being queued twice
+    '''
+
+    __tablename__ = 'storage_jobs'
+
+    id:Mapped[String] = mapped_column(String,primary_key=True)
+    kind:Mapped[String] = mapped_column(String,nullable=False)
+    idempotency_key:Mapped[String] = mapped_column(String,unique=True,nullable=False)
+    payload:Mapped[JSON] = mapped_column(JSON,nullable=False)
+    status:Mapped[String] = mapped_column(String,nullable=False,index=True,default=StorageJobStatus.PENDING)
+    attempts:Mapped[Integer] = mapped_column(Integer,nullable=False,default=0)
+    last_error:Mapped[String] = mapped_column(String,nullable=True)
+    # a pending job is not run before this moment, it is pushed forward while a worker runs it
+    run_after:Mapped[DateTime] = mapped_column(DateTime(timezone=True),nullable=False,index=True)
+    created_at:Mapped[DateTime] = mapped_column(DateTime(timezone=True),nullable=False)
+    updated_at:Mapped[DateTime] = mapped_column(DateTime(timezone=True),nullable=False)
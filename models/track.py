@@ -1,6 +1,8 @@
-from sqlalchemy import Column, ForeignKey, String,Integer,BigInteger,Table
+from sqlalchemy import Column, ForeignKey, String,Integer,BigInteger,Table,Index,Computed,UniqueConstraint
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import mapped_column,Mapped,relationship
 from database import BaseModel
+from .blob import BlobStatus
 
 playlists_tracks = Table(
     'playlists_tracks',
@@ -38,18 +40,41 @@ class Track(BaseModel):
     '''
 
     __tablename__ = 'tracks'
+    __table_args__ = (
+        # trigram indexes, they serve the 'ILIKE %text%' searches
+        Index('ix_tracks_name_trgm','name',postgresql_using='gin',postgresql_ops={'name':'gin_trgm_ops'}),
+        Index('ix_tracks_author_name_trgm','author_name',postgresql_using='gin',postgresql_ops={'author_name':'gin_trgm_ops'}),
+        Index('ix_tracks_search_vector','search_vector',postgresql_using='gin'),
+        # a user can share a content with other users but can not upload it twice
+        UniqueConstraint('uploaded_by','content_hash',name='uq_tracks_uploaded_by_content_hash'),
+    )
 
     id:Mapped[String] = mapped_column(String,primary_key=True)
-    file_id:Mapped[String] = mapped_column(String,unique=True,index=True,nullable=False)
-    content_hash:Mapped[String] = mapped_column(String,unique=True,nullable=False,index=True)
+    # location of the stored file, copied from the blob of the content
+    file_id:Mapped[String] = mapped_column(String,index=True,nullable=False)
+    file_name:Mapped[String] = mapped_column(String,nullable=False)
+    content_hash:Mapped[String] = mapped_column(String,ForeignKey('blobs.content_hash'),nullable=False,index=True)
     name:Mapped[String] = mapped_column(String,nullable=False,index=True)
     author_name:Mapped[String] = mapped_column(String,nullable=False,index=True)
     size:Mapped[Integer] = mapped_column(Integer,nullable=False)
+    # copied from the blob of the content, only a 'READY' track can be downloaded
+    status:Mapped[String] = mapped_column(String,nullable=False,default=BlobStatus.READY,server_default=BlobStatus.READY)
     likes:Mapped[BigInteger] = mapped_column(BigInteger,default=0)
     dislikes:Mapped[BigInteger] = mapped_column(BigInteger,default=0)
     plays:Mapped[BigInteger] = mapped_column(BigInteger,default=0)
     loves:Mapped[BigInteger] = mapped_column(BigInteger,default=0)
     uploaded_by:Mapped[String] = mapped_column(String,ForeignKey('users.id',ondelete='CASCADE'),nullable=False,index=True)
+    # full text document of the ranked search, computed by the database
+    search_vector:Mapped[TSVECTOR] = mapped_column(
+        TSVECTOR,
+        Computed(
+            "setweight(to_tsvector('simple'::regconfig, coalesce(name, '')), 'A') || "
+            "setweight(to_tsvector('simple'::regconfig, coalesce(author_name, '')), 'B')",
+            persisted=True
+        ),
+        nullable=True,
+        deferred=True
+    )
 
     playlists = relationship(
         'Playlist',
@@ -0,0 +1,22 @@
+from sqlalchemy import ForeignKey,String,BigInteger,DateTime
+from sqlalchemy.orm import mapped_column,Mapped
+from database import BaseModel
+
+class UploadSession(BaseModel):
+    '''
+    Docstring for UploadSession
+
+    resumable upload of a track, the received bytes are kept in a file shared by all the
+    workers and this row tells how many of them were written
+    '''
+
+    __tablename__ = 'upload_sessions'
+
+    id:Mapped[String] = mapped_column(String,primary_key=True)
+    user_id:Mapped[String] = mapped_column(String,ForeignKey('users.id',ondelete='CASCADE'),nullable=False,index=True)
+    track_name:Mapped[String] = mapped_column(String,nullable=False)
+    author_name:Mapped[String] = mapped_column(String,nullable=False)
+    file_name:Mapped[String] = mapped_column(String,nullable=False)
+    size:Mapped[BigInteger] = mapped_column(BigInteger,nullable=False)
+    received:Mapped[BigInteger] = mapped_column(BigInteger,nullable=False,default=0)
+    expires_at:Mapped[DateTime] = mapped_column(DateTime(timezone=True),nullable=False,index=True)
@@ -1,4 +1,4 @@
-from sqlalchemy import String
+from sqlalchemy import String,Index
 from sqlalchemy.orm import mapped_column,Mapped,relationship
 from database import BaseModel
 
@@ -10,6 +10,10 @@ class User(BaseModel):
     '''
 
     __tablename__ = 'users'
+    __table_args__ = (
+        # trigram index, it serves the 'ILIKE %text%' searches of playlists by author
+        Index('ix_users_username_trgm','username',postgresql_using='gin',postgresql_ops={'username':'gin_trgm_ops'}),
+    )
 
     id:Mapped[String] = mapped_column(String,primary_key=True)
     username:Mapped[String] = mapped_column(String,unique=True,index=True,nullable=False)
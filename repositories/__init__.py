@@ -4,6 +4,9 @@ from database import get_database_session
 from .user import UserRepository
 from .playlist import PlaylistRepository
 from .track import TrackRepository
+from .upload_session import UploadSessionRepository
+from .storage_job import StorageJobRepository,store_file_job_key
+from .idempotency_key import IdempotencyKeyRepository
 
 def get_user_repository(db:AsyncSession=Depends(get_database_session)):
     '''
@@ -52,6 +55,36 @@ def get_playlist_repository(
     :rtype: PlaylistRepository
     '''
     repository = PlaylistRepository(db,track_repository,user_repository)
+    try:
+        yield repository
+    finally:
+        repository = None
+
+def get_upload_session_repository(db:AsyncSession=Depends(get_database_session)):
+    '''
+    Docstring for get_upload_session_repository
+    
+    :param db: database session dependency
+    :type db: AsyncSession
+    :return: the 'UploadSessionRepository' dependency
+    :rtype: UploadSessionRepository
+    '''
+    repository = UploadSessionRepository(db)
+    try:
+        yield repository
+    finally:
+        repository = None
+
+def get_storage_job_repository(db:AsyncSession=Depends(get_database_session)):
+    '''
+    Docstring for get_storage_job_repository
+    
+    :param db: database session dependency
+    :type db: AsyncSession
+    :return: the 'StorageJobRepository' dependency
+    :rtype: StorageJobRepository
+    '''
+    repository = StorageJobRepository(db)
     try:
         yield repository
     finally:
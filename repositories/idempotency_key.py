@@ -0,0 +1,146 @@
+import datetime
+import logging
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy import select,update,delete
+from typing import List,Tuple
+from models import IdempotencyKey
+from .repository import Repository
+
+logger = logging.getLogger(__name__)
+
+class IdempotencyKeyRepository(Repository[IdempotencyKey]):
+
+    def __init__(self,db:AsyncSession):
+        super().__init__(IdempotencyKey,db)
+
+    async def _try_get_instance(self,instance:IdempotencyKey) -> IdempotencyKey | None:
+        return await self.get_by_id(str(instance.key))
+
+    async def claim(
+        self,
+        key:str,
+        fingerprint:str,
+        expires_at:datetime.datetime
+    ) -> Tuple[bool,IdempotencyKey | None]:
+        '''
+        Docstring for claim
+
+        takes the key for a request, an expired key is taken again
+
+        :type key: str
+        :param fingerprint: what identifies the request sent with the key
+        :type fingerprint: str
+        :param expires_at: moment the key is released if its request never completes
+        :type expires_at: datetime.datetime
+        :return: if the key was taken, else the record of the request that has it, None if
+        it could not be read
+        :rtype: Tuple[bool, IdempotencyKey | None]
+        '''
+        try:
+            await self._db.execute(
+                delete(IdempotencyKey)
+                .where(IdempotencyKey.key==key)
+                .where(IdempotencyKey.expires_at < datetime.datetime.now(datetime.UTC))
+            )
+            result = await self._db.execute(
+                insert(IdempotencyKey)
+                .values(key=key,fingerprint=fingerprint,expires_at=expires_at)
+                .on_conflict_do_nothing(index_elements=[IdempotencyKey.key])
+                .returning(IdempotencyKey.key)
+            )
+            claimed = result.scalar_one_or_none() is not None
+            await self._db.commit()
+            if claimed:
+                return True,None
+            result = await self._db.execute(
+                select(IdempotencyKey)
+                .where(IdempotencyKey.key==key)
+                .execution_options(populate_existing=True)
+            )
+            return False,result.scalar_one_or_none()
+        except SQLAlchemyError as e:
+            logger.error(f'Database error claiming IdempotencyKey: {e}')
+            await self._db.rollback()
+            return False,None
+
+    async def complete(
+        self,
+        key:str,
+        status_code:int,
+        headers:List[List[str]],
+        body:bytes,
+        expires_at:datetime.datetime
+    ) -> bool:
+        '''
+        Docstring for complete
+
+        saves the response of the request that has the key
+
+        :type key: str
+        :type status_code: int
+        :param headers: name and value of each header of the response
+        :type headers: List[List[str]]
+        :type body: bytes
+        :param expires_at: moment the response stops being replayed
+        :type expires_at: datetime.datetime
+        :return: True if the key was updated, False otherwise
+        :rtype: bool
+        '''
+        try:
+            result = await self._db.execute(
+                update(IdempotencyKey)
+                .where(IdempotencyKey.key==key)
+                .values(status_code=status_code,headers=headers,body=body,expires_at=expires_at)
+            )
+            await self._db.commit()
+            return result.rowcount > 0 # type: ignore
+        except SQLAlchemyError as e:
+            logger.error(f'Database error updating IdempotencyKey: {e}')
+            await self._db.rollback()
+            return False
+
+    async def release(self,key:str) -> bool:
+        '''
+        Docstring for release
+
+        frees a key whose request has no response worth replaying, so it can be retried
+
+        :type key: str
+        :return: True if the key was released, False otherwise
+        :rtype: bool
+        '''
+        try:
+            result = await self._db.execute(
+                delete(IdempotencyKey)
+                .where(IdempotencyKey.key==key)
+                .where(IdempotencyKey.status_code.is_(None))
+            )
+            await self._db.commit()
+            return result.rowcount > 0 # type: ignore
+        except SQLAlchemyError as e:
+            logger.error(f'Database error deleting IdempotencyKey: {e}')
+            await self._db.rollback()
+            return False
+
+    async def delete_expired(self,now:datetime.datetime) -> int:
+        '''
+        Docstring for delete_expired
+
+        :param now: keys expired before this moment are deleted
+        :type now: datetime.datetime
+        :return: the number of deleted keys
+        :rtype: int
+        '''
+        try:
+            result = await self._db.execute(
+                delete(IdempotencyKey)
+                .where(IdempotencyKey.expires_at < now)
+            )
+            await self._db.commit()
+            return result.rowcount # type: ignore
+        except SQLAlchemyError as e:
+            logger.error(f'Database error deleting expired IdempotencyKey: {e}')
+            await self._db.rollback()
+            return 0
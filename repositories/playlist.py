@@ -1,7 +1,7 @@
-from typing import Sequence
+from typing import AsyncIterator,Sequence
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError,SQLAlchemyError
-from sqlalchemy import select,exists,func
+from sqlalchemy import Row,select,exists,func
 from sqlalchemy.orm import selectinload
 from .repository import Repository
 from .track import TrackRepository
@@ -19,6 +19,9 @@ logger = logging.getLogger(__name__)
 
 class PlaylistRepository(Repository[Playlist]):
 
+    _counters = ('likes','dislikes','loves','plays')
+    _generated = ('search_vector',)
+
     def __init__(self,db: AsyncSession,track_repository:TrackRepository,user_repository:UserRepository):
         super().__init__(Playlist, db)
         self._track_repository = track_repository
@@ -76,210 +79,108 @@ class PlaylistRepository(Repository[Playlist]):
         result = await self._db.execute(query)
         return result.scalar() == True
 
-    async def add_like_from_user_to_playlist(self,user_id:str,playlist_id:str) -> bool:
+    async def add_like_from_user_to_playlist(self,user_id:str,playlist_id:str) -> Row | None:
         '''
         Docstring for add_like_from_user_to_playlist
         
         :type user_id: str
         :type playlist_id: str
-        :rtype: bool
-        '''
-        query = select(Playlist).where(Playlist.id==playlist_id).options(selectinload(Playlist.users_likes))
-        result = await self._db.execute(query)
-        db_playlist = result.scalar_one_or_none()
-        if not db_playlist:
-            return False
-        db_user = await self._user_repository.get_by_id(user_id)
-        if not db_user:
-            return False
-        try:
-            db_playlist.users_likes.append(db_user)
-            await self._db.commit()
-            await self._db.refresh(db_playlist)
-            return True
-        except IntegrityError as e:
-            logger.error(f'Integrity error while adding like: {e}')
-            await self._db.rollback()
-            return False
-        except SQLAlchemyError as e:
-            logger.error(f'Database error whiel adding like: {e}')
-            await self._db.rollback()
-            return False
-        except Exception as e:
-            logger.error(f'An unexpected error has ocurred while adding like: {e}')
-            await self._db.rollback()
-            return False
+        :return: the new counters if success, else None
+        :rtype: Row | None
+        '''
+        return await self._add_reaction(
+            self._likes.columns.playlist_id,
+            self._likes.columns.user_id,
+            playlist_id,
+            user_id,
+            'likes'
+        )
     
-    async def remove_like_from_user_to_playlist(self,user_id:str,playlist_id:str) -> bool:
+    async def remove_like_from_user_to_playlist(self,user_id:str,playlist_id:str) -> Row | None:
         '''
         Docstring for remove_like_from_user_to_playlist
         
         :type user_id: str
         :type playlist_id: str
-        :rtype: bool
-        '''
-        query = select(Playlist).where(Playlist.id==playlist_id).options(selectinload(Playlist.users_likes))
-        result = await self._db.execute(query)
-        db_playlist = result.scalar_one_or_none()
-        if not db_playlist:
-            return False
-        db_user = await self._user_repository.get_by_id(user_id)
-        if not db_user:
-            return False
-        try:
-            db_playlist.users_likes.remove(db_user)
-            await self._db.commit()
-            await self._db.refresh(db_playlist)
-            return True
-        except IntegrityError as e:
-            logger.error(f'Integrity error while removing like: {e}')
-            await self._db.rollback()
-            return False
-        except SQLAlchemyError as e:
-            logger.error(f'Database error whiel removing like: {e}')
-            await self._db.rollback()
-            return False
-        except Exception as e:
-            logger.error(f'An unexpected error has ocurred while removing like: {e}')
-            await self._db.rollback()
-            return False
+        :return: the new counters if success, else None
+        :rtype: Row | None
+        '''
+        return await self._remove_reaction(
+            self._likes.columns.playlist_id,
+            self._likes.columns.user_id,
+            playlist_id,
+            user_id,
+            'likes'
+        )
     
-    async def add_dislike_from_user_to_playlist(self,user_id:str,playlist_id:str) -> bool:
+    async def add_dislike_from_user_to_playlist(self,user_id:str,playlist_id:str) -> Row | None:
         '''
         Docstring for add_dislike_from_user_to_playlist
         
         :type user_id: str
         :type playlist_id: str
-        :rtype: bool
-        '''
-        query = select(Playlist).where(Playlist.id==playlist_id).options(selectinload(Playlist.users_dislikes))
-        result = await self._db.execute(query)
-        db_playlist = result.scalar_one_or_none()
-        if not db_playlist:
-            return False
-        db_user = await self._user_repository.get_by_id(user_id)
-        if not db_user:
-            return False
-        try:
-            db_playlist.users_dislikes.append(db_user)
-            await self._db.commit()
-            await self._db.refresh(db_playlist)
-            return True
-        except IntegrityError as e:
-            logger.error(f'Integrity error while adding dislike: {e}')
-            await self._db.rollback()
-            return False
-        except SQLAlchemyError as e:
-            logger.error(f'Database error whiel adding dislike: {e}')
-            await self._db.rollback()
-            return False
-        except Exception as e:
-            logger.error(f'An unexpected error has ocurred while adding dislike: {e}')
-            await self._db.rollback()
-            return False
+        :return: the new counters if success, else None
+        :rtype: Row | None
+        '''
+        return await self._add_reaction(
+            self._dislikes.columns.playlist_id,
+            self._dislikes.columns.user_id,
+            playlist_id,
+            user_id,
+            'dislikes'
+        )
     
-    async def remove_dislike_from_user_to_playlist(self,user_id:str,playlist_id:str) -> bool:
+    async def remove_dislike_from_user_to_playlist(self,user_id:str,playlist_id:str) -> Row | None:
         '''
         Docstring for remove_dislike_from_user_to_playlist
         
         :type user_id: str
         :type playlist_id: str
-        :rtype: bool
-        '''
-        query = select(Playlist).where(Playlist.id==playlist_id).options(selectinload(Playlist.users_dislikes))
-        result = await self._db.execute(query)
-        db_playlist = result.scalar_one_or_none()
-        if not db_playlist:
-            return False
-        db_user = await self._user_repository.get_by_id(user_id)
-        if not db_user:
-            return False
-        try:
-            db_playlist.users_dislikes.remove(db_user)
-            await self._db.commit()
-            await self._db.refresh(db_playlist)
-            return True
-        except IntegrityError as e:
-            logger.error(f'Integrity error while removing dislike: {e}')
-            await self._db.rollback()
-            return False
-        except SQLAlchemyError as e:
-            logger.error(f'Database error whiel removing dislike: {e}')
-            await self._db.rollback()
-            return False
-        except Exception as e:
-            logger.error(f'An unexpected error has ocurred while removing dislike: {e}')
-            await self._db.rollback()
-            return False
-
-    async def add_love_from_user_to_playlist(self,user_id:str,playlist_id:str) -> bool:
+        :return: the new counters if success, else None
+        :rtype: Row | None
+        '''
+        return await self._remove_reaction(
+            self._dislikes.columns.playlist_id,
+            self._dislikes.columns.user_id,
+            playlist_id,
+            user_id,
+            'dislikes'
+        )
+    
+    async def add_love_from_user_to_playlist(self,user_id:str,playlist_id:str) -> Row | None:
         '''
         Docstring for add_love_from_user_to_playlist
         
         :type user_id: str
         :type playlist_id: str
-        :rtype: bool
-        '''
-        query = select(Playlist).where(Playlist.id==playlist_id).options(selectinload(Playlist.users_loves))
-        result = await self._db.execute(query)
-        db_playlist = result.scalar_one_or_none()
-        if not db_playlist:
-            return False
-        db_user = await self._user_repository.get_by_id(user_id)
-        if not db_user:
-            return False
-        try:
-            db_playlist.users_loves.append(db_user)
-            await self._db.commit()
-            await self._db.refresh(db_playlist)
-            return True
-        except IntegrityError as e:
-            logger.error(f'Integrity error while adding love: {e}')
-            await self._db.rollback()
-            return False
-        except SQLAlchemyError as e:
-            logger.error(f'Database error whiel adding love: {e}')
-            await self._db.rollback()
-            return False
-        except Exception as e:
-            logger.error(f'An unexpected error has ocurred while adding love: {e}')
-            await self._db.rollback()
-            return False
+        :return: the new counters if success, else None
+        :rtype: Row | None
+        '''
+        return await self._add_reaction(
+            self._loves.columns.playlist_id,
+            self._loves.columns.user_id,
+            playlist_id,
+            user_id,
+            'loves'
+        )
     
-    async def remove_love_from_user_to_playlist(self,user_id:str,playlist_id:str) -> bool:
+    async def remove_love_from_user_to_playlist(self,user_id:str,playlist_id:str) -> Row | None:
         '''
         Docstring for remove_love_from_user_to_playlist
         
         :type user_id: str
         :type playlist_id: str
-        :rtype: bool
-        '''
-        query = select(Playlist).where(Playlist.id==playlist_id).options(selectinload(Playlist.users_loves))
-        result = await self._db.execute(query)
-        db_playlist = result.scalar_one_or_none()
-        if not db_playlist:
-            return False
-        db_user = await self._user_repository.get_by_id(user_id)
-        if not db_user:
-            return False
-        try:
-            db_playlist.users_loves.remove(db_user)
-            await self._db.commit()
-            await self._db.refresh(db_playlist)
-            return True
-        except IntegrityError as e:
-            logger.error(f'Integrity error while removing love: {e}')
-            await self._db.rollback()
-            return False
-        except SQLAlchemyError as e:
-            logger.error(f'Database error whiel removing love: {e}')
-            await self._db.rollback()
-            return False
-        except Exception as e:
-            logger.error(f'An unexpected error has ocurred while removing love: {e}')
-            await self._db.rollback()
-            return False
-
+        :return: the new counters if success, else None
+        :rtype: Row | None
+        '''
+        return await self._remove_reaction(
+            self._loves.columns.playlist_id,
+            self._loves.columns.user_id,
+            playlist_id,
+            user_id,
+            'loves'
+        )
+    
     async def add_track_to_playlist(self,playlist_id:str,track_id:str) -> bool:
         '''
         Docstring for add_track_to_playlist
@@ -344,7 +245,7 @@ class PlaylistRepository(Repository[Playlist]):
             await self._db.rollback()
             return False
         
-    async def get_user_playlists(self,user_id:str,skip:int=0,limit:int=100) -> Sequence[Playlist]:
+    async def get_user_playlists(self,user_id:str,skip:int=0,limit:int=100,after:str | None=None) -> Sequence[Playlist]:
         '''
         Docstring for get_user_playlists
         
@@ -353,9 +254,12 @@ class PlaylistRepository(Repository[Playlist]):
         :type skip: int
         :param limit: limit of results by query
         :type limit: int
+        :param after: id of the last result of the previous page, replaces 'skip'
+        :type after: str | None
         :rtype: Sequence[Playlist]
         '''
-        query = select(Playlist).where(Playlist.author_id == user_id).offset(skip).limit(limit)
+        query = select(Playlist).where(Playlist.author_id == user_id)
+        query = self._paginate(query,limit,skip,after)
         result = await self._db.execute(query)
         return result.scalars().all()
     
@@ -371,12 +275,14 @@ class PlaylistRepository(Repository[Playlist]):
         result = await self._db.execute(query)
         return result.scalar() == True
     
-    async def get_instances(self, limit: int = 100, skip: int = 0) -> Sequence[Playlist]:
+    async def get_instances(self, limit: int = 100, skip: int = 0, after: str | None = None) -> Sequence[Playlist]:
         '''
         Docstring for get_instances
         
         :type limit: int
         :type skip: int
+        :param after: id of the last result of the previous page, replaces 'skip'
+        :type after: str | None
         :rtype: Sequence[Playlist]
         '''
         subquery = (
@@ -386,17 +292,20 @@ class PlaylistRepository(Repository[Playlist]):
             )
             .correlate(Playlist)
         )
-        query = select(Playlist).where(exists(subquery)).offset(skip).limit(limit)
+        query = select(Playlist).where(exists(subquery))
+        query = self._paginate(query,limit,skip,after)
         result = await self._db.execute(query)
         return result.scalars().all()
     
-    async def search_playlists_by_name(self,text:str,limit:int=100,skip:int=0) -> Sequence[Playlist]:
+    async def search_playlists_by_name(self,text:str,limit:int=100,skip:int=0,after:str | None=None) -> Sequence[Playlist]:
         '''
         Docstring for search_playlist_by_name
         
         :type text: str
         :type limit: int
         :type skip: int
+        :param after: id of the last result of the previous page, replaces 'skip'
+        :type after: str | None
         :rtype: Sequence[Playlist]
         '''
         subquery = (
@@ -406,17 +315,20 @@ class PlaylistRepository(Repository[Playlist]):
             )
             .correlate(Playlist)
         )
-        query = select(Playlist).where(exists(subquery)).where(Playlist.name.like(f'%{text}%')).offset(skip).limit(limit)
+        query = select(Playlist).where(exists(subquery)).where(self._contains(Playlist.name,text))
+        query = self._paginate(query,limit,skip,after)
         result = await self._db.execute(query)
         return result.scalars().all()
     
-    async def search_playlists_by_author_name(self,text:str,limit:int=100,skip:int=0) -> Sequence[Playlist]:
+    async def search_playlists_by_author_name(self,text:str,limit:int=100,skip:int=0,after:str | None=None) -> Sequence[Playlist]:
         '''
         Docstring for search_playlist_by_author_name
         
         :type text: str
         :type limit: int
         :type skip: int
+        :param after: id of the last result of the previous page, replaces 'skip'
+        :type after: str | None
         :rtype: Sequence[Playlist]
         '''
         subquery = (
@@ -427,18 +339,21 @@ class PlaylistRepository(Repository[Playlist]):
             .correlate(Playlist)
         )
         query = select(Playlist).where(exists(subquery)).join(Playlist.author).where(
-            User.username.like(f'%{text}%')
-        ).offset(skip).limit(limit)
+            self._contains(User.username,text)
+        )
+        query = self._paginate(query,limit,skip,after)
         result = await self._db.execute(query)
         return result.scalars().all()
     
-    async def search_playlists_by_text(self,text:str,limit:int=100,skip:int=0) -> Sequence[Playlist]:
+    async def search_playlists_by_text(self,text:str,limit:int=100,skip:int=0,after:str | None=None) -> Sequence[Playlist]:
         '''
         Docstring for search_playlist_by_text
         
         :type text: str
         :type limit: int
         :type skip: int
+        :param after: id of the last result of the previous page, replaces 'skip'
+        :type after: str | None
         :rtype: Sequence[Playlist]
         '''
         subquery = (
@@ -449,8 +364,74 @@ class PlaylistRepository(Repository[Playlist]):
             .correlate(Playlist)
         )
         query = select(Playlist).where(exists(subquery)).options(selectinload(Playlist.author)).where(
-            (Playlist.name.like(f'%{text}%')) |
-            (Playlist.author.has(User.username.like(f'%{text}%')))
+            (self._contains(Playlist.name,text)) |
+            (Playlist.author.has(self._contains(User.username,text)))
+        )
+        query = self._paginate(query,limit,skip,after)
+        result = await self._db.execute(query)
+        return result.scalars().all()
+
+    async def rank_playlists_by_text(self,text:str,limit:int=100,skip:int=0,candidates:int=1000) -> Sequence[Playlist]:
+        '''
+        Docstring for rank_playlists_by_text
+        
+        :type text: str
+        :type limit: int
+        :type skip: int
+        :param candidates: max number of matches blended with the popularity counters
+        :type candidates: int
+        :return: the playlists matching the text in their name, description or author, the most
+        relevant and popular first
+        :rtype: Sequence[Playlist]
+        '''
+        subquery = (
+            select(1).where(
+                (self._tracks.columns.playlist_id==Playlist.id) &
+                (self._tracks.columns.track_id==Track.id)
+            )
+            .correlate(Playlist)
         )
+        query = self._rank(select(Playlist).where(exists(subquery)),text,limit,skip,candidates)
         result = await self._db.execute(query)
-        return result.scalars().all()
\ No newline at end of file
+        return result.scalars().all()
+
+    async def search_playlists_by_ids(self,ids:Sequence[str],limit:int=100,skip:int=0,after:str | None=None) -> Sequence[Playlist]:
+        '''
+        Docstring for search_playlists_by_ids
+        
+        :param ids: ids of the playlists matching a search
+        :type ids: Sequence[str]
+        :type limit: int
+        :type skip: int
+        :param after: id of the last result of the previous page, replaces 'skip'
+        :type after: str | None
+        :return: one page of the playlists that still exist and have tracks, as the other searches
+        :rtype: Sequence[Playlist]
+        '''
+        if len(ids) == 0:
+            return []
+        subquery = (
+            select(1).where(
+                (self._tracks.columns.playlist_id==Playlist.id) &
+                (self._tracks.columns.track_id==Track.id)
+            )
+            .correlate(Playlist)
+        )
+        query = select(Playlist).where(exists(subquery)).where(Playlist.id.in_(ids))
+        query = self._paginate(query,limit,skip,after)
+        result = await self._db.execute(query)
+        return result.scalars().all()
+
+    async def stream_search_documents(self,batch_size:int=1000) -> AsyncIterator[Row]:
+        '''
+        Docstring for stream_search_documents
+        
+        :param batch_size: number of rows fetched from the server at once
+        :type batch_size: int
+        :return: the id and name of every playlist, read without loading the whole table in memory
+        :rtype: AsyncIterator[Row]
+        '''
+        query = select(Playlist.id,Playlist.name).execution_options(yield_per=batch_size)
+        result = await self._db.stream(query)
+        async for row in result:
+            yield row
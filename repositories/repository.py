@@ -1,17 +1,31 @@
 import logging
 from sqlalchemy.exc import IntegrityError,SQLAlchemyError
-from typing import Any, TypeVar,Generic,Sequence,Dict
+from typing import Any, TypeVar,Generic,Sequence,Dict,Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select,update
+from sqlalchemy import Column,ColumnElement,Row,Select,select,update,insert,delete,func,cast
+from sqlalchemy.dialects.postgresql import REGCONFIG
+from sqlalchemy.orm import aliased
 from abc import ABC,abstractmethod
-from database import BaseModel
+from database import BaseModel,release_connection
 
 logger = logging.getLogger(__name__)
 
+# text search configuration of the 'search_vector' columns, names and authors are not
+# stemmed because they can be in any language
+SEARCH_CONFIG = 'simple'
+
+# weight of each counter in the popularity that is blended with the text relevance
+_POPULARITY_WEIGHTS = {'likes':1.0,'loves':2.0,'plays':0.1}
+
 ModelType = TypeVar('ModelType',bound=BaseModel) # type: ignore
 
 class Repository(Generic[ModelType],ABC):
 
+    # numeric columns that can be changed through 'increment'
+    _counters:Tuple[str,...] = ()
+    # columns maintained by the database, they are never written by 'update'
+    _generated:Tuple[str,...] = ()
+
     def __init__(self,model:type[ModelType],db:AsyncSession):
         '''
         Docstring for __init__
@@ -24,6 +38,15 @@ class Repository(Generic[ModelType],ABC):
         self._model = model
         self._db = db
     
+    async def release_connection(self) -> None:
+        '''
+        Docstring for release_connection
+        
+        gives the connection of the session back to the pool until the next query, must be
+        called before waiting for something that is not the database
+        '''
+        await release_connection(self._db)
+    
     @abstractmethod
     async def _try_get_instance(self,instance:ModelType) -> ModelType | None:
         '''
@@ -48,10 +71,237 @@ class Repository(Generic[ModelType],ABC):
         return {
             key:getattr(instance,key)
             for key in instance.__mapper__.columns.keys()
-            if hasattr(instance,key)
+            if hasattr(instance,key) and key not in self._generated
         }
     
-    async def get_instances(self,limit:int=100,skip:int=0) -> Sequence[ModelType]:
+    def _paginate(self,query:Select,limit:int,skip:int=0,after:str | None=None) -> Select:
+        '''
+        Docstring for _paginate
+        
+        :param query: query over the model of this repository
+        :type query: Select
+        :type limit: int
+        :param skip: number of registers to jump, ignored if 'after' is given
+        :type skip: int
+        :param after: id of the last result of the previous page
+        :type after: str | None
+        :return: the query ordered by the primary key, so the results are deterministic, and
+        limited to one page. With 'after' the page starts right after that key through the
+        primary key index, so the cost does not grow with the page number as with 'skip'
+        :rtype: Select
+        '''
+        query = query.order_by(self._model.id)
+        if after is not None:
+            return query.where(self._model.id > after).limit(limit)
+        return query.offset(skip).limit(limit)
+
+    @staticmethod
+    def _contains(column:Any,text:str) -> ColumnElement[bool]:
+        '''
+        Docstring for _contains
+        
+        :param column: text column to search in
+        :type column: Any
+        :param text: text to search, '%' and '_' are matched literally
+        :type text: str
+        :return: a case insensitive substring match. It is written as 'ILIKE' so the
+        'gin_trgm_ops' indexes of the searched columns can serve it
+        :rtype: ColumnElement[bool]
+        '''
+        escaped = text.replace('\\','\\\\').replace('%','\\%').replace('_','\\_')
+        return column.ilike(f'%{escaped}%',escape='\\')
+
+    def _rank(self,query:Select,text:str,limit:int,skip:int=0,candidates:int=1000) -> Select:
+        '''
+        Docstring for _rank
+        
+        :param query: query over the model of this repository, that must have a 'search_vector' column
+        :type query: Select
+        :param text: search in the web search syntax of postgres (words, "phrases", or, -word)
+        :type text: str
+        :type limit: int
+        :type skip: int
+        :param candidates: max number of matches blended with the popularity counters
+        :type candidates: int
+        :return: the query restricted to the full text matches of 'text', found through the GIN
+        index of 'search_vector', and ordered by 'ts_rank' blended with the popularity counters.
+        Only the 'candidates' matches with the best 'ts_rank' are blended and paged, so the
+        pages are always the best matches and the sorting of a page stays bounded even for
+        very common words
+        :rtype: Select
+        '''
+        columns = self._model.__table__.columns
+        ts_query = func.websearch_to_tsquery(cast(SEARCH_CONFIG,REGCONFIG),text)
+        popularity = [
+            columns[key] * weight
+            for key,weight in _POPULARITY_WEIGHTS.items()
+            if key in self._counters
+        ]
+        text_rank = func.ts_rank(columns['search_vector'],ts_query)
+        # the logarithm keeps a very popular weak match from burying a strong one
+        rank = text_rank * func.ln(sum(popularity,2.0))
+        # the candidates are the best text matches, not the first ones the index returns
+        matches = (
+            query.where(columns['search_vector'].op('@@')(ts_query))
+            .add_columns(rank.label('rank'))
+            .order_by(text_rank.desc(),columns['id'])
+            .limit(candidates)
+            .subquery()
+        )
+        model = aliased(self._model,matches)
+        return (
+            select(model)
+            .order_by(matches.c.rank.desc(),matches.c.id)
+            .offset(skip)
+            .limit(limit)
+        )
+
+    def _increment_query(self,instance_id:str,deltas:Dict[str,int]):
+        '''
+        Docstring for _increment_query
+        
+        :param instance_id: id of the instance to update
+        :type instance_id: str
+        :param deltas: amount to add to each counter
+        :type deltas: Dict[str, int]
+        :return: a single 'UPDATE ... SET counter = counter + delta ... RETURNING' statement,
+        the counters are computed by the database so concurrent updates are never lost
+        '''
+        unknown = set(deltas.keys()).difference(self._counters)
+        if len(unknown) > 0:
+            raise ValueError(f'{self._model.__name__} has no counters {sorted(unknown)}')
+        columns = self._model.__table__.columns
+        return (
+            update(self._model)
+            .where(self._model.id==instance_id)
+            .values({key:columns[key] + delta for key,delta in deltas.items()})
+            .returning(self._model.id,*[columns[key] for key in self._counters])
+        )
+
+    async def increment(self,instance_id:str,**deltas:int) -> Row | None:
+        '''
+        Docstring for increment
+        
+        :param instance_id: id of the instance to update
+        :type instance_id: str
+        :param deltas: amount to add to each counter, can be negative
+        :return: the id and the new value of every counter if the instance exists, else None
+        :rtype: Row | None
+        '''
+        try:
+            result = await self._db.execute(self._increment_query(instance_id,deltas))
+            counters = result.first()
+            await self._db.commit()
+            return counters
+        except SQLAlchemyError as e:
+            logger.error(f'Database error updating counters of {self._model.__name__}: {e}')
+            await self._db.rollback()
+            return None
+
+    async def _add_reaction(
+        self,
+        instance_column:Column,
+        user_column:Column,
+        instance_id:str,
+        user_id:str,
+        counter:str
+    ) -> Row | None:
+        '''
+        Docstring for _add_reaction
+
+        inserts the relation between the user and the instance and increments 'counter'
+        in the same transaction
+        
+        :param instance_column: column of the relation table referencing the instance
+        :type instance_column: Column
+        :param user_column: column of the relation table referencing the user
+        :type user_column: Column
+        :type instance_id: str
+        :type user_id: str
+        :param counter: counter to increment
+        :type counter: str
+        :return: the new counters if success, else None
+        :rtype: Row | None
+        '''
+        try:
+            await self._db.execute(
+                insert(instance_column.table).values({
+                    instance_column.name:instance_id,
+                    user_column.name:user_id
+                })
+            )
+            result = await self._db.execute(self._increment_query(instance_id,{counter:1}))
+            counters = result.first()
+            if not counters:
+                await self._db.rollback()
+                return None
+            await self._db.commit()
+            return counters
+        except IntegrityError as e:
+            logger.error(f'Integrity error while adding {counter}: {e}')
+            await self._db.rollback()
+            return None
+        except SQLAlchemyError as e:
+            logger.error(f'Database error while adding {counter}: {e}')
+            await self._db.rollback()
+            return None
+        except Exception as e:
+            logger.error(f'An unexpected error has ocurred while adding {counter}: {e}')
+            await self._db.rollback()
+            return None
+
+    async def _remove_reaction(
+        self,
+        instance_column:Column,
+        user_column:Column,
+        instance_id:str,
+        user_id:str,
+        counter:str
+    ) -> Row | None:
+        '''
+        Docstring for _remove_reaction
+
+        deletes the relation between the user and the instance and decrements 'counter'
+        in the same transaction
+        
+        :param instance_column: column of the relation table referencing the instance
+        :type instance_column: Column
+        :param user_column: column of the relation table referencing the user
+        :type user_column: Column
+        :type instance_id: str
+        :type user_id: str
+        :param counter: counter to decrement
+        :type counter: str
+        :return: the new counters if success, else None
+        :rtype: Row | None
+        '''
+        try:
+            result = await self._db.execute(
+                delete(instance_column.table)
+                .where((instance_column==instance_id) & (user_column==user_id))
+                .returning(instance_column)
+            )
+            if not result.first():
+                await self._db.rollback()
+                return None
+            result = await self._db.execute(self._increment_query(instance_id,{counter:-1}))
+            counters = result.first()
+            await self._db.commit()
+            return counters
+        except IntegrityError as e:
+            logger.error(f'Integrity error while removing {counter}: {e}')
+            await self._db.rollback()
+            return None
+        except SQLAlchemyError as e:
+            logger.error(f'Database error while removing {counter}: {e}')
+            await self._db.rollback()
+            return None
+        except Exception as e:
+            logger.error(f'An unexpected error has ocurred while removing {counter}: {e}')
+            await self._db.rollback()
+            return None
+
+    async def get_instances(self,limit:int=100,skip:int=0,after:str | None=None) -> Sequence[ModelType]:
         '''
         Docstring for get_instances
         
@@ -59,9 +309,34 @@ class Repository(Generic[ModelType],ABC):
         :type limit: int
         :param skip: number of registers to jump
         :type skip: int
+        :param after: id of the last result of the previous page, replaces 'skip'
+        :type after: str | None
+        :rtype: Sequence[ModelType]
+        '''
+        query = select(self._model)
+        query = self._paginate(query,limit,skip,after)
+        result = await self._db.execute(query)
+        return result.scalars().all()
+    
+    async def get_instances_by_ids(self,ids:Sequence[str],limit:int=100,skip:int=0,after:str | None=None) -> Sequence[ModelType]:
+        '''
+        Docstring for get_instances_by_ids
+        
+        :param ids: ids of the instances to retrieve, for example the matches of a search
+        :type ids: Sequence[str]
+        :param limit: limit of results
+        :type limit: int
+        :param skip: number of registers to jump
+        :type skip: int
+        :param after: id of the last result of the previous page, replaces 'skip'
+        :type after: str | None
+        :return: one page of the instances that still exist, in the same order as the other lists
         :rtype: Sequence[ModelType]
         '''
-        query = select(self._model).offset(skip).limit(limit)
+        if len(ids) == 0:
+            return []
+        query = select(self._model).where(self._model.id.in_(ids))
+        query = self._paginate(query,limit,skip,after)
         result = await self._db.execute(query)
         return result.scalars().all()
     
@@ -144,6 +419,47 @@ class Repository(Generic[ModelType],ABC):
             await self._db.rollback()
             return None
     
+    async def update_fields(self,instance_id:str,**values:Any) -> ModelType | None:
+        '''
+        Docstring for update_fields
+
+        writes only the given columns in a single 'UPDATE' statement, so the other columns,
+        as the counters changed meanwhile by other requests, are left as they are
+        
+        :param instance_id: id of the instance to update
+        :type instance_id: str
+        :param values: new value of each column
+        :return: the updated instance if it exists, else None
+        :rtype: ModelType | None
+        '''
+        try:
+            result = await self._db.execute(
+                update(self._model)
+                .where(self._model.id==instance_id)
+                .values(**values)
+                .returning(self._model.id)
+                .execution_options(synchronize_session=False)
+            )
+            if result.first() is None:
+                await self._db.rollback()
+                return None
+            await self._db.commit()
+        except IntegrityError as e:
+            logger.error(f'Integrity error while updating {self._model.__name__}: {e}')
+            await self._db.rollback()
+            return None
+        except SQLAlchemyError as e:
+            logger.error(f'Database error updating {self._model.__name__}: {e}')
+            await self._db.rollback()
+            return None
+        query = (
+            select(self._model)
+            .where(self._model.id==instance_id)
+            .execution_options(populate_existing=True)
+        )
+        result = await self._db.execute(query)
+        return result.scalar_one_or_none()
+    
     async def delete(self,instance_id:str) -> bool:
         '''
         Docstring for delete
@@ -0,0 +1,260 @@
+import datetime
+import logging
+from uuid import uuid4
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy import Row,select,update,delete,func
+from typing import Any,Dict,Sequence
+from models import StorageJob,StorageJobKind,StorageJobStatus
+from .repository import Repository
+
+logger = logging.getLogger(__name__)
+
+def enqueue_storage_job_query(kind:StorageJobKind,idempotency_key:str,payload:Dict[str,Any]):
+    '''
+    Docstring for enqueue_storage_job_query
+
+    :param kind: operation to run
+    :type kind: StorageJobKind
+    :param idempotency_key: key of the operation, a job with the same key is not queued again
+    :type idempotency_key: str
+    :param payload: arguments of the operation
+    :type payload: Dict[str, Any]
+    :return: an 'INSERT' statement of a pending job, so it can be written in the transaction
+    of the change that makes the job needed
+    '''
+    now = datetime.datetime.now(datetime.UTC)
+    return insert(StorageJob).values(
+        id=str(uuid4()),
+        kind=kind,
+        idempotency_key=idempotency_key,
+        payload=payload,
+        status=StorageJobStatus.PENDING,
+        attempts=0,
+        run_after=now,
+        created_at=now,
+        updated_at=now
+    ).on_conflict_do_nothing(index_elements=[StorageJob.idempotency_key])
+
+def remove_file_job_query(file_id:str,file_name:str):
+    '''
+    Docstring for remove_file_job_query
+
+    :param file_id: id of the stored file to remove
+    :type file_id: str
+    :type file_name: str
+    :return: the 'INSERT' statement of the job that removes the file
+    '''
+    return enqueue_storage_job_query(
+        StorageJobKind.REMOVE_FILE,
+        f'{StorageJobKind.REMOVE_FILE}:{file_id}',
+        {'file_id':file_id,'file_name':file_name}
+    )
+
+def store_file_job_key(track_id:str) -> str:
+    '''
+    Docstring for store_file_job_key
+
+    :param track_id: id of the ingested track
+    :type track_id: str
+    :return: idempotency key of the job that stores the file of the track
+    :rtype: str
+    '''
+    return f'{StorageJobKind.STORE_FILE}:{track_id}'
+
+def store_file_job_query(track_id:str,payload:Dict[str,Any]):
+    '''
+    Docstring for store_file_job_query
+
+    :param track_id: id of the ingested track
+    :type track_id: str
+    :param payload: location and validation result of the file kept on the local disk
+    :type payload: Dict[str, Any]
+    :return: the 'INSERT' statement of the job that stores the file of the track
+    '''
+    return enqueue_storage_job_query(
+        StorageJobKind.STORE_FILE,
+        store_file_job_key(track_id),
+        payload
+    )
+
+class StorageJobRepository(Repository[StorageJob]):
+
+    def __init__(self,db:AsyncSession):
+        super().__init__(StorageJob,db)
+
+    async def _try_get_instance(self,instance:StorageJob) -> StorageJob | None:
+        return await self.get_by_id(str(instance.id))
+
+    async def enqueue_remove_file(self,file_id:str,file_name:str) -> bool:
+        '''
+        Docstring for enqueue_remove_file
+
+        :param file_id: id of the stored file to remove
+        :type file_id: str
+        :type file_name: str
+        :return: True if the job is queued, even if it was queued before
+        :rtype: bool
+        '''
+        try:
+            await self._db.execute(remove_file_job_query(file_id,file_name))
+            await self._db.commit()
+            return True
+        except SQLAlchemyError as e:
+            logger.error(f'Database error creating StorageJob: {e}')
+            await self._db.rollback()
+            return False
+
+    async def claim(self,limit:int,lease:float) -> Sequence[Row]:
+        '''
+        Docstring for claim
+
+        takes the due pending jobs and pushes their 'run_after' forward by 'lease' seconds,
+        so no other worker takes them while they run. A job whose worker dies is taken
+        again when its lease ends. The rows are locked with 'SKIP LOCKED', so workers
+        claiming at once never wait for each other
+
+        :param limit: max number of jobs to take
+        :type limit: int
+        :param lease: seconds the jobs are reserved for this worker
+        :type lease: float
+        :return: the id, kind, payload and attempts, counting this one, of each job taken
+        :rtype: Sequence[Row]
+        '''
+        now = datetime.datetime.now(datetime.UTC)
+        due = (
+            select(StorageJob.id)
+            .where(
+                (StorageJob.status==StorageJobStatus.PENDING)
+                & (StorageJob.run_after <= now)
+            )
+            .order_by(StorageJob.run_after)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        try:
+            result = await self._db.execute(
+                update(StorageJob)
+                .where(StorageJob.id.in_(due))
+                .values(
+                    attempts=StorageJob.attempts + 1,
+                    run_after=now + datetime.timedelta(seconds=lease),
+                    updated_at=now
+                )
+                .returning(StorageJob.id,StorageJob.kind,StorageJob.payload,StorageJob.attempts)
+                .execution_options(synchronize_session=False)
+            )
+            jobs = result.all()
+            await self._db.commit()
+            return jobs
+        except SQLAlchemyError as e:
+            logger.error(f'Database error claiming StorageJob: {e}')
+            await self._db.rollback()
+            return []
+
+    async def finish(
+        self,
+        job_id:str,
+        status:StorageJobStatus,
+        error:str | None=None,
+        run_after:datetime.datetime | None=None
+    ) -> bool:
+        '''
+        Docstring for finish
+
+        saves the result of an attempt
+
+        :type job_id: str
+        :param status: 'PENDING' to retry the job at 'run_after'
+        :type status: StorageJobStatus
+        :param error: error of the attempt if it failed
+        :type error: str | None
+        :type run_after: datetime.datetime | None
+        :rtype: bool
+        '''
+        now = datetime.datetime.now(datetime.UTC)
+        values:Dict[str,Any] = {'status':status,'last_error':error,'updated_at':now}
+        if run_after is not None:
+            values['run_after'] = run_after
+        try:
+            await self._db.execute(
+                update(StorageJob)
+                .where(StorageJob.id==job_id)
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+            await self._db.commit()
+            return True
+        except SQLAlchemyError as e:
+            logger.error(f'Database error updating StorageJob: {e}')
+            await self._db.rollback()
+            return False
+
+    async def get_by_idempotency_key(self,idempotency_key:str) -> StorageJob | None:
+        '''
+        Docstring for get_by_idempotency_key
+
+        :type idempotency_key: str
+        :return: the job queued with that key, if it was not purged yet
+        :rtype: StorageJob | None
+        '''
+        result = await self._db.execute(
+            select(StorageJob).where(StorageJob.idempotency_key==idempotency_key)
+        )
+        return result.scalar_one_or_none()
+
+    async def count_by_status(self) -> Dict[str,int]:
+        '''
+        Docstring for count_by_status
+
+        :return: number of jobs of each status
+        :rtype: Dict[str, int]
+        '''
+        result = await self._db.execute(
+            select(StorageJob.status,func.count()).group_by(StorageJob.status)
+        )
+        return {str(status):int(count) for status,count in result.all()}
+
+    async def get_by_status(self,status:StorageJobStatus,limit:int=100) -> Sequence[StorageJob]:
+        '''
+        Docstring for get_by_status
+
+        :type status: StorageJobStatus
+        :type limit: int
+        :return: the jobs with that status, the most recently updated first
+        :rtype: Sequence[StorageJob]
+        '''
+        result = await self._db.execute(
+            select(StorageJob)
+            .where(StorageJob.status==status)
+            .order_by(StorageJob.updated_at.desc())
+            .limit(limit)
+        )
+        return result.scalars().all()
+
+    async def delete_done_before(self,moment:datetime.datetime) -> int:
+        '''
+        Docstring for delete_done_before
+
+        :param moment: finished jobs updated before this moment are deleted
+        :type moment: datetime.datetime
+        :return: number of deleted jobs
+        :rtype: int
+        '''
+        try:
+            result = await self._db.execute(
+                delete(StorageJob)
+                .where(
+                    (StorageJob.status==StorageJobStatus.DONE)
+                    & (StorageJob.updated_at < moment)
+                )
+                .execution_options(synchronize_session=False)
+            )
+            await self._db.commit()
+            return result.rowcount # type: ignore
+        except SQLAlchemyError as e:
+            logger.error(f'Database error deleting StorageJob: {e}')
+            await self._db.rollback()
+            return 0
@@ -1,11 +1,12 @@
-from typing import Sequence
+from typing import Any,AsyncIterator,Dict,Sequence,Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select,exists
-from sqlalchemy.orm import selectinload
 from sqlalchemy.exc import IntegrityError,SQLAlchemyError
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy import Row,select,exists,update,delete,case
 from .repository import Repository
 from .user import UserRepository
-from models import Track,Playlist
+from .storage_job import remove_file_job_query,store_file_job_query
+from models import Blob,BlobStatus,Track,Playlist
 from models.track import (
     tracks_likes as likes,
     tracks_dislikes as dislikes,
@@ -16,8 +17,30 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# prefix of the placeholder 'file_id' of a blob whose file is not stored yet, it is unique
+_PENDING_FILE_ID_PREFIX = 'pending:'
+
+def _ready_tracks_query(content_hash:str,file_id:str,file_name:str):
+    '''
+    Docstring for _ready_tracks_query
+
+    :return: the 'UPDATE' statement that points the tracks waiting for the file of their
+    content to the stored file
+    '''
+    return update(Track).where(
+        (Track.content_hash==content_hash)
+        & (Track.status!=BlobStatus.READY)
+    ).values(
+        file_id=file_id,
+        file_name=file_name,
+        status=BlobStatus.READY
+    ).execution_options(synchronize_session=False)
+
 class TrackRepository(Repository):
 
+    _counters = ('likes','dislikes','loves','plays')
+    _generated = ('search_vector',)
+
     def __init__(self,db: AsyncSession,user_repository:UserRepository):
         super().__init__(Track, db)
         self._user_repository = user_repository
@@ -29,9 +52,307 @@ class TrackRepository(Repository):
     async def _try_get_instance(self, instance: Track) -> Track | None:
         db_instance = await self.get_by_id(str(instance.id))
         if not db_instance:
-            query = select(Track).where(Track.content_hash==instance.content_hash)
-            result = await self._db.execute(query)
-            return result.scalar_one_or_none()
+            return await self.get_by_content_hash(str(instance.content_hash),str(instance.uploaded_by))
+        return db_instance
+
+    async def get_by_content_hash(self,content_hash:str,uploaded_by:str) -> Track | None:
+        '''
+        Docstring for get_by_content_hash
+        
+        :param content_hash: SHA-256 of the file of the track
+        :type content_hash: str
+        :param uploaded_by: id of the user who uploaded the track
+        :type uploaded_by: str
+        :return: the track of the user with that content
+        :rtype: Track | None
+        '''
+        query = select(Track).where(
+            (Track.uploaded_by==uploaded_by)
+            & (Track.content_hash==content_hash)
+        )
+        result = await self._db.execute(query)
+        return result.scalar_one_or_none()
+
+    async def get_id_by_content_hash(self,content_hash:str,uploaded_by:str) -> str | None:
+        '''
+        Docstring for get_id_by_content_hash
+        
+        :param content_hash: SHA-256 of the file of the track
+        :type content_hash: str
+        :param uploaded_by: id of the user whose track is preferred
+        :type uploaded_by: str
+        :return: the id of a track with that content, the one of the user if there is one
+        :rtype: str | None
+        '''
+        query = (
+            select(Track.id)
+            .where(Track.content_hash==content_hash)
+            .order_by((Track.uploaded_by==uploaded_by).desc(),Track.id)
+            .limit(1)
+        )
+        result = await self._db.execute(query)
+        return result.scalar_one_or_none()
+
+    async def get_blob(self,content_hash:str) -> Blob | None:
+        '''
+        Docstring for get_blob
+        
+        :param content_hash: SHA-256 of a file
+        :type content_hash: str
+        :return: the stored file with that content
+        :rtype: Blob | None
+        '''
+        query = select(Blob).where(Blob.content_hash==content_hash)
+        result = await self._db.execute(query)
+        return result.scalar_one_or_none()
+
+    async def create(self,instance:Track,blob:Blob | None=None) -> Track | None:
+        '''
+        Docstring for create
+
+        creates the track and adds its reference to the blob of its content in the same
+        transaction, the location, size and status of the file are taken from the blob
+        
+        :param instance: track to create
+        :type instance: Track
+        :param blob: blob of a file just stored for the track, it is inserted unless another
+        upload of the same content inserted it first. It replaces a blob whose file is not
+        stored yet. Without it the blob must exist
+        :type blob: Blob | None
+        :return: the created track if success, else None
+        :rtype: Track | None
+        '''
+        try:
+            if blob is None:
+                query = update(Blob).where(
+                    Blob.content_hash==instance.content_hash
+                ).values(references=Blob.references + 1)
+            else:
+                query = insert(Blob).values(
+                    content_hash=blob.content_hash,
+                    file_id=blob.file_id,
+                    file_name=blob.file_name,
+                    size=blob.size,
+                    references=1,
+                    status=BlobStatus.READY
+                )
+                # the file replaces the placeholder of a blob not stored yet
+                ready = Blob.status==BlobStatus.READY
+                query = query.on_conflict_do_update(
+                    index_elements=[Blob.content_hash],
+                    set_={
+                        'references':Blob.references + 1,
+                        'file_id':case((ready,Blob.file_id),else_=query.excluded.file_id),
+                        'file_name':case((ready,Blob.file_name),else_=query.excluded.file_name),
+                        'status':BlobStatus.READY
+                    }
+                )
+            result = await self._db.execute(
+                query.returning(Blob.file_id,Blob.file_name,Blob.size,Blob.status)
+            )
+            stored = result.first()
+            if not stored:
+                await self._db.rollback()
+                return None
+            instance.file_id,instance.file_name,instance.size,instance.status = stored
+            if blob is not None and instance.file_id == blob.file_id:
+                # tracks of an ingestion of the same content may be waiting for the file
+                await self._db.execute(_ready_tracks_query(
+                    str(blob.content_hash),
+                    str(blob.file_id),
+                    str(blob.file_name)
+                ))
+            self._db.add(instance)
+            await self._db.commit()
+            await self._db.refresh(instance)
+            return instance
+        except IntegrityError as e:
+            logger.error(f'Integrity error while creating Track: {e}')
+            await self._db.rollback()
+            return None
+        except SQLAlchemyError as e:
+            logger.error(f'Database error creating Track: {e}')
+            await self._db.rollback()
+            return None
+        except Exception as e:
+            logger.error(f'An unexpected error has ocurred: {e}')
+            await self._db.rollback()
+            return None
+
+    async def create_processing(self,instance:Track,size:int,payload:Dict[str,Any]) -> Track | None:
+        '''
+        Docstring for create_processing
+
+        creates the track of a file kept on the local disk until a background job stores it.
+        A new content gets a 'PROCESSING' blob, and the job is queued in the same transaction
+        as the track. A content whose storing failed is tried again with this file
+        
+        :param instance: track to create
+        :type instance: Track
+        :param size: size of the file
+        :type size: int
+        :param payload: arguments of the job that stores the file
+        :type payload: Dict[str, Any]
+        :return: the created track if success, else None. It is 'READY' if another upload
+        stored the same content first, then no job is queued
+        :rtype: Track | None
+        '''
+        try:
+            query = insert(Blob).values(
+                content_hash=instance.content_hash,
+                file_id=f'{_PENDING_FILE_ID_PREFIX}{instance.content_hash}',
+                file_name='',
+                size=size,
+                references=1,
+                status=BlobStatus.PROCESSING
+            ).on_conflict_do_update(
+                index_elements=[Blob.content_hash],
+                set_={
+                    'references':Blob.references + 1,
+                    'status':case(
+                        (Blob.status==BlobStatus.FAILED,BlobStatus.PROCESSING),
+                        else_=Blob.status
+                    )
+                }
+            )
+            result = await self._db.execute(
+                query.returning(Blob.file_id,Blob.file_name,Blob.size,Blob.status)
+            )
+            instance.file_id,instance.file_name,instance.size,instance.status = result.one()
+            self._db.add(instance)
+            if instance.status == BlobStatus.PROCESSING:
+                await self._db.execute(store_file_job_query(str(instance.id),payload))
+            await self._db.commit()
+            await self._db.refresh(instance)
+            return instance
+        except IntegrityError as e:
+            logger.error(f'Integrity error while creating Track: {e}')
+            await self._db.rollback()
+            return None
+        except SQLAlchemyError as e:
+            logger.error(f'Database error creating Track: {e}')
+            await self._db.rollback()
+            return None
+
+    async def complete_blob(self,content_hash:str,file_id:str,file_name:str) -> bool:
+        '''
+        Docstring for complete_blob
+
+        points the blob and the tracks of a content to its file just stored. If the blob was
+        deleted, or another upload stored the content first, the removal of the file is
+        queued instead in the same transaction
+        
+        :param content_hash: SHA-256 of the file
+        :type content_hash: str
+        :param file_id: id of the stored file
+        :type file_id: str
+        :type file_name: str
+        :return: False if nothing could be saved
+        :rtype: bool
+        '''
+        try:
+            result = await self._db.execute(
+                update(Blob)
+                .where(
+                    (Blob.content_hash==content_hash)
+                    & (Blob.status!=BlobStatus.READY)
+                )
+                .values(file_id=file_id,file_name=file_name,status=BlobStatus.READY)
+                .returning(Blob.content_hash)
+                .execution_options(synchronize_session=False)
+            )
+            if result.scalar_one_or_none() is None:
+                await self._db.execute(remove_file_job_query(file_id,file_name))
+            else:
+                await self._db.execute(_ready_tracks_query(content_hash,file_id,file_name))
+            await self._db.commit()
+            return True
+        except SQLAlchemyError as e:
+            logger.error(f'Database error updating Blob: {e}')
+            await self._db.rollback()
+            return False
+
+    async def fail_blob(self,content_hash:str) -> bool:
+        '''
+        Docstring for fail_blob
+
+        marks the blob and the tracks of a content as 'FAILED' once its file could not be
+        stored, a later upload of the same content tries again
+        
+        :param content_hash: SHA-256 of the file
+        :type content_hash: str
+        :rtype: bool
+        '''
+        try:
+            await self._db.execute(
+                update(Blob)
+                .where(
+                    (Blob.content_hash==content_hash)
+                    & (Blob.status==BlobStatus.PROCESSING)
+                )
+                .values(status=BlobStatus.FAILED)
+                .execution_options(synchronize_session=False)
+            )
+            await self._db.execute(
+                update(Track)
+                .where(
+                    (Track.content_hash==content_hash)
+                    & (Track.status==BlobStatus.PROCESSING)
+                )
+                .values(status=BlobStatus.FAILED)
+                .execution_options(synchronize_session=False)
+            )
+            await self._db.commit()
+            return True
+        except SQLAlchemyError as e:
+            logger.error(f'Database error updating Blob: {e}')
+            await self._db.rollback()
+            return False
+
+    async def delete_reference(self,track_id:str) -> Tuple[bool,Row | None]:
+        '''
+        Docstring for delete_reference
+
+        deletes the track and its reference to the blob of its content in the same
+        transaction, the blob is deleted with its last reference and the job that removes
+        its file from the storage is queued in the same transaction. A blob whose file is not
+        stored yet has nothing to remove, its job finds the blob gone
+        
+        :type track_id: str
+        :return: if the track was deleted, and the deleted blob
+        :rtype: Tuple[bool, Row | None]
+        '''
+        try:
+            result = await self._db.execute(
+                delete(Track).where(Track.id==track_id).returning(Track.content_hash)
+            )
+            content_hash = result.scalar_one_or_none()
+            if content_hash is None:
+                await self._db.rollback()
+                return False,None
+            result = await self._db.execute(
+                update(Blob)
+                .where(Blob.content_hash==content_hash)
+                .values(references=Blob.references - 1)
+                .returning(Blob.content_hash,Blob.file_id,Blob.file_name,Blob.size,Blob.references,Blob.status)
+            )
+            blob = result.first()
+            if blob is not None and blob.references <= 0:
+                await self._db.execute(delete(Blob).where(Blob.content_hash==content_hash))
+                if blob.status == BlobStatus.READY:
+                    await self._db.execute(remove_file_job_query(blob.file_id,blob.file_name))
+            else:
+                blob = None
+            await self._db.commit()
+            return True,blob
+        except SQLAlchemyError as e:
+            logger.error(f'Database error deleting Track: {e}')
+            await self._db.rollback()
+            return False,None
+        except Exception as e:
+            logger.error(f'An unexpected error has ocurred: {e}')
+            await self._db.rollback()
+            return False,None
     
     async def liked_by(self,user_id:str,track_id:str) -> bool:
         '''
@@ -78,7 +399,7 @@ class TrackRepository(Repository):
         result = await self._db.execute(query)
         return result.scalar() == True
 
-    async def add_like_from_user_to_track(self,user_id:str,track_id:str) -> bool:
+    async def add_like_from_user_to_track(self,user_id:str,track_id:str) -> Row | None:
         '''
         Docstring for add_like_from
 
@@ -86,35 +407,18 @@ class TrackRepository(Repository):
 
         :type user_id: str
         :type track_id: str
-        :rtype: bool
-        '''
-        query = select(Track).where(Track.id==track_id).options(selectinload(Track.users_likes))
-        result = await self._db.execute(query)
-        db_track = result.scalar_one_or_none()
-        if not db_track:
-            return False
-        db_user = await self._user_repository.get_by_id(user_id)
-        if not db_user:
-            return False
-        try:
-            db_track.users_likes.append(db_user)
-            await self._db.commit()
-            await self._db.refresh(db_track)
-            return True
-        except IntegrityError as e:
-            logger.error(f'Integrity error while adding like: {e}')
-            await self._db.rollback()
-            return False
-        except SQLAlchemyError as e:
-            logger.error(f'Database error while adding like: {e}')
-            await self._db.rollback()
-            return False
-        except Exception as e:
-            logger.error(f'An unexpected error has ocurred while adding like: {e}')
-            await self._db.rollback()
-            return False
+        :return: the new counters if success, else None
+        :rtype: Row | None
+        '''
+        return await self._add_reaction(
+            self._likes.columns.track_id,
+            self._likes.columns.user_id,
+            track_id,
+            user_id,
+            'likes'
+        )
     
-    async def remove_like_from_user_to_track(self,user_id:str,track_id:str) -> bool:
+    async def remove_like_from_user_to_track(self,user_id:str,track_id:str) -> Row | None:
         '''
         Docstring for remove_like_from_user_to_track
         
@@ -122,35 +426,18 @@ class TrackRepository(Repository):
 
         :type user_id: str
         :type track_id: str
-        :rtype: bool
-        '''
-        query = select(Track).where(Track.id==track_id).options(selectinload(Track.users_likes))
-        result = await self._db.execute(query)
-        db_track = result.scalar_one_or_none()
-        if not db_track:
-            return False
-        db_user = await self._user_repository.get_by_id(user_id)
-        if not db_user:
-            return False
-        try:
-            db_track.users_likes.remove(db_user)
-            await self._db.commit()
-            await self._db.refresh(db_track)
-            return True
-        except IntegrityError as e:
-            logger.error(f'Integrity error while deleting like: {e}')
-            await self._db.rollback()
-            return False
-        except SQLAlchemyError as e:
-            logger.error(f'Database error while deleting like: {e}')
-            await self._db.rollback()
-            return False
-        except Exception as e:
-            logger.error(f'An unexpected error has ocurred while deleting like: {e}')
-            await self._db.rollback()
-            return False
+        :return: the new counters if success, else None
+        :rtype: Row | None
+        '''
+        return await self._remove_reaction(
+            self._likes.columns.track_id,
+            self._likes.columns.user_id,
+            track_id,
+            user_id,
+            'likes'
+        )
     
-    async def add_dislike_from_user_to_track(self,user_id:str,track_id:str) -> bool:
+    async def add_dislike_from_user_to_track(self,user_id:str,track_id:str) -> Row | None:
         '''
         Docstring for add_dislike_from_user_to_track
 
@@ -158,36 +445,18 @@ class TrackRepository(Repository):
                 
         :type user_id: str
         :type track_id: str
-        :rtype: bool
-        '''
-
-        query = select(Track).where(Track.id==track_id).options(selectinload(Track.users_dislikes))
-        result = await self._db.execute(query)
-        db_track = result.scalar_one_or_none()
-        if not db_track:
-            return False
-        db_user = await self._user_repository.get_by_id(user_id)
-        if not db_user:
-            return False
-        try:
-            db_track.users_dislikes.append(db_user)
-            await self._db.commit()
-            await self._db.refresh(db_track)
-            return True
-        except IntegrityError as e:
-            logger.error(f'IntegrityError while adding dislike: {e}')
-            await self._db.rollback()
-            return False
-        except SQLAlchemyError as e:
-            logger.error(f'Database error while adding dislike: {e}')
-            await self._db.rollback()
-            return False
-        except Exception as e:
-            logger.error(f'An unexpected error has ocurred while adding dislike: {e}')
-            await self._db.rollback()
-            return False
+        :return: the new counters if success, else None
+        :rtype: Row | None
+        '''
+        return await self._add_reaction(
+            self._dislikes.columns.track_id,
+            self._dislikes.columns.user_id,
+            track_id,
+            user_id,
+            'dislikes'
+        )
     
-    async def remove_dislike_from_user_to_track(self,user_id:str,track_id:str) -> bool:
+    async def remove_dislike_from_user_to_track(self,user_id:str,track_id:str) -> Row | None:
         '''
         Docstring for remove_dislike_from_user_to_track
 
@@ -195,36 +464,18 @@ class TrackRepository(Repository):
                 
         :type user_id: str
         :type track_id: str
-        :rtype: bool
-        '''
-
-        query = select(Track).where(Track.id==track_id).options(selectinload(Track.users_dislikes))
-        result = await self._db.execute(query)
-        db_track = result.scalar_one_or_none()
-        if not db_track:
-            return False
-        db_user = await self._user_repository.get_by_id(user_id)
-        if not db_user:
-            return False
-        try:
-            db_track.users_dislikes.remove(db_user)
-            await self._db.commit()
-            await self._db.refresh(db_track)
-            return True
-        except IntegrityError as e:
-            logger.error(f'IntegrityError while deleting dislike: {e}')
-            await self._db.rollback()
-            return False
-        except SQLAlchemyError as e:
-            logger.error(f'Database error while deleting dislike: {e}')
-            await self._db.rollback()
-            return False
-        except Exception as e:
-            logger.error(f'An unexpected error has ocurred while deleting dislike: {e}')
-            await self._db.rollback()
-            return False
-        
-    async def add_love_from_user_to_track(self,user_id:str,track_id:str) -> bool:
+        :return: the new counters if success, else None
+        :rtype: Row | None
+        '''
+        return await self._remove_reaction(
+            self._dislikes.columns.track_id,
+            self._dislikes.columns.user_id,
+            track_id,
+            user_id,
+            'dislikes'
+        )
+    
+    async def add_love_from_user_to_track(self,user_id:str,track_id:str) -> Row | None:
         '''
         Docstring for add_love_from_user_to_track
 
@@ -232,69 +483,35 @@ class TrackRepository(Repository):
                 
         :type user_id: str
         :type track_id: str
-        :rtype: bool
-        '''
-        query = select(Track).where(Track.id==track_id).options(selectinload(Track.users_loves))
-        result = await self._db.execute(query)
-        db_track = result.scalar_one_or_none()
-        if not db_track:
-            return False
-        db_user = await self._user_repository.get_by_id(user_id)
-        if not db_user:
-            return False
-        try:
-            db_track.users_loves.append(db_user)
-            await self._db.commit()
-            await self._db.refresh(db_track)
-            return True
-        except IntegrityError as e:
-            logger.error(f'IntegrityError while adding love: {e}')
-            await self._db.rollback()
-            return False
-        except SQLAlchemyError as e:
-            logger.error(f'Database error while adding love: {e}')
-            await self._db.rollback()
-            return False
-        except Exception as e:
-            logger.error(f'An unexpected error has ocurred while adding love: {e}')
-            await self._db.rollback()
-            return False
-        
-    async def remove_love_from_user_to_track(self,user_id:str,track_id:str) -> bool:
+        :return: the new counters if success, else None
+        :rtype: Row | None
+        '''
+        return await self._add_reaction(
+            self._loves.columns.track_id,
+            self._loves.columns.user_id,
+            track_id,
+            user_id,
+            'loves'
+        )
+    
+    async def remove_love_from_user_to_track(self,user_id:str,track_id:str) -> Row | None:
         '''
         Docstring for remove_love_from_user_to_track
         
         :type user_id: str
         :type track_id: str
-        :rtype: bool
-        '''
-        query = select(Track).where(Track.id==track_id).options(selectinload(Track.users_loves))
-        result = await self._db.execute(query)
-        db_track = result.scalar_one_or_none()
-        if not db_track:
-            return False
-        db_user = await self._user_repository.get_by_id(user_id)
-        if not db_user:
-            return False
-        try:
-            db_track.users_loves.remove(db_user)
-            await self._db.commit()
-            await self._db.refresh(db_track)
-            return True
-        except IntegrityError as e:
-            logger.error(f'IntegrityError while deleting love: {e}')
-            await self._db.rollback()
-            return False
-        except SQLAlchemyError as e:
-            logger.error(f'Database error while deleting love: {e}')
-            await self._db.rollback()
-            return False
-        except Exception as e:
-            logger.error(f'An unexpected error has ocurred while deleting love: {e}')
-            await self._db.rollback()
-            return False
-
-    async def get_tracks_uploaded_by(self,user_id:str,limit:int=100,skip:int=0) -> Sequence[Track]:
+        :return: the new counters if success, else None
+        :rtype: Row | None
+        '''
+        return await self._remove_reaction(
+            self._loves.columns.track_id,
+            self._loves.columns.user_id,
+            track_id,
+            user_id,
+            'loves'
+        )
+    
+    async def get_tracks_uploaded_by(self,user_id:str,limit:int=100,skip:int=0,after:str | None=None) -> Sequence[Track]:
         '''
         Docstring for get_tracks_uploaded_by
         
@@ -302,13 +519,16 @@ class TrackRepository(Repository):
         :type limit: int
         :param skip: limit of results per query
         :type skip: number of register to jump
+        :param after: id of the last result of the previous page, replaces 'skip'
+        :type after: str | None
         :rtype: Sequence[Track]
         '''
-        query = select(Track).where(Track.uploaded_by==user_id).offset(skip).limit(limit)
+        query = select(Track).where(Track.uploaded_by==user_id)
+        query = self._paginate(query,limit,skip,after)
         result = await self._db.execute(query)
         return result.scalars().all()
 
-    async def get_tracks_with_name_like(self,text:str,limit:int=100,skip:int=0) -> Sequence[Track]:
+    async def get_tracks_with_name_like(self,text:str,limit:int=100,skip:int=0,after:str | None=None) -> Sequence[Track]:
         '''
         Docstring for get_tracks_with_name_like
         
@@ -317,22 +537,28 @@ class TrackRepository(Repository):
         :type limit: int
         :param skip: number of registers to jump
         :type skip: int
+        :param after: id of the last result of the previous page, replaces 'skip'
+        :type after: str | None
         :rtype: Sequence[Track]
         '''
-        query = select(Track).where(Track.name.like(f'%{text}%')).offset(skip).limit(limit)
+        query = select(Track).where(self._contains(Track.name,text))
+        query = self._paginate(query,limit,skip,after)
         result = await self._db.execute(query)
         return result.scalars().all()
     
-    async def get_tracks_with_author_name_like(self,text:str,limit:int=100,skip:int=0) -> Sequence[Track]:
+    async def get_tracks_with_author_name_like(self,text:str,limit:int=100,skip:int=0,after:str | None=None) -> Sequence[Track]:
         '''
         Docstring for get_tracks_with_author_name_like
         
         :type text: str
         :type limit: int
         :type skip: int
+        :param after: id of the last result of the previous page, replaces 'skip'
+        :type after: str | None
         :rtype: Sequence[Track]
         '''
-        query = select(Track).where(Track.author_name.like(f'%{text}%')).offset(skip).limit(limit)
+        query = select(Track).where(self._contains(Track.author_name,text))
+        query = self._paginate(query,limit,skip,after)
         result = await self._db.execute(query)
         return result.scalars().all()
     
@@ -341,7 +567,8 @@ class TrackRepository(Repository):
         user_id:str,
         text:str,
         limit:int=100,
-        skip:int=0
+        skip:int=0,
+        after:str | None=None
     ) -> Sequence[Track]:
         '''
         Docstring for get_tracks_from_user_with_name_like
@@ -352,12 +579,15 @@ class TrackRepository(Repository):
         :type limit: int
         :param skip: number of registers to jump
         :type skip: int
+        :param after: id of the last result of the previous page, replaces 'skip'
+        :type after: str | None
         :rtype: Sequence[Track]
         '''
         query = select(Track).where(
-            (Track.name.like(f'%{text}%')) &
+            (self._contains(Track.name,text)) &
             (Track.uploaded_by==user_id)
-        ).offset(skip).limit(limit)
+        )
+        query = self._paginate(query,limit,skip,after)
         result = await self._db.execute(query)
         return result.scalars().all()
     
@@ -366,7 +596,8 @@ class TrackRepository(Repository):
         user_id:str,
         text:str,
         limit:int=100,
-        skip:int=0
+        skip:int=0,
+        after:str | None=None
     ) -> Sequence[Track]:
         '''
         Docstring for get_tracks_from_user_with_author_name_like
@@ -375,29 +606,66 @@ class TrackRepository(Repository):
         :type text: str
         :type limit: int
         :type skip: int
+        :param after: id of the last result of the previous page, replaces 'skip'
+        :type after: str | None
         :rtype: Sequence[Track]
         '''
         query = select(Track).where(
-            (Track.author_name.like(f'%{text}%')) &
+            (self._contains(Track.author_name,text)) &
             (Track.uploaded_by==user_id)
-        ).offset(skip).limit(limit)
+        )
+        query = self._paginate(query,limit,skip,after)
         result = await self._db.execute(query)
         return result.scalars().all()
     
-    async def get_tracks_on_playlist(self,playlist_id:str,limit:int=100,skip:int=0) -> Sequence[Track]:
+    async def get_tracks_on_playlist(self,playlist_id:str,limit:int=100,skip:int=0,after:str | None=None) -> Sequence[Track]:
         '''
         Docstring for get_tracks_on_playlist
         
         :type playlist_id: str
+        :param after: id of the last result of the previous page, replaces 'skip'
+        :type after: str | None
         :rtype: Sequence[Track]
         '''
         query = select(Track).join(Track.playlists).where(
             Playlist.id==playlist_id
-        ).offset(skip).limit(limit)
+        )
+        query = self._paginate(query,limit,skip,after)
         result = await self._db.execute(query)
         return result.scalars().all()
     
-    async def get_tracks_on_playlists_with_name_like(self,playlist_id:str,text:str,limit:int=100,skip:int=0) -> Sequence[Track]:
+    async def get_track_files_on_playlist(self,playlist_id:str,limit:int=100,skip:int=0,after:str | None=None) -> Sequence[Row]:
+        '''
+        Docstring for get_track_files_on_playlist
+
+        loads in a single query only the columns needed to locate the files of the tracks,
+        the tracks whose file is not stored yet are left out
+        
+        :type playlist_id: str
+        :type limit: int
+        :type skip: int
+        :param after: id of the last result of the previous page, replaces 'skip'
+        :type after: str | None
+        :rtype: Sequence[Row]
+        '''
+        query = select(
+            Track.id,
+            Track.name,
+            Track.author_name,
+            Track.size,
+            Track.file_name
+        ).join(
+            self._playlists_tracks,
+            self._playlists_tracks.columns.track_id==Track.id
+        ).where(
+            (self._playlists_tracks.columns.playlist_id==playlist_id)
+            & (Track.status==BlobStatus.READY)
+        )
+        query = self._paginate(query,limit,skip,after)
+        result = await self._db.execute(query)
+        return result.all()
+    
+    async def get_tracks_on_playlists_with_name_like(self,playlist_id:str,text:str,limit:int=100,skip:int=0,after:str | None=None) -> Sequence[Track]:
         '''
         Docstring for get_tracks_on_playlists_with_name_like
         
@@ -405,15 +673,18 @@ class TrackRepository(Repository):
         :type text: str
         :type limit: int
         :type skip: int
+        :param after: id of the last result of the previous page, replaces 'skip'
+        :type after: str | None
         :rtype: Sequence[Track]
         '''
         query = select(Track).join(Track.playlists).where(
             Playlist.id==playlist_id
-        ).where(Track.name.like(f'%{text}%')).offset(skip).limit(limit)
+        ).where(self._contains(Track.name,text))
+        query = self._paginate(query,limit,skip,after)
         result = await self._db.execute(query)
         return result.scalars().all()
     
-    async def get_tracks_on_playlists_with_author_name_like(self,playlist_id:str,text:str,limit:int=100,skip:int=0) -> Sequence[Track]:
+    async def get_tracks_on_playlists_with_author_name_like(self,playlist_id:str,text:str,limit:int=100,skip:int=0,after:str | None=None) -> Sequence[Track]:
         '''
         Docstring for get_tracks_on_playlists_with_name_like
         
@@ -421,15 +692,18 @@ class TrackRepository(Repository):
         :type text: str
         :type limit: int
         :type skip: int
+        :param after: id of the last result of the previous page, replaces 'skip'
+        :type after: str | None
         :rtype: Sequence[Track]
         '''
         query = select(Track).join(Track.playlists).where(
             Playlist.id==playlist_id
-        ).where(Track.author_name.like(f'%{text}%')).offset(skip).limit(limit)
+        ).where(self._contains(Track.author_name,text))
+        query = self._paginate(query,limit,skip,after)
         result = await self._db.execute(query)
         return result.scalars().all()
     
-    async def search_tracks_on_playlist_by_text(self,playlist_id:str,text:str,limit:int=100,skip:int=0) -> Sequence[Track]:
+    async def search_tracks_on_playlist_by_text(self,playlist_id:str,text:str,limit:int=100,skip:int=0,after:str | None=None) -> Sequence[Track]:
         '''
         Docstring for search_tracks_on_playlist_by_text
         
@@ -437,29 +711,98 @@ class TrackRepository(Repository):
         :type text: str
         :type limit: int
         :type skip: int
+        :param after: id of the last result of the previous page, replaces 'skip'
+        :type after: str | None
         :rtype: Sequence[Track]
         '''
         query = select(Track).join(Track.playlists).where(
             Playlist.id==playlist_id
         ).where(
-            (Track.name.like(f'%{text}%')) |
-            (Track.author_name.like(f'%{text}%'))
-        ).offset(skip).limit(limit)
+            (self._contains(Track.name,text)) |
+            (self._contains(Track.author_name,text))
+        )
+        query = self._paginate(query,limit,skip,after)
         result = await self._db.execute(query)
         return result.scalars().all()
     
-    async def search_tracks_by_text(self,text:str,limit:int=100,skip:int=0) -> Sequence[Track]:
+    async def search_tracks_by_text(self,text:str,limit:int=100,skip:int=0,after:str | None=None) -> Sequence[Track]:
         '''
         Docstring for search_tracks_by_text
         
         :type text: str
         :type limit: int
         :type skip: int
+        :param after: id of the last result of the previous page, replaces 'skip'
+        :type after: str | None
         :rtype: Sequence[Track]
         '''
         query = select(Track).where(
-            (Track.name.like(f'%{text}%')) |
-            (Track.author_name.like(f'%{text}%'))
+            (self._contains(Track.name,text)) |
+            (self._contains(Track.author_name,text))
         )
+        query = self._paginate(query,limit,skip,after)
         result = await self._db.execute(query)
-        return result.scalars().all()
\ No newline at end of file
+        return result.scalars().all()
+
+    async def rank_tracks_on_playlist_by_text(self,playlist_id:str,text:str,limit:int=100,skip:int=0,candidates:int=1000) -> Sequence[Track]:
+        '''
+        Docstring for rank_tracks_on_playlist_by_text
+        
+        :type playlist_id: str
+        :type text: str
+        :type limit: int
+        :type skip: int
+        :param candidates: max number of matches blended with the popularity counters
+        :type candidates: int
+        :return: the tracks of the playlist matching the text, the most relevant and popular first
+        :rtype: Sequence[Track]
+        '''
+        query = select(Track).join(Track.playlists).where(Playlist.id==playlist_id)
+        query = self._rank(query,text,limit,skip,candidates)
+        result = await self._db.execute(query)
+        return result.scalars().all()
+    
+    async def rank_tracks_by_text(self,text:str,limit:int=100,skip:int=0,candidates:int=1000) -> Sequence[Track]:
+        '''
+        Docstring for rank_tracks_by_text
+        
+        :type text: str
+        :type limit: int
+        :type skip: int
+        :param candidates: max number of matches blended with the popularity counters
+        :type candidates: int
+        :return: the tracks matching the text, the most relevant and popular first
+        :rtype: Sequence[Track]
+        '''
+        query = self._rank(select(Track),text,limit,skip,candidates)
+        result = await self._db.execute(query)
+        return result.scalars().all()
+
+    async def stream_search_documents(self,batch_size:int=1000) -> AsyncIterator[Row]:
+        '''
+        Docstring for stream_search_documents
+        
+        :param batch_size: number of rows fetched from the server at once
+        :type batch_size: int
+        :return: the id, name and author name of every track, read without loading the whole
+        table in memory
+        :rtype: AsyncIterator[Row]
+        '''
+        query = select(Track.id,Track.name,Track.author_name).execution_options(yield_per=batch_size)
+        result = await self._db.stream(query)
+        async for row in result:
+            yield row
+
+    async def stream_content_hashes(self,batch_size:int=1000) -> AsyncIterator[str]:
+        '''
+        Docstring for stream_content_hashes
+        
+        :param batch_size: number of rows fetched from the server at once
+        :type batch_size: int
+        :return: the content hash of every blob, read without loading the whole table in memory
+        :rtype: AsyncIterator[str]
+        '''
+        query = select(Blob.content_hash).execution_options(yield_per=batch_size)
+        result = await self._db.stream_scalars(query)
+        async for content_hash in result:
+            yield content_hash
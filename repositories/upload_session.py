@@ -0,0 +1,93 @@
+import datetime
+import logging
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy import select,update,delete
+from typing import Sequence
+from models import UploadSession
+from .repository import Repository
+
+logger = logging.getLogger(__name__)
+
+class UploadSessionRepository(Repository[UploadSession]):
+
+    def __init__(self,db:AsyncSession):
+        super().__init__(UploadSession,db)
+
+    async def _try_get_instance(self,instance:UploadSession) -> UploadSession | None:
+        return await self.get_by_id(str(instance.id))
+
+    async def lock(self,session_id:str) -> UploadSession | None:
+        '''
+        Docstring for lock
+
+        loads the session locking its row until 'set_received' or 'unlock' are called, so
+        two workers never write the same session at once
+
+        :type session_id: str
+        :rtype: UploadSession | None
+        '''
+        query = (
+            select(UploadSession)
+            .where(UploadSession.id==session_id)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        )
+        result = await self._db.execute(query)
+        return result.scalar_one_or_none()
+
+    async def unlock(self) -> None:
+        '''
+        Docstring for unlock
+
+        releases the row locked by 'lock' without changes
+        '''
+        await self._db.rollback()
+
+    async def set_received(self,session_id:str,received:int) -> bool:
+        '''
+        Docstring for set_received
+
+        saves the received bytes of the session and releases its row
+
+        :type session_id: str
+        :param received: bytes of the file already written
+        :type received: int
+        :return: True if the session was updated, False otherwise
+        :rtype: bool
+        '''
+        try:
+            result = await self._db.execute(
+                update(UploadSession)
+                .where(UploadSession.id==session_id)
+                .values(received=received)
+            )
+            await self._db.commit()
+            return result.rowcount > 0 # type: ignore
+        except SQLAlchemyError as e:
+            logger.error(f'Database error updating UploadSession: {e}')
+            await self._db.rollback()
+            return False
+
+    async def delete_expired(self,now:datetime.datetime) -> Sequence[str]:
+        '''
+        Docstring for delete_expired
+
+        :param now: sessions expired before this moment are deleted
+        :type now: datetime.datetime
+        :return: the ids of the deleted sessions
+        :rtype: Sequence[str]
+        '''
+        try:
+            result = await self._db.execute(
+                delete(UploadSession)
+                .where(UploadSession.expires_at < now)
+                .returning(UploadSession.id)
+            )
+            ids = result.scalars().all()
+            await self._db.commit()
+            return ids
+        except SQLAlchemyError as e:
+            logger.error(f'Database error deleting expired UploadSession: {e}')
+            await self._db.rollback()
+            return []
@@ -1,9 +1,12 @@
 from pydantic import BaseModel
 from .user import UserCreateSchema,UserUpdateSchema,UserSchema
 from .access_token import AccessTokenDataSchema,AccessTokenSchema,VerificationSchema
-from .playlist import PlaylistCreateSchema,PlaylistUpdateSchema,PlaylistSchema,PlaylistPrivateUpdateSchema
-from .track import TrackUploadSchema,TrackUpdateSchema,TrackSchema,TrackDownloadSchema,TrackPrivateUpdateSchema
-from .track_upload import TrackUploadedSchema
+from .playlist import PlaylistCreateSchema,PlaylistUpdateSchema,PlaylistSchema,PlaylistPrivateUpdateSchema,PlaylistStatsSchema
+from .track import TrackUploadSchema,TrackUpdateSchema,TrackSchema,TrackDownloadSchema,TrackPrivateUpdateSchema,TrackFileSchema,TrackStatsSchema
+from .blob import BlobSchema
+from .track_upload import TrackUploadedSchema,TrackPreflightSchema,TrackPreflightResultSchema,TrackIngestionSchema
+from .upload_session import UploadSessionCreateSchema,UploadSessionSchema
+from .storage_job import StorageJobSchema,StorageJobStatusSchema
 
 class ExistencialQuerySchema(BaseModel):
     '''
@@ -12,4 +15,14 @@ class ExistencialQuerySchema(BaseModel):
     schema for an existencial query
     '''
 
-    result:bool
\ No newline at end of file
+    result:bool
+
+class PlayRegisteredSchema(BaseModel):
+    '''
+    Docstring for PlayRegisteredSchema
+
+    schema for a play accepted to be written later
+    '''
+
+    id:str
+    pending:int
\ No newline at end of file
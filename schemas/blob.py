@@ -0,0 +1,16 @@
+from pydantic import BaseModel
+
+class BlobSchema(BaseModel):
+    '''
+    Docstring for BlobSchema
+
+    schema for 'Blob' entity, the stored file of a content
+    '''
+    content_hash:str
+    file_id:str
+    file_name:str
+    size:int
+    status:str = 'ready'
+
+    class Config:
+        from_attributes = True
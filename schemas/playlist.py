@@ -48,6 +48,17 @@ class PlaylistUpdateSchema(BaseModel):
     plays:int
     loves:int
 
+class PlaylistStatsSchema(PlaylistUpdateSchema):
+    '''
+    Docstring for PlaylistStatsSchema
+    
+    counters of 'Playlist' entity
+    '''
+    id:str
+
+    class Config:
+        from_attributes = True
+
 class NestedTrackSchema(BaseModel):
     '''
     schema for nested 'Track' entity
@@ -0,0 +1,36 @@
+from pydantic import BaseModel
+from typing import Any,Dict,List
+import datetime
+
+class StorageJobSchema(BaseModel):
+    '''
+    Docstring for StorageJobSchema
+
+    schema for 'StorageJob' entity responses
+    '''
+    id:str
+    kind:str
+    idempotency_key:str
+    payload:Dict[str,Any]
+    status:str
+    attempts:int
+    last_error:str | None
+    run_after:datetime.datetime
+    updated_at:datetime.datetime
+
+    class Config:
+        from_attributes = True
+
+class StorageJobStatusSchema(BaseModel):
+    '''
+    Docstring for StorageJobStatusSchema
+
+    schema for the state of the storage job queue, the counters are the ones of this worker
+    since it started
+    '''
+    workers:int
+    completed:int
+    retried:int
+    failed:int
+    jobs:Dict[str,int]
+    failed_jobs:List[StorageJobSchema]
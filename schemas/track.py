@@ -21,9 +21,8 @@ class TrackUploadSchema(TrackBaseSchema):
     '''
     Docstring for TrackUploadSchema
     
-    schema for 'Track' upload operation
+    schema for 'Track' upload operation, the file is the one stored for its content
     '''
-    file_id:str
     content_hash:str
 
 class TrackUpdateSchema(BaseModel):
@@ -37,6 +36,17 @@ class TrackUpdateSchema(BaseModel):
     loves:int
     plays:int
 
+class TrackStatsSchema(TrackUpdateSchema):
+    '''
+    Docstring for TrackStatsSchema
+    
+    counters of 'Track' entity
+    '''
+    id:str
+
+    class Config:
+        from_attributes = True
+
 class TrackSchema(TrackBaseSchema):
     '''
     Docstring for TrackSchema
@@ -51,7 +61,10 @@ class TrackSchema(TrackBaseSchema):
     plays:int
     uploaded_by:str
     file_id:str
+    file_name:str
     content_hash:str
+    # 'processing' until the file of an ingested upload is stored, only 'ready' tracks can be downloaded
+    status:str = 'ready'
     playlists:List[str]
 
     @field_validator('playlists',mode='before')
@@ -70,6 +83,19 @@ class TrackSchema(TrackBaseSchema):
         from_attributes = True
         exclude = {'playlist_objects'}
 
+class TrackFileSchema(TrackBaseSchema):
+    '''
+    Docstring for TrackFileSchema
+    
+    schema with the data of 'Track' needed to locate its file
+    '''
+    id:str
+    size:int
+    file_name:str
+
+    class Config:
+        from_attributes = True
+
 class TrackDownloadSchema(TrackBaseSchema):
     '''
     Docstring for TrackDownloadSchema
@@ -1,5 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel,Field
 import datetime
+from .track import TrackSchema
 
 class TrackUploadedSchema(BaseModel):
     '''
@@ -12,4 +13,37 @@ class TrackUploadedSchema(BaseModel):
     content_type:str
     content_sha1:str
     size:int
-    uploaded_at:datetime.datetime
\ No newline at end of file
+    uploaded_at:datetime.datetime
+class TrackPreflightSchema(BaseModel):
+    '''
+    Docstring for TrackPreflightSchema
+    
+    schema with the content hash and size of a file computed by the client before uploading it
+    '''
+    content_hash:str = Field(pattern='^[0-9a-f]{64}$')
+    size:int = Field(gt=0)
+
+class TrackPreflightResultSchema(BaseModel):
+    '''
+    Docstring for TrackPreflightResultSchema
+    
+    schema for the response of a preflight, 'exists' tells the content is already stored so
+    its upload is not sent to the storage again, 'track_id' is a track with the same content,
+    the one of the user if there is one, so it can be used without uploading the file
+    '''
+    exists:bool
+    track_id:str | None = None
+
+class TrackIngestionSchema(BaseModel):
+    '''
+    Docstring for TrackIngestionSchema
+    
+    schema for the state of an upload accepted before its file is stored, 'id' is the id of
+    its track. 'attempts' and 'error' come from the background job storing the file, if the
+    upload queued one
+    '''
+    id:str
+    status:str
+    attempts:int = 0
+    error:str | None = None
+    track:TrackSchema
@@ -0,0 +1,26 @@
+from pydantic import BaseModel,Field
+import datetime
+
+class UploadSessionCreateSchema(BaseModel):
+    '''
+    Docstring for UploadSessionCreateSchema
+
+    schema for 'UploadSession' entity creation
+    '''
+    track_name:str
+    author_name:str
+    file_name:str
+    size:int = Field(gt=0)
+
+class UploadSessionSchema(UploadSessionCreateSchema):
+    '''
+    Docstring for UploadSessionSchema
+
+    schema for 'UploadSession' entity responses, 'received' is the offset of the next chunk
+    '''
+    id:str
+    received:int
+    expires_at:datetime.datetime
+
+    class Config:
+        from_attributes = True
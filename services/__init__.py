@@ -3,16 +3,81 @@ from repositories import (
     get_user_repository,
     get_playlist_repository,
     get_track_repository,
+    get_upload_session_repository,
+    get_storage_job_repository,
     UserRepository,
     PlaylistRepository,
-    TrackRepository
+    TrackRepository,
+    UploadSessionRepository,
+    StorageJobRepository
 )
 from .user import UserService
 from .auth import AuthService,_oauth2_schema
 from .playlist import PlaylistService,PlaylistSearchMode
-from .external import BackBlazeB2Service,get_backblazeb2_service
+from .external import (
+    StorageService,
+    BackBlazeB2Service,
+    LocalStorageService,
+    FileValidationResult,
+    get_storage_service,
+    get_local_storage_service,
+    start_storage_service,
+    stop_storage_service,
+    storage_service_ready
+)
 from .track import TrackService,TrackSearchMode
+from .upload_session import UploadSessionService
+from .ingestion import stage_file,remove_staged_file
+from .play_counter import (
+    PlayCounter,
+    start_play_counters,
+    stop_play_counters,
+    get_track_play_counter,
+    get_playlist_play_counter
+)
+from .search_index import (
+    NGramIndex,
+    start_search_indexes,
+    stop_search_indexes,
+    get_track_search_index,
+    get_playlist_search_index
+)
+from .content_hashes import (
+    BloomFilter,
+    KnownContentCache,
+    start_content_hash_filter,
+    stop_content_hash_filter,
+    get_content_hash_filter,
+    get_known_content_cache
+)
+from .stream_cache import (
+    TrackFileCache,
+    CachedFileResponse,
+    start_track_file_cache,
+    stop_track_file_cache,
+    get_track_file_cache
+)
+from .upload_admission import UploadAdmissionController,UploadAdmissionMiddleware,MULTIPART_OVERHEAD
+from .idempotency import (
+    IdempotentResponse,
+    IdempotencyStore,
+    DatabaseIdempotencyStore,
+    IdempotencyMiddleware,
+    start_idempotency_store,
+    stop_idempotency_store,
+    get_idempotency_store
+)
+from .storage_jobs import (
+    StorageJobRunner,
+    StorageJobService,
+    start_storage_job_runner,
+    stop_storage_job_runner,
+    get_storage_job_runner
+)
 from fastapi.security import HTTPAuthorizationCredentials,HTTPBearer
+from settings import ENVIRONMENT
+from tools import STATS_TOKEN_HEADER
+import hmac
 
 _http_security = HTTPBearer(auto_error=False)
 
@@ -50,22 +115,77 @@ async def get_current_user(
         )
     return await service.get_current_user(token)
 
+def get_current_username(
+    request:Request,
+    credentials:HTTPAuthorizationCredentials=Depends(_http_security)
+) -> str | None:
+    '''
+    Docstring for get_current_username
+
+    identifies the user from the token without touching the database
+
+    :return: the username if the request has a valid token, else None
+    :rtype: str | None
+    '''
+    token = None
+    if credentials:
+        token = credentials.credentials
+    
+    if not token:
+        token = request.cookies.get('access_token')
+    
+    if not token:
+        return None
+    return AuthService.get_token_subject(token)
+
+def require_stats_token(request:Request):
+    '''
+    Docstring for require_stats_token
+
+    lets only the requests with the stats token read the stats endpoints,
+    the endpoints don't exist while the token isn't set
+
+    :param request: the incoming request
+    :type request: Request
+    '''
+    if not ENVIRONMENT.STATS_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    
+    token = request.headers.get(STATS_TOKEN_HEADER,'')
+    if not hmac.compare_digest(token.encode(),ENVIRONMENT.STATS_TOKEN.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail='Invalid stats token'
+        )
+
 def get_playlist_service(repository:PlaylistRepository=Depends(get_playlist_repository)):
-    service = PlaylistService(repository)
+    service = PlaylistService(repository,search_index=get_playlist_search_index())
     try:
         yield service
     finally:
         service = None
 
 def get_track_service(repository:TrackRepository=Depends(get_track_repository)):
-    service = TrackService(repository)
+    service = TrackService(
+        repository,
+        search_index=get_track_search_index(),
+        content_hashes=get_content_hash_filter(),
+        known_contents=get_known_content_cache()
+    )
+    try:
+        yield service
+    finally:
+        service = None
+
+def get_upload_session_service(repository:UploadSessionRepository=Depends(get_upload_session_repository)):
+    service = UploadSessionService(repository)
     try:
         yield service
     finally:
         service = None
 
-def get_backblazeb2_service():
-    service = BackBlazeB2Service()
+def get_storage_job_service(repository:StorageJobRepository=Depends(get_storage_job_repository)):
+    service = StorageJobService(repository,get_storage_job_runner())
     try:
         yield service
     finally:
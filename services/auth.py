@@ -5,6 +5,7 @@ from jwt import PyJWTError
 from datetime import datetime,timedelta
 from fastapi.security import OAuth2PasswordBearer
 from fastapi import HTTPException,status
+from starlette.requests import HTTPConnection
 from schemas import AccessTokenSchema,AccessTokenDataSchema,UserSchema
 from repositories import UserRepository
 from settings import ENVIRONMENT
@@ -59,6 +60,49 @@ class AuthService:
         )
         return encoded_jwt
     
+    @staticmethod
+    def get_token_subject(token:str) -> str | None:
+        '''
+        Docstring for get_token_subject
+
+        decodes the token without looking up the user
+        
+        :type token: str
+        :return: the username inside a valid token, else None
+        :rtype: str | None
+        '''
+        try:
+            payload = jwt.decode(
+                token,
+                ENVIRONMENT.SECRET_KEY,
+                algorithms=[ENVIRONMENT.ALGORITHM]
+            )
+        except PyJWTError:
+            return None
+        return payload.get('sub')
+
+    @staticmethod
+    def get_connection_subject(connection:HTTPConnection) -> str | None:
+        '''
+        Docstring for get_connection_subject
+
+        reads the token of a request from its 'Authorization' header or its cookies, so it
+        can be used before the request reaches its endpoint
+
+        :type connection: HTTPConnection
+        :return: the username inside a valid token, else None
+        :rtype: str | None
+        '''
+        token = None
+        authorization = connection.headers.get('authorization','')
+        if authorization.lower().startswith('bearer '):
+            token = authorization[7:]
+        if not token:
+            token = connection.cookies.get('access_token')
+        if not token:
+            return None
+        return AuthService.get_token_subject(token)
+    
     async def get_current_user(
         self,
         token:str
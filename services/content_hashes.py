@@ -0,0 +1,279 @@
+import asyncio
+import logging
+import math
+import time
+from collections import OrderedDict
+from contextlib import suppress
+from hashlib import blake2b
+from typing import AsyncIterator, Callable, List, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import AsyncSessionLocal
+from repositories import TrackRepository,UserRepository
+from schemas import BlobSchema
+from settings import ENVIRONMENT
+
+logger = logging.getLogger(__name__)
+
+class BloomFilter:
+
+    def __init__(self,capacity:int,error_rate:float=0.01):
+        '''
+        Docstring for __init__
+
+        set of strings that can answer 'maybe present' for a missing one, with a probability
+        close to 'error_rate' while it holds at most 'capacity' strings, but never answers
+        'absent' for an added one
+
+        :param capacity: number of strings expected
+        :type capacity: int
+        :param error_rate: probability of a false positive at full capacity
+        :type error_rate: float
+        '''
+        capacity = max(capacity,1)
+        self._capacity = capacity
+        self._error_rate = error_rate
+        self._size = max(8,int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self._hashes = max(1,round(self._size / capacity * math.log(2)))
+        self._bits = bytearray((self._size + 7) // 8)
+        self._count = 0
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    @property
+    def error_rate(self) -> float:
+        return self._error_rate
+
+    def __len__(self) -> int:
+        '''
+        :return: number of strings added, counting repeated ones
+        :rtype: int
+        '''
+        return self._count
+
+    def _positions(self,key:str) -> List[int]:
+        digest = blake2b(key.encode(),digest_size=16).digest()
+        first = int.from_bytes(digest[:8],'little')
+        second = int.from_bytes(digest[8:],'little') | 1
+        return [(first + i * second) % self._size for i in range(self._hashes)]
+
+    def add(self,key:str) -> None:
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self._count += 1
+
+    def __contains__(self,key:str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+class KnownContentCache:
+
+    def __init__(self,max_size:int,ttl:float):
+        '''
+        Docstring for __init__
+
+        blobs recently found, by content hash. The blobs removed by other workers are only
+        forgotten when their entry expires
+
+        :param max_size: max number of blobs to keep, least recently used are evicted first
+        :type max_size: int
+        :param ttl: seconds an entry is trusted
+        :type ttl: float
+        '''
+        self._max_size = max_size
+        self._ttl = ttl
+        self._entries:OrderedDict[str,Tuple[BlobSchema,float]] = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def hits(self) -> int:
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        return self._misses
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self,content_hash:str) -> BlobSchema | None:
+        '''
+        Docstring for get
+
+        :type content_hash: str
+        :return: the blob with that content
+        :rtype: BlobSchema | None
+        '''
+        entry = self._entries.get(content_hash)
+        if not entry or entry[1] < time.monotonic():
+            self._entries.pop(content_hash,None)
+            self._misses += 1
+            return None
+        self._entries.move_to_end(content_hash)
+        self._hits += 1
+        return entry[0]
+
+    def put(self,blob:BlobSchema) -> None:
+        self._entries.pop(blob.content_hash,None)
+        self._entries[blob.content_hash] = (blob,time.monotonic() + self._ttl)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    def discard(self,content_hash:str) -> None:
+        '''
+        Docstring for discard
+
+        :param content_hash: content hash of a removed blob
+        :type content_hash: str
+        '''
+        self._entries.pop(content_hash,None)
+
+class ContentHashFilterRefresher:
+
+    def __init__(
+        self,
+        capacity:int,
+        error_rate:float,
+        scan:Callable[[AsyncSession],AsyncIterator[str]],
+        session_factory:Callable[[],AsyncSession],
+        refresh_interval:float
+    ):
+        '''
+        Docstring for __init__
+
+        keeps a bloom filter of the content hashes of the blobs, rebuilt periodically from
+        the database so it learns the blobs created by other workers and forgets the deleted
+        ones
+
+        :param capacity: min capacity of the filter, it grows with the number of blobs
+        :type capacity: int
+        :type error_rate: float
+        :param scan: streams the content hashes from a database session
+        :type scan: Callable[[AsyncSession], AsyncIterator[str]]
+        :type session_factory: Callable[[], AsyncSession]
+        :param refresh_interval: seconds between rebuilds, 0 disables them
+        :type refresh_interval: float
+        '''
+        self._capacity = capacity
+        self._error_rate = error_rate
+        self._scan = scan
+        self._session_factory = session_factory
+        self._refresh_interval = refresh_interval
+        self._filter = BloomFilter(capacity,error_rate)
+        self._added_during_rebuild:List[str] | None = None
+        self._ready = False
+        self._task:asyncio.Task | None = None
+
+    @property
+    def filter(self) -> BloomFilter:
+        return self._filter
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    def __contains__(self,content_hash:str) -> bool:
+        return content_hash in self._filter
+
+    def add(self,content_hash:str) -> None:
+        self._filter.add(content_hash)
+        if self._added_during_rebuild is not None:
+            self._added_during_rebuild.append(content_hash)
+
+    async def rebuild(self) -> bool:
+        '''
+        Docstring for rebuild
+
+        fills a new filter aside and swaps it in
+
+        :return: True if success
+        :rtype: bool
+        '''
+        bloom_filter = BloomFilter(max(self._capacity,2 * len(self._filter)),self._error_rate)
+        self._added_during_rebuild = []
+        try:
+            async with self._session_factory() as session:
+                async for content_hash in self._scan(session):
+                    bloom_filter.add(content_hash)
+            # the blobs created by this worker during the scan may be missing from it
+            for content_hash in self._added_during_rebuild:
+                bloom_filter.add(content_hash)
+        except Exception as e:
+            logger.error(f'Error while building the content hash filter: {e}')
+            return False
+        finally:
+            self._added_during_rebuild = None
+        self._filter = bloom_filter
+        self._ready = True
+        return True
+
+    async def _run(self) -> None:
+        await self.rebuild()
+        while self._refresh_interval > 0:
+            await asyncio.sleep(self._refresh_interval)
+            await self.rebuild()
+
+    async def start(self) -> None:
+        if not self._task:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+# filter and cache shared by every request of this worker process
+_content_hash_filter:ContentHashFilterRefresher | None = None
+_known_content_cache:KnownContentCache | None = None
+
+async def _scan_content_hashes(session:AsyncSession) -> AsyncIterator[str]:
+    repository = TrackRepository(session,UserRepository(session))
+    async for content_hash in repository.stream_content_hashes(ENVIRONMENT.SEARCH_INDEX_SCAN_BATCH_SIZE):
+        yield content_hash
+
+async def start_content_hash_filter() -> None:
+    '''
+    Docstring for start_content_hash_filter
+
+    creates the shared content hash filter and cache, must be called from the app lifespan
+    '''
+    global _content_hash_filter,_known_content_cache
+    if not _known_content_cache and ENVIRONMENT.CONTENT_HASH_CACHE_SIZE > 0:
+        _known_content_cache = KnownContentCache(
+            ENVIRONMENT.CONTENT_HASH_CACHE_SIZE,
+            ENVIRONMENT.CONTENT_HASH_CACHE_TTL
+        )
+    if not ENVIRONMENT.CONTENT_HASH_FILTER_ENABLED:
+        return
+    if not _content_hash_filter:
+        _content_hash_filter = ContentHashFilterRefresher(
+            ENVIRONMENT.CONTENT_HASH_FILTER_CAPACITY,
+            ENVIRONMENT.CONTENT_HASH_FILTER_ERROR_RATE,
+            _scan_content_hashes,
+            AsyncSessionLocal,
+            ENVIRONMENT.CONTENT_HASH_FILTER_REFRESH_INTERVAL
+        )
+        await _content_hash_filter.start()
+
+async def stop_content_hash_filter() -> None:
+    '''
+    Docstring for stop_content_hash_filter
+
+    stops the rebuilds, must be called from the app lifespan
+    '''
+    global _content_hash_filter,_known_content_cache
+    if _content_hash_filter:
+        await _content_hash_filter.stop()
+        _content_hash_filter = None
+    _known_content_cache = None
+
+def get_content_hash_filter() -> ContentHashFilterRefresher | None:
+    if not _content_hash_filter or not _content_hash_filter.ready:
+        return None
+    return _content_hash_filter
+
+def get_known_content_cache() -> KnownContentCache | None:
+    return _known_content_cache
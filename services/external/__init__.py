@@ -1,9 +1,72 @@
+from fastapi import HTTPException,status
+from settings import ENVIRONMENT
+from .storage import StorageService,FileValidationResult,UploadStreamValidator,UploadStreamError
 from .upload_download import BackBlazeB2Service
+from .local_storage import LocalStorageService
 from .circuit_breaker import AsyncCircuitBreaker,CircuitBreakerConfig,CircuitState,circuit_breaker,circuit_breaker_context
+from .worker_pool import BoundedWorkerPool
+from .multipart_upload import LargeFileStorage,B2LargeFileStorage,MultipartUploader
 
-def get_backblazeb2_service():
-    service = BackBlazeB2Service()
-    try:
-        yield service
-    finally:
-        service = None
\ No newline at end of file
+# storage shared by every request of this worker process
+_storage_service:StorageService | None = None
+
+def _create_storage_service() -> StorageService:
+    if ENVIRONMENT.STORAGE_BACKEND == 'local':
+        return LocalStorageService(
+            ENVIRONMENT.LOCAL_STORAGE_DIR,
+            ENVIRONMENT.LOCAL_STORAGE_SIGNING_KEY,
+            ENVIRONMENT.LOCAL_STORAGE_URL_LIFETIME,
+            ENVIRONMENT.LOCAL_STORAGE_BASE_URL
+        )
+    return BackBlazeB2Service()
+
+async def start_storage_service() -> StorageService:
+    '''
+    Docstring for start_storage_service
+
+    creates the shared storage of the backend chosen by 'STORAGE_BACKEND', must be called
+    from the app lifespan
+
+    :rtype: StorageService
+    '''
+    global _storage_service
+    if not _storage_service:
+        _storage_service = _create_storage_service()
+        await _storage_service.start()
+    return _storage_service
+
+async def stop_storage_service() -> None:
+    '''
+    Docstring for stop_storage_service
+
+    stops the shared storage, must be called from the app lifespan
+    '''
+    global _storage_service
+    if _storage_service:
+        await _storage_service.stop()
+        _storage_service = None
+
+def storage_service_ready() -> bool:
+    '''
+    Docstring for storage_service_ready
+
+    :return: True if the shared storage can be used
+    :rtype: bool
+    '''
+    return _storage_service is not None and _storage_service.is_ready
+
+def get_storage_service() -> StorageService:
+    if not _storage_service or not _storage_service.is_ready:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail='Can not connect to the storage service'
+        )
+    return _storage_service
+
+def get_local_storage_service() -> LocalStorageService:
+    if not isinstance(_storage_service,LocalStorageService) or not _storage_service.is_ready:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='File not found'
+        )
+    return _storage_service
\ No newline at end of file
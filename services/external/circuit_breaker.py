@@ -157,6 +157,8 @@ class AsyncCircuitBreaker:
         self._last_state_change = time.time()
         self._half_open_attemps = 0
         self._half_open_successes = 0
+        # counts the times the circuit went HALF_OPEN, a probe only frees a slot of its own round
+        self._half_open_round = 0
         self._metrics = CircuitMetrics(30,self._config.failure_window_seconds)
         self._lock = asyncio.Lock()
 
@@ -191,51 +193,82 @@ class AsyncCircuitBreaker:
         **kwargs
     ) -> Any:
         
+        # the lock only guards the state, the call itself runs outside so concurrent
+        # calls through the same circuit are not serialized
+        probe:int | None = None
         async with self._lock:
             if self._state == CircuitState.OPEN:
                 retry_after = self._get_retry_after()
                 if retry_after > 0:
                     raise OpenCircuitBreakerException(self._name,retry_after)
-                self._transition_to(CircuitState.OPEN)
-            elif self._state == CircuitState.HALF_OPEN:
+                self._transition_to(CircuitState.HALF_OPEN)
+            if self._state == CircuitState.HALF_OPEN:
+                # the slot is taken before the call runs, so no more probes than allowed
+                # reach a service that is recovering
                 if self._half_open_attemps >= self._config.half_open_max_attemps:
-                    self._transition_to(CircuitState.OPEN)
-                    retry_after = self._get_retry_after()
-                    raise OpenCircuitBreakerException(self._name,retry_after)
+                    raise OpenCircuitBreakerException(self._name)
+                self._half_open_attemps += 1
+                probe = self._half_open_round
             
-            start_time = time.time()
-            try:
-                if self._config.call_timeout_seconds:
-                    result = await asyncio.wait_for(
-                        func(*args,**kwargs),
-                        timeout=self._config.call_timeout_seconds
-                    )
-                else:
-                    result = await func(*args,**kwargs)
-
-                await self._on_success(start_time)
-                return result
-            except asyncio.TimeoutError:
+        start_time = time.time()
+        try:
+            if self._config.call_timeout_seconds:
+                result = await asyncio.wait_for(
+                    func(*args,**kwargs),
+                    timeout=self._config.call_timeout_seconds
+                )
+            else:
+                result = await func(*args,**kwargs)
+        except asyncio.TimeoutError:
+            async with self._lock:
                 await self._on_fail(start_time,'timout')
-                raise
-            except self._config.ignored_exceptions:
-                duration_time = time.time() - start_time
-                if duration_time >= self._config.slow_call_threshold_seconds:
-                    self._metrics.record_slow_call()
-                raise
-            except Exception as e:
+            raise
+        except self._config.ignored_exceptions:
+            duration_time = time.time() - start_time
+            if duration_time >= self._config.slow_call_threshold_seconds:
+                self._metrics.record_slow_call()
+            async with self._lock:
+                self._release_probe(probe)
+            raise
+        except Exception as e:
+            async with self._lock:
                 await self._on_fail(start_time,str(e))
-                raise
+            raise
+        except BaseException:
+            async with self._lock:
+                self._release_probe(probe)
+            raise
+
+        async with self._lock:
+            await self._on_success(start_time,probe)
+        return result
+
+    def _release_probe(self,probe:int | None) -> bool:
+        '''
+        Docstring for _release_probe
+
+        frees the slot of a probe that ended, unless the circuit changed of state since
+        it started
+
+        :param probe: HALF_OPEN round in which the probe started
+        :type probe: int | None
+        :return: if the slot was freed
+        :rtype: bool
+        '''
+        if probe is None or self._state != CircuitState.HALF_OPEN or probe != self._half_open_round:
+            return False
+        self._half_open_attemps -= 1
+        return True
     
-    async def _on_success(self,start_time:float) -> None:
+    async def _on_success(self,start_time:float,probe:int | None=None) -> None:
         duration = time.time() - start_time
         self._metrics.record_success_request(duration)
         if duration >= self._config.slow_call_threshold_seconds:
             self._metrics.record_slow_call()
         if self._state == CircuitState.HALF_OPEN:
-            self._half_open_attemps += 1
-            self._half_open_successes += 1
-            if self._half_open_attemps >= self._config.half_open_success_threshold:
+            if self._release_probe(probe):
+                self._half_open_successes += 1
+            if self._half_open_successes >= self._config.half_open_success_threshold:
                 self._transition_to(CircuitState.CLOSED)
                 logger.info(f'Circuit "{self._name}" CLOSED after successfully recovered')
         elif self._state == CircuitState.CLOSED:
@@ -253,7 +286,6 @@ class AsyncCircuitBreaker:
         recent_failures = self._metrics.recent_failures_count
         if self._state == CircuitState.HALF_OPEN:
             self._transition_to(CircuitState.OPEN)
-            self._half_open_attemps += 1
             logger.warning(f'Circuit "{self._name}" re-OPENED after failure  in HALF_OPEN state')
         elif self._state == CircuitState.CLOSED:
             if recent_failures >= self._config.failure_threshold:
@@ -270,6 +302,8 @@ class AsyncCircuitBreaker:
         if new_state != CircuitState.HALF_OPEN:
             self._half_open_attemps = 0
             self._half_open_successes = 0
+        else:
+            self._half_open_round += 1
         
         if new_state == CircuitState.OPEN:
             logger.debug(f'CIrcuit {self._name} transition: {old_state.name} -> {new_state.name}')
@@ -0,0 +1,123 @@
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict
+
+@dataclass
+class DownloadAuthorization:
+    '''
+    Docstring for DownloadAuthorization
+
+    download authorization token valid for every file name starting with 'prefix'
+    '''
+    prefix:str
+    token:str
+    expires_at:float
+
+    @property
+    def remaining_seconds(self) -> float:
+        return self.expires_at - time.time()
+
+class DownloadAuthorizationCache:
+
+    def __init__(self,max_size:int,min_remaining_seconds:float):
+        '''
+        Docstring for __init__
+
+        :param max_size: max number of prefixes to keep, least recently used are evicted first
+        :type max_size: int
+        :param min_remaining_seconds: tokens with less remaining lifetime are refreshed
+        :type min_remaining_seconds: float
+        '''
+        self._max_size = max_size
+        self._min_remaining_seconds = min_remaining_seconds
+        self._entries:OrderedDict[str,DownloadAuthorization] = OrderedDict()
+        self._pending:Dict[str,asyncio.Future[DownloadAuthorization]] = {}
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def hits(self) -> int:
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        return self._misses
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self,prefix:str) -> DownloadAuthorization | None:
+        '''
+        Docstring for get
+
+        :type prefix: str
+        :return: the cached authorization if it still lives long enough
+        :rtype: DownloadAuthorization | None
+        '''
+        authorization = self._entries.get(prefix)
+        if not authorization:
+            return None
+        if authorization.remaining_seconds < self._min_remaining_seconds:
+            del self._entries[prefix]
+            return None
+        self._entries.move_to_end(prefix)
+        return authorization
+
+    def put(self,authorization:DownloadAuthorization) -> None:
+        '''
+        Docstring for put
+
+        :type authorization: DownloadAuthorization
+        '''
+        self._entries[authorization.prefix] = authorization
+        self._entries.move_to_end(authorization.prefix)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    async def get_or_create(
+        self,
+        prefix:str,
+        factory:Callable[[str],Awaitable[DownloadAuthorization]]
+    ) -> DownloadAuthorization:
+        '''
+        Docstring for get_or_create
+
+        returns the cached authorization for the prefix or creates it with 'factory',
+        concurrent misses for the same prefix share a single call to 'factory'
+
+        :type prefix: str
+        :type factory: Callable[[str], Awaitable[DownloadAuthorization]]
+        :rtype: DownloadAuthorization
+        '''
+        authorization = self.get(prefix)
+        if authorization:
+            self._hits += 1
+            return authorization
+
+        pending = self._pending.get(prefix)
+        if pending:
+            return await asyncio.shield(pending)
+
+        self._misses += 1
+        future:asyncio.Future[DownloadAuthorization] = asyncio.get_running_loop().create_future()
+        self._pending[prefix] = future
+        try:
+            authorization = await factory(prefix)
+            self.put(authorization)
+            future.set_result(authorization)
+            return authorization
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # avoids 'exception never retrieved' warnings when nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            del self._pending[prefix]
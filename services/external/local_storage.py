@@ -0,0 +1,360 @@
+import asyncio
+import datetime
+import hmac
+import logging
+import mimetypes
+import os
+import shutil
+import tempfile
+import time
+from contextlib import suppress
+from hashlib import sha256
+from pathlib import Path
+from typing import IO, AsyncIterator, List, Tuple
+from urllib.parse import quote
+from uuid import uuid4
+from fastapi import HTTPException,status
+from schemas import TrackUploadedSchema,TrackSchema,TrackDownloadSchema,TrackFileSchema
+from settings import ENVIRONMENT
+from tools import content_disposition
+from .storage import StorageService,FileValidationResult,UploadStreamValidator,_BLOBS_PREFIX
+
+logger = logging.getLogger(__name__)
+
+# folder of the files being written, they are renamed into place once complete
+_INCOMING_DIR = '.incoming'
+
+# seconds after which a file left in the incoming folder by a dead worker is removed
+_INCOMING_MAX_AGE = 24 * 60 * 60
+
+class LocalStorageService(StorageService):
+
+    def __init__(
+        self,
+        root:str | Path,
+        signing_key:str,
+        url_lifetime:int,
+        base_url:str=''
+    ):
+        '''
+        Docstring for __init__
+
+        keeps the files in a local folder and serves them through urls signed with HMAC,
+        checked by the '/files' endpoint
+
+        :param root: folder of the stored files
+        :type root: str | Path
+        :param signing_key: key of the url signatures
+        :type signing_key: str
+        :param url_lifetime: seconds a download url is valid
+        :type url_lifetime: int
+        :param base_url: scheme and host of the download urls, empty for urls relative to this api
+        :type base_url: str
+        '''
+        super().__init__()
+        self._root = Path(root).resolve()
+        self._signing_key = signing_key.encode()
+        self._url_lifetime = url_lifetime
+        self._base_url = base_url.rstrip('/')
+        self._ready = False
+
+    @property
+    def is_ready(self) -> bool:
+        return self._ready
+
+    def _prepare(self) -> None:
+        incoming = self._root / _INCOMING_DIR
+        incoming.mkdir(parents=True,exist_ok=True)
+        oldest = time.time() - _INCOMING_MAX_AGE
+        for path in incoming.iterdir():
+            with suppress(OSError):
+                if path.stat().st_mtime < oldest:
+                    path.unlink()
+
+    async def start(self) -> None:
+        '''
+        Docstring for start
+
+        creates the folders and removes the incomplete files older than a day
+        '''
+        try:
+            await asyncio.to_thread(self._prepare)
+            self._ready = True
+        except OSError as e:
+            logger.error(f'Can not use the local storage at {self._root}: {e}')
+
+    def path(self,file_name:str) -> Path:
+        '''
+        Docstring for path
+
+        :type file_name: str
+        :return: where the file is kept, it is always inside the storage folder
+        :rtype: Path
+        '''
+        path = (self._root / file_name).resolve()
+        if not path.is_relative_to(self._root) or path.parent == self._root / _INCOMING_DIR:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail='File not found'
+            )
+        return path
+
+    def _copy(self,file:IO[bytes],target:IO[bytes],size:int) -> None:
+        '''
+        Docstring for _copy
+
+        copies the file with 'sendfile' so its bytes do not go through python, the files
+        kept in memory are copied by chunks
+
+        :param file: file positioned at its start
+        :type file: IO[bytes]
+        :type target: IO[bytes]
+        :type size: int
+        '''
+        # small uploads are kept in memory and have no descriptor to copy from
+        if size >= ENVIRONMENT.STREAMING_THRESHOLD:
+            sent = 0
+            with suppress(OSError,AttributeError):
+                source_fd = file.fileno()
+                while sent < size:
+                    count = os.sendfile(target.fileno(),source_fd,sent,size - sent)
+                    if count == 0:
+                        break
+                    sent += count
+            if sent == size:
+                return
+            # the file system does not support it, the copy starts again by chunks
+            target.seek(0)
+            target.truncate()
+        file.seek(0)
+        shutil.copyfileobj(file,target,ENVIRONMENT.CHUNK_SIZE)
+
+    def _write(self,file:IO[bytes],size:int,path:Path) -> None:
+        '''
+        Docstring for _write
+
+        writes the whole file aside and renames it into place, so a file is never seen
+        half written
+        '''
+        fd,incoming = tempfile.mkstemp(dir=self._root / _INCOMING_DIR)
+        try:
+            with os.fdopen(fd,'wb') as target:
+                file.seek(0)
+                self._copy(file,target,size)
+                target.flush()
+                os.fsync(target.fileno())
+            path.parent.mkdir(parents=True,exist_ok=True)
+            os.replace(incoming,path)
+        except BaseException:
+            with suppress(OSError):
+                os.unlink(incoming)
+            raise
+
+    async def store_file(
+        self,
+        file:IO[bytes],
+        validation_result:FileValidationResult
+    ) -> TrackUploadedSchema:
+        '''
+        Docstring for store_file
+
+        every copy of a content gets its own file inside the folder of the content, so
+        removing one never touches the others
+
+        :type file: IO[bytes]
+        :type validation_result: FileValidationResult
+        :rtype: TrackUploadedSchema
+        '''
+        file_id = uuid4().hex
+        file_name = f'{_BLOBS_PREFIX}{validation_result.hash}/{file_id}{validation_result.extension}'
+        try:
+            await asyncio.to_thread(self._write,file,validation_result.size,self.path(file_name))
+        except OSError as e:
+            logger.error(e)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail='An unexpected error has ocurred'
+            )
+        content_type,_ = mimetypes.guess_type(file_name)
+        return TrackUploadedSchema(
+            id=file_id,
+            filename=file_name,
+            content_type=content_type or 'application/octet-stream',
+            content_sha1=validation_result.sha1 or 'none',
+            size=validation_result.size,
+            uploaded_at=datetime.datetime.now(datetime.UTC)
+        )
+
+    @staticmethod
+    def _write_chunks(target:IO[bytes],chunks:List[bytes]) -> None:
+        target.writelines(chunks)
+
+    @staticmethod
+    def _complete(target:IO[bytes],incoming:str,path:Path) -> None:
+        target.flush()
+        os.fsync(target.fileno())
+        target.close()
+        path.parent.mkdir(parents=True,exist_ok=True)
+        os.replace(incoming,path)
+
+    async def store_stream(
+        self,
+        stream:AsyncIterator[bytes],
+        validator:UploadStreamValidator
+    ) -> Tuple[TrackUploadedSchema,FileValidationResult]:
+        '''
+        Docstring for store_stream
+
+        the bytes are written to the incoming folder as they arrive, the file is renamed into
+        place only once it is valid
+
+        :type stream: AsyncIterator[bytes]
+        :type validator: UploadStreamValidator
+        :rtype: Tuple[TrackUploadedSchema, FileValidationResult]
+        '''
+        file_id = uuid4().hex
+        file_name = f'{_BLOBS_PREFIX}{validator.content_hash}/{file_id}{validator.extension}'
+        path = self.path(file_name)
+        fd,incoming = tempfile.mkstemp(dir=self._root / _INCOMING_DIR)
+        target = os.fdopen(fd,'wb')
+        completed = False
+        try:
+            # the chunks of a request are small, they are written to the disk in batches
+            chunks:List[bytes] = []
+            buffered = 0
+            async for chunk in validator.validate(stream):
+                chunks.append(chunk)
+                buffered += len(chunk)
+                if buffered >= ENVIRONMENT.CHUNK_SIZE:
+                    await asyncio.to_thread(self._write_chunks,target,chunks)
+                    chunks = []
+                    buffered = 0
+            await asyncio.to_thread(self._write_chunks,target,chunks)
+            validation_result = validator.result()
+            await asyncio.to_thread(self._complete,target,incoming,path)
+            completed = True
+        except OSError as e:
+            logger.error(e)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail='An unexpected error has ocurred'
+            )
+        finally:
+            target.close()
+            if not completed:
+                with suppress(OSError):
+                    os.unlink(incoming)
+        content_type,_ = mimetypes.guess_type(file_name)
+        return TrackUploadedSchema(
+            id=file_id,
+            filename=file_name,
+            content_type=content_type or 'application/octet-stream',
+            content_sha1=validation_result.sha1 or 'none',
+            size=validation_result.size,
+            uploaded_at=datetime.datetime.now(datetime.UTC)
+        ),validation_result
+
+    def _signature(self,file_name:str,expires:int,disposition:str) -> str:
+        message = f'{file_name}\n{expires}\n{disposition}'.encode()
+        return hmac.new(self._signing_key,message,sha256).hexdigest()
+
+    async def get_file(self,track:TrackSchema | TrackFileSchema) -> TrackDownloadSchema:
+        '''
+        Docstring for get_file
+
+        signs a download url for the track, nothing is read from the disk
+
+        :type track: TrackSchema | TrackFileSchema
+        :rtype: TrackDownloadSchema
+        '''
+        expires = int(time.time()) + self._url_lifetime
+        disposition = content_disposition(track.name)
+        signature = self._signature(track.file_name,expires,disposition)
+        return TrackDownloadSchema(
+            id=track.id,
+            size=track.size,
+            name=track.name,
+            author_name=track.author_name,
+            url=(
+                f'{self._base_url}{ENVIRONMENT.GLOBAL_API_PREFIX}/files/{quote(track.file_name)}'
+                f'?expires={expires}'
+                f'&disposition={quote(disposition,safe="")}'
+                f'&signature={signature}'
+            ),
+            expires=self._url_lifetime
+        )
+
+    def open_signed(self,file_name:str,expires:int,disposition:str,signature:str) -> Path:
+        '''
+        Docstring for open_signed
+
+        checks a download url built by 'get_file'
+
+        :type file_name: str
+        :type expires: int
+        :type disposition: str
+        :type signature: str
+        :return: the file to send
+        :rtype: Path
+        '''
+        if (
+            expires < time.time()
+            or not hmac.compare_digest(self._signature(file_name,expires,disposition),signature)
+        ):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail='The download url is not valid'
+            )
+        path = self.path(file_name)
+        if not path.is_file():
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail='File not found'
+            )
+        return path
+
+    def local_path(self,file_name:str) -> Path | None:
+        return self.path(file_name)
+
+    def _read(self,path:Path,target:IO[bytes]) -> None:
+        with open(path,'rb') as file:
+            self._copy(file,target,path.stat().st_size)
+
+    async def download_file(self,file_name:str,target:IO[bytes]) -> None:
+        '''
+        Docstring for download_file
+
+        :type file_name: str
+        :type target: IO[bytes]
+        '''
+        try:
+            await asyncio.to_thread(self._read,self.path(file_name),target)
+        except FileNotFoundError:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail='File not found'
+            )
+
+    def _remove(self,path:Path) -> None:
+        path.unlink(missing_ok=True)
+        # the folder of the content is left when another copy is still in it
+        with suppress(OSError):
+            path.parent.rmdir()
+
+    async def remove_file(self,file_id:str,file_name:str) -> bool:
+        '''
+        Docstring for remove_file
+
+        :type file_id: str
+        :type file_name: str
+        :rtype: bool
+        '''
+        try:
+            await asyncio.to_thread(self._remove,self.path(file_name))
+            return True
+        except OSError as e:
+            logger.error(e)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail='An unexpected error has ocurred'
+            )
@@ -0,0 +1,285 @@
+import asyncio
+import logging
+from contextlib import suppress
+from hashlib import sha1
+from io import BytesIO
+from typing import IO, Any, AsyncIterator, Dict, List, Tuple, Type
+from b2sdk.v2 import B2Api,Bucket
+from b2sdk.v2.exception import B2Error
+
+logger = logging.getLogger(__name__)
+
+# smallest part accepted by the large file API, except for the last one
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+class LargeFileStorage:
+    '''
+    Docstring for LargeFileStorage
+
+    calls of a storage supporting uploads split in parts, they are blocking and the
+    uploader runs them in threads
+    '''
+
+    def start(self,file_name:str,content_type:str,file_info:Dict[str,str]) -> str:
+        '''
+        :return: id of the new unfinished file
+        :rtype: str
+        '''
+        raise NotImplementedError()
+
+    def upload_part(self,file_id:str,part_number:int,data:bytes,content_sha1:str) -> None:
+        raise NotImplementedError()
+
+    def finish(self,file_id:str,part_sha1s:List[str]) -> Any:
+        '''
+        :return: the version of the finished file
+        '''
+        raise NotImplementedError()
+
+    def cancel(self,file_id:str) -> None:
+        '''
+        drops the file and the parts already uploaded
+        '''
+        raise NotImplementedError()
+
+class B2LargeFileStorage(LargeFileStorage):
+
+    def __init__(self,api:B2Api,bucket:Bucket):
+        self._api = api
+        self._bucket = bucket
+
+    def start(self,file_name:str,content_type:str,file_info:Dict[str,str]) -> str:
+        response = self._api.session.start_large_file(
+            self._bucket.id_,
+            file_name,
+            content_type,
+            file_info
+        )
+        return response['fileId']
+
+    def upload_part(self,file_id:str,part_number:int,data:bytes,content_sha1:str) -> None:
+        self._api.session.upload_part(
+            file_id,
+            part_number,
+            len(data),
+            content_sha1,
+            BytesIO(data)
+        )
+
+    def finish(self,file_id:str,part_sha1s:List[str]) -> Any:
+        response = self._api.session.finish_large_file(file_id,part_sha1s)
+        return self._api.file_version_factory.from_api_response(response)
+
+    def cancel(self,file_id:str) -> None:
+        self._api.session.cancel_large_file(file_id)
+
+class MultipartUploader:
+
+    def __init__(
+        self,
+        storage:LargeFileStorage,
+        part_size:int,
+        max_workers:int,
+        part_retries:int=3,
+        retry_delay:float=0.5,
+        retry_on:Tuple[Type[Exception],...]=(B2Error,)
+    ):
+        '''
+        Docstring for __init__
+
+        uploads a file as a large file, the parts are read one after another and up to
+        'max_workers' of them are sent at once, so at most 'max_workers' parts are kept
+        in memory
+
+        :type storage: LargeFileStorage
+        :param part_size: size of every part but the last one, in bytes
+        :type part_size: int
+        :param max_workers: parts uploaded at the same time
+        :type max_workers: int
+        :param part_retries: times a failed part is sent again before the upload is abandoned
+        :type part_retries: int
+        :param retry_delay: seconds to wait before the first retry, doubled on each one
+        :type retry_delay: float
+        :param retry_on: errors worth a retry, any other one abandons the upload right away
+        :type retry_on: Tuple[Type[Exception], ...]
+        '''
+        self._storage = storage
+        self._part_size = max(part_size,MIN_PART_SIZE)
+        self._max_workers = max(max_workers,1)
+        self._part_retries = part_retries
+        self._retry_delay = retry_delay
+        self._retry_on = retry_on
+
+    @property
+    def part_size(self) -> int:
+        return self._part_size
+
+    def count_parts(self,file_size:int) -> int:
+        return max(1,-(-file_size // self._part_size))
+
+    @staticmethod
+    def _read_part(file:IO[bytes],size:int) -> Tuple[bytes,str]:
+        data = file.read(size)
+        return data,sha1(data).hexdigest()
+
+    @staticmethod
+    def _join_part(chunks:List[bytes]) -> Tuple[bytes,str]:
+        data = b''.join(chunks)
+        return data,sha1(data).hexdigest()
+
+    async def _file_parts(self,file:IO[bytes],file_size:int) -> AsyncIterator[Tuple[bytes,str]]:
+        for _ in range(self.count_parts(file_size)):
+            yield await asyncio.to_thread(self._read_part,file,self._part_size)
+
+    async def _stream_parts(self,stream:AsyncIterator[bytes]) -> AsyncIterator[Tuple[bytes,str]]:
+        '''
+        Docstring for _stream_parts
+
+        joins the chunks of the stream into parts, only the chunk crossing the end of a part
+        is split so every byte is copied once
+        '''
+        chunks:List[bytes] = []
+        buffered = 0
+        async for chunk in stream:
+            while buffered + len(chunk) >= self._part_size:
+                cut = self._part_size - buffered
+                chunks.append(chunk[:cut])
+                chunk = chunk[cut:]
+                yield await asyncio.to_thread(self._join_part,chunks)
+                chunks = []
+                buffered = 0
+            if chunk:
+                chunks.append(chunk)
+                buffered += len(chunk)
+        if chunks:
+            yield await asyncio.to_thread(self._join_part,chunks)
+
+    async def _upload_part(self,file_id:str,part_number:int,data:bytes,content_sha1:str) -> None:
+        attempt = 0
+        while True:
+            try:
+                await asyncio.to_thread(
+                    self._storage.upload_part,
+                    file_id,
+                    part_number,
+                    data,
+                    content_sha1
+                )
+                return
+            except self._retry_on as ex:
+                if attempt >= self._part_retries:
+                    raise
+                logger.warning(f'Part {part_number} of {file_id} failed, retrying: {ex}')
+                await asyncio.sleep(self._retry_delay * 2 ** attempt)
+                attempt += 1
+
+    async def _upload(
+        self,
+        parts:AsyncIterator[Tuple[bytes,str]],
+        file_name:str,
+        content_type:str,
+        file_info:Dict[str,str]
+    ) -> Any:
+        '''
+        Docstring for _upload
+
+        the file is started once its first part is read, so an upload rejected by its first
+        bytes never reaches the storage. The unfinished file is canceled if any part fails
+        after its retries, the reading of the parts fails or the upload is cancelled, so no
+        orphan parts are left in the storage
+
+        :param parts: data and SHA-1 of each part, in order
+        :type parts: AsyncIterator[Tuple[bytes, str]]
+        :type file_name: str
+        :type content_type: str
+        :type file_info: Dict[str, str]
+        :return: the version of the uploaded file returned by the storage
+        '''
+        file_id:str | None = None
+        slots = asyncio.Semaphore(self._max_workers)
+        tasks:List[asyncio.Task] = []
+
+        async def send(file_id:str,part_number:int,data:bytes,part_sha1:str) -> None:
+            try:
+                await self._upload_part(file_id,part_number,data,part_sha1)
+            finally:
+                slots.release()
+
+        try:
+            part_sha1s:List[str] = []
+            while True:
+                await slots.acquire()
+                # a failed part stops the reading of the next ones
+                failed = [task for task in tasks if task.done() and task.exception()]
+                if failed:
+                    slots.release()
+                    raise failed[0].exception() # type: ignore
+                try:
+                    data,part_sha1 = await anext(parts)
+                except StopAsyncIteration:
+                    slots.release()
+                    break
+                if file_id is None:
+                    file_id = await asyncio.to_thread(
+                        self._storage.start,
+                        file_name,
+                        content_type,
+                        file_info
+                    )
+                part_sha1s.append(part_sha1)
+                tasks.append(asyncio.create_task(send(file_id,len(part_sha1s),data,part_sha1)))
+            await asyncio.gather(*tasks)
+            return await asyncio.to_thread(self._storage.finish,file_id,part_sha1s)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks,return_exceptions=True)
+            if file_id is not None:
+                with suppress(Exception):
+                    await asyncio.to_thread(self._storage.cancel,file_id)
+                logger.error(f'Upload of {file_name} abandoned, large file {file_id} canceled')
+            raise
+
+    async def upload(
+        self,
+        file:IO[bytes],
+        file_name:str,
+        file_size:int,
+        content_type:str,
+        content_sha1:str | None=None
+    ) -> Any:
+        '''
+        Docstring for upload
+
+        :param file: file positioned at its start
+        :type file: IO[bytes]
+        :type file_name: str
+        :type file_size: int
+        :type content_type: str
+        :param content_sha1: SHA-1 of the whole file, saved with it if given
+        :type content_sha1: str | None
+        :return: the version of the uploaded file returned by the storage
+        '''
+        file_info = {'large_file_sha1':content_sha1} if content_sha1 else {}
+        return await self._upload(self._file_parts(file,file_size),file_name,content_type,file_info)
+
+    async def upload_stream(
+        self,
+        stream:AsyncIterator[bytes],
+        file_name:str,
+        content_type:str
+    ) -> Any:
+        '''
+        Docstring for upload_stream
+
+        uploads the bytes of a stream as they arrive, without keeping them anywhere but in
+        the parts being sent. The SHA-1 of the whole file is not known when the file is
+        started, so it is not saved with it
+
+        :param stream: bytes of the file, an error raised by it cancels the upload
+        :type stream: AsyncIterator[bytes]
+        :type file_name: str
+        :type content_type: str
+        :return: the version of the uploaded file returned by the storage
+        '''
+        return await self._upload(self._stream_parts(stream),file_name,content_type,{})
@@ -0,0 +1,489 @@
+from abc import ABC,abstractmethod
+from hashlib import sha1,sha256
+import mimetypes
+import asyncio
+from pathlib import Path
+from typing import IO, AsyncIterator, Callable, List, Sequence, Tuple
+import filetype
+import magic
+from fastapi import HTTPException, UploadFile,status
+from starlette.requests import ClientDisconnect
+from schemas import TrackUploadedSchema,TrackSchema,TrackDownloadSchema,TrackFileSchema
+from settings import ENVIRONMENT
+from .worker_pool import BoundedWorkerPool
+
+# bytes from the start of an upload used to detect its type
+_SNIFF_HEADER_SIZE = 8192
+
+# folder of the stored files, each one is named after the content hash of its file
+_BLOBS_PREFIX = 'tracks/'
+
+
+class FileValidationResult:
+    
+    def __init__(self,size:int,content_hash:str,extension:str,content_sha1:str | None=None):
+        self._size = size
+        self._hash = content_hash
+        self._extension = extension
+        self._sha1 = content_sha1
+
+    @property
+    def size(self) -> int:
+        return self._size
+    
+    @property
+    def hash(self) -> str:
+        return self._hash
+    
+    @property
+    def extension(self) -> str:
+        return self._extension
+
+    @property
+    def sha1(self) -> str | None:
+        return self._sha1
+
+class UploadStreamError(HTTPException):
+    '''
+    Docstring for UploadStreamError
+
+    error of the bytes of a streamed upload, not of the storage, the circuit breakers do not
+    count it
+    '''
+
+class UploadStreamValidator:
+
+    def __init__(
+        self,
+        check_file_type:Callable[[bytes,str],None],
+        size:int,
+        content_hash:str,
+        extension:str
+    ):
+        '''
+        Docstring for __init__
+
+        validates a file while its bytes arrive. The type is checked from the first bytes,
+        before any of them is stored. The size and the SHA-256 are announced by the client,
+        so the file can be named after its content before it arrives, and they are checked
+        once the last byte arrives, before the stored file is completed
+
+        :param check_file_type: checks the first bytes of the file and its extension
+        :type check_file_type: Callable[[bytes, str], None]
+        :param size: announced size of the file
+        :type size: int
+        :param content_hash: announced SHA-256 of the file
+        :type content_hash: str
+        :param extension: extension of the file name
+        :type extension: str
+        '''
+        self._check_file_type = check_file_type
+        self._size = size
+        self._content_hash = content_hash
+        self._extension = extension
+        self._received = 0
+        self._header = b''
+        self._checked = False
+        self._sha256 = sha256()
+        self._sha1 = sha1()
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def content_hash(self) -> str:
+        return self._content_hash
+
+    @property
+    def extension(self) -> str:
+        return self._extension
+
+    @property
+    def received(self) -> int:
+        return self._received
+
+    def update(self,chunk:bytes) -> None:
+        '''
+        Docstring for update
+
+        the chunks of a request are small, hashing them where they arrive costs less than
+        sending each one to a thread
+
+        :type chunk: bytes
+        '''
+        self._received += len(chunk)
+        if self._received > self._size:
+            raise UploadStreamError(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f'The file is larger than the announced {self._size} bytes'
+            )
+        if not self._checked:
+            self._header += chunk[:_SNIFF_HEADER_SIZE - len(self._header)]
+            if len(self._header) >= _SNIFF_HEADER_SIZE:
+                self._check_file_type(self._header,self._extension)
+                self._checked = True
+        self._sha256.update(chunk)
+        self._sha1.update(chunk)
+
+    def result(self) -> FileValidationResult:
+        '''
+        Docstring for result
+
+        :return: the validation result once every byte arrived
+        :rtype: FileValidationResult
+        '''
+        if not self._checked:
+            self._check_file_type(self._header,self._extension)
+            self._checked = True
+        if self._received != self._size:
+            raise UploadStreamError(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f'Only {self._received} of the announced {self._size} bytes were received'
+            )
+        if self._sha256.hexdigest() != self._content_hash:
+            raise UploadStreamError(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail='The content does not match the announced hash'
+            )
+        return FileValidationResult(
+            self._size,
+            self._content_hash,
+            self._extension,
+            self._sha1.hexdigest()
+        )
+
+    async def validate(self,stream:AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        '''
+        Docstring for validate
+
+        :param stream: bytes of the file
+        :type stream: AsyncIterator[bytes]
+        :return: the same bytes, it fails with 'UploadStreamError' before the first invalid
+        chunk or after the last one if the file is not valid
+        :rtype: AsyncIterator[bytes]
+        '''
+        try:
+            async for chunk in stream:
+                self.update(chunk)
+                yield chunk
+            self.result()
+        except UploadStreamError:
+            raise
+        except HTTPException as e:
+            # rejections of the type, or of the admission control of the upload
+            raise UploadStreamError(status_code=e.status_code,detail=e.detail,headers=e.headers)
+        except ClientDisconnect:
+            raise UploadStreamError(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail='The upload was interrupted'
+            )
+
+class StorageService(ABC):
+
+    def __init__(self):
+        '''
+        Docstring for __init__
+
+        storage of the track files, the validation of the uploads is shared by every backend
+        and the way the files are kept and served is up to each one
+        '''
+        mimetypes.add_type("audio/x-m4a",'.m4a')
+        # hashing and type detection of the uploads run here, out of the event loop
+        self._validation_pool = BoundedWorkerPool(
+            'upload_validation',
+            ENVIRONMENT.UPLOAD_VALIDATION_WORKERS,
+            ENVIRONMENT.UPLOAD_VALIDATION_MAX_QUEUE
+        )
+
+    @property
+    def validation_pool(self) -> BoundedWorkerPool:
+        return self._validation_pool
+
+    @property
+    @abstractmethod
+    def is_ready(self) -> bool:
+        '''
+        tells if the storage can be used
+        '''
+
+    async def start(self) -> None:
+        '''
+        Docstring for start
+
+        prepares the storage, must be called before using it
+        '''
+
+    async def stop(self) -> None:
+        '''
+        Docstring for stop
+
+        stops the validation workers
+        '''
+        self._validation_pool.shutdown()
+
+    def _check_file_type(self,header:bytes,extension:str) -> None:
+        '''
+        Docstring for _check_file_type
+
+        checks that the content and the extension of the file are an allowed audio type
+
+        :param header: first bytes of the file
+        :type header: bytes
+        :param extension: extension of the file name
+        :type extension: str
+        '''
+        mime_type = magic.from_buffer(header,mime=True)
+        if not mime_type in ENVIRONMENT.ALLOWED_TRACKS_MIME_TYPES:
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail=f'Unsupported type file: {mime_type}. Allowed :{ENVIRONMENT.ALLOWED_TRACKS_MIME_TYPES}'
+            )
+        
+        kind = filetype.guess(header)
+        if not kind:
+            raise HTTPException(
+                status_code=status.HTTP_406_NOT_ACCEPTABLE,
+                detail='The file is corrupted'
+            )
+        
+        if not f'.{kind.extension}' == extension:
+            raise HTTPException(
+                status_code=status.HTTP_406_NOT_ACCEPTABLE,
+                detail=f'The extension of your file is "{extension}" what is different from the content type ".{kind.extension}" detected'
+            )
+        if not f'.{kind.extension}' == mimetypes.guess_extension(mime_type):
+            raise HTTPException(
+                status_code=status.HTTP_406_NOT_ACCEPTABLE,
+                detail=f'The expected extension for the mime type of the given file does not matchs with the content, rejected for security'
+            )
+
+    async def validate_file(self,data:UploadFile) -> FileValidationResult:
+        '''
+        Docstring for validate_file
+
+        validates the file in a single pass over it, the type is detected from the first
+        bytes before reading the rest and the SHA-256 and SHA-1 hashes are computed at once,
+        so only one chunk is kept in memory. The pass runs in the validation pool, when it
+        is full the upload is rejected with a 503
+        
+        :type data: UploadFile
+        '''
+        if not data.filename:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f'The file does not have a valid filename'
+            )
+        
+        # gets the file size
+        data.file.seek(0,2)
+        file_size = data.file.tell()
+        data.file.seek(0)
+
+        if file_size > ENVIRONMENT.MAX_TRACK_SIZE:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f'File too large. Maximum size allowed is {ENVIRONMENT.MAX_TRACK_SIZE // (1024*1024)}MB'
+            )
+
+        extension = Path(data.filename).suffix
+        try:
+            return await self._validation_pool.run(
+                self._validate_stream,
+                data.file,
+                file_size,
+                extension
+            )
+        finally:
+            await data.seek(0)
+
+    def _validate_stream(self,file:IO[bytes],file_size:int,extension:str) -> FileValidationResult:
+        '''
+        Docstring for _validate_stream
+
+        blocking part of the validation, runs in the validation pool
+
+        :param file: file positioned at its start
+        :type file: IO[bytes]
+        :type file_size: int
+        :param extension: extension of the file name
+        :type extension: str
+        :rtype: FileValidationResult
+        '''
+        hasher = sha256()
+        sha1_hasher = sha1()
+        header = b''
+        checked = False
+        chunk = file.read(ENVIRONMENT.CHUNK_SIZE)
+        while chunk:
+            if not checked:
+                header += chunk[:_SNIFF_HEADER_SIZE - len(header)]
+                if len(header) >= _SNIFF_HEADER_SIZE:
+                    self._check_file_type(header,extension)
+                    checked = True
+            hasher.update(chunk)
+            sha1_hasher.update(chunk)
+            chunk = file.read(ENVIRONMENT.CHUNK_SIZE)
+        if not checked:
+            self._check_file_type(header,extension)
+
+        return FileValidationResult(
+            file_size,
+            hasher.hexdigest(),
+            extension,
+            sha1_hasher.hexdigest()
+        )
+
+    async def upload_file(self,data: UploadFile) -> Tuple[TrackUploadedSchema,str]:
+        '''
+        Docstring for upload_file
+
+        validates and stores the file
+        
+        :type data: UploadFile
+        :return: the uploaded file and its SHA-256
+        :rtype: Tuple[TrackUploadedSchema, str]
+        '''
+        validation_result = await self.validate_file(data)
+        cloud_response = await self.store_file(data.file,validation_result)
+        return cloud_response,validation_result.hash
+
+    @staticmethod
+    def blob_file_name(validation_result:FileValidationResult) -> str:
+        '''
+        Docstring for blob_file_name
+
+        :type validation_result: FileValidationResult
+        :return: name of the stored file of a content, it does not depend on any track so
+        the tracks with the same content share it
+        :rtype: str
+        '''
+        return f'{_BLOBS_PREFIX}{validation_result.hash}{validation_result.extension}'
+
+    def stream_validator(self,size:int,content_hash:str,extension:str) -> UploadStreamValidator:
+        '''
+        Docstring for stream_validator
+
+        :param size: announced size of the file
+        :type size: int
+        :param content_hash: announced SHA-256 of the file
+        :type content_hash: str
+        :param extension: extension of the file name
+        :type extension: str
+        :return: the validator of a file uploaded as a stream
+        :rtype: UploadStreamValidator
+        '''
+        if size > ENVIRONMENT.MAX_TRACK_SIZE:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f'File too large. Maximum size allowed is {ENVIRONMENT.MAX_TRACK_SIZE // (1024*1024)}MB'
+            )
+        return UploadStreamValidator(self._check_file_type,size,content_hash,extension)
+
+    async def check_file_type(self,file:IO[bytes],extension:str) -> None:
+        '''
+        Docstring for check_file_type
+
+        checks the type of a file whose size and hashes are already known, from its first bytes
+        
+        :param file: file positioned at its start
+        :type file: IO[bytes]
+        :param extension: extension of the file name
+        :type extension: str
+        '''
+        header = await asyncio.to_thread(file.read,_SNIFF_HEADER_SIZE)
+        file.seek(0)
+        self._check_file_type(header,extension)
+
+    @abstractmethod
+    async def store_file(
+        self,
+        file:IO[bytes],
+        validation_result:FileValidationResult
+    ) -> TrackUploadedSchema:
+        '''
+        Docstring for store_file
+
+        stores a validated file, every call stores a new copy with its own id even if the
+        content was stored before
+        
+        :type file: IO[bytes]
+        :type validation_result: FileValidationResult
+        :rtype: TrackUploadedSchema
+        '''
+
+    @abstractmethod
+    async def store_stream(
+        self,
+        stream:AsyncIterator[bytes],
+        validator:UploadStreamValidator
+    ) -> Tuple[TrackUploadedSchema,FileValidationResult]:
+        '''
+        Docstring for store_stream
+
+        stores a file while its bytes arrive and are validated, without writing them to a
+        temporary file. Nothing is stored if the file is not valid
+        
+        :param stream: bytes of the file
+        :type stream: AsyncIterator[bytes]
+        :param validator: validator of the announced file
+        :type validator: UploadStreamValidator
+        :return: the stored file and its validation result
+        :rtype: Tuple[TrackUploadedSchema, FileValidationResult]
+        '''
+
+    @abstractmethod
+    async def get_file(self,track:TrackSchema | TrackFileSchema) -> TrackDownloadSchema:
+        '''
+        Docstring for get_file
+
+        builds a signed download url for the track
+        
+        :type track: TrackSchema | TrackFileSchema
+        :rtype: TrackDownloadSchema
+        '''
+
+    async def get_files(self,tracks:Sequence[TrackSchema | TrackFileSchema]) -> List[TrackDownloadSchema]:
+        '''
+        Docstring for get_files
+
+        builds signed download urls for many tracks
+        
+        :type tracks: Sequence[TrackSchema | TrackFileSchema]
+        :rtype: List[TrackDownloadSchema]
+        '''
+        return [await self.get_file(track) for track in tracks]
+
+    @abstractmethod
+    async def download_file(self,file_name:str,target:IO[bytes]) -> None:
+        '''
+        Docstring for download_file
+
+        writes the whole stored file to 'target'
+        
+        :type file_name: str
+        :type target: IO[bytes]
+        '''
+
+    def local_path(self,file_name:str) -> Path | None:
+        '''
+        Docstring for local_path
+
+        :type file_name: str
+        :return: where the file is if this storage keeps it on the local disk, so it can be
+        sent from there without copying it
+        :rtype: Path | None
+        '''
+        return None
+
+    @abstractmethod
+    async def remove_file(self,file_id:str,file_name:str) -> bool:
+        '''
+        Docstring for remove_file
+
+        removes a stored copy, a copy already removed counts as removed so it can be retried
+        
+        :type file_id: str
+        :type file_name: str
+        :rtype: bool
+        '''
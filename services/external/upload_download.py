@@ -1,159 +1,236 @@
-from hashlib import sha256
 import mimetypes
 import datetime
 import asyncio
 import logging
-from io import IOBase
-from pathlib import Path
-from typing import Callable, Tuple
+import time
+from contextlib import suppress
+from io import BytesIO,IOBase
+from typing import IO, AsyncIterator, Callable, List, Sequence, Tuple
+from urllib.parse import quote
 from b2sdk.v2 import InMemoryAccountInfo,B2Api,UploadSourceBytes,UploadSourceStream,FileVersion
-from b2sdk.v2.exception import B2ConnectionError,B2Error,B2RequestTimeout
-import filetype
-import magic
-import mimetypes
-from schemas import TrackUploadedSchema,TrackSchema,TrackDownloadSchema,TrackUploadSchema
+from b2sdk.v2.exception import B2ConnectionError,B2Error,B2RequestTimeout,FileNotPresent
+from schemas import TrackUploadedSchema,TrackSchema,TrackDownloadSchema,TrackFileSchema
 from settings import ENVIRONMENT
-from fastapi import HTTPException, UploadFile,status
-from .circuit_breaker import circuit_breaker
+from tools import content_disposition
+from fastapi import HTTPException,status
+from .circuit_breaker import CircuitBreakerConfig,circuit_breaker
+from .download_authorization import DownloadAuthorization,DownloadAuthorizationCache
+from .multipart_upload import B2LargeFileStorage,MultipartUploader
+from .storage import StorageService,FileValidationResult,UploadStreamError,UploadStreamValidator,_BLOBS_PREFIX
 
 logger = logging.getLogger(__name__)
 
+# lifetime of an account authorization token in backblazeb2
+_ACCOUNT_TOKEN_LIFETIME = 24 * 60 * 60
 
-class FileValidationResult:
-    
-    def __init__(self,size:int,content_hash:str,extension:str):
-        self._size = size
-        self._hash = content_hash
-        self._extension = extension
-
-    @property
-    def size(self) -> int:
-        return self._size
-    
-    @property
-    def hash(self) -> str:
-        return self._hash
-    
-    @property
-    def extension(self) -> str:
-        return self._extension
-
-class BackBlazeB2Service:
+class BackBlazeB2Service(StorageService):
     def __init__(self,testing=False):
         '''
         Docstring for __init__
         
-        service to use BackBlazeB2 cloud-storage platform
+        service to use BackBlazeB2 cloud-storage platform, the account is not authorized
+        until 'start' is called
         '''
-        mimetypes.add_type("audio/x-m4a",'.m4a')
+        super().__init__()
+        self._testing = testing
+        self._authorized_at:float | None = None
+        self._refresh_task:asyncio.Task | None = None
+        self._download_base_url:str | None = None
+        self._download_authorizations = DownloadAuthorizationCache(
+            ENVIRONMENT.BACKBLAZEB2_DOWNLOAD_AUTHORIZATION_CACHE_SIZE,
+            ENVIRONMENT.BACKBLAZEB2_URL_LIFETIME
+        )
+        self._multipart_uploader:MultipartUploader | None = None
         if not testing:
-            try:
-                self._info = InMemoryAccountInfo()
-                self._api = B2Api(self._info) # type: ignore
-                self._api.authorize_account(
-                    'production',
-                    ENVIRONMENT.BACKBLAZEB2_AWS_ACCESS_KEY_ID,
-                    ENVIRONMENT.BACKBLAZEB2_AWS_SECRET_ACCESS_KEY
-                )
-                self._bucket = self._api.get_bucket_by_id(
-                    ENVIRONMENT.BACKBLAZEB2_BUCKET_ID
-                )
-            except Exception as ex:
-                logger.error(f'Can not acces to backblazeb2 service: {ex}')
-                raise HTTPException(
-                    status_code=status.HTTP_408_REQUEST_TIMEOUT,
-                    detail='Can not connect to backblazeb2 service'
-                )
-        
-    async def _validate_file(self,data:UploadFile) -> FileValidationResult:
+            self._info = InMemoryAccountInfo()
+            self._api = B2Api(self._info) # type: ignore
+    
+    @property
+    def is_ready(self) -> bool:
         '''
-        Docstring for validate_file
-        
-        :type data: UploadFile
+        tells if the service holds a valid account authorization
         '''
-        if not data.filename:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f'The file does not have a valid filename'
-            )
+        if self._testing:
+            return True
+        if self._authorized_at is None:
+            return False
+        return time.time() - self._authorized_at < _ACCOUNT_TOKEN_LIFETIME
+
+    def _authorize(self) -> None:
+        self._api.authorize_account(
+            'production',
+            ENVIRONMENT.BACKBLAZEB2_AWS_ACCESS_KEY_ID,
+            ENVIRONMENT.BACKBLAZEB2_AWS_SECRET_ACCESS_KEY
+        )
+        self._bucket = self._api.get_bucket_by_id(
+            ENVIRONMENT.BACKBLAZEB2_BUCKET_ID
+        )
+        self._download_base_url = self._api.get_download_url_for_file_name(self._bucket.name,'')
+        self._multipart_uploader = MultipartUploader(
+            B2LargeFileStorage(self._api,self._bucket),
+            ENVIRONMENT.BACKBLAZEB2_PART_SIZE,
+            ENVIRONMENT.BACKBLAZEB2_UPLOAD_WORKERS,
+            ENVIRONMENT.BACKBLAZEB2_PART_RETRIES
+        )
+        self._authorized_at = time.time()
+
+    async def authorize(self) -> bool:
+        '''
+        Docstring for authorize
+
+        authorizes the account and loads the bucket
         
-        # gets the file size
-        data.file.seek(0,2)
-        file_size = data.file.tell()
-        data.file.seek(0)
+        :return: True if the authorization succeeded, False otherwise
+        :rtype: bool
+        '''
+        try:
+            await asyncio.to_thread(self._authorize)
+            logger.info('backblazeb2 account authorized')
+            return True
+        except Exception as ex:
+            logger.error(f'Can not acces to backblazeb2 service: {ex}')
+            return False
     
-        hasher = sha256()
-        chunks = []
-        chunk = await data.read(ENVIRONMENT.CHUNK_SIZE)
-        while chunk:
-            chunks.append(chunk)
-            hasher.update(chunk)
-            chunk = await data.read(ENVIRONMENT.CHUNK_SIZE)
+    async def _refresh_authorization(self) -> None:
+        while True:
+            if self.is_ready:
+                await asyncio.sleep(ENVIRONMENT.BACKBLAZEB2_AUTHORIZATION_REFRESH)
+            else:
+                await asyncio.sleep(ENVIRONMENT.BACKBLAZEB2_AUTHORIZATION_RETRY)
+            await self.authorize()
 
-        await data.seek(0)
+    async def start(self) -> None:
+        '''
+        Docstring for start
 
-        content_hash = hasher.hexdigest()
+        authorizes the account and keeps it authorized in background
+        '''
+        await self.authorize()
+        self._refresh_task = asyncio.create_task(self._refresh_authorization())
+    
+    async def stop(self) -> None:
+        '''
+        Docstring for stop
 
-        extension = Path(data.filename).suffix
-        
-        file_header = await data.read(2048)
-        await data.seek(0)
-        mime_type = magic.from_buffer(b''.join(chunks),mime=True)
-        if not mime_type in ENVIRONMENT.ALLOWED_TRACKS_MIME_TYPES:
-            raise HTTPException(
-                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
-                detail=f'Unsupported type file: {mime_type}. Allowed :{ENVIRONMENT.ALLOWED_TRACKS_MIME_TYPES}'
-            )
+        stops the background authorization refresh and the validation workers
+        '''
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._refresh_task
+            self._refresh_task = None
+        await super().stop()
+
+    @circuit_breaker('backblazeb2_upload')
+    async def store_file(
+        self,
+        file:IO[bytes],
+        validation_result:FileValidationResult
+    ) -> TrackUploadedSchema:
+        '''
+        Docstring for store_file
+
+        uploads a validated file the way that suits its size, named after its content. Only
+        the storage failures count for the circuit breaker
         
-        kind = filetype.guess(file_header)
-        if not kind:
-            raise HTTPException(
-                status_code=status.HTTP_406_NOT_ACCEPTABLE,
-                detail='The file is corrupted'
+        :type file: IO[bytes]
+        :type validation_result: FileValidationResult
+        :rtype: TrackUploadedSchema
+        '''
+        return await self._store_file(file,validation_result)
+
+    @circuit_breaker(
+        'backblazeb2_stream_upload',
+        CircuitBreakerConfig(ignored_exceptions=(UploadStreamError,))
+    )
+    async def store_stream(
+        self,
+        stream:AsyncIterator[bytes],
+        validator:UploadStreamValidator
+    ) -> Tuple[TrackUploadedSchema,FileValidationResult]:
+        '''
+        Docstring for store_stream
+
+        a file that fits in a part is kept in memory until it is validated, so it is uploaded
+        like any other. A larger one is uploaded by parts as it arrives, and its large file is
+        canceled if it is not valid. The rejected files do not count for the circuit breaker
+
+        :type stream: AsyncIterator[bytes]
+        :type validator: UploadStreamValidator
+        :rtype: Tuple[TrackUploadedSchema, FileValidationResult]
+        '''
+        if not self._multipart_uploader or validator.size <= self._multipart_uploader.part_size:
+            chunks = [chunk async for chunk in validator.validate(stream)]
+            validation_result = validator.result()
+            return await self._store_file(BytesIO(b''.join(chunks)),validation_result),validation_result
+
+        file_name = f'{_BLOBS_PREFIX}{validator.content_hash}{validator.extension}'
+        content_type,_ = mimetypes.guess_type(file_name)
+        try:
+            uploaded_file:FileVersion = await self._multipart_uploader.upload_stream(
+                validator.validate(stream),
+                file_name,
+                content_type or 'application/octet-stream'
             )
-        
-        if not f'.{kind.extension}' == extension:
+        except HTTPException:
+            raise
+        except B2RequestTimeout:
             raise HTTPException(
-                status_code=status.HTTP_406_NOT_ACCEPTABLE,
-                detail=f'The extension of your file is "{extension}" what is different from the content type ".{kind.extension}" detected'
+                status_code=status.HTTP_408_REQUEST_TIMEOUT,
+                detail='The upload process took too long to complete'
             )
-        if not f'.{kind.extension}' == mimetypes.guess_extension(mime_type):
+        except Exception as e:
+            logger.error(e)
             raise HTTPException(
-                status_code=status.HTTP_406_NOT_ACCEPTABLE,
-                detail=f'The expected extension for the mime type of the given file does not matchs with the content, rejected for security'
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail='An unexpected error has ocurred'
             )
-        return FileValidationResult(
-            file_size,
-            content_hash,
-            extension
-        )
-
-    @circuit_breaker('backblazeb2_upload')
-    async def upload_file(self,data: UploadFile,track_name:str) -> Tuple[TrackUploadedSchema,str]:
-        validation_result = await self._validate_file(data)
-
-        if validation_result.size > ENVIRONMENT.MAX_TRACK_SIZE:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f'File too large. Maximum size allowed is {ENVIRONMENT.MAX_TRACK_SIZE // 1024*1024 }MB'
+        return TrackUploadedSchema(
+            id=uploaded_file.id_,
+            filename=uploaded_file.file_name,
+            content_type=str(uploaded_file.content_type),
+            content_sha1=uploaded_file.get_content_sha1() or 'none',
+            size=uploaded_file.size,
+            uploaded_at=datetime.datetime.fromtimestamp(
+                uploaded_file.upload_timestamp / 1000,
+                datetime.UTC
             )
+        ),validator.result()
 
+    async def _store_file(
+        self,
+        file:IO[bytes],
+        validation_result:FileValidationResult
+    ) -> TrackUploadedSchema:
+        file_name = self.blob_file_name(validation_result)
         try:
-            data.file.seek(0)
+            file.seek(0)
 
             if validation_result.size < ENVIRONMENT.STREAMING_THRESHOLD:
-                track_data = await data.read()
-                cloud_response = await self._upload_file(track_data,f'{track_name}{validation_result.extension}')
+                track_data = await asyncio.to_thread(file.read)
+                cloud_response = await self._upload_file(
+                    track_data,
+                    file_name,
+                    content_sha1=validation_result.sha1
+                )
+            elif self._multipart_uploader and validation_result.size > self._multipart_uploader.part_size:
+                cloud_response = await self._upload_file_multipart(
+                    file,
+                    file_name,
+                    validation_result.size,
+                    content_sha1=validation_result.sha1
+                )
             else:
                 def stream_opener():
-                    return data.file
+                    return file
 
                 cloud_response = await self._upload_file_streaming(
                     stream_opener=stream_opener, # type: ignore
-                    file_name=f'{track_name}{validation_result.extension}',
-                    file_size=validation_result.size
-                )            
-            return cloud_response,validation_result.hash
+                    file_name=file_name,
+                    file_size=validation_result.size,
+                    content_sha1=validation_result.sha1
+                )
+            return cloud_response
         except HTTPException:
             raise
         except Exception as e:
@@ -169,7 +246,20 @@ class BackBlazeB2Service:
         file_name:str,
         file_size:int,
         content_type:str | None = None,
+        content_sha1:str | None = None
     ) -> TrackUploadedSchema:
+        '''
+        Docstring for _upload_file_streaming
+        
+        :param stream_opener: returns the file to upload
+        :type stream_opener: Callable[[], IOBase]
+        :type file_name: str
+        :type file_size: int
+        :type content_type: str | None
+        :param content_sha1: SHA-1 of the file if already known, so it is not read again to compute it
+        :type content_sha1: str | None
+        :rtype: TrackUploadedSchema
+        '''
         if not content_type:
             content_type,_ = mimetypes.guess_type(file_name)
             if not content_type:
@@ -177,7 +267,8 @@ class BackBlazeB2Service:
         
         upload_source = UploadSourceStream(
             stream_opener=stream_opener,
-            stream_length=file_size
+            stream_length=file_size,
+            stream_sha1=content_sha1
         )
 
         try:
@@ -185,7 +276,8 @@ class BackBlazeB2Service:
                 lambda:self._bucket.upload(
                 upload_source=upload_source,
                 file_name=file_name,
-                content_type=content_type
+                content_type=content_type,
+                large_file_sha1=content_sha1
             ))
 
             return TrackUploadedSchema(
@@ -215,11 +307,75 @@ class BackBlazeB2Service:
                 detail=f'An unexpected error has ocurred'
             )
 
+    async def _upload_file_multipart(
+        self,
+        file:IO[bytes],
+        file_name:str,
+        file_size:int,
+        content_type:str | None = None,
+        content_sha1:str | None = None
+    ) -> TrackUploadedSchema:
+        '''
+        Docstring for _upload_file_multipart
+
+        uploads the file as a large file, its parts are sent concurrently
+        
+        :param file: file positioned at its start
+        :type file: IO[bytes]
+        :type file_name: str
+        :type file_size: int
+        :type content_type: str | None
+        :param content_sha1: SHA-1 of the whole file if already known
+        :type content_sha1: str | None
+        :rtype: TrackUploadedSchema
+        '''
+        if not content_type:
+            content_type,_ = mimetypes.guess_type(file_name)
+            if not content_type:
+                content_type = 'application/octet-stream'
+
+        try:
+            uploaded_file:FileVersion = await self._multipart_uploader.upload( # type: ignore
+                file,
+                file_name,
+                file_size,
+                content_type,
+                content_sha1
+            )
+
+            return TrackUploadedSchema(
+                id=uploaded_file.id_,
+                filename=uploaded_file.file_name,
+                content_type=str(uploaded_file.content_type),
+                content_sha1=uploaded_file.get_content_sha1() or 'none',
+                size=uploaded_file.size,
+                uploaded_at=datetime.datetime.fromtimestamp(
+                    uploaded_file.upload_timestamp / 1000,
+                    datetime.UTC
+                )
+            )
+        except B2RequestTimeout as e:
+            raise HTTPException(
+                status_code=status.HTTP_408_REQUEST_TIMEOUT,
+                detail='The upload process took too long to complete'
+            )
+        except B2ConnectionError as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f'Connection failed'
+            )
+        except B2Error as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f'An unexpected error has ocurred'
+            )
+
     async def _upload_file(
         self,
         file_data:bytes,
         file_name:str,
-        content_type:str | None = None
+        content_type:str | None = None,
+        content_sha1:str | None = None
     ) -> TrackUploadedSchema:
         '''
         Docstring for upload_file
@@ -228,6 +384,8 @@ class BackBlazeB2Service:
         :type file_data: bytes
         :type file_name: str
         :type content_type: str | None
+        :param content_sha1: SHA-1 of the data if already known
+        :type content_sha1: str | None
         :rtype: TrackUploadedSchema
         '''
         if not content_type:
@@ -235,7 +393,7 @@ class BackBlazeB2Service:
             if not content_type:
                 content_type = 'application/octet-stream'
             
-        upload_source = UploadSourceBytes(file_data)
+        upload_source = UploadSourceBytes(file_data,content_sha1=content_sha1)
         try:
             uploaded_file:FileVersion = await asyncio.to_thread(
                 lambda:self._bucket.upload(
@@ -271,33 +429,38 @@ class BackBlazeB2Service:
                 detail=f'An unexpected error has ocurred'
             )
     
-    @circuit_breaker('backblazeb2_get_file_info')
-    async def get_file(self,track:TrackSchema) -> TrackDownloadSchema:
+    def _get_download_base_url(self) -> str:
+        if not self._download_base_url:
+            self._download_base_url = self._api.get_download_url_for_file_name(self._bucket.name,'')
+        return self._download_base_url
+
+    def _get_authorization_prefix(self,file_name:str) -> str:
+        prefix_length = ENVIRONMENT.BACKBLAZEB2_DOWNLOAD_AUTHORIZATION_PREFIX_LENGTH
+        if prefix_length <= 0:
+            return file_name
+        return file_name[:prefix_length]
+
+    @circuit_breaker('backblazeb2_get_download_authorization')
+    async def _get_download_authorization(self,prefix:str) -> DownloadAuthorization:
         '''
-        Docstring for get_file_by_id
+        Docstring for _get_download_authorization
         
-        :type track: TrackSchema
-        :rtype: TrackDownloadSchema
+        :param prefix: file name prefix the token will be valid for
+        :type prefix: str
+        :rtype: DownloadAuthorization
         '''
+        lifetime = ENVIRONMENT.BACKBLAZEB2_DOWNLOAD_AUTHORIZATION_LIFETIME
+        requested_at = time.time()
         try:
-            file = await asyncio.to_thread(
-                lambda:self._api.get_file_info(track.file_id)
-            )
-            authorization_token = await asyncio.to_thread(
+            token = await asyncio.to_thread(
                 lambda:self._bucket.get_download_authorization(
-                file_name_prefix=file.file_name,
-                valid_duration_in_seconds=ENVIRONMENT.BACKBLAZEB2_URL_LIFETIME
+                file_name_prefix=prefix,
+                valid_duration_in_seconds=lifetime
             ))
-            url = await asyncio.to_thread(
-                lambda:self._api.get_download_url_for_file_name(self._bucket.name,file.file_name)
-            )
-            return TrackDownloadSchema(
-                id=track.id,
-                size=track.size,
-                name=file.file_name,
-                author_name=track.author_name,
-                url=f'{url}?Authorization={authorization_token}',
-                expires=ENVIRONMENT.BACKBLAZEB2_URL_LIFETIME
+            return DownloadAuthorization(
+                prefix=prefix,
+                token=token,
+                expires_at=requested_at + lifetime
             )
         except B2RequestTimeout as e:
             logger.error(e)
@@ -317,42 +480,95 @@ class BackBlazeB2Service:
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f'An unexpected error has ocurred'
             )
+
+    def _build_download(self,track:TrackSchema | TrackFileSchema,authorization:DownloadAuthorization) -> TrackDownloadSchema:
+        return TrackDownloadSchema(
+            id=track.id,
+            size=track.size,
+            name=track.name,
+            author_name=track.author_name,
+            # the stored file is named after its content, the client sees the name of the track
+            url=(
+                f'{self._get_download_base_url()}{quote(track.file_name)}'
+                f'?Authorization={authorization.token}'
+                f'&b2ContentDisposition={quote(content_disposition(track.name),safe="")}'
+            ),
+            expires=int(authorization.remaining_seconds)
+        )
+
+    async def get_file(self,track:TrackSchema | TrackFileSchema) -> TrackDownloadSchema:
+        '''
+        Docstring for get_file
+
+        builds a signed download url for the track, the name of its file is taken from the
+        track and the authorization token from the cache, so a cache hit does not touch the network
+        
+        :type track: TrackSchema | TrackFileSchema
+        :rtype: TrackDownloadSchema
+        '''
+        authorization = await self._download_authorizations.get_or_create(
+            self._get_authorization_prefix(track.file_name),
+            self._get_download_authorization
+        )
+        return self._build_download(track,authorization)
     
-    @circuit_breaker('backblazeb2_rename')
-    async def rename_file(self,file_id:str,file_name:str,new_file_name:str) -> TrackUploadedSchema:
+    async def get_files(self,tracks:Sequence[TrackSchema | TrackFileSchema]) -> List[TrackDownloadSchema]:
         '''
-        Docstring for rename_file
+        Docstring for get_files
+
+        builds signed download urls for many tracks, one authorization is requested per
+        distinct prefix not cached yet and the requests run concurrently up to
+        'BACKBLAZEB2_MAX_CONCURRENT_REQUESTS' at once
+        
+        :type tracks: Sequence[TrackSchema | TrackFileSchema]
+        :rtype: List[TrackDownloadSchema]
+        '''
+        semaphore = asyncio.Semaphore(ENVIRONMENT.BACKBLAZEB2_MAX_CONCURRENT_REQUESTS)
+
+        async def authorize(prefix:str) -> DownloadAuthorization:
+            async with semaphore:
+                return await self._download_authorizations.get_or_create(
+                    prefix,
+                    self._get_download_authorization
+                )
+
+        prefixes = list(dict.fromkeys(
+            self._get_authorization_prefix(track.file_name) for track in tracks
+        ))
+        authorizations = dict(zip(
+            prefixes,
+            await asyncio.gather(*[authorize(prefix) for prefix in prefixes])
+        ))
+        return [
+            self._build_download(track,authorizations[self._get_authorization_prefix(track.file_name)])
+            for track in tracks
+        ]
+
+    @circuit_breaker('backblazeb2_download')
+    async def download_file(self,file_name:str,target:IO[bytes]) -> None:
+        '''
+        Docstring for download_file
+
+        streams the stored file to 'target' without keeping it in memory
         
-        :type file_id: str
         :type file_name: str
-        :type new_file_name: str
-        :rtype: TrackUploadedSchema
+        :type target: IO[bytes]
         '''
         try:
-            new_file = await asyncio.to_thread(
-                lambda:self._bucket.copy(
-                file_id=file_id,
-                new_file_name=new_file_name
-            ))
             await asyncio.to_thread(
-                lambda:self._api.delete_file_version(file_id,file_name,True)
+                lambda:self._bucket.download_file_by_name(file_name).save(target)
             )
-            return TrackUploadedSchema(
-                id=new_file.id_,
-                filename=new_file.file_name,
-                content_type=str(new_file.content_type),
-                content_sha1=new_file.content_sha1,
-                size=new_file.size,
-                uploaded_at=datetime.datetime.fromtimestamp(
-                    new_file.upload_timestamp / 1000,
-                    datetime.UTC
-                )
+        except FileNotPresent as e:
+            logger.error(e)
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail='File not found'
             )
         except B2RequestTimeout as e:
             logger.error(e)
             raise HTTPException(
                 status_code=status.HTTP_408_REQUEST_TIMEOUT,
-                detail='The upgrade process took too long to complete'
+                detail='The download process took too long to complete'
             )
         except B2ConnectionError as e:
             logger.error(e)
@@ -383,6 +599,9 @@ class BackBlazeB2Service:
                 lambda:self._api.delete_file_version(file_id,file_name,True)
             )
             return True
+        except FileNotPresent:
+            # removed by an earlier attempt, so retrying a removal is safe
+            return True
         except B2RequestTimeout as e:
             logger.error(e)
             raise HTTPException(
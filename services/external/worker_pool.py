@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, TypeVar
+from fastapi import HTTPException,status
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+class BoundedWorkerPool:
+
+    def __init__(self,name:str,workers:int,max_queue:int,retry_after:int=5):
+        '''
+        Docstring for __init__
+
+        runs blocking or CPU bound functions in a dedicated thread pool, so they never stall
+        the event loop. At most 'workers' functions run at once, and at most 'max_queue'
+        more wait for a free worker, the rest are rejected right away
+
+        :param name: name of the pool, used in logs and thread names
+        :type name: str
+        :param workers: number of threads
+        :type workers: int
+        :param max_queue: max number of calls waiting for a thread
+        :type max_queue: int
+        :param retry_after: seconds suggested to the clients rejected because the pool is full
+        :type retry_after: int
+        '''
+        self._name = name
+        self._workers = workers
+        self._max_queue = max_queue
+        self._retry_after = retry_after
+        self._executor = ThreadPoolExecutor(max_workers=workers,thread_name_prefix=name)
+        self._slots = asyncio.Semaphore(workers)
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+        self._wait_time = 0.0
+        self._max_wait_time = 0.0
+        self._run_time = 0.0
+
+    @property
+    def queued(self) -> int:
+        '''
+        :return: calls waiting for a free worker
+        :rtype: int
+        '''
+        return self._queued
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    @property
+    def completed(self) -> int:
+        return self._completed
+
+    @property
+    def rejected(self) -> int:
+        return self._rejected
+
+    @property
+    def wait_time(self) -> float:
+        '''
+        :return: seconds spent by all the calls waiting for a free worker
+        :rtype: float
+        '''
+        return self._wait_time
+
+    @property
+    def max_wait_time(self) -> float:
+        return self._max_wait_time
+
+    @property
+    def run_time(self) -> float:
+        '''
+        :return: seconds spent by all the calls running in the workers
+        :rtype: float
+        '''
+        return self._run_time
+
+    def stats(self) -> Dict[str,int | float]:
+        '''
+        Docstring for stats
+
+        :return: counters of this pool since it started
+        :rtype: Dict[str, int | float]
+        '''
+        return {
+            'workers':self._workers,
+            'max_queue':self._max_queue,
+            'queued':self._queued,
+            'running':self._running,
+            'completed':self._completed,
+            'rejected':self._rejected,
+            'wait_time':self._wait_time,
+            'max_wait_time':self._max_wait_time,
+            'run_time':self._run_time
+        }
+
+    async def run(self,func:Callable[...,T],*args:Any) -> T:
+        '''
+        Docstring for run
+
+        :param func: function to run in a worker
+        :type func: Callable[..., T]
+        :param args: arguments of the function
+        :return: the result of the function, its exceptions are raised here
+        :rtype: T
+        '''
+        if self._slots.locked() and self._queued >= self._max_queue:
+            self._rejected += 1
+            logger.warning(f'{self._name} pool is full, {self._queued} calls waiting')
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail='The server is busy, try again later',
+                headers={'Retry-After':str(self._retry_after)}
+            )
+        queued_at = time.monotonic()
+        self._queued += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._queued -= 1
+        started_at = time.monotonic()
+        waited = started_at - queued_at
+        self._wait_time += waited
+        self._max_wait_time = max(self._max_wait_time,waited)
+        self._running += 1
+        loop = asyncio.get_running_loop()
+        try:
+            future = self._executor.submit(func,*args)
+        except RuntimeError:
+            self._finish(started_at)
+            raise
+        # the worker is given back when the function ends, even if the caller stopped waiting
+        future.add_done_callback(
+            lambda _: loop.call_soon_threadsafe(self._finish,started_at) if not loop.is_closed() else None
+        )
+        return await asyncio.wrap_future(future,loop=loop)
+
+    def _finish(self,started_at:float) -> None:
+        self._running -= 1
+        self._completed += 1
+        self._run_time += time.monotonic() - started_at
+        self._slots.release()
+
+    def shutdown(self) -> None:
+        '''
+        Docstring for shutdown
+
+        stops the threads once the running calls finish
+        '''
+        self._executor.shutdown(wait=False,cancel_futures=True)
@@ -0,0 +1,537 @@
+import asyncio
+import datetime
+import logging
+import re
+import time
+from collections import OrderedDict
+from contextlib import suppress
+from hashlib import sha256
+from typing import Callable, Dict, List, Tuple
+from fastapi import HTTPException,status
+from fastapi.responses import JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.requests import HTTPConnection
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from database import AsyncSessionLocal
+from repositories import IdempotencyKeyRepository
+from settings import ENVIRONMENT
+from tools import IDEMPOTENCY_KEY_HEADER,IDEMPOTENT_REPLAYED_HEADER
+from .auth import AuthService
+
+logger = logging.getLogger(__name__)
+
+# responses larger than this are not kept, the retries of their request run it again
+_MAX_STORED_BODY = 1024 * 1024
+
+# failures a retry may not get again, their responses are not kept
+_TRANSIENT_STATUSES = frozenset({401,403,408,409,425,429})
+
+_MAX_KEY_LENGTH = 255
+
+# bodies larger than this are not read to identify their request
+_MAX_HASHED_BODY = 1024 * 1024
+
+# seconds added to the longest request to get the lease of a key whose request is running
+_CLAIM_LEASE_MARGIN = 60
+
+class IdempotentResponse:
+
+    def __init__(self,status_code:int,headers:List[Tuple[bytes,bytes]],body:bytes):
+        '''
+        Docstring for __init__
+
+        :param status_code: status of the response
+        :type status_code: int
+        :param headers: raw headers of the response
+        :type headers: List[Tuple[bytes, bytes]]
+        :param body: whole body of the response
+        :type body: bytes
+        '''
+        self._status_code = status_code
+        self._headers = headers
+        self._body = body
+
+    @property
+    def status_code(self) -> int:
+        return self._status_code
+
+    @property
+    def headers(self) -> List[Tuple[bytes,bytes]]:
+        return self._headers
+
+    @property
+    def body(self) -> bytes:
+        return self._body
+
+    @staticmethod
+    def keeps(status_code:int) -> bool:
+        '''
+        Docstring for keeps
+
+        :type status_code: int
+        :return: if a response with this status is replayed, the server errors and the
+        failures that may not happen again are not
+        :rtype: bool
+        '''
+        return 200 <= status_code < 500 and status_code not in _TRANSIENT_STATUSES
+
+class _Record:
+
+    def __init__(self,fingerprint:str,response:IdempotentResponse | None=None):
+        self.fingerprint = fingerprint
+        # None while the request that has the key is running
+        self.response = response
+
+class IdempotencyStore:
+
+    def __init__(self,ttl:float,wait:float,poll_interval:float=0.5):
+        '''
+        Docstring for __init__
+
+        keeps the responses of the requests sent with an idempotency key in the memory of
+        this worker. A retry of a running request waits for it and gets its response
+
+        :param ttl: seconds a response is replayed
+        :type ttl: float
+        :param wait: seconds a retry waits for its running request before it is rejected
+        :type wait: float
+        :param poll_interval: seconds between the checks of a request running in another worker
+        :type poll_interval: float
+        '''
+        self._ttl = ttl
+        self._wait = wait
+        self._poll_interval = poll_interval
+        self._records:OrderedDict[str,Tuple[float,_Record]] = OrderedDict()
+        # requests of this worker that have a key, the retries wait for their event
+        self._running:Dict[str,Tuple[str,asyncio.Event]] = {}
+        self._replayed = 0
+        self._coalesced = 0
+        self._rejected = 0
+
+    def stats(self) -> Dict[str,int]:
+        '''
+        Docstring for stats
+
+        :return: state and counters of this worker since it started
+        :rtype: Dict[str, int]
+        '''
+        return {
+            'running':len(self._running),
+            'replayed':self._replayed,
+            'coalesced':self._coalesced,
+            'rejected':self._rejected
+        }
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    async def _claim(self,key:str,fingerprint:str) -> Tuple[bool,_Record | None]:
+        '''
+        Docstring for _claim
+
+        :type key: str
+        :type fingerprint: str
+        :return: if the key was taken, else the record of the request that has it, None if
+        it can not be read
+        :rtype: Tuple[bool, _Record | None]
+        '''
+        now = time.monotonic()
+        # the records are kept in the order they expire
+        while self._records:
+            oldest = next(iter(self._records))
+            if self._records[oldest][0] > now:
+                break
+            del self._records[oldest]
+        entry = self._records.get(key)
+        if entry:
+            return False,entry[1]
+        self._records[key] = (now + self._ttl,_Record(fingerprint))
+        return True,None
+
+    async def _save(self,key:str,response:IdempotentResponse) -> None:
+        entry = self._records.pop(key,None)
+        if entry:
+            self._records[key] = (time.monotonic() + self._ttl,_Record(entry[1].fingerprint,response))
+
+    async def _release(self,key:str) -> None:
+        entry = self._records.get(key)
+        if entry and entry[1].response is None:
+            del self._records[key]
+
+    def _check(self,key_fingerprint:str,fingerprint:str) -> None:
+        if key_fingerprint != fingerprint:
+            self._rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+                detail=f'The {IDEMPOTENCY_KEY_HEADER} was already used by a different request'
+            )
+
+    async def claim(self,key:str,fingerprint:str) -> IdempotentResponse | None:
+        '''
+        Docstring for claim
+
+        :param key: idempotency key of the request
+        :type key: str
+        :param fingerprint: what identifies the request, a key is never used by two different ones
+        :type fingerprint: str
+        :return: the response to replay, or None if the request must run, 'complete' must be
+        called once it does
+        :rtype: IdempotentResponse | None
+        :raises HTTPException: 422 if the key belongs to another request, 409 if its request
+        did not complete in time
+        '''
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self._wait
+        waiting = False
+        while True:
+            running = self._running.get(key)
+            if running:
+                self._check(running[0],fingerprint)
+            else:
+                # taken at once, so the retries of this worker wait for its event
+                event = asyncio.Event()
+                self._running[key] = (fingerprint,event)
+                try:
+                    claimed,record = await self._claim(key,fingerprint)
+                except BaseException:
+                    del self._running[key]
+                    event.set()
+                    raise
+                if claimed or record is None:
+                    return None
+                del self._running[key]
+                event.set()
+                self._check(record.fingerprint,fingerprint)
+                if record.response is not None:
+                    self._replayed += 1
+                    return record.response
+            if not waiting:
+                waiting = True
+                self._coalesced += 1
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                self._rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail=f'A request with the same {IDEMPOTENCY_KEY_HEADER} is still running, try again later'
+                )
+            if running:
+                with suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(running[1].wait(),remaining)
+            else:
+                # the request runs in another worker
+                await asyncio.sleep(min(self._poll_interval,remaining))
+
+    async def complete(self,key:str,response:IdempotentResponse | None) -> None:
+        '''
+        Docstring for complete
+
+        :param key: key taken by 'claim'
+        :type key: str
+        :param response: the response to replay, None frees the key so the request can run again
+        :type response: IdempotentResponse | None
+        '''
+        try:
+            if response:
+                await self._save(key,response)
+            else:
+                await self._release(key)
+        finally:
+            running = self._running.pop(key,None)
+            if running:
+                running[1].set()
+
+class DatabaseIdempotencyStore(IdempotencyStore):
+
+    def __init__(
+        self,
+        session_factory:Callable[[],AsyncSession],
+        ttl:float,
+        wait:float,
+        lease:float,
+        poll_interval:float=0.5
+    ):
+        '''
+        Docstring for __init__
+
+        keeps the responses in the database, so a retry sent to another worker is replayed
+        too. The retries of a request running in this worker wait for it without polling
+
+        :param session_factory: creates the database sessions of the store
+        :type session_factory: Callable[[], AsyncSession]
+        :type ttl: float
+        :type wait: float
+        :param lease: seconds a key is kept for its running request, so the key of a worker
+        that died is freed long before its response would have expired
+        :type lease: float
+        :type poll_interval: float
+        '''
+        super().__init__(ttl,wait,poll_interval)
+        self._session_factory = session_factory
+        self._lease = lease
+        self._task:asyncio.Task | None = None
+
+    @staticmethod
+    def _expires_at(seconds:float) -> datetime.datetime:
+        return datetime.datetime.now(datetime.UTC) + datetime.timedelta(seconds=seconds)
+
+    async def _claim(self,key:str,fingerprint:str) -> Tuple[bool,_Record | None]:
+        async with self._session_factory() as session:
+            claimed,db_key = await IdempotencyKeyRepository(session).claim(
+                key,
+                fingerprint,
+                self._expires_at(self._lease)
+            )
+            if not db_key:
+                return claimed,None
+            response = None
+            if db_key.status_code is not None:
+                response = IdempotentResponse(
+                    int(db_key.status_code), # type: ignore
+                    [(name.encode('latin-1'),value.encode('latin-1')) for name,value in db_key.headers], # type: ignore
+                    bytes(db_key.body) # type: ignore
+                )
+            return False,_Record(str(db_key.fingerprint),response)
+
+    async def _save(self,key:str,response:IdempotentResponse) -> None:
+        async with self._session_factory() as session:
+            saved = await IdempotencyKeyRepository(session).complete(
+                key,
+                response.status_code,
+                [[name.decode('latin-1'),value.decode('latin-1')] for name,value in response.headers],
+                response.body,
+                self._expires_at(self._ttl)
+            )
+        if not saved:
+            logger.warning(f'The response of the idempotency key {key} was not saved')
+
+    async def _release(self,key:str) -> None:
+        async with self._session_factory() as session:
+            await IdempotencyKeyRepository(session).release(key)
+
+    async def _purge(self) -> None:
+        while True:
+            await asyncio.sleep(self._ttl)
+            async with self._session_factory() as session:
+                deleted = await IdempotencyKeyRepository(session).delete_expired(
+                    datetime.datetime.now(datetime.UTC)
+                )
+            if deleted:
+                logger.info(f'{deleted} expired idempotency keys deleted')
+
+    async def start(self) -> None:
+        '''
+        Docstring for start
+
+        starts the periodic deletion of the expired keys
+        '''
+        if not self._task:
+            self._task = asyncio.create_task(self._purge())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+class IdempotencyMiddleware:
+
+    def __init__(
+        self,
+        app:ASGIApp,
+        routes:List[Tuple[str,str,bool]],
+        store:IdempotencyStore | None=None
+    ):
+        '''
+        Docstring for __init__
+
+        replays the response of a request to its retries sent with the same 'Idempotency-Key'
+        header. The keys belong to the user of the token. A request is identified by its
+        method, path, query and body. The body of an upload is not read twice, so an upload is
+        identified by its 'Content-Length' and its retries are answered before their body is read
+
+        :type app: ASGIApp
+        :param routes: method and path pattern of each route that accepts the header, and if
+        its body identifies the request, False for the uploads
+        :type routes: List[Tuple[str, str, bool]]
+        :param store: where the responses are kept, the shared store of the worker if None
+        :type store: IdempotencyStore | None
+        '''
+        self._app = app
+        self._routes = [(method,re.compile(pattern),hash_body) for method,pattern,hash_body in routes]
+        self._store = store
+
+    def _match(self,scope:Scope) -> bool | None:
+        '''
+        Docstring for _match
+
+        :type scope: Scope
+        :return: if the body of the request must be hashed, None if its route does not accept
+        the header
+        :rtype: bool | None
+        '''
+        for method,pattern,hash_body in self._routes:
+            if scope['method'] == method and pattern.fullmatch(scope['path']):
+                return hash_body
+        return None
+
+    @staticmethod
+    async def _read_body(receive:Receive) -> bytes | None:
+        '''
+        Docstring for _read_body
+
+        :type receive: Receive
+        :return: the whole body, None if the client left before sending it
+        :rtype: bytes | None
+        '''
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            body.extend(message.get('body',b''))
+            if len(body) > _MAX_HASHED_BODY:
+                raise HTTPException(
+                    status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+                    detail=f'The body can not be larger than {_MAX_HASHED_BODY} bytes'
+                )
+            if not message.get('more_body',False):
+                return bytes(body)
+
+    @staticmethod
+    def _fingerprint(connection:HTTPConnection,body:bytes | None) -> str:
+        parts = [
+            connection.scope['method'],
+            connection.scope['path'],
+            connection.scope.get('query_string',b'').decode('latin-1'),
+            connection.headers.get('content-length','') if body is None else sha256(body).hexdigest()
+        ]
+        return sha256('\n'.join(parts).encode()).hexdigest()
+
+    @staticmethod
+    async def _replay(response:IdempotentResponse,send:Send) -> None:
+        await send({
+            'type':'http.response.start',
+            'status':response.status_code,
+            'headers':[*response.headers,(IDEMPOTENT_REPLAYED_HEADER.lower().encode(),b'true')]
+        })
+        await send({'type':'http.response.body','body':response.body})
+
+    async def __call__(self,scope:Scope,receive:Receive,send:Send) -> None:
+        store = self._store or get_idempotency_store()
+        hash_body = self._match(scope) if scope['type'] == 'http' else None
+        if not store or hash_body is None:
+            await self._app(scope,receive,send)
+            return
+        connection = HTTPConnection(scope)
+        client_key = connection.headers.get(IDEMPOTENCY_KEY_HEADER)
+        user = AuthService.get_connection_subject(connection)
+        # without a user the endpoint rejects the request
+        if client_key is None or not user:
+            await self._app(scope,receive,send)
+            return
+        request_body:bytes | None = None
+        try:
+            if not client_key or len(client_key) > _MAX_KEY_LENGTH:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f'The {IDEMPOTENCY_KEY_HEADER} header must have between 1 and {_MAX_KEY_LENGTH} characters'
+                )
+            if hash_body:
+                request_body = await self._read_body(receive)
+                if request_body is None:
+                    return
+            key = sha256(f'{user}\n{client_key}'.encode()).hexdigest()
+            replayed = await store.claim(key,self._fingerprint(connection,request_body))
+        except HTTPException as e:
+            response = JSONResponse(
+                status_code=e.status_code,
+                content={'detail':e.detail},
+                headers=e.headers
+            )
+            await response(scope,receive,send)
+            return
+        if replayed:
+            await self._replay(replayed,send)
+            return
+
+        disconnected = False
+        start:Message | None = None
+        body = bytearray()
+        completed = False
+        too_large = False
+
+        async def watched_receive() -> Message:
+            nonlocal disconnected,request_body
+            if request_body is not None:
+                # the body already read to identify the request
+                body_message:Message = {'type':'http.request','body':request_body,'more_body':False}
+                request_body = None
+                return body_message
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                disconnected = True
+            return message
+
+        async def recording_send(message:Message) -> None:
+            nonlocal start,completed,too_large
+            # recorded before it is sent, so a response the client left before is still kept
+            if message['type'] == 'http.response.start':
+                start = message
+            elif message['type'] == 'http.response.body' and not too_large:
+                body.extend(message.get('body',b''))
+                too_large = len(body) > _MAX_STORED_BODY
+                completed = not message.get('more_body',False)
+            await send(message)
+
+        try:
+            await self._app(scope,watched_receive,recording_send)
+        finally:
+            stored = None
+            # a response to an interrupted request is not the one its retry would get
+            if start and completed and not too_large and not disconnected and IdempotentResponse.keeps(start['status']):
+                stored = IdempotentResponse(start['status'],list(start.get('headers',[])),bytes(body))
+            await store.complete(key,stored)
+
+# idempotency store shared by every request of this worker process
+_idempotency_store:IdempotencyStore | None = None
+
+async def start_idempotency_store() -> None:
+    '''
+    Docstring for start_idempotency_store
+
+    creates the shared idempotency store, must be called from the app lifespan
+    '''
+    global _idempotency_store
+    if _idempotency_store:
+        return
+    if ENVIRONMENT.IDEMPOTENCY_STORE == 'memory':
+        _idempotency_store = IdempotencyStore(ENVIRONMENT.IDEMPOTENCY_TTL,ENVIRONMENT.IDEMPOTENCY_WAIT)
+    elif ENVIRONMENT.IDEMPOTENCY_STORE == 'database':
+        _idempotency_store = DatabaseIdempotencyStore(
+            AsyncSessionLocal,
+            ENVIRONMENT.IDEMPOTENCY_TTL,
+            ENVIRONMENT.IDEMPOTENCY_WAIT,
+            ENVIRONMENT.UPLOAD_TIMEOUT + _CLAIM_LEASE_MARGIN
+        )
+    else:
+        return
+    await _idempotency_store.start()
+
+async def stop_idempotency_store() -> None:
+    '''
+    Docstring for stop_idempotency_store
+
+    stops the shared idempotency store, must be called from the app lifespan
+    '''
+    global _idempotency_store
+    if _idempotency_store:
+        await _idempotency_store.stop()
+        _idempotency_store = None
+
+def get_idempotency_store() -> IdempotencyStore | None:
+    return _idempotency_store
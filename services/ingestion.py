@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import os
+import shutil
+from contextlib import suppress
+from pathlib import Path
+from typing import IO, Any, Dict
+from uuid import uuid4
+from database import AsyncSessionLocal
+from models import BlobStatus
+from repositories import TrackRepository,UserRepository
+from settings import ENVIRONMENT
+from .external import FileValidationResult,get_storage_service
+
+logger = logging.getLogger(__name__)
+
+def staged_path(file_name:str) -> Path:
+    '''
+    Docstring for staged_path
+
+    :param file_name: name given to the file by 'stage_file'
+    :type file_name: str
+    :return: where the ingested file waits to be stored
+    :rtype: Path
+    '''
+    return Path(ENVIRONMENT.INGESTION_DIR) / file_name
+
+def _stage(file:IO[bytes],path:Path) -> None:
+    path.parent.mkdir(parents=True,exist_ok=True)
+    try:
+        with open(path,'wb') as target:
+            file.seek(0)
+            shutil.copyfileobj(file,target,ENVIRONMENT.CHUNK_SIZE)
+            target.flush()
+            # the job storing it may run after a restart
+            os.fsync(target.fileno())
+    except BaseException:
+        with suppress(OSError):
+            path.unlink()
+        raise
+
+async def stage_file(file:IO[bytes],validation_result:FileValidationResult) -> Dict[str,Any]:
+    '''
+    Docstring for stage_file
+
+    keeps a validated file on the local disk until a background job stores it
+
+    :type file: IO[bytes]
+    :type validation_result: FileValidationResult
+    :return: the payload of the job that stores the file
+    :rtype: Dict[str, Any]
+    '''
+    file_name = f'{uuid4().hex}{validation_result.extension}'
+    await asyncio.to_thread(_stage,file,staged_path(file_name))
+    return {
+        'file_name':file_name,
+        'content_hash':validation_result.hash,
+        'sha1':validation_result.sha1,
+        'size':validation_result.size,
+        'extension':validation_result.extension
+    }
+
+async def remove_staged_file(payload:Dict[str,Any]) -> None:
+    '''
+    Docstring for remove_staged_file
+
+    :param payload: payload returned by 'stage_file'
+    :type payload: Dict[str, Any]
+    '''
+    with suppress(FileNotFoundError):
+        await asyncio.to_thread(staged_path(payload['file_name']).unlink)
+
+async def store_staged_file(payload:Dict[str,Any]) -> None:
+    '''
+    Docstring for store_staged_file
+
+    runs the jobs that store the ingested files. Nothing is stored if the blob of the content
+    is 'READY' or was deleted, so it is safe to run it again
+
+    :param payload: payload returned by 'stage_file'
+    :type payload: Dict[str, Any]
+    '''
+    content_hash = payload['content_hash']
+    async with AsyncSessionLocal() as session:
+        blob = await TrackRepository(session,UserRepository(session)).get_blob(content_hash)
+        blob_status = blob.status if blob else None
+    if blob_status is None or blob_status == BlobStatus.READY:
+        await remove_staged_file(payload)
+        return
+    # no database connection is kept while the file is stored
+    with open(staged_path(payload['file_name']),'rb') as file:
+        stored = await get_storage_service().store_file(
+            file,
+            FileValidationResult(payload['size'],content_hash,payload['extension'],payload['sha1'])
+        )
+    async with AsyncSessionLocal() as session:
+        repository = TrackRepository(session,UserRepository(session))
+        if not await repository.complete_blob(content_hash,stored.id,stored.filename):
+            raise RuntimeError(f'The file {stored.filename} was stored but its blob was not updated')
+    await remove_staged_file(payload)
+    logger.info(f'Ingested file of the content {content_hash} stored as {stored.filename}')
+
+async def fail_staged_file(payload:Dict[str,Any]) -> None:
+    '''
+    Docstring for fail_staged_file
+
+    runs once a job storing an ingested file gives up, the tracks waiting for the file are
+    marked as 'FAILED'
+
+    :param payload: payload returned by 'stage_file'
+    :type payload: Dict[str, Any]
+    '''
+    async with AsyncSessionLocal() as session:
+        if not await TrackRepository(session,UserRepository(session)).fail_blob(payload['content_hash']):
+            raise RuntimeError(f'The blob of the content {payload["content_hash"]} was not marked as failed')
+    await remove_staged_file(payload)
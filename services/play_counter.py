@@ -0,0 +1,280 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from contextlib import suppress
+from typing import Callable, Dict, List, Tuple
+from sqlalchemy import BigInteger,String,Table,column,update,values
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import AsyncSessionLocal
+from models import Track,Playlist
+from settings import ENVIRONMENT
+
+logger = logging.getLogger(__name__)
+
+# keeps every flush statement below the 32767 bind parameters allowed by asyncpg
+_MAX_ROWS_PER_STATEMENT = 10000
+
+class PlayCounter:
+
+    def __init__(
+        self,
+        table:Table,
+        session_factory:Callable[[],AsyncSession],
+        flush_interval:float,
+        flush_size:int,
+        max_pending:int,
+        dedup_window:float=0,
+        dedup_max_entries:int=100000
+    ):
+        '''
+        Docstring for __init__
+
+        buffers the plays of the rows of 'table' in memory and adds them to the
+        'plays' column in batches
+
+        :param table: table with an 'id' and a 'plays' column
+        :type table: Table
+        :param session_factory: creates the database sessions used by the flushes
+        :type session_factory: Callable[[], AsyncSession]
+        :param flush_interval: seconds between flushes
+        :type flush_interval: float
+        :param flush_size: number of buffered ids that triggers a flush before the interval ends
+        :type flush_size: int
+        :param max_pending: max number of buffered ids
+        :type max_pending: int
+        :param dedup_window: seconds during which repeated plays of the same user are counted once
+        :type dedup_window: float
+        :param dedup_max_entries: max number of remembered (user, id) pairs
+        :type dedup_max_entries: int
+        '''
+        self._table = table
+        self._session_factory = session_factory
+        self._flush_interval = flush_interval
+        self._flush_size = flush_size
+        self._max_pending = max_pending
+        self._dedup_window = dedup_window
+        self._dedup_max_entries = dedup_max_entries
+        self._pending:Dict[str,int] = {}
+        self._recent:OrderedDict[Tuple[str,str],float] = OrderedDict()
+        self._flush_lock = asyncio.Lock()
+        self._flush_requested = asyncio.Event()
+        self._task:asyncio.Task | None = None
+        self._flushed = 0
+        self._deduplicated = 0
+        self._overflowed = 0
+        self._lost = 0
+        self._unmatched = 0
+
+    @property
+    def flushed(self) -> int:
+        return self._flushed
+
+    @property
+    def deduplicated(self) -> int:
+        return self._deduplicated
+
+    @property
+    def overflowed(self) -> int:
+        return self._overflowed
+
+    @property
+    def lost(self) -> int:
+        return self._lost
+
+    @property
+    def unmatched(self) -> int:
+        '''
+        :return: plays dropped at flush time because their id does not exist
+        :rtype: int
+        '''
+        return self._unmatched
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def pending(self,instance_id:str) -> int:
+        '''
+        Docstring for pending
+
+        :type instance_id: str
+        :return: plays of the instance not written to the database yet
+        :rtype: int
+        '''
+        return self._pending.get(instance_id,0)
+
+    def _is_duplicate(self,user:str,instance_id:str) -> bool:
+        now = time.monotonic()
+        # entries are never moved, so the oldest ones are always first
+        while len(self._recent) > 0:
+            seen_at = next(iter(self._recent.values()))
+            if now - seen_at < self._dedup_window and len(self._recent) < self._dedup_max_entries:
+                break
+            self._recent.popitem(last=False)
+        key = (user,instance_id)
+        if key in self._recent:
+            return True
+        self._recent[key] = now
+        return False
+
+    def record(self,instance_id:str,user:str | None=None) -> bool:
+        '''
+        Docstring for record
+
+        registers a play without touching the database
+
+        :type instance_id: str
+        :param user: who played it, used to ignore repeated plays inside the dedup window
+        :type user: str | None
+        :return: False if the buffer is full and the play must be written directly
+        :rtype: bool
+        '''
+        if user and self._dedup_window > 0 and self._is_duplicate(user,instance_id):
+            self._deduplicated += 1
+            return True
+        if instance_id not in self._pending and len(self._pending) >= self._max_pending:
+            self._overflowed += 1
+            return False
+        self._pending[instance_id] = self._pending.get(instance_id,0) + 1
+        if len(self._pending) >= self._flush_size:
+            self._flush_requested.set()
+        return True
+
+    def _flush_query(self,rows:List[Tuple[str,int]]):
+        '''
+        Docstring for _flush_query
+
+        :param rows: pairs (id, plays to add)
+        :type rows: List[Tuple[str, int]]
+        :return: a single 'UPDATE ... FROM (VALUES ...)' statement for all the rows, returning
+        the ids that exist
+        '''
+        pending_plays = values(
+            column('id',String),
+            column('plays',BigInteger),
+            name='pending_plays'
+        ).data(rows)
+        return (
+            update(self._table)
+            .where(self._table.c.id==pending_plays.c.id)
+            .values(plays=self._table.c.plays + pending_plays.c.plays)
+            .returning(self._table.c.id)
+        )
+
+    def _restore(self,pending:Dict[str,int]) -> None:
+        for instance_id,plays in pending.items():
+            if instance_id not in self._pending and len(self._pending) >= self._max_pending:
+                self._lost += plays
+                continue
+            self._pending[instance_id] = self._pending.get(instance_id,0) + plays
+        if self._lost > 0:
+            logger.warning(f'{self._lost} plays of {self._table.name} were lost because the buffer is full')
+
+    async def flush(self) -> int:
+        '''
+        Docstring for flush
+
+        writes the buffered plays, they are kept in the buffer if the write fails. The plays
+        were accepted without checking their ids, the ones of ids that don't exist are dropped
+
+        :return: number of updated ids
+        :rtype: int
+        '''
+        async with self._flush_lock:
+            self._flush_requested.clear()
+            if len(self._pending) == 0:
+                return 0
+            pending,self._pending = self._pending,{}
+            # a fixed order avoids deadlocks between workers flushing the same rows
+            rows = sorted(pending.items())
+            updated = set()
+            try:
+                async with self._session_factory() as session:
+                    for start in range(0,len(rows),_MAX_ROWS_PER_STATEMENT):
+                        result = await session.execute(self._flush_query(rows[start:start + _MAX_ROWS_PER_STATEMENT]))
+                        updated.update(result.scalars().all())
+                    await session.commit()
+            except Exception as e:
+                logger.error(f'Error while flushing plays of {self._table.name}: {e}')
+                self._restore(pending)
+                return 0
+            unmatched = sum(plays for instance_id,plays in rows if instance_id not in updated)
+            if unmatched > 0:
+                self._unmatched += unmatched
+                logger.warning(f'{unmatched} plays of {self._table.name} were dropped because their ids do not exist')
+            self._flushed += sum(pending.values()) - unmatched
+            return len(updated)
+
+    async def _run(self) -> None:
+        while True:
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._flush_requested.wait(),self._flush_interval)
+            await self.flush()
+
+    def start(self) -> None:
+        if not self._task:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        '''
+        Docstring for stop
+
+        stops the periodic flushes and writes what is left in the buffer
+        '''
+        if self._task:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        await self.flush()
+
+# play buffers shared by every request of this worker process
+_track_play_counter:PlayCounter | None = None
+_playlist_play_counter:PlayCounter | None = None
+
+def _create_play_counter(table:Table) -> PlayCounter:
+    return PlayCounter(
+        table,
+        AsyncSessionLocal,
+        ENVIRONMENT.PLAYS_FLUSH_INTERVAL,
+        ENVIRONMENT.PLAYS_FLUSH_SIZE,
+        ENVIRONMENT.PLAYS_MAX_PENDING,
+        ENVIRONMENT.PLAYS_DEDUP_WINDOW,
+        ENVIRONMENT.PLAYS_DEDUP_MAX_ENTRIES
+    )
+
+async def start_play_counters() -> None:
+    '''
+    Docstring for start_play_counters
+
+    creates the shared play buffers, must be called from the app lifespan
+    '''
+    global _track_play_counter,_playlist_play_counter
+    if ENVIRONMENT.PLAYS_FLUSH_INTERVAL <= 0:
+        return
+    if not _track_play_counter:
+        _track_play_counter = _create_play_counter(Track.__table__)
+        _track_play_counter.start()
+    if not _playlist_play_counter:
+        _playlist_play_counter = _create_play_counter(Playlist.__table__)
+        _playlist_play_counter.start()
+
+async def stop_play_counters() -> None:
+    '''
+    Docstring for stop_play_counters
+
+    flushes and stops the shared play buffers, must be called from the app lifespan
+    '''
+    global _track_play_counter,_playlist_play_counter
+    if _track_play_counter:
+        await _track_play_counter.stop()
+        _track_play_counter = None
+    if _playlist_play_counter:
+        await _playlist_play_counter.stop()
+        _playlist_play_counter = None
+
+def get_track_play_counter() -> PlayCounter | None:
+    return _track_play_counter
+
+def get_playlist_play_counter() -> PlayCounter | None:
+    return _playlist_play_counter
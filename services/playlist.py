@@ -1,15 +1,18 @@
 from typing import Sequence
 from repositories import PlaylistRepository
 from models import Playlist
-from schemas import PlaylistCreateSchema,PlaylistUpdateSchema,PlaylistSchema,ExistencialQuerySchema,PlaylistPrivateUpdateSchema
+from schemas import PlaylistCreateSchema,PlaylistUpdateSchema,PlaylistSchema,ExistencialQuerySchema,PlaylistPrivateUpdateSchema,PlaylistStatsSchema
 from settings import ENVIRONMENT
 from .service import Service
+from .search_index import NGramIndex
 from enum import StrEnum
 
 class PlaylistSearchMode(StrEnum):
     BY_NAME = 'by name'
     BY_AUTHOR = 'by author'
     BOTH = 'both'
+    # full text search over name, description and author, the most relevant and popular first
+    RANKED = 'ranked'
 
 class PlaylistService(Service[
     Playlist,
@@ -19,8 +22,14 @@ class PlaylistService(Service[
     PlaylistSchema
 ]):
     
-    def __init__(self,repository: PlaylistRepository,exclude_fields:set=set(), exclude_unset: bool = True):
-        super().__init__(Playlist,PlaylistSchema,repository, exclude_fields, exclude_unset)
+    def __init__(
+        self,
+        repository: PlaylistRepository,
+        exclude_fields:set=set(),
+        exclude_unset: bool = True,
+        search_index: NGramIndex | None = None
+    ):
+        super().__init__(Playlist,PlaylistSchema,repository, exclude_fields, exclude_unset, search_index)
     
     async def private_update(self,playlist_id:str,update_data:PlaylistPrivateUpdateSchema,**extra_fields) -> PlaylistSchema | None:
         '''
@@ -44,8 +53,32 @@ class PlaylistService(Service[
             }
         })
         result = await self._repository.update(playlist_id,update_instance)
-        return await self._to_schema(result)
+        playlist = await self._to_schema(result)
+        self._index(playlist)
+        return playlist
 
+    def _to_stats(self,counters) -> PlaylistStatsSchema | None:
+        '''
+        Docstring for _to_stats
+        
+        :param counters: row with the id and the counters of the playlist
+        :rtype: PlaylistStatsSchema | None
+        '''
+        if not counters:
+            return None
+        return PlaylistStatsSchema.model_validate(counters)
+    
+    async def add_play(self,playlist_id:str) -> PlaylistStatsSchema | None:
+        '''
+        Docstring for add_play
+        
+        :type playlist_id: str
+        :return: the new counters if the playlist exists, else None
+        :rtype: PlaylistStatsSchema | None
+        '''
+        result = await self._repository.increment(playlist_id,plays=1)
+        return self._to_stats(result)
+    
     async def liked_by(self,user_id:str,playlist_id:str) -> ExistencialQuerySchema:
         '''
         Docstring for liked_by
@@ -79,65 +112,77 @@ class PlaylistService(Service[
         result = await self._repository.loved_by(user_id,playlist_id)
         return ExistencialQuerySchema(result=result)
     
-    async def add_like_from_user_to_playlist(self,user_id:str,playlist_id:str) -> bool:
+    async def add_like_from_user_to_playlist(self,user_id:str,playlist_id:str) -> PlaylistStatsSchema | None:
         '''
         Docstring for add_like_from_user_to_playlist
         
         :type user_id: str
         :type playlist_id: str
-        :rtype: bool
+        :return: the new counters if success, else None
+        :rtype: PlaylistStatsSchema | None
         '''
-        return await self._repository.add_like_from_user_to_playlist(user_id,playlist_id)
+        result = await self._repository.add_like_from_user_to_playlist(user_id,playlist_id)
+        return self._to_stats(result)
     
-    async def remove_like_from_user_to_playlist(self,user_id:str,playlist_id:str) -> bool:
+    async def remove_like_from_user_to_playlist(self,user_id:str,playlist_id:str) -> PlaylistStatsSchema | None:
         '''
         Docstring for remove_like_from_user_to_playlist
         
         :type user_id: str
         :type playlist_id: str
-        :rtype: bool
+        :return: the new counters if success, else None
+        :rtype: PlaylistStatsSchema | None
         '''
-        return await self._repository.remove_like_from_user_to_playlist(user_id,playlist_id)
+        result = await self._repository.remove_like_from_user_to_playlist(user_id,playlist_id)
+        return self._to_stats(result)
     
-    async def add_dislike_from_user_to_playlist(self,user_id:str,playlist_id:str) -> bool:
+    async def add_dislike_from_user_to_playlist(self,user_id:str,playlist_id:str) -> PlaylistStatsSchema | None:
         '''
         Docstring for add_dislike_from_user_to_playlist
         
         :type user_id: str
         :type playlist_id: str
-        :rtype: bool
+        :return: the new counters if success, else None
+        :rtype: PlaylistStatsSchema | None
         '''
-        return await self._repository.add_dislike_from_user_to_playlist(user_id,playlist_id)
+        result = await self._repository.add_dislike_from_user_to_playlist(user_id,playlist_id)
+        return self._to_stats(result)
     
-    async def remove_dislike_from_user_to_playlist(self,user_id:str,playlist_id:str) -> bool:
+    async def remove_dislike_from_user_to_playlist(self,user_id:str,playlist_id:str) -> PlaylistStatsSchema | None:
         '''
         Docstring for remove_dislike_from_user_to_playlist
         
         :type user_id: str
         :type playlist_id: str
-        :rtype: bool
+        :return: the new counters if success, else None
+        :rtype: PlaylistStatsSchema | None
         '''
-        return await self._repository.remove_dislike_from_user_to_playlist(user_id,playlist_id)
+        result = await self._repository.remove_dislike_from_user_to_playlist(user_id,playlist_id)
+        return self._to_stats(result)
     
-    async def add_love_from_user_to_playlist(self,user_id:str,playlist_id:str) -> bool:
+    async def add_love_from_user_to_playlist(self,user_id:str,playlist_id:str) -> PlaylistStatsSchema | None:
         '''
         Docstring for add_love_from_user_to_playlist
         
         :type user_id: str
         :type playlist_id: str
-        :rtype: bool
+        :return: the new counters if success, else None
+        :rtype: PlaylistStatsSchema | None
         '''
-        return await self._repository.add_love_from_user_to_playlist(user_id,playlist_id)
+        result = await self._repository.add_love_from_user_to_playlist(user_id,playlist_id)
+        return self._to_stats(result)
     
-    async def remove_love_from_user_to_playlist(self,user_id:str,playlist_id:str) -> bool:
+    async def remove_love_from_user_to_playlist(self,user_id:str,playlist_id:str) -> PlaylistStatsSchema | None:
         '''
         Docstring for remove_love_from_user_to_playlist
         
         :type user_id: str
         :type playlist_id: str
-        :rtype: bool
+        :return: the new counters if success, else None
+        :rtype: PlaylistStatsSchema | None
         '''
-        return await self._repository.remove_love_from_user_to_playlist(user_id,playlist_id)
+        result = await self._repository.remove_love_from_user_to_playlist(user_id,playlist_id)
+        return self._to_stats(result)
 
     async def add_track_to_playlist(self,playlist_id:str,track_id:str) -> bool:
         '''
@@ -159,7 +204,7 @@ class PlaylistService(Service[
         '''
         return await self._repository.remove_track_from_playlist(playlist_id,track_id)
     
-    async def get_user_playlists(self,user_id:str,skip:int=0,limit:int=100) -> Sequence[PlaylistSchema]:
+    async def get_user_playlists(self,user_id:str,skip:int=0,limit:int=100,after:str | None=None) -> Sequence[PlaylistSchema]:
         '''
         Docstring for get_user_playlists
         
@@ -168,9 +213,11 @@ class PlaylistService(Service[
         :type skip: int
         :param limit: limit of results by query
         :type limit: int
+        :param after: id of the last result of the previous page, replaces 'skip'
+        :type after: str | None
         :rtype: Sequence[PlaylistSchema]
         '''
-        db_result = await self._repository.get_user_playlists(user_id,skip,limit)
+        db_result = await self._repository.get_user_playlists(user_id,skip,limit,after)
         return [await self._to_schema(result) for result in db_result if result] # type: ignore
     
     async def exists_playlist_with_name_from_user(self,user_id:str,playlist_name:str) -> bool:
@@ -183,40 +230,63 @@ class PlaylistService(Service[
         '''
         return await self._repository.exists_playlist_with_name_from_user(user_id,playlist_name)
     
-    async def search_playlist_by_name(self,text:str,limit:int=100,skip:int=0) -> Sequence[PlaylistSchema]:
+    async def search_playlist_by_name(self,text:str,limit:int=100,skip:int=0,after:str | None=None) -> Sequence[PlaylistSchema]:
         '''
         Docstring for search_playlist_by_name
         
         :type text: str
         :type limit: int
         :type skip: int
+        :param after: id of the last result of the previous page, replaces 'skip'
+        :type after: str | None
         :rtype: Sequence[PlaylistSchema]
         '''
-        playlists = await self._repository.search_playlists_by_name(text,limit,skip)
+        ids = self._search_ids(text,'name')
+        if ids is not None:
+            playlists = await self._repository.search_playlists_by_ids(ids,limit,skip,after)
+        else:
+            playlists = await self._repository.search_playlists_by_name(text,limit,skip,after)
         return [await self._to_schema(playlist) for playlist in playlists if playlist] # type: ignore
     
-    async def search_playlists_by_author_name(self,text:str,limit:int=100,skip:int=0) -> Sequence[PlaylistSchema]:
+    async def search_playlists_by_author_name(self,text:str,limit:int=100,skip:int=0,after:str | None=None) -> Sequence[PlaylistSchema]:
         '''
         Docstring for search_playlists_by_author_name
         
         :type text: str
         :type limit: int
         :type skip: int
+        :param after: id of the last result of the previous page, replaces 'skip'
+        :type after: str | None
         :rtype: Sequence[PlaylistSchema]
         '''
-        playlists = await self._repository.search_playlists_by_author_name(text,limit,skip)
+        playlists = await self._repository.search_playlists_by_author_name(text,limit,skip,after)
         return [await self._to_schema(playlist) for playlist in playlists if playlist] # type: ignore
     
-    async def search_playlists_by_text(self,text:str,limit:int=100,skip:int=0) -> Sequence[PlaylistSchema]:
+    async def search_playlists_by_text(self,text:str,limit:int=100,skip:int=0,after:str | None=None) -> Sequence[PlaylistSchema]:
         '''
         Docstring for search_playlists_by_text
         
         :type text: str
         :type limit: int
         :type skipt: int
+        :param after: id of the last result of the previous page, replaces 'skip'
+        :type after: str | None
+        :rtype: Sequence[PlaylistSchema]
+        '''
+        playlists = await self._repository.search_playlists_by_text(text,limit,skip,after)
+        return [await self._to_schema(playlist) for playlist in playlists if playlist] # type: ignore
+
+    async def rank_playlists_by_text(self,text:str,limit:int=100,skip:int=0) -> Sequence[PlaylistSchema]:
+        '''
+        Docstring for rank_playlists_by_text
+        
+        :type text: str
+        :type limit: int
+        :type skip: int
+        :return: the playlists matching the text, the most relevant and popular first
         :rtype: Sequence[PlaylistSchema]
         '''
-        playlists = await self._repository.search_playlists_by_text(text,limit,skip)
+        playlists = await self._repository.rank_playlists_by_text(text,limit,skip,ENVIRONMENT.SEARCH_RANK_CANDIDATES)
         return [await self._to_schema(playlist) for playlist in playlists if playlist] # type: ignore
 
     async def search_playlists(
@@ -224,7 +294,8 @@ class PlaylistService(Service[
         text:str,
         limit:int=100,
         skip:int=0,
-        search_mode:PlaylistSearchMode=PlaylistSearchMode.BOTH
+        search_mode:PlaylistSearchMode=PlaylistSearchMode.BOTH,
+        after:str | None=None
     ) -> Sequence[PlaylistSchema]:
         '''
         Docstring for search_playlists_by_text
@@ -233,13 +304,17 @@ class PlaylistService(Service[
         :type limit: int
         :type skip: int
         :type search_mode: PlaylistSearchMode
+        :param after: id of the last result of the previous page, replaces 'skip'
+        :type after: str | None
         :rtype: Sequence[PlaylistSchema]
         '''
 
         match search_mode:
             case PlaylistSearchMode.BOTH:
-                return await self.search_playlists_by_text(text,limit,skip)
+                return await self.search_playlists_by_text(text,limit,skip,after)
             case PlaylistSearchMode.BY_NAME:
-                return await self.search_playlist_by_name(text,limit,skip)
+                return await self.search_playlist_by_name(text,limit,skip,after)
             case PlaylistSearchMode.BY_AUTHOR:
-                return await self.search_playlists_by_author_name(text,limit,skip)
\ No newline at end of file
+                return await self.search_playlists_by_author_name(text,limit,skip,after)
+            case PlaylistSearchMode.RANKED:
+                return await self.rank_playlists_by_text(text,limit,skip)
\ No newline at end of file
@@ -0,0 +1,467 @@
+import asyncio
+import json
+import logging
+import os
+from array import array
+from contextlib import suppress
+from typing import AsyncIterator, Callable, Dict, Iterable, List, Sequence, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import AsyncSessionLocal
+from repositories import TrackRepository,PlaylistRepository,UserRepository
+from settings import ENVIRONMENT
+
+logger = logging.getLogger(__name__)
+
+_SNAPSHOT_VERSION = 1
+
+class NGramIndex:
+
+    def __init__(self,fields:Tuple[str,...],n:int=3):
+        '''
+        Docstring for __init__
+
+        in memory n-gram inverted index that answers the same case insensitive substring
+        searches as 'Repository._contains'. Every document gets a sequential number, the
+        posting list of each n-gram is an array of those numbers, so it stays sorted and
+        takes 4 bytes per entry
+
+        :param fields: names of the indexed text fields of every document
+        :type fields: Tuple[str, ...]
+        :param n: length of the n-grams, shorter searches can not be answered
+        :type n: int
+        '''
+        self._fields = fields
+        self._n = n
+        self._journal:List[Tuple[str,Dict[str,str | None] | None]] | None = None
+        self._reset()
+
+    def _reset(self) -> None:
+        self._ids:List[str | None] = []
+        self._texts:Dict[str,List[str | None]] = {field:[] for field in self._fields}
+        self._numbers:Dict[str,int] = {}
+        self._postings:Dict[str,Dict[str,array]] = {field:{} for field in self._fields}
+
+    @property
+    def fields(self) -> Tuple[str,...]:
+        return self._fields
+
+    @property
+    def n(self) -> int:
+        return self._n
+
+    @property
+    def removed(self) -> int:
+        '''
+        Docstring for removed
+
+        :return: number of document slots left behind by removes and updates
+        :rtype: int
+        '''
+        return len(self._ids) - len(self._numbers)
+
+    def __len__(self) -> int:
+        return len(self._numbers)
+
+    def __contains__(self,document_id:str) -> bool:
+        return document_id in self._numbers
+
+    def _grams(self,text:str) -> Iterable[str]:
+        return {text[i:i + self._n] for i in range(len(text) - self._n + 1)}
+
+    def add(self,document_id:str,**texts:str | None) -> None:
+        '''
+        Docstring for add
+
+        indexes a document, replacing it if it was already indexed
+
+        :param document_id: id of the document
+        :type document_id: str
+        :param texts: value of every indexed field
+        '''
+        self.remove(document_id)
+        if self._journal is not None:
+            self._journal.append((document_id,texts))
+        number = len(self._ids)
+        self._ids.append(document_id)
+        self._numbers[document_id] = number
+        for field in self._fields:
+            text = (texts.get(field) or '').lower()
+            self._texts[field].append(text)
+            postings = self._postings[field]
+            for gram in self._grams(text):
+                if gram not in postings:
+                    postings[gram] = array('I')
+                postings[gram].append(number)
+        if self.removed > max(1024,len(self._numbers)):
+            self.compact()
+
+    def remove(self,document_id:str) -> bool:
+        '''
+        Docstring for remove
+
+        :param document_id: id of the document
+        :type document_id: str
+        :return: True if the document was indexed
+        :rtype: bool
+        '''
+        if self._journal is not None:
+            self._journal.append((document_id,None))
+        number = self._numbers.pop(document_id,None)
+        if number is None:
+            return False
+        # the slot stays in the posting lists until the next compaction
+        self._ids[number] = None
+        for field in self._fields:
+            self._texts[field][number] = None
+        return True
+
+    def compact(self) -> None:
+        '''
+        Docstring for compact
+
+        rebuilds the posting lists without the slots of removed documents
+        '''
+        documents = [
+            (document_id,{field:self._texts[field][number] for field in self._fields})
+            for number,document_id in enumerate(self._ids)
+            if document_id is not None
+        ]
+        journal,self._journal = self._journal,None
+        self._reset()
+        for document_id,texts in documents:
+            self.add(document_id,**texts)
+        self._journal = journal
+
+    def record_changes(self) -> None:
+        '''
+        Docstring for record_changes
+
+        starts keeping every add and remove, so they can be replayed over an index built
+        from a database scan that may have missed them
+        '''
+        self._journal = []
+
+    def replay_changes(self,index:'NGramIndex | None') -> int:
+        '''
+        Docstring for replay_changes
+
+        applies to 'index' the changes recorded since 'record_changes' and stops recording
+
+        :param index: index to update, None only stops recording
+        :type index: NGramIndex | None
+        :return: number of replayed changes
+        :rtype: int
+        '''
+        journal,self._journal = self._journal or [],None
+        if index is None:
+            return 0
+        for document_id,texts in journal:
+            if texts is None:
+                index.remove(document_id)
+            else:
+                index.add(document_id,**texts)
+        return len(journal)
+
+    def _match(self,field:str,text:str) -> Iterable[int]:
+        postings = self._postings[field]
+        lists = []
+        for gram in self._grams(text):
+            if gram not in postings:
+                return ()
+            lists.append(postings[gram])
+        lists.sort(key=len)
+        candidates = set(lists[0])
+        for numbers in lists[1:]:
+            candidates.intersection_update(numbers)
+            if len(candidates) == 0:
+                return ()
+        texts = self._texts[field]
+        return (
+            number for number in candidates
+            if texts[number] is not None and text in texts[number] # type: ignore
+        )
+
+    def search(self,text:str,fields:Sequence[str] | None=None,max_results:int | None=None) -> List[str] | None:
+        '''
+        Docstring for search
+
+        :param text: text to search, matched as a case insensitive substring
+        :type text: str
+        :param fields: fields where the text is searched, any of them must contain it, all by default
+        :type fields: Sequence[str] | None
+        :param max_results: max number of matches, more of them are not answered
+        :type max_results: int | None
+        :return: the ids of the matching documents, or None if the search can not be answered
+        here because the text is shorter than the n-grams or there are more than 'max_results'
+        matches
+        :rtype: List[str] | None
+        '''
+        text = text.lower()
+        if len(text) < self._n:
+            return None
+        numbers = set()
+        for field in fields or self._fields:
+            numbers.update(self._match(field,text))
+            if max_results is not None and len(numbers) > max_results:
+                return None
+        return [self._ids[number] for number in numbers] # type: ignore
+
+    async def build(self,documents:AsyncIterator[Sequence[str | None]]) -> int:
+        '''
+        Docstring for build
+
+        :param documents: stream of rows (id, value of every field in order)
+        :type documents: AsyncIterator[Sequence[str | None]]
+        :return: number of indexed documents
+        :rtype: int
+        '''
+        async for row in documents:
+            self.add(str(row[0]),**dict(zip(self._fields,row[1:])))
+        return len(self)
+
+    def snapshot(self) -> Dict:
+        '''
+        Docstring for snapshot
+
+        :return: the indexed documents in the format read by 'load'
+        :rtype: Dict
+        '''
+        return {
+            'version':_SNAPSHOT_VERSION,
+            'n':self._n,
+            'fields':list(self._fields),
+            'documents':[
+                [document_id,*[self._texts[field][number] for field in self._fields]]
+                for number,document_id in enumerate(self._ids)
+                if document_id is not None
+            ]
+        }
+
+    @staticmethod
+    def write(snapshot:Dict,path:str) -> None:
+        '''
+        Docstring for write
+
+        writes a snapshot atomically, the posting lists are not saved, 'load' rebuilds them
+
+        :param snapshot: result of 'snapshot'
+        :type snapshot: Dict
+        :type path: str
+        '''
+        # several workers can save the same snapshot, each one through its own file
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path,'w',encoding='utf-8') as file:
+            json.dump(snapshot,file,separators=(',',':'))
+        os.replace(tmp_path,path)
+
+    def save(self,path:str) -> None:
+        '''
+        Docstring for save
+
+        :type path: str
+        '''
+        self.write(self.snapshot(),path)
+
+    def load(self,path:str) -> bool:
+        '''
+        Docstring for load
+
+        :type path: str
+        :return: True if the index was restored from a snapshot written by 'save'
+        :rtype: bool
+        '''
+        try:
+            with open(path,encoding='utf-8') as file:
+                snapshot = json.load(file)
+        except FileNotFoundError:
+            return False
+        except (OSError,ValueError) as e:
+            logger.warning(f'Ignoring the search index snapshot {path}: {e}')
+            return False
+        if (
+            snapshot.get('version') != _SNAPSHOT_VERSION or
+            snapshot.get('n') != self._n or
+            tuple(snapshot.get('fields',())) != self._fields
+        ):
+            logger.warning(f'Ignoring the search index snapshot {path}, it was written for another index')
+            return False
+        self._reset()
+        for document_id,*texts in snapshot['documents']:
+            self.add(document_id,**dict(zip(self._fields,texts)))
+        return True
+
+class SearchIndexRefresher:
+
+    def __init__(
+        self,
+        index:NGramIndex,
+        scan:Callable[[AsyncSession],AsyncIterator[Sequence[str | None]]],
+        session_factory:Callable[[],AsyncSession],
+        refresh_interval:float,
+        snapshot_path:str | None=None
+    ):
+        '''
+        Docstring for __init__
+
+        keeps an index in sync with the writes of the other workers by rebuilding it
+        periodically from the database, that is the source of truth
+
+        :param index: index shared by the requests of this worker
+        :type index: NGramIndex
+        :param scan: streams the documents of the index from a database session
+        :type scan: Callable[[AsyncSession], AsyncIterator[Sequence[str | None]]]
+        :type session_factory: Callable[[], AsyncSession]
+        :param refresh_interval: seconds between rebuilds, 0 disables them
+        :type refresh_interval: float
+        :param snapshot_path: file where the index is saved after every rebuild and on stop
+        :type snapshot_path: str | None
+        '''
+        self._index = index
+        self._scan = scan
+        self._session_factory = session_factory
+        self._refresh_interval = refresh_interval
+        self._snapshot_path = snapshot_path
+        self._ready = False
+        self._task:asyncio.Task | None = None
+
+    @property
+    def index(self) -> NGramIndex:
+        return self._index
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    async def rebuild(self) -> bool:
+        '''
+        Docstring for rebuild
+
+        builds a new index aside and swaps it in, searches keep using the old one meanwhile
+
+        :return: True if success
+        :rtype: bool
+        '''
+        index = NGramIndex(self._index.fields,self._index.n)
+        self._index.record_changes()
+        try:
+            async with self._session_factory() as session:
+                await index.build(self._scan(session))
+        except Exception as e:
+            logger.error(f'Error while building the search index: {e}')
+            self._index.replay_changes(None)
+            return False
+        # the writes of this worker during the scan may be missing from it
+        self._index.replay_changes(index)
+        self._index = index
+        self._ready = True
+        await self.save()
+        return True
+
+    async def save(self) -> None:
+        if not self._snapshot_path or not self._ready:
+            return
+        try:
+            # the documents are copied here, the index can change while the file is written
+            await asyncio.to_thread(NGramIndex.write,self._index.snapshot(),self._snapshot_path)
+        except OSError as e:
+            logger.error(f'Error while saving the search index snapshot: {e}')
+
+    async def _run(self) -> None:
+        if not self._ready:
+            await self.rebuild()
+        while self._refresh_interval > 0:
+            await asyncio.sleep(self._refresh_interval)
+            await self.rebuild()
+
+    async def start(self) -> None:
+        '''
+        Docstring for start
+
+        restores the snapshot if there is one, so searches are answered right away, and
+        builds the index in background otherwise
+        '''
+        if self._snapshot_path:
+            self._ready = await asyncio.to_thread(self._index.load,self._snapshot_path)
+        if not self._task:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        await self.save()
+
+# indexes shared by every request of this worker process
+_track_search_index:SearchIndexRefresher | None = None
+_playlist_search_index:SearchIndexRefresher | None = None
+
+def _snapshot_path(name:str) -> str | None:
+    if len(ENVIRONMENT.SEARCH_INDEX_SNAPSHOT_DIR) == 0:
+        return None
+    os.makedirs(ENVIRONMENT.SEARCH_INDEX_SNAPSHOT_DIR,exist_ok=True)
+    return os.path.join(ENVIRONMENT.SEARCH_INDEX_SNAPSHOT_DIR,f'{name}.json')
+
+def _scan_tracks(session:AsyncSession) -> AsyncIterator[Sequence[str | None]]:
+    return TrackRepository(session,UserRepository(session)).stream_search_documents(
+        ENVIRONMENT.SEARCH_INDEX_SCAN_BATCH_SIZE
+    )
+
+def _scan_playlists(session:AsyncSession) -> AsyncIterator[Sequence[str | None]]:
+    user_repository = UserRepository(session)
+    return PlaylistRepository(session,TrackRepository(session,user_repository),user_repository).stream_search_documents(
+        ENVIRONMENT.SEARCH_INDEX_SCAN_BATCH_SIZE
+    )
+
+async def start_search_indexes() -> None:
+    '''
+    Docstring for start_search_indexes
+
+    creates the shared search indexes, must be called from the app lifespan
+    '''
+    global _track_search_index,_playlist_search_index
+    if not ENVIRONMENT.SEARCH_INDEX_ENABLED:
+        return
+    if not _track_search_index:
+        _track_search_index = SearchIndexRefresher(
+            NGramIndex(('name','author_name')),
+            _scan_tracks,
+            AsyncSessionLocal,
+            ENVIRONMENT.SEARCH_INDEX_REFRESH_INTERVAL,
+            _snapshot_path('tracks')
+        )
+        await _track_search_index.start()
+    if not _playlist_search_index:
+        _playlist_search_index = SearchIndexRefresher(
+            NGramIndex(('name',)),
+            _scan_playlists,
+            AsyncSessionLocal,
+            ENVIRONMENT.SEARCH_INDEX_REFRESH_INTERVAL,
+            _snapshot_path('playlists')
+        )
+        await _playlist_search_index.start()
+
+async def stop_search_indexes() -> None:
+    '''
+    Docstring for stop_search_indexes
+
+    stops the rebuilds and saves the snapshots, must be called from the app lifespan
+    '''
+    global _track_search_index,_playlist_search_index
+    if _track_search_index:
+        await _track_search_index.stop()
+        _track_search_index = None
+    if _playlist_search_index:
+        await _playlist_search_index.stop()
+        _playlist_search_index = None
+
+def get_track_search_index() -> NGramIndex | None:
+    if not _track_search_index or not _track_search_index.ready:
+        return None
+    return _track_search_index.index
+
+def get_playlist_search_index() -> NGramIndex | None:
+    if not _playlist_search_index or not _playlist_search_index.ready:
+        return None
+    return _playlist_search_index.index
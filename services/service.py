@@ -1,8 +1,10 @@
-from typing import Sequence,Generic,TypeVar
+from typing import List,Sequence,Generic,TypeVar
 from pydantic import BaseModel as SchemaBaseModel
 from uuid import uuid4
 from database import BaseModel as DataBaseModel
 from repositories.repository import Repository
+from settings import ENVIRONMENT
+from .search_index import NGramIndex
 
 ModelType = TypeVar('ModelType',bound=DataBaseModel) # type: ignore
 RepositoryType = TypeVar('RepositoryType',bound=Repository)
@@ -24,7 +26,8 @@ class Service(Generic[
         schema:type[SchemaType],
         repository:RepositoryType,
         exclude_fields:set=set(),
-        exclude_unset:bool=True
+        exclude_unset:bool=True,
+        search_index:NGramIndex | None=None
     ):
         '''
         Docstring for __init__
@@ -37,6 +40,9 @@ class Service(Generic[
         :type exclude_fields: set
         :param exclude_unset: indicates what to do with fields unset in 'Schema.model_dump'
         :type exclude_unset: bool
+        :param search_index: in memory index kept up to date by this service, it answers the
+        substring searches over its fields when it can
+        :type search_index: NGramIndex | None
         '''
 
         self._model = model
@@ -44,6 +50,36 @@ class Service(Generic[
         self._repository = repository
         self._exclude_fields = exclude_fields
         self._exclude_unset = exclude_unset or len(exclude_fields) > 0
+        self._search_index = search_index
+    
+    def _index(self,instance:SchemaType | None) -> None:
+        '''
+        Docstring for _index
+        
+        :param instance: created or updated instance to add to the search index
+        :type instance: SchemaType | None
+        '''
+        if not instance or self._search_index is None:
+            return
+        self._search_index.add(
+            str(getattr(instance,'id')),
+            **{field:getattr(instance,field,None) for field in self._search_index.fields}
+        )
+    
+    def _search_ids(self,text:str,*fields:str) -> List[str] | None:
+        '''
+        Docstring for _search_ids
+        
+        :param text: text to search, matched as a case insensitive substring
+        :type text: str
+        :param fields: fields where the text is searched
+        :return: the ids of the matches from the search index, or None if the search
+        must go to the database
+        :rtype: List[str] | None
+        '''
+        if self._search_index is None:
+            return None
+        return self._search_index.search(text,fields,ENVIRONMENT.SEARCH_INDEX_MAX_CANDIDATES)
     
     async def _to_schema(self,model:ModelType | None) -> SchemaType | None:
         '''
@@ -67,6 +103,15 @@ class Service(Generic[
         '''
         return self._model(**fields)
     
+    async def release_connection(self) -> None:
+        '''
+        Docstring for release_connection
+        
+        gives the database connection of this request back to the pool until the next query,
+        so slow calls to other services do not keep it busy
+        '''
+        await self._repository.release_connection()
+    
     async def get_by_id(self,id:str) -> SchemaType | None:
         '''
         Docstring for get_by_id
@@ -78,7 +123,7 @@ class Service(Generic[
         model = await self._repository.get_by_id(id)
         return await self._to_schema(model)
 
-    async def get(self,limit:int=100,skip:int=0) -> Sequence[SchemaType]:
+    async def get(self,limit:int=100,skip:int=0,after:str | None=None) -> Sequence[SchemaType]:
         '''
         Docstring for get
         
@@ -86,10 +131,12 @@ class Service(Generic[
         :type limit: int
         :param skip: number of registers to skip
         :type skip: int
+        :param after: id of the last result of the previous page, replaces 'skip'
+        :type after: str | None
         :rtype: Sequence[SchemaType]
         '''
 
-        results = await self._repository.get_instances(limit,skip)
+        results = await self._repository.get_instances(limit,skip,after)
         instances = []
         for instance in results:
             ins = await self._to_schema(instance)
@@ -120,7 +167,9 @@ class Service(Generic[
         db_instance = await self._repository.create(db_instance)
         if not db_instance:
             return None
-        return await self._to_schema(db_instance)
+        instance = await self._to_schema(db_instance)
+        self._index(instance)
+        return instance
     
     async def update(self,id:str,update_data:UpdateSchemaType,**extra_fields) -> SchemaType | None:
         '''
@@ -156,4 +205,7 @@ class Service(Generic[
         :type id: str
         :rtype: bool
         '''
-        return await self._repository.delete(id)
\ No newline at end of file
+        deleted = await self._repository.delete(id)
+        if deleted and self._search_index is not None:
+            self._search_index.remove(id)
+        return deleted
\ No newline at end of file
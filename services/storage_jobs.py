@@ -0,0 +1,328 @@
+import asyncio
+import datetime
+import logging
+import random
+import time
+from contextlib import suppress
+from typing import Any, Awaitable, Callable, Dict, List
+from sqlalchemy import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import AsyncSessionLocal
+from models import StorageJobKind,StorageJobStatus
+from repositories import StorageJobRepository,store_file_job_key
+from schemas import StorageJobSchema,StorageJobStatusSchema
+from settings import ENVIRONMENT
+from .external import get_storage_service
+from .ingestion import store_staged_file,fail_staged_file
+
+logger = logging.getLogger(__name__)
+
+StorageJobHandler = Callable[[Dict[str,Any]],Awaitable[Any]]
+
+# seconds between deletions of the finished jobs older than the retention
+_PURGE_INTERVAL = 3600
+
+class StorageJobRunner:
+
+    def __init__(
+        self,
+        handlers:Dict[str,StorageJobHandler],
+        session_factory:Callable[[],AsyncSession],
+        workers:int,
+        batch_size:int,
+        poll_interval:float,
+        max_attempts:int,
+        retry_delay:float,
+        max_retry_delay:float,
+        lease:float,
+        retention:float,
+        failure_handlers:Dict[str,StorageJobHandler] | None=None
+    ):
+        '''
+        Docstring for __init__
+
+        runs the queued storage jobs in background tasks. Every worker process runs its own
+        tasks over the same table, a job is claimed by one of them at a time
+
+        :param handlers: function that runs the payload of each kind of job, it must be safe
+        to run it again after a failure
+        :type handlers: Dict[str, StorageJobHandler]
+        :param session_factory: creates the database sessions used by the tasks
+        :type session_factory: Callable[[], AsyncSession]
+        :param workers: number of tasks running jobs
+        :type workers: int
+        :param batch_size: max number of jobs claimed at once by a task
+        :type batch_size: int
+        :param poll_interval: seconds between looks for due jobs when nobody notifies new ones
+        :type poll_interval: float
+        :param max_attempts: attempts before a job is marked as failed
+        :type max_attempts: int
+        :param retry_delay: seconds before the first retry, doubled on every failure
+        :type retry_delay: float
+        :param max_retry_delay: max seconds between retries
+        :type max_retry_delay: float
+        :param lease: seconds a claimed job is reserved, it is run again if it takes longer
+        :type lease: float
+        :param retention: seconds the finished jobs are kept
+        :type retention: float
+        :param failure_handlers: function run with the payload of each kind of job once a job
+        of that kind is marked as failed
+        :type failure_handlers: Dict[str, StorageJobHandler] | None
+        '''
+        self._handlers = handlers
+        self._session_factory = session_factory
+        self._workers = workers
+        self._batch_size = batch_size
+        self._poll_interval = poll_interval
+        self._max_attempts = max_attempts
+        self._retry_delay = retry_delay
+        self._max_retry_delay = max_retry_delay
+        self._lease = lease
+        self._retention = retention
+        self._failure_handlers = failure_handlers or {}
+        self._jobs_queued = asyncio.Event()
+        self._tasks:List[asyncio.Task] = []
+        self._last_purge = 0.0
+        self._completed = 0
+        self._retried = 0
+        self._failed = 0
+
+    @property
+    def workers(self) -> int:
+        return self._workers
+
+    @property
+    def completed(self) -> int:
+        return self._completed
+
+    @property
+    def retried(self) -> int:
+        return self._retried
+
+    @property
+    def failed(self) -> int:
+        return self._failed
+
+    def notify(self) -> None:
+        '''
+        Docstring for notify
+
+        wakes up the tasks after a job is queued, so it runs without waiting for the poll
+        '''
+        self._jobs_queued.set()
+
+    def _next_attempt(self,attempts:int) -> datetime.datetime:
+        delay = min(self._retry_delay * 2 ** (attempts - 1),self._max_retry_delay)
+        # the jitter keeps the jobs failed at once from being retried at once
+        delay = random.uniform(delay / 2,delay)
+        return datetime.datetime.now(datetime.UTC) + datetime.timedelta(seconds=delay)
+
+    async def _give_up(self,job:Row) -> None:
+        handler = self._failure_handlers.get(job.kind)
+        if not handler:
+            return
+        try:
+            await handler(job.payload)
+        except Exception as e:
+            logger.error(f'Error while giving up the storage job {job.id}: {e}')
+
+    async def _run_job(self,repository:StorageJobRepository,job:Row) -> None:
+        handler = self._handlers.get(job.kind)
+        try:
+            if not handler:
+                raise ValueError(f'No handler for storage jobs of kind {job.kind}')
+            await handler(job.payload)
+        except Exception as e:
+            error = f'{type(e).__name__}: {e}'
+            if not handler or job.attempts >= self._max_attempts:
+                logger.error(f'Storage job {job.id} failed after {job.attempts} attempts: {error}')
+                await repository.finish(job.id,StorageJobStatus.FAILED,error)
+                self._failed += 1
+                await self._give_up(job)
+                return
+            logger.warning(f'Storage job {job.id} will be retried: {error}')
+            await repository.finish(job.id,StorageJobStatus.PENDING,error,self._next_attempt(job.attempts))
+            self._retried += 1
+            return
+        await repository.finish(job.id,StorageJobStatus.DONE)
+        self._completed += 1
+
+    async def run_pending(self) -> int:
+        '''
+        Docstring for run_pending
+
+        claims a batch of due jobs and runs them
+
+        :return: number of claimed jobs
+        :rtype: int
+        '''
+        async with self._session_factory() as session:
+            repository = StorageJobRepository(session)
+            jobs = await repository.claim(self._batch_size,self._lease)
+            for job in jobs:
+                await self._run_job(repository,job)
+            return len(jobs)
+
+    async def purge(self) -> int:
+        '''
+        Docstring for purge
+
+        :return: number of deleted finished jobs older than the retention
+        :rtype: int
+        '''
+        self._last_purge = time.monotonic()
+        moment = datetime.datetime.now(datetime.UTC) - datetime.timedelta(seconds=self._retention)
+        async with self._session_factory() as session:
+            return await StorageJobRepository(session).delete_done_before(moment)
+
+    async def _run(self) -> None:
+        while True:
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._jobs_queued.wait(),self._poll_interval)
+            self._jobs_queued.clear()
+            try:
+                # a full batch means there may be more due jobs
+                while await self.run_pending() >= self._batch_size:
+                    pass
+                if time.monotonic() - self._last_purge >= _PURGE_INTERVAL:
+                    await self.purge()
+            except Exception as e:
+                logger.error(f'Error while running storage jobs: {e}')
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._run()) for _ in range(self._workers)]
+
+    async def stop(self) -> None:
+        '''
+        Docstring for stop
+
+        stops the tasks, the jobs they were running are run again when their lease ends
+        '''
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            with suppress(asyncio.CancelledError):
+                await task
+        self._tasks = []
+
+async def _remove_file(payload:Dict[str,Any]) -> None:
+    await get_storage_service().remove_file(payload['file_id'],payload['file_name'])
+
+# job runner shared by every request of this worker process
+_storage_job_runner:StorageJobRunner | None = None
+
+async def start_storage_job_runner() -> None:
+    '''
+    Docstring for start_storage_job_runner
+
+    creates the shared job runner, must be called from the app lifespan
+    '''
+    global _storage_job_runner
+    if ENVIRONMENT.STORAGE_JOB_WORKERS <= 0:
+        return
+    if not _storage_job_runner:
+        _storage_job_runner = StorageJobRunner(
+            {
+                StorageJobKind.REMOVE_FILE:_remove_file,
+                StorageJobKind.STORE_FILE:store_staged_file
+            },
+            AsyncSessionLocal,
+            ENVIRONMENT.STORAGE_JOB_WORKERS,
+            ENVIRONMENT.STORAGE_JOB_BATCH_SIZE,
+            ENVIRONMENT.STORAGE_JOB_POLL_INTERVAL,
+            ENVIRONMENT.STORAGE_JOB_MAX_ATTEMPTS,
+            ENVIRONMENT.STORAGE_JOB_RETRY_DELAY,
+            ENVIRONMENT.STORAGE_JOB_MAX_RETRY_DELAY,
+            ENVIRONMENT.STORAGE_JOB_LEASE,
+            ENVIRONMENT.STORAGE_JOB_RETENTION,
+            {StorageJobKind.STORE_FILE:fail_staged_file}
+        )
+        _storage_job_runner.start()
+
+async def stop_storage_job_runner() -> None:
+    '''
+    Docstring for stop_storage_job_runner
+
+    stops the shared job runner, must be called from the app lifespan
+    '''
+    global _storage_job_runner
+    if _storage_job_runner:
+        await _storage_job_runner.stop()
+        _storage_job_runner = None
+
+def get_storage_job_runner() -> StorageJobRunner | None:
+    return _storage_job_runner
+
+class StorageJobService:
+
+    def __init__(self,repository:StorageJobRepository,runner:StorageJobRunner | None=None):
+        '''
+        Docstring for __init__
+
+        :param repository: repository of the queued jobs
+        :type repository: StorageJobRepository
+        :param runner: runner of this worker, it is woken up after a job is queued
+        :type runner: StorageJobRunner | None
+        '''
+        self._repository = repository
+        self._runner = runner
+
+    def notify(self) -> None:
+        '''
+        Docstring for notify
+
+        runs the jobs queued by another transaction as soon as possible
+        '''
+        if self._runner:
+            self._runner.notify()
+
+    async def remove_file(self,file_id:str,file_name:str) -> bool:
+        '''
+        Docstring for remove_file
+
+        queues the removal of a stored file
+
+        :type file_id: str
+        :type file_name: str
+        :return: False if the job could not be queued and the file is left in the storage
+        :rtype: bool
+        '''
+        if not await self._repository.enqueue_remove_file(file_id,file_name):
+            logger.error(f'The removal of the file {file_name} could not be queued')
+            return False
+        self.notify()
+        return True
+
+    async def get_store_file_job(self,track_id:str) -> StorageJobSchema | None:
+        '''
+        Docstring for get_store_file_job
+
+        :param track_id: id of an ingested track
+        :type track_id: str
+        :return: the job queued to store the file of the track, None if the track shared a
+        content already stored or the job was purged
+        :rtype: StorageJobSchema | None
+        '''
+        job = await self._repository.get_by_idempotency_key(store_file_job_key(track_id))
+        if not job:
+            return None
+        return StorageJobSchema.model_validate(job)
+
+    async def status(self,limit:int=100) -> StorageJobStatusSchema:
+        '''
+        Docstring for status
+
+        :param limit: max number of failed jobs listed
+        :type limit: int
+        :rtype: StorageJobStatusSchema
+        '''
+        failed_jobs = await self._repository.get_by_status(StorageJobStatus.FAILED,limit)
+        return StorageJobStatusSchema(
+            workers=self._runner.workers if self._runner else 0,
+            completed=self._runner.completed if self._runner else 0,
+            retried=self._runner.retried if self._runner else 0,
+            failed=self._runner.failed if self._runner else 0,
+            jobs=await self._repository.count_by_status(),
+            failed_jobs=[StorageJobSchema.model_validate(job) for job in failed_jobs]
+        )
@@ -0,0 +1,258 @@
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+from contextlib import suppress
+from pathlib import Path
+from typing import IO, Awaitable, Callable, Dict
+from starlette.responses import FileResponse
+from starlette.types import Message, Receive, Scope, Send
+from settings import ENVIRONMENT
+
+logger = logging.getLogger(__name__)
+
+# folder of the files being filled, they are renamed into place once complete
+_INCOMING_DIR = '.incoming'
+
+class TrackFileCache:
+
+    def __init__(self,directory:str | Path,max_size:int):
+        '''
+        Docstring for __init__
+
+        keeps the files of the most played tracks on the local disk, keyed by their content
+        hash. Its index lives in memory, so every worker process uses its own folder inside
+        'directory'
+
+        :param directory: folder of the cached files
+        :type directory: str | Path
+        :param max_size: max bytes kept, the least recently used files are removed first
+        :type max_size: int
+        '''
+        self._parent = Path(directory)
+        self._directory = self._parent / str(os.getpid())
+        self._max_size = max_size
+        self._entries:OrderedDict[str,int] = OrderedDict()
+        self._readers:Dict[str,int] = {}
+        self._fills:Dict[str,asyncio.Task[Path]] = {}
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._evictions = 0
+        self._bytes_served = 0
+
+    @property
+    def max_size(self) -> int:
+        return self._max_size
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def hits(self) -> int:
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        return self._misses
+
+    @property
+    def bytes_served(self) -> int:
+        return self._bytes_served
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str,int]:
+        '''
+        Docstring for stats
+
+        :return: counters of this worker since it started
+        :rtype: Dict[str, int]
+        '''
+        return {
+            'files':len(self._entries),
+            'size':self._size,
+            'max_size':self._max_size,
+            'hits':self._hits,
+            'misses':self._misses,
+            'coalesced':self._coalesced,
+            'evictions':self._evictions,
+            'bytes_served':self._bytes_served
+        }
+
+    def start(self) -> None:
+        '''
+        Docstring for start
+
+        empties the folder of this worker and removes the folders of the workers that died
+        '''
+        self._parent.mkdir(parents=True,exist_ok=True)
+        for path in self._parent.iterdir():
+            if not path.name.isdigit() or path == self._directory:
+                continue
+            try:
+                os.kill(int(path.name),0)
+            except ProcessLookupError:
+                shutil.rmtree(path,ignore_errors=True)
+            except OSError:
+                pass
+        shutil.rmtree(self._directory,ignore_errors=True)
+        (self._directory / _INCOMING_DIR).mkdir(parents=True)
+
+    def stop(self) -> None:
+        for fill in self._fills.values():
+            fill.cancel()
+        shutil.rmtree(self._directory,ignore_errors=True)
+
+    def _path(self,key:str) -> Path:
+        return self._directory / key
+
+    def _evict(self) -> None:
+        # the files being served are skipped, they are removed once released
+        for key in list(self._entries):
+            if self._size <= self._max_size:
+                return
+            if self._readers.get(key,0) > 0:
+                continue
+            self._size -= self._entries.pop(key)
+            self._evictions += 1
+            with suppress(OSError):
+                self._path(key).unlink()
+
+    async def _fill(self,key:str,fill:Callable[[IO[bytes]],Awaitable[None]]) -> Path:
+        fd,name = tempfile.mkstemp(dir=self._directory / _INCOMING_DIR)
+        incoming = Path(name)
+        path = self._path(key)
+        try:
+            with os.fdopen(fd,'wb') as target:
+                await fill(target)
+                size = target.tell()
+            os.replace(incoming,path)
+        except BaseException:
+            with suppress(OSError):
+                incoming.unlink()
+            raise
+        self._entries[key] = size
+        self._size += size
+        return path
+
+    def _fill_done(self,key:str,task:asyncio.Task[Path]) -> None:
+        self._fills.pop(key,None)
+        # nobody may be waiting for it anymore
+        if not task.cancelled() and task.exception():
+            logger.error(f'Error while caching the file {key}: {task.exception()}')
+
+    async def acquire(self,key:str,fill:Callable[[IO[bytes]],Awaitable[None]]) -> Path:
+        '''
+        Docstring for acquire
+
+        returns the cached file, filling it first on a miss. Concurrent misses for the same
+        key share one fill, which runs on its own so a client that leaves does not cancel it
+        for the others. The file is not removed until 'release' is called
+
+        :param key: content hash of the file
+        :type key: str
+        :param fill: writes the whole file to the given target
+        :type fill: Callable[[IO[bytes]], Awaitable[None]]
+        :rtype: Path
+        '''
+        if key in self._entries:
+            self._hits += 1
+            self._entries.move_to_end(key)
+            path = self._path(key)
+        else:
+            pending = self._fills.get(key)
+            if pending:
+                self._coalesced += 1
+            else:
+                self._misses += 1
+                pending = asyncio.create_task(self._fill(key,fill))
+                self._fills[key] = pending
+                pending.add_done_callback(lambda task:self._fill_done(key,task))
+            path = await asyncio.shield(pending)
+        self._readers[key] = self._readers.get(key,0) + 1
+        self._evict()
+        return path
+
+    def release(self,key:str,bytes_served:int=0) -> None:
+        '''
+        Docstring for release
+
+        :param key: key of a file returned by 'acquire'
+        :type key: str
+        :param bytes_served: bytes of the file sent to the client
+        :type bytes_served: int
+        '''
+        self._bytes_served += bytes_served
+        readers = self._readers.get(key,0) - 1
+        if readers > 0:
+            self._readers[key] = readers
+            return
+        self._readers.pop(key,None)
+        self._evict()
+
+class CachedFileResponse(FileResponse):
+    '''
+    file response that releases its cache entry once sent, even if the client leaves
+    '''
+
+    def __init__(self,cache:TrackFileCache,key:str,path:str | os.PathLike[str],**kwargs):
+        super().__init__(path,**kwargs)
+        self._cache = cache
+        self._key = key
+
+    async def __call__(self,scope:Scope,receive:Receive,send:Send) -> None:
+        sent = 0
+
+        async def counted_send(message:Message) -> None:
+            nonlocal sent
+            if message['type'] == 'http.response.body':
+                sent += len(message.get('body',b''))
+            elif message['type'] == 'http.response.pathsend':
+                sent += int(self.headers.get('content-length',0))
+            await send(message)
+
+        try:
+            await super().__call__(scope,receive,counted_send)
+        finally:
+            self._cache.release(self._key,sent)
+
+# track file cache shared by every request of this worker process
+_track_file_cache:TrackFileCache | None = None
+
+async def start_track_file_cache() -> None:
+    '''
+    Docstring for start_track_file_cache
+
+    creates the shared track file cache, must be called from the app lifespan
+    '''
+    global _track_file_cache
+    if ENVIRONMENT.STREAM_CACHE_SIZE <= 0:
+        return
+    if not _track_file_cache:
+        cache = TrackFileCache(ENVIRONMENT.STREAM_CACHE_DIR,ENVIRONMENT.STREAM_CACHE_SIZE)
+        try:
+            await asyncio.to_thread(cache.start)
+        except OSError as e:
+            logger.error(f'Can not use the stream cache at {ENVIRONMENT.STREAM_CACHE_DIR}: {e}')
+            return
+        _track_file_cache = cache
+
+async def stop_track_file_cache() -> None:
+    '''
+    Docstring for stop_track_file_cache
+
+    removes the files of the shared track file cache, must be called from the app lifespan
+    '''
+    global _track_file_cache
+    if _track_file_cache:
+        await asyncio.to_thread(_track_file_cache.stop)
+        _track_file_cache = None
+
+def get_track_file_cache() -> TrackFileCache | None:
+    return _track_file_cache
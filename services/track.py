@@ -1,14 +1,21 @@
-from typing import Sequence
+from typing import Any,Dict,Sequence,Tuple
+from uuid import uuid4
 from repositories import TrackRepository
-from models import Track
+from models import Blob,BlobStatus,Track
 from schemas import (
+    BlobSchema,
     TrackUploadSchema,
     TrackUpdateSchema,
     TrackSchema,
     TrackPrivateUpdateSchema,
+    TrackFileSchema,
+    TrackStatsSchema,
     ExistencialQuerySchema
 )
+from settings import ENVIRONMENT
 from .service import Service
+from .search_index import NGramIndex
+from .content_hashes import ContentHashFilterRefresher,KnownContentCache
 
 from enum import StrEnum
 
@@ -16,6 +23,8 @@ class TrackSearchMode(StrEnum):
     BY_NAME = 'by name'
     BY_AUTHOR = 'by author'
     BOTH = 'both'
+    # full text search over name and author, the most relevant and popular first
+    RANKED = 'ranked'
 
 class TrackService(Service[
     Track,
@@ -24,34 +33,245 @@ class TrackService(Service[
     TrackUpdateSchema,
     TrackSchema
 ]):
-    def __init__(self, repository: TrackRepository, exclude_fields: set = set(), exclude_unset: bool = True):
-        super().__init__(Track, TrackSchema,repository, exclude_fields, exclude_unset)
+    def __init__(
+        self,
+        repository: TrackRepository,
+        exclude_fields: set = set(),
+        exclude_unset: bool = True,
+        search_index: NGramIndex | None = None,
+        content_hashes: ContentHashFilterRefresher | None = None,
+        known_contents: KnownContentCache | None = None
+    ):
+        '''
+        Docstring for __init__
+        
+        :param content_hashes: filter of the content hashes of the blobs, it spares the
+        database lookups of the new contents
+        :type content_hashes: ContentHashFilterRefresher | None
+        :param known_contents: cache of the blobs recently found, it spares the database
+        lookups of the uploads and preflights of known contents
+        :type known_contents: KnownContentCache | None
+        '''
+        super().__init__(Track, TrackSchema,repository, exclude_fields, exclude_unset, search_index)
+        self._content_hashes = content_hashes
+        self._known_contents = known_contents
+
+    async def create(self,value:TrackUploadSchema,blob:BlobSchema | None=None,**extra_fields) -> TrackSchema | None:
+        '''
+        Docstring for create
+        
+        :type value: TrackUploadSchema
+        :param blob: file just stored for the track, without it the track shares the file
+        already stored for its content
+        :type blob: BlobSchema | None
+        :param extra_fields: extra fields for model creation
+        :return: the created track, its 'file_id' tells which file was kept if the same
+        content was stored by two uploads at once. None if the track could not be created,
+        or the content is not stored and no blob was given
+        :rtype: TrackSchema | None
+        '''
+        db_track = await self._repository.create(
+            await self._get_instance(**{
+                **value.model_dump(
+                    exclude=self._exclude_fields,
+                    exclude_unset=self._exclude_unset
+                ),
+                **extra_fields,
+                **{
+                    'id':str(uuid4())
+                }
+            }),
+            Blob(**blob.model_dump()) if blob else None
+        )
+        track = await self._to_schema(db_track)
+        if not track:
+            return None
+        self._index(track)
+        if self._content_hashes is not None:
+            self._content_hashes.add(track.content_hash)
+        return track
+
+    async def create_processing(
+        self,
+        value:TrackUploadSchema,
+        size:int,
+        payload:Dict[str,Any],
+        **extra_fields
+    ) -> TrackSchema | None:
+        '''
+        Docstring for create_processing
+
+        creates the track of a file not stored yet, with the job that stores it
+        
+        :type value: TrackUploadSchema
+        :param size: size of the file
+        :type size: int
+        :param payload: arguments of the job that stores the file
+        :type payload: Dict[str, Any]
+        :param extra_fields: extra fields for model creation
+        :return: the created track, 'PROCESSING' until the job stores its file. It is 'READY'
+        if another upload stored the same content first, then no job was queued
+        :rtype: TrackSchema | None
+        '''
+        db_track = await self._repository.create_processing(
+            await self._get_instance(**{
+                **value.model_dump(
+                    exclude=self._exclude_fields,
+                    exclude_unset=self._exclude_unset
+                ),
+                **extra_fields,
+                **{
+                    'id':str(uuid4())
+                }
+            }),
+            size,
+            payload
+        )
+        track = await self._to_schema(db_track)
+        if not track:
+            return None
+        self._index(track)
+        if self._content_hashes is not None:
+            self._content_hashes.add(track.content_hash)
+        return track
+
+    async def get_blob(self,content_hash:str) -> BlobSchema | None:
+        '''
+        Docstring for get_blob
+
+        looks for the content in the known contents cache before asking the database, so the
+        answer can point to a blob removed by another worker a moment ago. Only 'READY' blobs
+        are cached
+        
+        :param content_hash: SHA-256 of a file
+        :type content_hash: str
+        :return: the stored file with that content, the database is only asked if the content
+        hash filter can not tell the content is new. A blob whose storing failed is not
+        returned, so the next upload of the content stores it again
+        :rtype: BlobSchema | None
+        '''
+        if self._known_contents is not None:
+            blob = self._known_contents.get(content_hash)
+            if blob:
+                return blob
+        if self._content_hashes is not None and content_hash not in self._content_hashes:
+            return None
+        db_blob = await self._repository.get_blob(content_hash)
+        if not db_blob or db_blob.status == BlobStatus.FAILED:
+            return None
+        blob = BlobSchema.model_validate(db_blob)
+        if self._known_contents is not None and blob.status == BlobStatus.READY:
+            self._known_contents.put(blob)
+        return blob
+
+    async def get_by_content_hash(self,content_hash:str,uploaded_by:str) -> TrackSchema | None:
+        '''
+        Docstring for get_by_content_hash
+        
+        :param content_hash: SHA-256 of a file
+        :type content_hash: str
+        :param uploaded_by: id of the user who uploaded the track
+        :type uploaded_by: str
+        :return: the track of the user with that content, the database is only asked if the
+        content hash filter can not tell the content is new
+        :rtype: TrackSchema | None
+        '''
+        if self._content_hashes is not None and content_hash not in self._content_hashes:
+            return None
+        db_track = await self._repository.get_by_content_hash(content_hash,uploaded_by)
+        return await self._to_schema(db_track)
+
+    async def find_content(self,content_hash:str,uploaded_by:str) -> Tuple[BlobSchema,str | None] | None:
+        '''
+        Docstring for find_content
+        
+        :param content_hash: SHA-256 of a file
+        :type content_hash: str
+        :param uploaded_by: id of the user asking
+        :type uploaded_by: str
+        :return: the stored file with that content and the id of a track with it, the track
+        of the user if there is one
+        :rtype: Tuple[BlobSchema, str | None] | None
+        '''
+        blob = await self.get_blob(content_hash)
+        if not blob:
+            return None
+        return blob,await self._repository.get_id_by_content_hash(content_hash,uploaded_by)
+
+    async def remove(self,id:str) -> Tuple[bool,BlobSchema | None]:
+        '''
+        Docstring for remove
+        
+        :type id: str
+        :return: if the track was deleted, and the blob deleted with it when it was the last
+        track with its content, the removal of its file is queued with the deletion
+        :rtype: Tuple[bool, BlobSchema | None]
+        '''
+        deleted,db_blob = await self._repository.delete_reference(id)
+        if deleted and self._search_index is not None:
+            self._search_index.remove(id)
+        if not db_blob:
+            return deleted,None
+        blob = BlobSchema.model_validate(db_blob)
+        if self._known_contents is not None:
+            self._known_contents.discard(blob.content_hash)
+        return deleted,blob
+
+    async def delete(self,id:str) -> bool:
+        '''
+        Docstring for delete
+
+        the file of a blob deleted with the track is left in the storage, 'remove' returns it
+        
+        :type id: str
+        :rtype: bool
+        '''
+        deleted,_ = await self.remove(id)
+        return deleted
     
-    async def private_update(self,id:str,update_data:TrackPrivateUpdateSchema,**extra_fields) -> TrackSchema | None:
+    async def private_update(self,id:str,update_data:TrackPrivateUpdateSchema) -> TrackSchema | None:
         '''
         Docstring for private_update
 
-        updates sensible data related to the track that only the owner can modify
+        updates sensible data related to the track that only the owner can modify, the
+        stored file is named after its content so it is not touched
         
         :type id: str
         :type udpate_data: TrackPrivateUpdateSchema
         :rtype: TrackSchema
         '''
-        db_instance = await self._repository.get_by_id(id)
-        if not db_instance:
-            return None
-        update_instance = await self._get_instance(**{
+        result = await self._repository.update_fields(
+            id,
             **update_data.model_dump(
                 exclude=self._exclude_fields,
                 exclude_unset=self._exclude_unset
-            ),
-            **extra_fields,
-            **{
-                'id':id
-            }
-        })
-        result = await self._repository.update(id,update_instance)
-        return await self._to_schema(result)
+            )
+        )
+        track = await self._to_schema(result)
+        self._index(track)
+        return track
+    
+    def _to_stats(self,counters) -> TrackStatsSchema | None:
+        '''
+        Docstring for _to_stats
+        
+        :param counters: row with the id and the counters of the track
+        :rtype: TrackStatsSchema | None
+        '''
+        if not counters:
+            return None
+        return TrackStatsSchema.model_validate(counters)
+    
+    async def add_play(self,track_id:str) -> TrackStatsSchema | None:
+        '''
+        Docstring for add_play
+        
+        :type track_id: str
+        :return: the new counters if the track exists, else None
+        :rtype: TrackStatsSchema | None
+        '''
+        result = await self._repository.increment(track_id,plays=1)
+        return self._to_stats(result)
     
     async def liked_by(self,user_id:str,track_id:str) -> ExistencialQuerySchema:
         '''
@@ -87,7 +307,7 @@ class TrackService(Service[
         result = await self._repository.loved_by(user_id,track_id)
         return ExistencialQuerySchema(result=result)
 
-    async def add_like_from_user_to_track(self,user_id:str,track_id:str) -> bool:
+    async def add_like_from_user_to_track(self,user_id:str,track_id:str) -> TrackStatsSchema | None:
         '''
         Docstring for add_like_from_user_to_track
 
@@ -95,11 +315,13 @@ class TrackService(Service[
 
         :type user_id: str
         :type track_id: str
-        :rtype: VoidResultOperationSchema
+        :return: the new counters if success, else None
+        :rtype: TrackStatsSchema | None
         '''
-        return await self._repository.add_like_from_user_to_track(user_id,track_id)
+        result = await self._repository.add_like_from_user_to_track(user_id,track_id)
+        return self._to_stats(result)
     
-    async def remove_like_from_user_to_track(self,user_id:str,track_id:str) -> bool:
+    async def remove_like_from_user_to_track(self,user_id:str,track_id:str) -> TrackStatsSchema | None:
         '''
         Docstring for remove_like_from_user_to_track
         
@@ -107,11 +329,13 @@ class TrackService(Service[
 
         :type user_id: str
         :type track_id: str
-        :rtype: VoidResultOperationSchema
+        :return: the new counters if success, else None
+        :rtype: TrackStatsSchema | None
         '''
-        return await self._repository.remove_like_from_user_to_track(user_id,track_id)
+        result = await self._repository.remove_like_from_user_to_track(user_id,track_id)
+        return self._to_stats(result)
     
-    async def add_dislike_from_user_to_track(self,user_id:str,track_id:str) -> bool:
+    async def add_dislike_from_user_to_track(self,user_id:str,track_id:str) -> TrackStatsSchema | None:
         '''
         Docstring for add_dislike_from_user_to_track
 
@@ -119,11 +343,13 @@ class TrackService(Service[
                 
         :type user_id: str
         :type track_id: str
-        :rtype: bool
+        :return: the new counters if success, else None
+        :rtype: TrackStatsSchema | None
         '''
-        return await self._repository.add_dislike_from_user_to_track(user_id,track_id)
+        result = await self._repository.add_dislike_from_user_to_track(user_id,track_id)
+        return self._to_stats(result)
     
-    async def remove_dislike_from_user_to_track(self,user_id:str,track_id:str) -> bool:
+    async def remove_dislike_from_user_to_track(self,user_id:str,track_id:str) -> TrackStatsSchema | None:
         '''
         Docstring for remove_dislike_from_user_to_track
 
@@ -131,11 +357,13 @@ class TrackService(Service[
                 
         :type user_id: str
         :type track_id: str
-        :rtype: bool
+        :return: the new counters if success, else None
+        :rtype: TrackStatsSchema | None
         '''
-        return await self._repository.remove_dislike_from_user_to_track(user_id,track_id)
+        result = await self._repository.remove_dislike_from_user_to_track(user_id,track_id)
+        return self._to_stats(result)
     
-    async def add_love_from_user_to_track(self,user_id:str,track_id:str) -> bool:
+    async def add_love_from_user_to_track(self,user_id:str,track_id:str) -> TrackStatsSchema | None:
         '''
         Docstring for add_love_from_user_to_track
 
@@ -143,11 +371,13 @@ class TrackService(Service[
                 
         :type user_id: str
         :type track_id: str
-        :rtype: bool
+        :return: the new counters if success, else None
+        :rtype: TrackStatsSchema | None
         '''
-        return await self._repository.add_love_from_user_to_track(user_id,track_id)
+        result = await self._repository.add_love_from_user_to_track(user_id,track_id)
+        return self._to_stats(result)
     
-    async def remove_love_from_user_to_track(self,user_id:str,track_id:str) -> bool:
+    async def remove_love_from_user_to_track(self,user_id:str,track_id:str) -> TrackStatsSchema | None:
         '''
         Docstring for remove_love_from_user_to_track
 
@@ -155,11 +385,13 @@ class TrackService(Service[
                 
         :type user_id: str
         :type track_str: str
-        :rtype: bool
+        :return: the new counters if success, else None
+        :rtype: TrackStatsSchema | None
         '''
-        return await self._repository.remove_love_from_user_to_track(user_id,track_id)
+        result = await self._repository.remove_love_from_user_to_track(user_id,track_id)
+        return self._to_stats(result)
     
-    async def get_tracks_uploaded_by(self,user_id:str,limit:int=100,skip:int=0) -> Sequence[TrackSchema]:
+    async def get_tracks_uploaded_by(self,user_id:str,limit:int=100,skip:int=0,after:str | None=None) -> Sequence[TrackSchema]:
         '''
         Docstring for get_tracks_uploaded_by
         
@@ -167,12 +399,14 @@ class TrackService(Service[
         :type limit: int
         :param skip: limit of results per query
         :type skip: number of register to jump
+        :param after: id of the last result of the previous page, replaces 'skip'
+        :type after: str | None
         :rtype: Sequence[TrackSchema]
         '''
-        tracks = await self._repository.get_tracks_uploaded_by(user_id,limit,skip)
+        tracks = await self._repository.get_tracks_uploaded_by(user_id,limit,skip,after)
         return [await self._to_schema(track) for track in tracks if track] # type: ignore
     
-    async def get_tracks_with_name_like(self,text:str,limit:int=100,skip:int=0) -> Sequence[TrackSchema]:
+    async def get_tracks_with_name_like(self,text:str,limit:int=100,skip:int=0,after:str | None=None) -> Sequence[TrackSchema]:
         '''
         Docstring for get_tracks_with_name_like
         
@@ -181,21 +415,33 @@ class TrackService(Service[
         :type limit: int
         :param skip: number of registers to jump
         :type skip: int
+        :param after: id of the last result of the previous page, replaces 'skip'
+        :type after: str | None
         :rtype: Sequence[TrackSchema]
         '''
-        tracks = await self._repository.get_tracks_with_name_like(text,limit,skip)
+        ids = self._search_ids(text,'name')
+        if ids is not None:
+            tracks = await self._repository.get_instances_by_ids(ids,limit,skip,after)
+        else:
+            tracks = await self._repository.get_tracks_with_name_like(text,limit,skip,after)
         return [await self._to_schema(track) for track in tracks if track] # type: ignore
     
-    async def get_tracks_with_author_name_like(self,text:str,limit:int=100,skip:int=0) -> Sequence[TrackSchema]:
+    async def get_tracks_with_author_name_like(self,text:str,limit:int=100,skip:int=0,after:str | None=None) -> Sequence[TrackSchema]:
         '''
         Docstring for get_tracks_with_author_name_like
         
         :type text: str
         :type limit: int
         :type skip: int
+        :param after: id of the last result of the previous page, replaces 'skip'
+        :type after: str | None
         :rtype: Sequence[TrackSchema]
         '''
-        tracks = await self._repository.get_tracks_with_author_name_like(text,limit,skip)
+        ids = self._search_ids(text,'author_name')
+        if ids is not None:
+            tracks = await self._repository.get_instances_by_ids(ids,limit,skip,after)
+        else:
+            tracks = await self._repository.get_tracks_with_author_name_like(text,limit,skip,after)
         return [await self._to_schema(track) for track in tracks if track] # type: ignore
 
     async def get_tracks_from_user_with_name_like(
@@ -203,7 +449,8 @@ class TrackService(Service[
         user_id:str,
         text:str,
         limit:int=100,
-        skip:int=0
+        skip:int=0,
+        after:str | None=None
     ) -> Sequence[TrackSchema]:
         '''
         Docstring for get_tracks_from_user_with_name_like
@@ -214,13 +461,16 @@ class TrackService(Service[
         :type limit: int
         :param skip: number of registers to jump
         :type skip: int
+        :param after: id of the last result of the previous page, replaces 'skip'
+        :type after: str | None
         :rtype: Sequence[TrackSchema]
         '''
         tracks = await self._repository.get_tracks_from_user_with_name_like(
             user_id,
             text,
             limit,
-            skip
+            skip,
+            after
         )
         return [await self._to_schema(track) for track in tracks if track] # type: ignore
     
@@ -229,7 +479,8 @@ class TrackService(Service[
         user_id:str,
         text:str,
         limit:int=100,
-        skip:int=0
+        skip:int=0,
+        after:str | None=None
     ) -> Sequence[TrackSchema]:
         '''
         Docstring for get_tracks_from_user_with_author_name_like
@@ -238,31 +489,51 @@ class TrackService(Service[
         :type text: str
         :type limit: int
         :type skip: int
+        :param after: id of the last result of the previous page, replaces 'skip'
+        :type after: str | None
         :rtype: Sequence[TrackSchema]
         '''
         tracks = await self._repository.get_tracks_from_user_with_author_name_like(
             user_id,
             text,limit,
-            skip
+            skip,
+            after
         )
         return [await self._to_schema(track) for track in tracks if track] # type: ignore
 
-    async def get_tracks_on_playlist(self,playlist_id:str,limit:int=100,skip:int=0) -> Sequence[TrackSchema]:
+    async def get_tracks_on_playlist(self,playlist_id:str,limit:int=100,skip:int=0,after:str | None=None) -> Sequence[TrackSchema]:
         '''
         Docstring for get_tracks_on_playlist
         
         :type playlist_id: str
+        :param after: id of the last result of the previous page, replaces 'skip'
+        :type after: str | None
         :rtype: Sequence[TrackSchema]
         '''
-        tracks = await self._repository.get_tracks_on_playlist(playlist_id,limit,skip)
+        tracks = await self._repository.get_tracks_on_playlist(playlist_id,limit,skip,after)
         return [await self._to_schema(track) for track in tracks if track]  # type: ignore
     
+    async def get_track_files_on_playlist(self,playlist_id:str,limit:int=100,skip:int=0,after:str | None=None) -> Sequence[TrackFileSchema]:
+        '''
+        Docstring for get_track_files_on_playlist
+        
+        :type playlist_id: str
+        :type limit: int
+        :type skip: int
+        :param after: id of the last result of the previous page, replaces 'skip'
+        :type after: str | None
+        :rtype: Sequence[TrackFileSchema]
+        '''
+        rows = await self._repository.get_track_files_on_playlist(playlist_id,limit,skip,after)
+        return [TrackFileSchema.model_validate(row) for row in rows]
+    
     async def get_tracks_on_playlist_with_name_like(
         self,
         playlist_id:str,
         text:str,
         limit:int=100,
-        skip:int=0
+        skip:int=0,
+        after:str | None=None
     ) -> Sequence[TrackSchema]:
         '''
         Docstring for get_tracks_on_playlist_with_name_like
@@ -271,9 +542,11 @@ class TrackService(Service[
         :type text: str
         :type limit: int
         :type skip: int
+        :param after: id of the last result of the previous page, replaces 'skip'
+        :type after: str | None
         :rtype: Sequence[TrackSchema]
         '''
-        tracks = await self._repository.get_tracks_on_playlists_with_name_like(playlist_id,text,limit,skip)
+        tracks = await self._repository.get_tracks_on_playlists_with_name_like(playlist_id,text,limit,skip,after)
         return [await self._to_schema(track) for track in tracks if track] # type: ignore
     
     async def get_tracks_on_playlist_with_author_name_like(
@@ -281,7 +554,8 @@ class TrackService(Service[
         playlist_id:str,
         text:str,
         limit:int=100,
-        skip:int=0
+        skip:int=0,
+        after:str | None=None
     ) -> Sequence[TrackSchema]:
         '''
         Docstring for get_tracks_on_playlist_with_author_name_like
@@ -290,12 +564,14 @@ class TrackService(Service[
         :type text: str
         :type limit: int
         :type skip: int
+        :param after: id of the last result of the previous page, replaces 'skip'
+        :type after: str | None
         :rtype: Sequence[TrackSchema]
         '''
-        tracks = await self._repository.get_tracks_on_playlists_with_author_name_like(playlist_id,text,limit,skip)
+        tracks = await self._repository.get_tracks_on_playlists_with_author_name_like(playlist_id,text,limit,skip,after)
         return [await self._to_schema(track) for track in tracks if track] # type: ignore
     
-    async def search_track_on_playlist_by_text(self,playlist_id:str,text:str,limit:int=100,skip:int=0) -> Sequence[TrackSchema]:
+    async def search_track_on_playlist_by_text(self,playlist_id:str,text:str,limit:int=100,skip:int=0,after:str | None=None) -> Sequence[TrackSchema]:
         '''
         Docstring for search_track_on_playlist_by_text
         
@@ -303,24 +579,65 @@ class TrackService(Service[
         :type text: str
         :type limit: int
         :type skip: int
+        :param after: id of the last result of the previous page, replaces 'skip'
+        :type after: str | None
         :rtype: Sequence[TrackSchema]
         '''
-        tracks = await self._repository.search_tracks_on_playlist_by_text(playlist_id,text,limit,skip)
+        tracks = await self._repository.search_tracks_on_playlist_by_text(playlist_id,text,limit,skip,after)
         return [await self._to_schema(track) for track in tracks if track] # type: ignore
     
-    async def search_tracks_by_text(self,text:str,limit:int=100,skip:int=0) -> Sequence[TrackSchema]:
+    async def search_tracks_by_text(self,text:str,limit:int=100,skip:int=0,after:str | None=None) -> Sequence[TrackSchema]:
         '''
         Docstring for search_tracks_by_text
         
         :type text: str
         :type limit: int
         :type skip: int
+        :param after: id of the last result of the previous page, replaces 'skip'
+        :type after: str | None
         :rtype: Sequence[TrackSchema]
         '''
-        tracks = await self._repository.search_tracks_by_text(text,limit,skip)
+        ids = self._search_ids(text,'name','author_name')
+        if ids is not None:
+            tracks = await self._repository.get_instances_by_ids(ids,limit,skip,after)
+        else:
+            tracks = await self._repository.search_tracks_by_text(text,limit,skip,after)
+        return [await self._to_schema(track) for track in tracks if track] # type: ignore
+    
+    async def rank_tracks_by_text(self,text:str,limit:int=100,skip:int=0) -> Sequence[TrackSchema]:
+        '''
+        Docstring for rank_tracks_by_text
+        
+        :type text: str
+        :type limit: int
+        :type skip: int
+        :return: the tracks matching the text, the most relevant and popular first
+        :rtype: Sequence[TrackSchema]
+        '''
+        tracks = await self._repository.rank_tracks_by_text(text,limit,skip,ENVIRONMENT.SEARCH_RANK_CANDIDATES)
+        return [await self._to_schema(track) for track in tracks if track] # type: ignore
+    
+    async def rank_tracks_on_playlist_by_text(self,playlist_id:str,text:str,limit:int=100,skip:int=0) -> Sequence[TrackSchema]:
+        '''
+        Docstring for rank_tracks_on_playlist_by_text
+        
+        :type playlist_id: str
+        :type text: str
+        :type limit: int
+        :type skip: int
+        :return: the tracks of the playlist matching the text, the most relevant and popular first
+        :rtype: Sequence[TrackSchema]
+        '''
+        tracks = await self._repository.rank_tracks_on_playlist_by_text(
+            playlist_id,
+            text,
+            limit,
+            skip,
+            ENVIRONMENT.SEARCH_RANK_CANDIDATES
+        )
         return [await self._to_schema(track) for track in tracks if track] # type: ignore
     
-    async def search_tracks(self,text:str,limit:int=100,skip:int=0,search_mode:TrackSearchMode=TrackSearchMode.BOTH) -> Sequence[TrackSchema]:
+    async def search_tracks(self,text:str,limit:int=100,skip:int=0,search_mode:TrackSearchMode=TrackSearchMode.BOTH,after:str | None=None) -> Sequence[TrackSchema]:
         '''
         Docstring for search_tracks
         
@@ -328,15 +645,19 @@ class TrackService(Service[
         :type limit: int
         :type skip: int
         :type search_mode: TrackSearchMode
+        :param after: id of the last result of the previous page, replaces 'skip'
+        :type after: str | None
         :rtype: Sequence[TrackSchema]
         '''
         match search_mode:
             case TrackSearchMode.BY_NAME:
-                return await self.get_tracks_with_name_like(text,limit,skip)
+                return await self.get_tracks_with_name_like(text,limit,skip,after)
             case TrackSearchMode.BY_AUTHOR:
-                return await self.get_tracks_with_author_name_like(text,limit,skip)
+                return await self.get_tracks_with_author_name_like(text,limit,skip,after)
             case TrackSearchMode.BOTH:
-                return await self.search_tracks_by_text(text,limit,skip)
+                return await self.search_tracks_by_text(text,limit,skip,after)
+            case TrackSearchMode.RANKED:
+                return await self.rank_tracks_by_text(text,limit,skip)
     
     async def search_tracks_on_playlist(
         self,
@@ -344,7 +665,8 @@ class TrackService(Service[
         text:str,
         limit:int=100,
         skip:int=0,
-        search_mode:TrackSearchMode=TrackSearchMode.BOTH
+        search_mode:TrackSearchMode=TrackSearchMode.BOTH,
+        after:str | None=None
     ) -> Sequence[TrackSchema]:
         '''
         Docstring for search_tracks_on_playlist
@@ -354,12 +676,16 @@ class TrackService(Service[
         :type limit: int
         :type skip: int
         :type search_mode: TrackSearchMode
+        :param after: id of the last result of the previous page, replaces 'skip'
+        :type after: str | None
         :rtype: Sequence[TrackSchema]
         '''
         match search_mode:
             case TrackSearchMode.BOTH:
-                return await self.search_track_on_playlist_by_text(playlist_id,text,limit,skip)
+                return await self.search_track_on_playlist_by_text(playlist_id,text,limit,skip,after)
             case TrackSearchMode.BY_AUTHOR:
-                return await self.get_tracks_on_playlist_with_author_name_like(playlist_id,text,limit,skip)
+                return await self.get_tracks_on_playlist_with_author_name_like(playlist_id,text,limit,skip,after)
             case TrackSearchMode.BY_NAME:
-                return await self.get_tracks_on_playlist_with_name_like(playlist_id,text,limit,skip)
\ No newline at end of file
+                return await self.get_tracks_on_playlist_with_name_like(playlist_id,text,limit,skip,after)
+            case TrackSearchMode.RANKED:
+                return await self.rank_tracks_on_playlist_by_text(playlist_id,text,limit,skip)
\ No newline at end of file
@@ -0,0 +1,236 @@
+import logging
+import re
+from typing import Dict, List, Tuple
+from fastapi import HTTPException,status
+from fastapi.responses import JSONResponse
+from starlette.requests import HTTPConnection
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from .auth import AuthService
+
+logger = logging.getLogger(__name__)
+
+# bytes a multipart body adds around the file it carries
+MULTIPART_OVERHEAD = 64 * 1024
+
+class UploadAdmissionController:
+
+    def __init__(
+        self,
+        max_concurrent:int,
+        max_concurrent_per_user:int,
+        max_bytes_in_flight:int,
+        retry_after:int
+    ):
+        '''
+        Docstring for __init__
+
+        bounds the uploads this worker receives at once, so a burst of uploads never takes
+        the memory, disk and threads the rest of the api needs
+
+        :param max_concurrent: max number of uploads at once
+        :type max_concurrent: int
+        :param max_concurrent_per_user: max number of uploads of the same user at once
+        :type max_concurrent_per_user: int
+        :param max_bytes_in_flight: max sum of the sizes of the uploads at once
+        :type max_bytes_in_flight: int
+        :param retry_after: seconds suggested to the rejected clients
+        :type retry_after: int
+        '''
+        self._max_concurrent = max_concurrent
+        self._max_concurrent_per_user = max_concurrent_per_user
+        self._max_bytes_in_flight = max_bytes_in_flight
+        self._retry_after = retry_after
+        self._uploads = 0
+        self._uploads_per_user:Dict[str,int] = {}
+        self._bytes_in_flight = 0
+        self._admitted = 0
+        self._rejected = 0
+        self._aborted = 0
+
+    @property
+    def uploads(self) -> int:
+        return self._uploads
+
+    @property
+    def bytes_in_flight(self) -> int:
+        return self._bytes_in_flight
+
+    def stats(self) -> Dict[str,int]:
+        '''
+        Docstring for stats
+
+        :return: state and counters of this worker since it started
+        :rtype: Dict[str, int]
+        '''
+        return {
+            'uploads':self._uploads,
+            'bytes_in_flight':self._bytes_in_flight,
+            'admitted':self._admitted,
+            'rejected':self._rejected,
+            'aborted':self._aborted
+        }
+
+    def _reject(self,status_code:int,detail:str) -> HTTPException:
+        self._rejected += 1
+        logger.warning(f'Upload rejected: {detail}')
+        return HTTPException(
+            status_code=status_code,
+            detail=detail,
+            headers={'Retry-After':str(self._retry_after)}
+        )
+
+    def admit(self,user:str,size:int) -> None:
+        '''
+        Docstring for admit
+
+        reserves room for an upload, nothing is reserved if it is rejected
+
+        :param user: who uploads
+        :type user: str
+        :param size: bytes reserved for the body of the upload
+        :type size: int
+        :raises HTTPException: 429 if the user has too many uploads, 503 if the worker does
+        '''
+        if self._uploads_per_user.get(user,0) >= self._max_concurrent_per_user:
+            raise self._reject(
+                status.HTTP_429_TOO_MANY_REQUESTS,
+                f'No more than {self._max_concurrent_per_user} uploads of the same user at once'
+            )
+        if self._uploads >= self._max_concurrent:
+            raise self._reject(
+                status.HTTP_503_SERVICE_UNAVAILABLE,
+                'Too many uploads at once, try again later'
+            )
+        # an upload alone larger than the budget is still let in when nothing else is uploading
+        if self._uploads > 0 and self._bytes_in_flight + size > self._max_bytes_in_flight:
+            raise self._reject(
+                status.HTTP_503_SERVICE_UNAVAILABLE,
+                'Too many bytes being uploaded at once, try again later'
+            )
+        self._uploads += 1
+        self._uploads_per_user[user] = self._uploads_per_user.get(user,0) + 1
+        self._bytes_in_flight += size
+        self._admitted += 1
+
+    def release(self,user:str,size:int) -> None:
+        '''
+        Docstring for release
+
+        :param user: who uploaded
+        :type user: str
+        :param size: bytes reserved by 'admit'
+        :type size: int
+        '''
+        self._uploads -= 1
+        self._bytes_in_flight -= size
+        uploads = self._uploads_per_user.get(user,0) - 1
+        if uploads > 0:
+            self._uploads_per_user[user] = uploads
+        else:
+            self._uploads_per_user.pop(user,None)
+
+    def abort(self,max_size:int) -> HTTPException:
+        '''
+        Docstring for abort
+
+        :param max_size: bytes the upload was allowed to send
+        :type max_size: int
+        :return: the error that stops an upload that sent more bytes than allowed
+        :rtype: HTTPException
+        '''
+        self._aborted += 1
+        return HTTPException(
+            status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+            detail=f'The upload can not be larger than {max_size} bytes'
+        )
+
+class UploadAdmissionMiddleware:
+
+    def __init__(
+        self,
+        app:ASGIApp,
+        controller:UploadAdmissionController,
+        routes:List[Tuple[str,str,int]]
+    ):
+        '''
+        Docstring for __init__
+
+        admits the uploads before their body is read. The size is taken from the
+        'Content-Length' header, and the body is cut as soon as it sends more bytes
+        than that or than the route allows
+
+        :type app: ASGIApp
+        :type controller: UploadAdmissionController
+        :param routes: method, path pattern and max body size of each upload route
+        :type routes: List[Tuple[str, str, int]]
+        '''
+        self._app = app
+        self._controller = controller
+        self._routes = [(method,re.compile(pattern),max_size) for method,pattern,max_size in routes]
+
+    def _max_size(self,scope:Scope) -> int | None:
+        for method,pattern,max_size in self._routes:
+            if scope['method'] == method and pattern.fullmatch(scope['path']):
+                return max_size
+        return None
+
+    def _admit(self,connection:HTTPConnection,max_size:int) -> Tuple[str,int]:
+        content_length = connection.headers.get('content-length')
+        size = max_size
+        if content_length is not None:
+            if not content_length.isdigit():
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail='Invalid Content-Length header'
+                )
+            size = int(content_length)
+            if size > max_size:
+                raise HTTPException(
+                    status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+                    detail=f'The upload can not be larger than {max_size} bytes'
+                )
+        user = AuthService.get_connection_subject(connection)
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail='Missing authorization token',
+                headers={'WWW-Authenticate':'Bearer'}
+            )
+        self._controller.admit(user,size)
+        return user,size
+
+    async def __call__(self,scope:Scope,receive:Receive,send:Send) -> None:
+        if scope['type'] != 'http':
+            await self._app(scope,receive,send)
+            return
+        max_size = self._max_size(scope)
+        if max_size is None:
+            await self._app(scope,receive,send)
+            return
+        try:
+            user,size = self._admit(HTTPConnection(scope),max_size)
+        except HTTPException as e:
+            response = JSONResponse(
+                status_code=e.status_code,
+                content={'detail':e.detail},
+                headers=e.headers
+            )
+            await response(scope,receive,send)
+            return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message['type'] == 'http.request':
+                received += len(message.get('body',b''))
+                if received > size:
+                    # raised inside the body parsing, so the app answers it
+                    raise self._controller.abort(size)
+            return message
+
+        try:
+            await self._app(scope,limited_receive,send)
+        finally:
+            self._controller.release(user,size)
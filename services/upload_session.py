@@ -0,0 +1,329 @@
+import asyncio
+import datetime
+import logging
+import os
+from collections import OrderedDict
+from contextlib import suppress
+from hashlib import sha1,sha256
+from pathlib import Path
+from typing import IO, Tuple
+from fastapi import HTTPException,status
+from repositories import UploadSessionRepository
+from models import UploadSession
+from schemas import UploadSessionCreateSchema,UploadSessionSchema
+from settings import ENVIRONMENT
+from tools import UPLOAD_OFFSET_HEADER
+from .external import FileValidationResult
+from .service import Service
+
+logger = logging.getLogger(__name__)
+
+# max number of sessions whose hash state is kept by this worker
+_HASH_STATES_SIZE = 1024
+
+class _HashState:
+    '''
+    hashes of the bytes received by a session, hash objects can not be saved so they only
+    live in the worker that received the bytes
+    '''
+
+    def __init__(self):
+        self.received = 0
+        self.sha256 = sha256()
+        self.sha1 = sha1()
+
+    def update(self,data:bytes) -> None:
+        self.sha256.update(data)
+        self.sha1.update(data)
+        self.received += len(data)
+
+    def copy(self) -> '_HashState':
+        state = _HashState()
+        state.received = self.received
+        state.sha256 = self.sha256.copy()
+        state.sha1 = self.sha1.copy()
+        return state
+
+_hash_states:OrderedDict[str,_HashState] = OrderedDict()
+
+def _get_hash_state(session_id:str) -> _HashState | None:
+    state = _hash_states.get(session_id)
+    if state is not None:
+        _hash_states.move_to_end(session_id)
+    return state
+
+def _set_hash_state(session_id:str,state:_HashState) -> None:
+    _hash_states[session_id] = state
+    _hash_states.move_to_end(session_id)
+    while len(_hash_states) > _HASH_STATES_SIZE:
+        _hash_states.popitem(last=False)
+
+class UploadSessionService(Service[
+    UploadSession,
+    UploadSessionRepository,
+    UploadSessionCreateSchema,
+    UploadSessionCreateSchema,
+    UploadSessionSchema
+]):
+
+    def __init__(
+        self,
+        repository:UploadSessionRepository,
+        exclude_fields:set=set(),
+        exclude_unset:bool=True
+    ):
+        super().__init__(UploadSession,UploadSessionSchema,repository,exclude_fields,exclude_unset)
+
+    @staticmethod
+    def file_path(session_id:str) -> Path:
+        '''
+        Docstring for file_path
+
+        :type session_id: str
+        :return: path of the file with the bytes received by the session
+        :rtype: Path
+        '''
+        return Path(ENVIRONMENT.UPLOAD_SESSIONS_DIR) / f'{session_id}.part'
+
+    @staticmethod
+    def _create_file(path:Path) -> None:
+        path.parent.mkdir(parents=True,exist_ok=True)
+        path.touch()
+
+    @staticmethod
+    def _catch_up(file:IO[bytes],state:_HashState | None,received:int) -> _HashState:
+        '''
+        Docstring for _catch_up
+
+        :param state: hash state known by this worker
+        :type state: _HashState | None
+        :param received: bytes of the file saved as received
+        :type received: int
+        :return: the state of the first 'received' bytes, rebuilt from the file when the one
+        of this worker is missing or stale
+        :rtype: _HashState
+        '''
+        if state is not None and state.received == received:
+            return state
+        state = _HashState()
+        file.seek(0)
+        while state.received < received:
+            chunk = file.read(min(ENVIRONMENT.CHUNK_SIZE,received - state.received))
+            if not chunk:
+                raise ValueError(f'Only {state.received} of {received} bytes were found')
+            state.update(chunk)
+        return state
+
+    @classmethod
+    def _catch_up_file(cls,path:Path,state:_HashState | None,received:int) -> _HashState:
+        with open(path,'rb') as file:
+            return cls._catch_up(file,state,received)
+
+    @classmethod
+    def _write_chunk(cls,path:Path,offset:int,data:bytes,state:_HashState | None) -> _HashState:
+        state = cls._catch_up_file(path,state,offset)
+        with open(path,'r+b') as file:
+            file.seek(offset)
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        # the known state is left as it was until the chunk is saved as received
+        new_state = state.copy()
+        new_state.update(data)
+        return new_state
+
+    def _check_session(self,db_session:UploadSession | None,user_id:str) -> UploadSession:
+        '''
+        Docstring for _check_session
+
+        :param db_session: session asked by the user
+        :type db_session: UploadSession | None
+        :param user_id: id of the user asking for the session
+        :type user_id: str
+        :return: the session if it belongs to the user and is not expired
+        :rtype: UploadSession
+        '''
+        if not db_session or db_session.user_id != user_id:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail='No upload session was found'
+            )
+        if db_session.expires_at < datetime.datetime.now(datetime.UTC): # type: ignore
+            raise HTTPException(
+                status_code=status.HTTP_410_GONE,
+                detail='The upload session has expired'
+            )
+        return db_session
+
+    async def remove_expired(self) -> int:
+        '''
+        Docstring for remove_expired
+
+        :return: number of expired sessions removed with their files
+        :rtype: int
+        '''
+        ids = await self._repository.delete_expired(datetime.datetime.now(datetime.UTC))
+        for session_id in ids:
+            _hash_states.pop(session_id,None)
+            with suppress(FileNotFoundError):
+                await asyncio.to_thread(self.file_path(session_id).unlink)
+        return len(ids)
+
+    async def open_session(self,value:UploadSessionCreateSchema,user_id:str) -> UploadSessionSchema:
+        '''
+        Docstring for open_session
+
+        creates a resumable upload, the expired ones are removed first
+
+        :type value: UploadSessionCreateSchema
+        :param user_id: id of the user uploading the track
+        :type user_id: str
+        :rtype: UploadSessionSchema
+        '''
+        if value.size > ENVIRONMENT.MAX_TRACK_SIZE:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f'File too large. Maximum size allowed is {ENVIRONMENT.MAX_TRACK_SIZE // (1024*1024)}MB'
+            )
+        await self.remove_expired()
+        session = await self.create(
+            value,
+            user_id=user_id,
+            received=0,
+            expires_at=datetime.datetime.now(datetime.UTC) + datetime.timedelta(
+                seconds=ENVIRONMENT.UPLOAD_SESSION_LIFETIME
+            )
+        )
+        if not session:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail='The upload session could not be created'
+            )
+        await asyncio.to_thread(self._create_file,self.file_path(session.id))
+        _set_hash_state(session.id,_HashState())
+        return session
+
+    async def get_session(self,session_id:str,user_id:str) -> UploadSessionSchema:
+        '''
+        Docstring for get_session
+
+        :type session_id: str
+        :type user_id: str
+        :return: the session, its 'received' field is the offset of the next chunk
+        :rtype: UploadSessionSchema
+        '''
+        db_session = self._check_session(await self._repository.get_by_id(session_id),user_id)
+        return await self._to_schema(db_session) # type: ignore
+
+    async def append(self,session_id:str,user_id:str,offset:int,data:bytes) -> UploadSessionSchema:
+        '''
+        Docstring for append
+
+        writes a chunk at the end of the received bytes, the session row is locked while the
+        chunk is written so any worker can receive the next one
+
+        :type session_id: str
+        :type user_id: str
+        :param offset: position of the chunk, must be the bytes already received
+        :type offset: int
+        :param data: bytes of the chunk
+        :type data: bytes
+        :rtype: UploadSessionSchema
+        '''
+        db_session = await self._repository.lock(session_id)
+        try:
+            db_session = self._check_session(db_session,user_id)
+            received = int(db_session.received) # type: ignore
+            if offset != received:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail=f'The next chunk starts at {received}',
+                    headers={UPLOAD_OFFSET_HEADER:str(received)}
+                )
+            if offset + len(data) > db_session.size: # type: ignore
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail='The chunk goes beyond the size of the file'
+                )
+            session = await self._to_schema(db_session)
+            state = await asyncio.to_thread(
+                self._write_chunk,
+                self.file_path(session_id),
+                offset,
+                data,
+                _get_hash_state(session_id)
+            )
+        except HTTPException:
+            await self._repository.unlock()
+            raise
+        except (OSError,ValueError) as e:
+            await self._repository.unlock()
+            logger.error(f'Upload session {session_id} lost its data: {e}')
+            raise HTTPException(
+                status_code=status.HTTP_410_GONE,
+                detail='The data of the upload session was lost'
+            )
+        except BaseException:
+            await self._repository.unlock()
+            raise
+        if not await self._repository.set_received(session_id,state.received):
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail='The chunk could not be saved'
+            )
+        _set_hash_state(session_id,state)
+        return session.model_copy(update={'received':state.received}) # type: ignore
+
+    async def finalize(self,session_id:str,user_id:str) -> Tuple[UploadSessionSchema,FileValidationResult]:
+        '''
+        Docstring for finalize
+
+        the hashes of the file come from the state kept while the chunks were received, the
+        file is only read again if they were received by another worker
+
+        :type session_id: str
+        :type user_id: str
+        :return: the complete session and the size, hashes and extension of its file
+        :rtype: Tuple[UploadSessionSchema, FileValidationResult]
+        '''
+        session = await self.get_session(session_id,user_id)
+        if session.received != session.size:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f'Only {session.received} of {session.size} bytes were received',
+                headers={UPLOAD_OFFSET_HEADER:str(session.received)}
+            )
+        try:
+            state = await asyncio.to_thread(
+                self._catch_up_file,
+                self.file_path(session_id),
+                _get_hash_state(session_id),
+                session.size
+            )
+        except (OSError,ValueError) as e:
+            logger.error(f'Upload session {session_id} lost its data: {e}')
+            raise HTTPException(
+                status_code=status.HTTP_410_GONE,
+                detail='The data of the upload session was lost'
+            )
+        _set_hash_state(session_id,state)
+        return session,FileValidationResult(
+            session.size,
+            state.sha256.hexdigest(),
+            Path(session.file_name).suffix,
+            state.sha1.hexdigest()
+        )
+
+    async def close_session(self,session_id:str) -> bool:
+        '''
+        Docstring for close_session
+
+        removes the session and its file
+
+        :type session_id: str
+        :rtype: bool
+        '''
+        _hash_states.pop(session_id,None)
+        with suppress(FileNotFoundError):
+            await asyncio.to_thread(self.file_path(session_id).unlink)
+        return await self.delete(session_id)
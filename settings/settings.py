@@ -1,5 +1,6 @@
 import dotenv
 import os
+import tempfile
 import json
 from passlib.context import CryptContext
 from typing import List, Literal
@@ -45,6 +46,138 @@ class Settings:
             'SQLALCHEMY_POOL_TIMEOUT',
             'pool timeout for sqlalchemy'
         ))
+        self._plays_flush_interval:float = float(os.getenv(
+            'PLAYS_FLUSH_INTERVAL',
+            '5'
+        ))
+        self._plays_flush_size:int = int(os.getenv(
+            'PLAYS_FLUSH_SIZE',
+            '1000'
+        ))
+        self._plays_max_pending:int = int(os.getenv(
+            'PLAYS_MAX_PENDING',
+            '10000'
+        ))
+        self._plays_dedup_window:float = float(os.getenv(
+            'PLAYS_DEDUP_WINDOW',
+            '0'
+        ))
+        self._plays_dedup_max_entries:int = int(os.getenv(
+            'PLAYS_DEDUP_MAX_ENTRIES',
+            '100000'
+        ))
+        self._search_rank_candidates:int = int(os.getenv(
+            'SEARCH_RANK_CANDIDATES',
+            '1000'
+        ))
+        self._search_index_enabled:bool = os.getenv(
+            'SEARCH_INDEX_ENABLED',
+            'false'
+        ).lower() == 'true'
+        self._search_index_refresh_interval:float = float(os.getenv(
+            'SEARCH_INDEX_REFRESH_INTERVAL',
+            '600'
+        ))
+        self._search_index_snapshot_dir:str = os.getenv(
+            'SEARCH_INDEX_SNAPSHOT_DIR',
+            ''
+        )
+        self._search_index_max_candidates:int = int(os.getenv(
+            'SEARCH_INDEX_MAX_CANDIDATES',
+            '10000'
+        ))
+        self._search_index_scan_batch_size:int = int(os.getenv(
+            'SEARCH_INDEX_SCAN_BATCH_SIZE',
+            '1000'
+        ))
+        self._content_hash_filter_enabled:bool = os.getenv(
+            'CONTENT_HASH_FILTER_ENABLED',
+            'true'
+        ).lower() == 'true'
+        self._content_hash_filter_capacity:int = int(os.getenv(
+            'CONTENT_HASH_FILTER_CAPACITY',
+            '1000000'
+        ))
+        self._content_hash_filter_error_rate:float = float(os.getenv(
+            'CONTENT_HASH_FILTER_ERROR_RATE',
+            '0.01'
+        ))
+        self._content_hash_filter_refresh_interval:float = float(os.getenv(
+            'CONTENT_HASH_FILTER_REFRESH_INTERVAL',
+            '3600'
+        ))
+        self._content_hash_cache_size:int = int(os.getenv(
+            'CONTENT_HASH_CACHE_SIZE',
+            '10000'
+        ))
+        self._content_hash_cache_ttl:float = float(os.getenv(
+            'CONTENT_HASH_CACHE_TTL',
+            '300'
+        ))
+        self._stream_cache_size:int = int(os.getenv(
+            'STREAM_CACHE_SIZE',
+            '0'
+        ))
+        self._stream_cache_dir:str = os.getenv(
+            'STREAM_CACHE_DIR',
+            ''
+        ) or os.path.join(tempfile.gettempdir(),'theplaylist_stream_cache')
+        self._storage_backend:str = os.getenv(
+            'STORAGE_BACKEND',
+            'backblazeb2'
+        ).lower()
+        self._local_storage_dir:str = os.getenv(
+            'LOCAL_STORAGE_DIR',
+            'storage'
+        )
+        self._local_storage_signing_key:str = os.getenv(
+            'LOCAL_STORAGE_SIGNING_KEY',
+            self._secret_key
+        )
+        self._local_storage_url_lifetime:int = int(os.getenv(
+            'LOCAL_STORAGE_URL_LIFETIME',
+            '600'
+        ))
+        self._local_storage_base_url:str = os.getenv(
+            'LOCAL_STORAGE_BASE_URL',
+            ''
+        )
+        self._storage_job_workers:int = int(os.getenv(
+            'STORAGE_JOB_WORKERS',
+            '2'
+        ))
+        self._storage_job_batch_size:int = int(os.getenv(
+            'STORAGE_JOB_BATCH_SIZE',
+            '10'
+        ))
+        self._storage_job_poll_interval:float = float(os.getenv(
+            'STORAGE_JOB_POLL_INTERVAL',
+            '5'
+        ))
+        self._storage_job_max_attempts:int = int(os.getenv(
+            'STORAGE_JOB_MAX_ATTEMPTS',
+            '8'
+        ))
+        self._storage_job_retry_delay:float = float(os.getenv(
+            'STORAGE_JOB_RETRY_DELAY',
+            '2'
+        ))
+        self._storage_job_max_retry_delay:float = float(os.getenv(
+            'STORAGE_JOB_MAX_RETRY_DELAY',
+            '600'
+        ))
+        self._storage_job_lease:float = float(os.getenv(
+            'STORAGE_JOB_LEASE',
+            '300'
+        ))
+        self._storage_job_retention:float = float(os.getenv(
+            'STORAGE_JOB_RETENTION',
+            '604800'
+        ))
+        self._stats_token:str = os.getenv(
+            'STATS_TOKEN',
+            ''
+        )
         self._min_username_length:int = int(os.getenv(
             'MIN_USERNAME_LENGTH',
             'minimun length for username'
@@ -118,6 +251,94 @@ class Settings:
             'BACKBLAZEB2_URL_LIFETIME',
             'lifetime of an authorization token for an url public'
         ))
+        self._backblazeb2_authorization_refresh:int = int(os.getenv(
+            'BACKBLAZEB2_AUTHORIZATION_REFRESH',
+            '43200'
+        ))
+        self._backblazeb2_authorization_retry:int = int(os.getenv(
+            'BACKBLAZEB2_AUTHORIZATION_RETRY',
+            '30'
+        ))
+        self._backblazeb2_download_authorization_lifetime:int = int(os.getenv(
+            'BACKBLAZEB2_DOWNLOAD_AUTHORIZATION_LIFETIME',
+            '86400'
+        ))
+        self._backblazeb2_download_authorization_prefix_length:int = int(os.getenv(
+            'BACKBLAZEB2_DOWNLOAD_AUTHORIZATION_PREFIX_LENGTH',
+            '0'
+        ))
+        self._backblazeb2_download_authorization_cache_size:int = int(os.getenv(
+            'BACKBLAZEB2_DOWNLOAD_AUTHORIZATION_CACHE_SIZE',
+            '10000'
+        ))
+        self._backblazeb2_max_concurrent_requests:int = int(os.getenv(
+            'BACKBLAZEB2_MAX_CONCURRENT_REQUESTS',
+            '8'
+        ))
+        self._backblazeb2_part_size:int = int(os.getenv(
+            'BACKBLAZEB2_PART_SIZE',
+            '10'
+        ))
+        self._backblazeb2_upload_workers:int = int(os.getenv(
+            'BACKBLAZEB2_UPLOAD_WORKERS',
+            '4'
+        ))
+        self._backblazeb2_part_retries:int = int(os.getenv(
+            'BACKBLAZEB2_PART_RETRIES',
+            '3'
+        ))
+        self._upload_validation_workers:int = int(os.getenv(
+            'UPLOAD_VALIDATION_WORKERS',
+            '2'
+        ))
+        self._upload_validation_max_queue:int = int(os.getenv(
+            'UPLOAD_VALIDATION_MAX_QUEUE',
+            '16'
+        ))
+        self._upload_max_concurrent:int = int(os.getenv(
+            'UPLOAD_MAX_CONCURRENT',
+            '16'
+        ))
+        self._upload_max_concurrent_per_user:int = int(os.getenv(
+            'UPLOAD_MAX_CONCURRENT_PER_USER',
+            '2'
+        ))
+        self._upload_max_bytes_in_flight:int = int(os.getenv(
+            'UPLOAD_MAX_BYTES_IN_FLIGHT',
+            '1024'
+        ))
+        self._upload_retry_after:int = int(os.getenv(
+            'UPLOAD_RETRY_AFTER',
+            '5'
+        ))
+        self._upload_sessions_dir:str = os.getenv(
+            'UPLOAD_SESSIONS_DIR',
+            ''
+        ) or os.path.join(tempfile.gettempdir(),'theplaylist_upload_sessions')
+        self._ingestion_dir:str = os.getenv(
+            'INGESTION_DIR',
+            ''
+        ) or os.path.join(tempfile.gettempdir(),'theplaylist_ingestions')
+        self._idempotency_store:str = os.getenv(
+            'IDEMPOTENCY_STORE',
+            'memory'
+        ).lower()
+        self._idempotency_ttl:int = int(os.getenv(
+            'IDEMPOTENCY_TTL',
+            '86400'
+        ))
+        self._idempotency_wait:float = float(os.getenv(
+            'IDEMPOTENCY_WAIT',
+            '300'
+        ))
+        self._upload_session_lifetime:int = int(os.getenv(
+            'UPLOAD_SESSION_LIFETIME',
+            '86400'
+        ))
+        self._upload_session_max_chunk:int = int(os.getenv(
+            'UPLOAD_SESSION_MAX_CHUNK',
+            '8'
+        ))
         self._max_track_size:int = int(os.getenv(
             'MAX_TRACK_SIZE',
             'max size allowed for uploading'
@@ -153,6 +374,11 @@ class Settings:
             'max time to wait for an url download generation'
         ))
 
+        self._stream_timeout:int = int(os.getenv(
+            'STREAM_TIMEOUT',
+            '120'
+        ))
+
         self._rename_timeout:int = int(os.getenv(
             'RENAME_TIMEOUT',
             'max time to wait for rename a track'
@@ -192,6 +418,10 @@ class Settings:
     def URL_DOWNLOAD_TIMEOUT(self) -> int:
         return self._url_download_timeout
     
+    @property
+    def STREAM_TIMEOUT(self) -> int:
+        return self._stream_timeout
+
     @property
     def UPLOAD_TIMEOUT(self) -> int:
         return self._upload_timeout
@@ -232,6 +462,229 @@ class Settings:
         '''
         return self._max_track_size * 1024 * 1024
 
+    @property
+    def BACKBLAZEB2_AUTHORIZATION_REFRESH(self) -> int:
+        '''
+        Docstring for BACKBLAZEB2_AUTHORIZATION_REFRESH
+        
+        :return: seconds between background re-authorizations of the backblazeb2 account
+        :rtype: int
+        '''
+        return self._backblazeb2_authorization_refresh
+    
+    @property
+    def BACKBLAZEB2_AUTHORIZATION_RETRY(self) -> int:
+        '''
+        Docstring for BACKBLAZEB2_AUTHORIZATION_RETRY
+        
+        :return: seconds to wait before retrying a failed backblazeb2 authorization
+        :rtype: int
+        '''
+        return self._backblazeb2_authorization_retry
+
+    @property
+    def BACKBLAZEB2_DOWNLOAD_AUTHORIZATION_LIFETIME(self) -> int:
+        '''
+        Docstring for BACKBLAZEB2_DOWNLOAD_AUTHORIZATION_LIFETIME
+        
+        :return: lifetime in seconds of a cached download authorization token, never lower
+        than twice 'BACKBLAZEB2_URL_LIFETIME' so every token serves urls for a while
+        :rtype: int
+        '''
+        return max(self._backblazeb2_download_authorization_lifetime,2 * self._backblazeb2_url_lifetime)
+    
+    @property
+    def BACKBLAZEB2_DOWNLOAD_AUTHORIZATION_PREFIX_LENGTH(self) -> int:
+        '''
+        Docstring for BACKBLAZEB2_DOWNLOAD_AUTHORIZATION_PREFIX_LENGTH
+        
+        :return: length of the file name prefix covered by one download authorization token,
+        0 means the whole file name
+        :rtype: int
+        '''
+        return self._backblazeb2_download_authorization_prefix_length
+    
+    @property
+    def BACKBLAZEB2_DOWNLOAD_AUTHORIZATION_CACHE_SIZE(self) -> int:
+        '''
+        Docstring for BACKBLAZEB2_DOWNLOAD_AUTHORIZATION_CACHE_SIZE
+        
+        :return: max number of download authorization tokens kept in memory
+        :rtype: int
+        '''
+        return self._backblazeb2_download_authorization_cache_size
+
+    @property
+    def BACKBLAZEB2_MAX_CONCURRENT_REQUESTS(self) -> int:
+        '''
+        Docstring for BACKBLAZEB2_MAX_CONCURRENT_REQUESTS
+        
+        :return: max number of backblazeb2 requests a single batch operation runs at once
+        :rtype: int
+        '''
+        return self._backblazeb2_max_concurrent_requests
+
+    @property
+    def BACKBLAZEB2_PART_SIZE(self) -> int:
+        '''
+        Docstring for BACKBLAZEB2_PART_SIZE
+        
+        :return: size of the parts of the files uploaded in parts, in bytes, at least 5MB
+        :rtype: int
+        '''
+        return self._backblazeb2_part_size * 1024 * 1024
+
+    @property
+    def BACKBLAZEB2_UPLOAD_WORKERS(self) -> int:
+        '''
+        Docstring for BACKBLAZEB2_UPLOAD_WORKERS
+        
+        :return: parts of a single file uploaded at the same time
+        :rtype: int
+        '''
+        return self._backblazeb2_upload_workers
+
+    @property
+    def BACKBLAZEB2_PART_RETRIES(self) -> int:
+        '''
+        Docstring for BACKBLAZEB2_PART_RETRIES
+        
+        :return: times a failed part is sent again before the upload is abandoned
+        :rtype: int
+        '''
+        return self._backblazeb2_part_retries
+
+    @property
+    def UPLOAD_VALIDATION_WORKERS(self) -> int:
+        '''
+        Docstring for UPLOAD_VALIDATION_WORKERS
+        
+        :return: number of threads that hash and check the uploads
+        :rtype: int
+        '''
+        return self._upload_validation_workers
+
+    @property
+    def UPLOAD_VALIDATION_MAX_QUEUE(self) -> int:
+        '''
+        Docstring for UPLOAD_VALIDATION_MAX_QUEUE
+        
+        :return: max number of uploads waiting for a validation thread, the rest are rejected
+        :rtype: int
+        '''
+        return self._upload_validation_max_queue
+
+    @property
+    def UPLOAD_MAX_CONCURRENT(self) -> int:
+        '''
+        Docstring for UPLOAD_MAX_CONCURRENT
+        
+        :return: max number of uploads every worker receives at once
+        :rtype: int
+        '''
+        return self._upload_max_concurrent
+
+    @property
+    def UPLOAD_MAX_CONCURRENT_PER_USER(self) -> int:
+        '''
+        Docstring for UPLOAD_MAX_CONCURRENT_PER_USER
+        
+        :return: max number of uploads of the same user every worker receives at once
+        :rtype: int
+        '''
+        return self._upload_max_concurrent_per_user
+
+    @property
+    def UPLOAD_MAX_BYTES_IN_FLIGHT(self) -> int:
+        '''
+        Docstring for UPLOAD_MAX_BYTES_IN_FLIGHT
+        
+        :return: max sum of the sizes of the uploads every worker receives at once, in bytes
+        :rtype: int
+        '''
+        return self._upload_max_bytes_in_flight * 1024 * 1024
+
+    @property
+    def UPLOAD_RETRY_AFTER(self) -> int:
+        '''
+        Docstring for UPLOAD_RETRY_AFTER
+        
+        :return: seconds the rejected uploads are told to wait before trying again
+        :rtype: int
+        '''
+        return self._upload_retry_after
+
+    @property
+    def UPLOAD_SESSIONS_DIR(self) -> str:
+        '''
+        Docstring for UPLOAD_SESSIONS_DIR
+        
+        :return: directory of the files of the resumable uploads, must be shared by all the workers
+        :rtype: str
+        '''
+        return self._upload_sessions_dir
+
+    @property
+    def INGESTION_DIR(self) -> str:
+        '''
+        Docstring for INGESTION_DIR
+        
+        :return: directory of the ingested files waiting to be stored, must be shared by all the workers
+        :rtype: str
+        '''
+        return self._ingestion_dir
+
+    @property
+    def IDEMPOTENCY_STORE(self) -> str:
+        '''
+        Docstring for IDEMPOTENCY_STORE
+        
+        :return: where the responses of the requests with an 'Idempotency-Key' are kept, 'memory'
+        for each worker, 'database' to share them between the workers or 'none' to disable them
+        :rtype: str
+        '''
+        return self._idempotency_store
+
+    @property
+    def IDEMPOTENCY_TTL(self) -> int:
+        '''
+        Docstring for IDEMPOTENCY_TTL
+        
+        :return: seconds a response is replayed to the retries of its request
+        :rtype: int
+        '''
+        return self._idempotency_ttl
+
+    @property
+    def IDEMPOTENCY_WAIT(self) -> float:
+        '''
+        Docstring for IDEMPOTENCY_WAIT
+        
+        :return: seconds a retry waits for its request to complete before it is rejected
+        :rtype: float
+        '''
+        return self._idempotency_wait
+
+    @property
+    def UPLOAD_SESSION_LIFETIME(self) -> int:
+        '''
+        Docstring for UPLOAD_SESSION_LIFETIME
+        
+        :return: seconds a resumable upload can take before it is discarded
+        :rtype: int
+        '''
+        return self._upload_session_lifetime
+
+    @property
+    def UPLOAD_SESSION_MAX_CHUNK(self) -> int:
+        '''
+        Docstring for UPLOAD_SESSION_MAX_CHUNK
+        
+        :return: max size of a chunk of a resumable upload, in bytes
+        :rtype: int
+        '''
+        return self._upload_session_max_chunk * 1024 * 1024
+
     @property
     def BACKBLAZEB2_URL_LIFETIME(self) -> int:
         return self._backblazeb2_url_lifetime
@@ -340,6 +793,337 @@ class Settings:
         '''
         return self._sqlalchemy_pool_timeout
 
+    @property
+    def PLAYS_FLUSH_INTERVAL(self) -> float:
+        '''
+        Docstring for PLAYS_FLUSH_INTERVAL
+        
+        :return: seconds between flushes of the buffered plays, 0 writes every play directly
+        :rtype: float
+        '''
+        return self._plays_flush_interval
+
+    @property
+    def PLAYS_FLUSH_SIZE(self) -> int:
+        '''
+        Docstring for PLAYS_FLUSH_SIZE
+        
+        :return: number of buffered ids that triggers a flush before the interval ends
+        :rtype: int
+        '''
+        return self._plays_flush_size
+
+    @property
+    def PLAYS_MAX_PENDING(self) -> int:
+        '''
+        Docstring for PLAYS_MAX_PENDING
+        
+        :return: max number of buffered ids, plays for new ids beyond it are written directly
+        :rtype: int
+        '''
+        return max(self._plays_max_pending,self._plays_flush_size)
+
+    @property
+    def PLAYS_DEDUP_WINDOW(self) -> float:
+        '''
+        Docstring for PLAYS_DEDUP_WINDOW
+        
+        :return: seconds during which repeated plays of the same user are counted once, 0 disables it
+        :rtype: float
+        '''
+        return self._plays_dedup_window
+
+    @property
+    def PLAYS_DEDUP_MAX_ENTRIES(self) -> int:
+        '''
+        Docstring for PLAYS_DEDUP_MAX_ENTRIES
+        
+        :return: max number of remembered (user, id) pairs for the plays dedup
+        :rtype: int
+        '''
+        return self._plays_dedup_max_entries
+
+    @property
+    def SEARCH_RANK_CANDIDATES(self) -> int:
+        '''
+        Docstring for SEARCH_RANK_CANDIDATES
+        
+        :return: max number of full text matches scored by a ranked search
+        :rtype: int
+        '''
+        return self._search_rank_candidates
+
+    @property
+    def SEARCH_INDEX_ENABLED(self) -> bool:
+        '''
+        Docstring for SEARCH_INDEX_ENABLED
+        
+        :return: whether every worker keeps an in memory index for the substring searches
+        :rtype: bool
+        '''
+        return self._search_index_enabled
+
+    @property
+    def SEARCH_INDEX_REFRESH_INTERVAL(self) -> float:
+        '''
+        Docstring for SEARCH_INDEX_REFRESH_INTERVAL
+        
+        :return: seconds between rebuilds of the search indexes from the database, 0 disables them
+        :rtype: float
+        '''
+        return self._search_index_refresh_interval
+
+    @property
+    def SEARCH_INDEX_SNAPSHOT_DIR(self) -> str:
+        '''
+        Docstring for SEARCH_INDEX_SNAPSHOT_DIR
+        
+        :return: directory of the search index snapshots, empty disables them
+        :rtype: str
+        '''
+        return self._search_index_snapshot_dir
+
+    @property
+    def SEARCH_INDEX_MAX_CANDIDATES(self) -> int:
+        '''
+        Docstring for SEARCH_INDEX_MAX_CANDIDATES
+        
+        :return: max number of matches of a search answered by the search index, the database
+        answers the ones with more
+        :rtype: int
+        '''
+        return self._search_index_max_candidates
+
+    @property
+    def SEARCH_INDEX_SCAN_BATCH_SIZE(self) -> int:
+        '''
+        Docstring for SEARCH_INDEX_SCAN_BATCH_SIZE
+        
+        :return: rows fetched at once while the search indexes are built
+        :rtype: int
+        '''
+        return self._search_index_scan_batch_size
+
+    @property
+    def CONTENT_HASH_FILTER_ENABLED(self) -> bool:
+        '''
+        Docstring for CONTENT_HASH_FILTER_ENABLED
+        
+        :return: if True every worker keeps a bloom filter of the content hashes of the tracks
+        :rtype: bool
+        '''
+        return self._content_hash_filter_enabled
+
+    @property
+    def CONTENT_HASH_FILTER_CAPACITY(self) -> int:
+        '''
+        Docstring for CONTENT_HASH_FILTER_CAPACITY
+        
+        :return: min number of hashes the filter is sized for, it grows with the tracks
+        :rtype: int
+        '''
+        return self._content_hash_filter_capacity
+
+    @property
+    def CONTENT_HASH_FILTER_ERROR_RATE(self) -> float:
+        '''
+        Docstring for CONTENT_HASH_FILTER_ERROR_RATE
+        
+        :return: share of the new contents that still need a database lookup
+        :rtype: float
+        '''
+        return self._content_hash_filter_error_rate
+
+    @property
+    def CONTENT_HASH_FILTER_REFRESH_INTERVAL(self) -> float:
+        '''
+        Docstring for CONTENT_HASH_FILTER_REFRESH_INTERVAL
+        
+        :return: seconds between rebuilds of the filter from the database
+        :rtype: float
+        '''
+        return self._content_hash_filter_refresh_interval
+
+    @property
+    def CONTENT_HASH_CACHE_SIZE(self) -> int:
+        '''
+        Docstring for CONTENT_HASH_CACHE_SIZE
+        
+        :return: number of known content hashes kept by every worker for the preflights, 0 disables it
+        :rtype: int
+        '''
+        return self._content_hash_cache_size
+
+    @property
+    def CONTENT_HASH_CACHE_TTL(self) -> float:
+        '''
+        Docstring for CONTENT_HASH_CACHE_TTL
+        
+        :return: seconds a known content hash is trusted without asking the database
+        :rtype: float
+        '''
+        return self._content_hash_cache_ttl
+
+    @property
+    def STREAM_CACHE_SIZE(self) -> int:
+        '''
+        Docstring for STREAM_CACHE_SIZE
+        
+        :return: bytes of track files every worker keeps on its disk for the streams, 0 disables it
+        :rtype: int
+        '''
+        return self._stream_cache_size * 1024 * 1024
+
+    @property
+    def STREAM_CACHE_DIR(self) -> str:
+        '''
+        Docstring for STREAM_CACHE_DIR
+        
+        :return: folder of the track files cached for the streams, every worker uses its own folder inside
+        :rtype: str
+        '''
+        return self._stream_cache_dir
+
+    @property
+    def STORAGE_BACKEND(self) -> str:
+        '''
+        Docstring for STORAGE_BACKEND
+        
+        :return: where the track files are kept, 'backblazeb2' or 'local'
+        :rtype: str
+        '''
+        return self._storage_backend
+
+    @property
+    def LOCAL_STORAGE_DIR(self) -> str:
+        '''
+        Docstring for LOCAL_STORAGE_DIR
+        
+        :return: folder of the track files when the local storage is used
+        :rtype: str
+        '''
+        return self._local_storage_dir
+
+    @property
+    def LOCAL_STORAGE_SIGNING_KEY(self) -> str:
+        '''
+        Docstring for LOCAL_STORAGE_SIGNING_KEY
+        
+        :return: key of the signatures of the local download urls
+        :rtype: str
+        '''
+        return self._local_storage_signing_key
+
+    @property
+    def LOCAL_STORAGE_URL_LIFETIME(self) -> int:
+        '''
+        Docstring for LOCAL_STORAGE_URL_LIFETIME
+        
+        :return: seconds a local download url is valid
+        :rtype: int
+        '''
+        return self._local_storage_url_lifetime
+
+    @property
+    def LOCAL_STORAGE_BASE_URL(self) -> str:
+        '''
+        Docstring for LOCAL_STORAGE_BASE_URL
+        
+        :return: scheme and host of the local download urls, empty for urls relative to the api
+        :rtype: str
+        '''
+        return self._local_storage_base_url
+
+    @property
+    def STORAGE_JOB_WORKERS(self) -> int:
+        '''
+        Docstring for STORAGE_JOB_WORKERS
+        
+        :return: number of tasks of every worker running the storage jobs, 0 disables them
+        :rtype: int
+        '''
+        return self._storage_job_workers
+
+    @property
+    def STORAGE_JOB_BATCH_SIZE(self) -> int:
+        '''
+        Docstring for STORAGE_JOB_BATCH_SIZE
+        
+        :return: max number of storage jobs claimed at once by a task
+        :rtype: int
+        '''
+        return self._storage_job_batch_size
+
+    @property
+    def STORAGE_JOB_POLL_INTERVAL(self) -> float:
+        '''
+        Docstring for STORAGE_JOB_POLL_INTERVAL
+        
+        :return: seconds between looks for due storage jobs
+        :rtype: float
+        '''
+        return self._storage_job_poll_interval
+
+    @property
+    def STORAGE_JOB_MAX_ATTEMPTS(self) -> int:
+        '''
+        Docstring for STORAGE_JOB_MAX_ATTEMPTS
+        
+        :return: attempts before a storage job is marked as failed
+        :rtype: int
+        '''
+        return self._storage_job_max_attempts
+
+    @property
+    def STORAGE_JOB_RETRY_DELAY(self) -> float:
+        '''
+        Docstring for STORAGE_JOB_RETRY_DELAY
+        
+        :return: seconds before the first retry of a storage job, doubled on every failure
+        :rtype: float
+        '''
+        return self._storage_job_retry_delay
+
+    @property
+    def STORAGE_JOB_MAX_RETRY_DELAY(self) -> float:
+        '''
+        Docstring for STORAGE_JOB_MAX_RETRY_DELAY
+        
+        :return: max seconds between retries of a storage job
+        :rtype: float
+        '''
+        return self._storage_job_max_retry_delay
+
+    @property
+    def STORAGE_JOB_LEASE(self) -> float:
+        '''
+        Docstring for STORAGE_JOB_LEASE
+        
+        :return: seconds a claimed storage job is reserved before another task can run it
+        :rtype: float
+        '''
+        return self._storage_job_lease
+
+    @property
+    def STORAGE_JOB_RETENTION(self) -> float:
+        '''
+        Docstring for STORAGE_JOB_RETENTION
+        
+        :return: seconds the finished storage jobs are kept
+        :rtype: float
+        '''
+        return self._storage_job_retention
+
+    @property
+    def STATS_TOKEN(self) -> str:
+        '''
+        Docstring for STATS_TOKEN
+        
+        :return: token the stats endpoints require, empty disables them
+        :rtype: str
+        '''
+        return self._stats_token
+
     @property
     def CRYPT_CONTEXT(self) -> CryptContext:
         '''
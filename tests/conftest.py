@@ -9,13 +9,13 @@ import pytest_asyncio
 import dotenv
 import os
 from httpx import AsyncClient,ASGITransport
-from sqlalchemy import Result
+from sqlalchemy import Result,text
 from sqlalchemy.ext.asyncio import create_async_engine,AsyncSession,async_sessionmaker
 from settings import ENVIRONMENT
 from unittest.mock import AsyncMock, MagicMock
 from database import BaseModel,get_database_session
-from repositories import UserRepository,PlaylistRepository,TrackRepository
-from services import get_backblazeb2_service,BackBlazeB2Service
+from repositories import UserRepository,PlaylistRepository,TrackRepository,UploadSessionRepository
+from services import get_storage_service,BackBlazeB2Service
 from unittest.mock import AsyncMock
 from b2sdk.v2 import FileVersion
 
@@ -62,6 +62,8 @@ async def async_client():
 
     async with engine.begin() as conn:
         await conn.run_sync(BaseModel.metadata.drop_all)
+        # the search indexes use the trigram operator classes
+        await conn.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
         await conn.run_sync(BaseModel.metadata.create_all)
 
     async_session = async_sessionmaker(
@@ -74,7 +76,6 @@ async def async_client():
 
     filepath = os.path.join(os.getcwd(),os.path.join('tests',os.path.join('tests_assets','Awaken.m4a')))
     file_size = os.stat(filepath).st_size
-    content_type,_ = mimetypes.guess_type(filepath)
 
     async def override_get_db():
         async with async_session() as session:
@@ -93,31 +94,18 @@ async def async_client():
         )
         return result
     
-    def mock_copy(*args,**kwargs):
-        result = AsyncMock(spec=FileVersion)
-        result.configure_mock(
-            id_=kwargs['file_id'],
-            file_name=kwargs['new_file_name'],
-            content_type=content_type,
-            content_sha1='sha1',
-            size=file_size,
-            upload_timestamp=time.time()
-        )
-        return result
-    
-    async def override_get_backblazeb2_service():
+    async def override_get_storage_service():
         service = BackBlazeB2Service(True)
         service._bucket = MagicMock()
         service._api = MagicMock()
         service._bucket.upload.side_effect = mock_upload
-        service._bucket.copy.side_effect = mock_copy
         try:
             yield service
         finally:
             service = None
     
     app.dependency_overrides[get_database_session] = override_get_db
-    app.dependency_overrides[get_backblazeb2_service] = override_get_backblazeb2_service
+    app.dependency_overrides[get_storage_service] = override_get_storage_service
 
     async with AsyncClient(base_url=base_url,transport=ASGITransport(app=app)) as client:
         yield client
@@ -175,4 +163,9 @@ def mocked_track_repository():
 # fixture for unit tests with PlaylistRepository
 @pytest.fixture
 def mocked_playlist_repository():
-    return AsyncMock(spec=PlaylistRepository)
\ No newline at end of file
+    return AsyncMock(spec=PlaylistRepository)
+
+# fixture for unit tests with UploadSessionRepository
+@pytest.fixture
+def mocked_upload_session_repository():
+    return AsyncMock(spec=UploadSessionRepository)
@@ -9,6 +9,7 @@ from schemas import (
     PlaylistCreateSchema,
     PlaylistPrivateUpdateSchema,
     PlaylistSchema,
+    TrackDownloadSchema,
     ExistencialQuerySchema
 )
 
@@ -251,4 +252,68 @@ class TestPlaylistEndpoints:
             f'playlists/{playlist_created.id}/tracks',
             params={'track_id':track_created.id}
         )
-        assert response.status_code == 202
\ No newline at end of file
+        assert response.status_code == 202
+    
+    @pytest.mark.asyncio
+    async def test_get_playlist_downloads(
+        self,
+        async_client:AsyncClient,
+        user,
+        playlist_create,
+        track_name,
+        author_name,
+        filepath
+    ):
+        user_registered = await self.log_user(async_client,user)
+        assert user_registered is not None
+        playlist_created = await self.create_playlist(async_client,playlist_create)
+        assert playlist_created is not None
+        track_created = await self.create_track(async_client,track_name,author_name,filepath)
+        assert track_created is not None
+        response = await async_client.put(
+            f'playlists/{playlist_created.id}/tracks',
+            params={'track_id':track_created.id}
+        )
+        assert response.status_code == 202
+        response = await async_client.get(f'playlists/{playlist_created.id}/downloads')
+        assert response.status_code == 200
+        downloads = [TrackDownloadSchema(**item) for item in response.json()]
+        assert len(downloads) == 1
+        assert downloads[0].id == track_created.id
+        assert downloads[0].name == track_created.name
+        response = await async_client.get('playlists/wrong_id/downloads')
+        assert response.status_code == 404
+    
+    @pytest.mark.asyncio
+    async def test_get_my_playlists_with_cursor(
+        self,
+        async_client:AsyncClient,
+        user
+    ):
+        user_registered = await self.log_user(async_client,user)
+        assert user_registered is not None
+        created = set()
+        for i in range(3):
+            playlist_created = await self.create_playlist(
+                async_client,
+                PlaylistCreateSchema(name=f'my playlist {i}',description='')
+            )
+            assert playlist_created is not None
+            created.add(playlist_created.id)
+        
+        response = await async_client.get('playlists/me',params={'limit':2})
+        assert response.status_code == 200
+        first_page = [PlaylistSchema(**item).id for item in response.json()]
+        assert len(first_page) == 2
+        assert first_page == sorted(first_page)
+        cursor = response.headers['X-Next-Cursor']
+
+        response = await async_client.get('playlists/me',params={'limit':2,'cursor':cursor})
+        assert response.status_code == 200
+        second_page = [PlaylistSchema(**item).id for item in response.json()]
+        assert len(second_page) == 1
+        assert 'X-Next-Cursor' not in response.headers
+        assert set(first_page + second_page) == created
+
+        response = await async_client.get('playlists/me',params={'limit':2,'cursor':'not a cursor'})
+        assert response.status_code == 400
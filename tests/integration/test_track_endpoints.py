@@ -8,6 +8,7 @@ from schemas import (
     UserCreateSchema,
     TrackSchema,
     TrackPrivateUpdateSchema,
+    TrackStatsSchema,
     ExistencialQuerySchema
 )
 
@@ -197,6 +198,35 @@ class TestTrackEndpoints:
         response = await async_client.delete(f'tracks/{track_created.id}')
         assert response.status_code == 202
     
+    @pytest.mark.asyncio
+    async def test_reactions_counters_only(
+        self,
+        async_client:AsyncClient,
+        user,
+        track_name,
+        author_name,
+        filepath
+    ):
+        user_registered = await self.log_user(async_client,user)
+        assert user_registered is not None
+        track_created = await self.create_track(async_client,track_name,author_name,filepath)
+        assert track_created is not None
+        url = f'tracks/{track_created.id}/stats/likes'
+        response = await async_client.put(url,params={'counters_only':True})
+        assert response.status_code == 202
+        counters = TrackStatsSchema(**response.json())
+        assert counters.id == track_created.id
+        assert counters.likes == track_created.likes + 1
+        assert 'name' not in response.json()
+        # a user can only like a track once
+        response = await async_client.put(url,params={'counters_only':True})
+        assert response.status_code == 500
+        response = await async_client.delete(url,params={'counters_only':True})
+        assert response.status_code == 202
+        assert TrackStatsSchema(**response.json()).likes == track_created.likes
+        response = await async_client.put('tracks/wrong_id/stats/plays')
+        assert response.status_code == 404
+    
     @pytest.mark.parametrize('reaction_type',[
         'likes',
         'dislikes',
@@ -226,6 +226,7 @@ class TestPlaylistRepository:
         assert 'WHERE playlists.id =' in query
         assert result == True
     
+    @pytest.mark.asyncio
     @pytest.mark.parametrize('reaction_type,method_name',[
         ('like','add_like_from_user_to_playlist'),
         ('dislike','add_dislike_from_user_to_playlist'),
@@ -242,11 +243,9 @@ class TestPlaylistRepository:
         mocked_get_execute_result,
         db_user
     ):
-        
+        counters = MagicMock()
         mocked_db.execute.return_value = mocked_get_execute_result
-        mocked_get_execute_result.scalar_one_or_none.return_value = db_mocked_playlist
-
-        mocked_user_repository.get_by_id.return_value = db_user
+        mocked_get_execute_result.first.return_value = counters
 
         repository = PlaylistRepository(mocked_db,mocked_track_repository,mocked_user_repository)
 
@@ -254,29 +253,19 @@ class TestPlaylistRepository:
 
         result = await method(db_user.id,db_mocked_playlist.id)
 
-        mocked_db.execute.assert_awaited_once()
-        raw_query = mocked_db.execute.await_args[0][0]
-        query = str(raw_query)
-        assert 'SELECT' in query
-        assert 'WHERE playlists.id =' in query
-        self.assert_has_selectinload_option(raw_query)
-
-        match reaction_type:
-
-            case 'like':
-                db_mocked_playlist.users_likes.append.assert_called_once_with(db_user)
-            
-            case 'dislike':
-                db_mocked_playlist.users_dislikes.append.assert_called_once_with(db_user)
-            
-            case 'love':
-                db_mocked_playlist.users_loves.append.assert_called_once_with(db_user)
-        
+        assert mocked_db.execute.await_count == 2
+        calls = list(map(lambda call: str(call[0][0]),mocked_db.execute.await_args_list))
+        assert calls[0].startswith('INSERT INTO playlists_'+reaction_type+'s')
+        assert 'UPDATE playlists SET '+reaction_type+'s=(playlists.'+reaction_type+'s + ' in calls[1]
+        assert 'WHERE playlists.id =' in calls[1]
+        assert 'RETURNING' in calls[1]
+        mocked_user_repository.get_by_id.assert_not_awaited()
         mocked_db.commit.assert_awaited_once()
-        mocked_db.refresh.assert_awaited_once_with(db_mocked_playlist)
+        mocked_db.rollback.assert_not_awaited()
 
-        assert result == True
+        assert result == counters
 
+    @pytest.mark.asyncio
     @pytest.mark.parametrize('reaction_type,method_name',[
         ('like','remove_like_from_user_to_playlist'),
         ('dislike','remove_dislike_from_user_to_playlist'),
@@ -293,11 +282,9 @@ class TestPlaylistRepository:
         mocked_get_execute_result,
         db_user
     ):
-        
+        counters = MagicMock()
         mocked_db.execute.return_value = mocked_get_execute_result
-        mocked_get_execute_result.scalar_one_or_none.return_value = db_mocked_playlist
-
-        mocked_user_repository.get_by_id.return_value = db_user
+        mocked_get_execute_result.first.return_value = counters
 
         repository = PlaylistRepository(mocked_db,mocked_track_repository,mocked_user_repository)
 
@@ -305,28 +292,17 @@ class TestPlaylistRepository:
 
         result = await method(db_user.id,db_mocked_playlist.id)
 
-        mocked_db.execute.assert_awaited_once()
-        raw_query = mocked_db.execute.await_args[0][0]
-        query = str(raw_query)
-        assert 'SELECT' in query
-        assert 'WHERE playlists.id =' in query
-        self.assert_has_selectinload_option(raw_query)
-
-        match reaction_type:
-
-            case 'like':
-                db_mocked_playlist.users_likes.remove.assert_called_once_with(db_user)
-            
-            case 'dislike':
-                db_mocked_playlist.users_dislikes.remove.assert_called_once_with(db_user)
-            
-            case 'love':
-                db_mocked_playlist.users_loves.remove.assert_called_once_with(db_user)
-        
+        assert mocked_db.execute.await_count == 2
+        calls = list(map(lambda call: str(call[0][0]),mocked_db.execute.await_args_list))
+        assert calls[0].startswith('DELETE FROM playlists_'+reaction_type+'s')
+        assert 'UPDATE playlists SET '+reaction_type+'s=(playlists.'+reaction_type+'s + ' in calls[1]
+        assert 'WHERE playlists.id =' in calls[1]
+        assert 'RETURNING' in calls[1]
+        mocked_user_repository.get_by_id.assert_not_awaited()
         mocked_db.commit.assert_awaited_once()
-        mocked_db.refresh.assert_awaited_once_with(db_mocked_playlist)
+        mocked_db.rollback.assert_not_awaited()
 
-        assert result == True
+        assert result == counters
 
     @pytest.mark.asyncio
     async def test_add_track_to_playlist(
@@ -1,7 +1,7 @@
 import pytest
 from unittest.mock import MagicMock
 
-from models import Track,User
+from models import Blob,Track,User
 from repositories import TrackRepository
 
 class TestTrackRepository:
@@ -88,28 +88,189 @@ class TestTrackRepository:
     ):
         
         mocked_db.execute.return_value = mocked_get_execute_result
-        mocked_get_execute_result.scalar_one_or_none.return_value = None
+        mocked_get_execute_result.first.return_value = ('file_id','tracks/content_hash.mp3',10,'ready')
 
         repository = TrackRepository(mocked_db,mocked_user_repository)
 
         track = await repository.create(db_track)
         
-        assert mocked_db.execute.await_count == 2
-        for call in mocked_db.execute.await_args_list:
-            query = str(call[0][0])
-            assert 'SELECT' in query
-        
-        calls = list(map(lambda call:str(call[0][0]),mocked_db.execute.await_args_list))
-        id_query = filter(lambda call: 'WHERE tracks.id =' in call,calls)
-        content_hash_query = filter(lambda call: 'WHERE tracks.content_hash =' in call,calls)
-        
-        assert len(list(id_query)) == 1
-        assert len(list(content_hash_query)) == 1
-
+        # the track takes a reference to the blob already stored for its content
+        mocked_db.execute.assert_awaited_once()
+        query = str(mocked_db.execute.await_args[0][0])
+        assert 'UPDATE blobs SET' in query
+        assert 'RETURNING' in query
         mocked_db.add.assert_called_once_with(db_track)
         mocked_db.commit.assert_awaited_once()
         mocked_db.refresh.assert_awaited_once_with(db_track)
-        self.assert_tracks_equals(track,db_track)        
+        self.assert_tracks_equals(track,db_track)
+        assert track.file_name == 'tracks/content_hash.mp3'
+
+    @pytest.mark.asyncio
+    async def test_create_track_with_new_blob(
+        self,
+        mocked_db,
+        mocked_get_execute_result,
+        db_track,
+        mocked_user_repository
+    ):
+        mocked_db.execute.return_value = mocked_get_execute_result
+        # another upload of the same content stored its file first
+        mocked_get_execute_result.first.return_value = ('other_file_id','tracks/content_hash.mp3',10,'ready')
+
+        repository = TrackRepository(mocked_db,mocked_user_repository)
+
+        track = await repository.create(
+            db_track,
+            Blob(content_hash='content_hash',file_id='file_id',file_name='tracks/content_hash.mp3',size=10)
+        )
+
+        query = str(mocked_db.execute.await_args[0][0])
+        assert 'INSERT INTO blobs' in query
+        assert 'ON CONFLICT' in query
+        assert track is not None
+        assert track.file_id == 'other_file_id'
+        mocked_db.commit.assert_awaited_once()
+
+        mocked_db.execute.reset_mock()
+        mocked_get_execute_result.first.return_value = ('file_id','tracks/content_hash.mp3',10,'ready')
+
+        await repository.create(
+            db_track,
+            Blob(content_hash='content_hash',file_id='file_id',file_name='tracks/content_hash.mp3',size=10)
+        )
+
+        # the file is kept, so the tracks waiting for it point to it
+        calls = [str(call[0][0]) for call in mocked_db.execute.await_args_list]
+        assert len(calls) == 2
+        assert calls[1].startswith('UPDATE tracks SET')
+
+    @pytest.mark.asyncio
+    async def test_create_processing_track(
+        self,
+        mocked_db,
+        mocked_get_execute_result,
+        db_track,
+        mocked_user_repository
+    ):
+        mocked_db.execute.return_value = mocked_get_execute_result
+        mocked_get_execute_result.one.return_value = ('pending:content_hash','',10,'processing')
+
+        repository = TrackRepository(mocked_db,mocked_user_repository)
+
+        track = await repository.create_processing(db_track,10,{'file_name':'staged.mp3'})
+
+        calls = [str(call[0][0]) for call in mocked_db.execute.await_args_list]
+        assert len(calls) == 2
+        assert calls[0].startswith('INSERT INTO blobs')
+        # the job is queued in the same transaction as the track
+        assert calls[1].startswith('INSERT INTO storage_jobs')
+        mocked_db.commit.assert_awaited_once()
+        assert track is not None
+        assert track.status == 'processing'
+
+        mocked_db.execute.reset_mock()
+        mocked_get_execute_result.one.return_value = ('file_id','tracks/content_hash.mp3',10,'ready')
+
+        track = await repository.create_processing(db_track,10,{'file_name':'staged.mp3'})
+
+        # another upload stored the content first
+        mocked_db.execute.assert_awaited_once()
+        assert track is not None
+        assert track.status == 'ready'
+        assert track.file_id == 'file_id'
+
+    @pytest.mark.asyncio
+    async def test_complete_blob(
+        self,
+        mocked_db,
+        mocked_get_execute_result,
+        mocked_user_repository
+    ):
+        mocked_db.execute.return_value = mocked_get_execute_result
+        mocked_get_execute_result.scalar_one_or_none.return_value = 'content_hash'
+
+        repository = TrackRepository(mocked_db,mocked_user_repository)
+
+        assert await repository.complete_blob('content_hash','file_id','tracks/content_hash.mp3')
+
+        calls = [str(call[0][0]) for call in mocked_db.execute.await_args_list]
+        assert calls[0].startswith('UPDATE blobs SET')
+        assert calls[1].startswith('UPDATE tracks SET')
+
+        mocked_db.execute.reset_mock()
+        mocked_get_execute_result.scalar_one_or_none.return_value = None
+
+        assert await repository.complete_blob('content_hash','file_id','tracks/content_hash.mp3')
+
+        # the blob is gone, so the file just stored is removed
+        calls = [str(call[0][0]) for call in mocked_db.execute.await_args_list]
+        assert calls[1].startswith('INSERT INTO storage_jobs')
+
+    @pytest.mark.asyncio
+    async def test_create_track_without_blob(
+        self,
+        mocked_db,
+        mocked_get_execute_result,
+        db_track,
+        mocked_user_repository
+    ):
+        mocked_db.execute.return_value = mocked_get_execute_result
+        mocked_get_execute_result.first.return_value = None
+
+        repository = TrackRepository(mocked_db,mocked_user_repository)
+
+        assert await repository.create(db_track) is None
+        mocked_db.add.assert_not_called()
+        mocked_db.rollback.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_delete_last_reference(
+        self,
+        mocked_db,
+        mocked_get_execute_result,
+        db_track,
+        mocked_user_repository
+    ):
+        blob = MagicMock()
+        blob.references = 0
+        blob.status = 'ready'
+        mocked_db.execute.return_value = mocked_get_execute_result
+        mocked_get_execute_result.scalar_one_or_none.return_value = db_track.content_hash
+        mocked_get_execute_result.first.return_value = blob
+
+        repository = TrackRepository(mocked_db,mocked_user_repository)
+
+        deleted,orphan = await repository.delete_reference(db_track.id)
+
+        calls = [str(call[0][0]) for call in mocked_db.execute.await_args_list]
+        assert len(calls) == 4
+        assert calls[0].startswith('DELETE FROM tracks')
+        assert calls[1].startswith('UPDATE blobs')
+        assert calls[2].startswith('DELETE FROM blobs')
+        # the removal of the file is queued in the same transaction
+        assert calls[3].startswith('INSERT INTO storage_jobs')
+        assert 'ON CONFLICT (idempotency_key) DO NOTHING' in calls[3]
+        mocked_db.commit.assert_awaited_once()
+        assert deleted
+        assert orphan is blob
+
+        blob.status = 'processing'
+        mocked_db.execute.reset_mock()
+
+        await repository.delete_reference(db_track.id)
+
+        # the file was never stored, so there is nothing to remove
+        assert mocked_db.execute.await_count == 3
+
+        blob.references = 1
+        mocked_db.execute.reset_mock()
+
+        deleted,orphan = await repository.delete_reference(db_track.id)
+
+        # other tracks share the blob
+        assert mocked_db.execute.await_count == 2
+        assert deleted
+        assert orphan is None
     
     @pytest.mark.asyncio
     async def test_get_track_by_id(
@@ -200,6 +361,30 @@ class TestTrackRepository:
         mocked_db.refresh.assert_awaited_once_with(db_track)
         self.assert_tracks_equals(track,db_update_track)
 
+    @pytest.mark.asyncio
+    async def test_update_track_fields(
+        self,
+        mocked_db,
+        mocked_get_execute_result,
+        db_track,
+        mocked_user_repository
+    ):
+        mocked_db.execute.return_value = mocked_get_execute_result
+        mocked_get_execute_result.first.return_value = (db_track.id,)
+        mocked_get_execute_result.scalar_one_or_none.return_value = db_track
+
+        repository = TrackRepository(mocked_db,mocked_user_repository)
+
+        track = await repository.update_fields(db_track.id,name='renamed.mp3')
+
+        update_query = str(mocked_db.execute.await_args_list[0][0][0])
+        assert update_query.startswith('UPDATE tracks SET name=')
+        # the counters and the file of the track are not written
+        assert 'likes' not in update_query
+        assert 'file_id' not in update_query
+        mocked_db.commit.assert_awaited_once()
+        assert track is db_track
+
     @pytest.mark.asyncio
     async def test_delete_track(
         self,
@@ -245,6 +430,7 @@ class TestTrackRepository:
         assert 'WHERE tracks.id =' in query
         assert result == False
 
+    @pytest.mark.asyncio
     @pytest.mark.parametrize('reaction_type,method_name',[
         ('like','add_like_from_user_to_track'),
         ('dislike','add_dislike_from_user_to_track'),
@@ -255,15 +441,14 @@ class TestTrackRepository:
         reaction_type,
         method_name,
         mocked_db,
+        mocked_user_repository,
         db_mocked_track,
         mocked_get_execute_result,
-        db_user,
-        mocked_user_repository
+        db_user
     ):
+        counters = MagicMock()
         mocked_db.execute.return_value = mocked_get_execute_result
-        mocked_get_execute_result.scalar_one_or_none.return_value = db_mocked_track
-
-        mocked_user_repository.get_by_id.return_value = db_user
+        mocked_get_execute_result.first.return_value = counters
 
         repository = TrackRepository(mocked_db,mocked_user_repository)
 
@@ -271,28 +456,19 @@ class TestTrackRepository:
 
         result = await method(db_user.id,db_mocked_track.id)
 
-        mocked_db.execute.assert_awaited_once()
-        raw_query = mocked_db.execute.await_args[0][0]
-        query = str(raw_query)
-        assert 'SELECT' in query
-        assert 'WHERE tracks.id =' in query
-        self.assert_has_selectinload_option(raw_query)
-        
-        match reaction_type:
-            case 'like':
-                db_mocked_track.users_likes.append.assert_called_once_with(db_user)
-                
-            case 'dislike':
-                db_mocked_track.users_dislikes.append.assert_called_once_with(db_user)
-
-            case 'love':
-                db_mocked_track.users_loves.append.assert_called_once_with(db_user)
-
+        assert mocked_db.execute.await_count == 2
+        calls = list(map(lambda call: str(call[0][0]),mocked_db.execute.await_args_list))
+        assert calls[0].startswith('INSERT INTO tracks_'+reaction_type+'s')
+        assert 'UPDATE tracks SET '+reaction_type+'s=(tracks.'+reaction_type+'s + ' in calls[1]
+        assert 'WHERE tracks.id =' in calls[1]
+        assert 'RETURNING' in calls[1]
+        mocked_user_repository.get_by_id.assert_not_awaited()
         mocked_db.commit.assert_awaited_once()
-        mocked_db.refresh.assert_awaited_once_with(db_mocked_track)
+        mocked_db.rollback.assert_not_awaited()
 
-        assert result == True
+        assert result == counters
 
+    @pytest.mark.asyncio
     @pytest.mark.parametrize('reaction_type,method_name',[
         ('like','remove_like_from_user_to_track'),
         ('dislike','remove_dislike_from_user_to_track'),
@@ -303,40 +479,148 @@ class TestTrackRepository:
         reaction_type,
         method_name,
         mocked_db,
+        mocked_user_repository,
         db_mocked_track,
         mocked_get_execute_result,
-        db_user,
-        mocked_user_repository
+        db_user
     ):
+        counters = MagicMock()
         mocked_db.execute.return_value = mocked_get_execute_result
-        mocked_get_execute_result.scalar_one_or_none.return_value = db_mocked_track
-
-        mocked_user_repository.get_by_id.return_value = db_user
+        mocked_get_execute_result.first.return_value = counters
 
         repository = TrackRepository(mocked_db,mocked_user_repository)
 
         method = getattr(repository,method_name)
-        
+
         result = await method(db_user.id,db_mocked_track.id)
 
+        assert mocked_db.execute.await_count == 2
+        calls = list(map(lambda call: str(call[0][0]),mocked_db.execute.await_args_list))
+        assert calls[0].startswith('DELETE FROM tracks_'+reaction_type+'s')
+        assert 'UPDATE tracks SET '+reaction_type+'s=(tracks.'+reaction_type+'s + ' in calls[1]
+        assert 'WHERE tracks.id =' in calls[1]
+        assert 'RETURNING' in calls[1]
+        mocked_user_repository.get_by_id.assert_not_awaited()
+        mocked_db.commit.assert_awaited_once()
+        mocked_db.rollback.assert_not_awaited()
+
+        assert result == counters
+
+    @pytest.mark.asyncio
+    async def test_increment_track_counters(
+        self,
+        mocked_db,
+        mocked_get_execute_result,
+        db_track,
+        mocked_user_repository
+    ):
+        counters = MagicMock()
+        mocked_db.execute.return_value = mocked_get_execute_result
+        mocked_get_execute_result.first.return_value = counters
+
+        repository = TrackRepository(mocked_db,mocked_user_repository)
+
+        result = await repository.increment(db_track.id,plays=1)
+
         mocked_db.execute.assert_awaited_once()
-        raw_query = mocked_db.execute.await_args[0][0]
-        query = str(raw_query)
-        assert 'SELECT' in query
+        query = str(mocked_db.execute.await_args[0][0])
+        assert 'UPDATE tracks SET plays=(tracks.plays + ' in query
         assert 'WHERE tracks.id =' in query
-        self.assert_has_selectinload_option(raw_query)
+        assert 'RETURNING tracks.id, tracks.likes, tracks.dislikes, tracks.loves, tracks.plays' in query
+        mocked_db.commit.assert_awaited_once()
+        assert result == counters
 
-        match reaction_type:
-            case 'like':
-                db_mocked_track.users_likes.remove.assert_called_once_with(db_user)
-                
-            case 'dislike':
-                db_mocked_track.users_dislikes.remove.assert_called_once_with(db_user)
+        with pytest.raises(ValueError):
+            await repository.increment(db_track.id,name=1)
 
-            case 'love':
-                db_mocked_track.users_loves.remove.assert_called_once_with(db_user)
+    @pytest.mark.asyncio
+    async def test_get_tracks_uploaded_by_pagination(
+        self,
+        mocked_db,
+        mocked_get_execute_result,
+        db_track,
+        mocked_user_repository
+    ):
+        mocked_db.execute.return_value = mocked_get_execute_result
+        mocked_get_execute_result.scalars.return_value.all.return_value = [db_track]
 
-        mocked_db.commit.assert_awaited_once()
-        mocked_db.refresh.assert_awaited_once_with(db_mocked_track)
+        repository = TrackRepository(mocked_db,mocked_user_repository)
+
+        await repository.get_tracks_uploaded_by('me',10,20)
+        query = str(mocked_db.execute.await_args[0][0])
+        assert 'ORDER BY tracks.id' in query
+        assert 'OFFSET' in query
+
+        tracks = await repository.get_tracks_uploaded_by('me',10,20,db_track.id)
+        query = str(mocked_db.execute.await_args[0][0])
+        assert 'tracks.id >' in query
+        assert 'ORDER BY tracks.id' in query
+        assert 'OFFSET' not in query
+        assert tracks == [db_track]
+
+    @pytest.mark.asyncio
+    async def test_search_tracks_by_text(
+        self,
+        mocked_db,
+        mocked_get_execute_result,
+        db_track,
+        mocked_user_repository
+    ):
+        mocked_db.execute.return_value = mocked_get_execute_result
+        mocked_get_execute_result.scalars.return_value.all.return_value = [db_track]
+
+        repository = TrackRepository(mocked_db,mocked_user_repository)
+
+        tracks = await repository.search_tracks_by_text('100%_',10,20)
+        statement = mocked_db.execute.await_args[0][0]
+        query = str(statement)
+        assert 'lower(tracks.name) LIKE lower(' in query
+        assert 'LIMIT' in query
+        assert 'OFFSET' in query
+        assert '%100\\%\\_%' in statement.compile().params.values()
+        assert tracks == [db_track]
+
+    @pytest.mark.asyncio
+    async def test_rank_tracks_by_text(
+        self,
+        mocked_db,
+        mocked_get_execute_result,
+        db_track,
+        mocked_user_repository
+    ):
+        mocked_db.execute.return_value = mocked_get_execute_result
+        mocked_get_execute_result.scalars.return_value.all.return_value = [db_track]
+
+        repository = TrackRepository(mocked_db,mocked_user_repository)
+
+        tracks = await repository.rank_tracks_by_text('awaken',10,20,500)
+        statement = mocked_db.execute.await_args[0][0]
+        query = str(statement)
+        assert 'tracks.search_vector @@ websearch_to_tsquery(' in query
+        assert 'ts_rank(tracks.search_vector' in query
+        assert 'ORDER BY anon_1.rank DESC, anon_1.id' in query
+        params = statement.compile().params
+        assert 'awaken' in params.values()
+        assert 500 in params.values()
+        assert tracks == [db_track]
+
+    @pytest.mark.asyncio
+    async def test_get_id_by_content_hash(
+        self,
+        mocked_db,
+        mocked_get_execute_result,
+        mocked_user_repository
+    ):
+        mocked_db.execute.return_value = mocked_get_execute_result
+        mocked_get_execute_result.scalar_one_or_none.return_value = 'track_id'
+
+        repository = TrackRepository(mocked_db,mocked_user_repository)
 
-        assert result == True
\ No newline at end of file
+        track_id = await repository.get_id_by_content_hash('content_hash','me')
+        statement = mocked_db.execute.await_args[0][0]
+        query = str(statement)
+        # any track with the content, the one of the user first
+        assert 'WHERE tracks.content_hash =' in query
+        assert 'ORDER BY tracks.uploaded_by =' in query
+        assert 'me' in statement.compile().params.values()
+        assert track_id == 'track_id'
@@ -250,4 +250,20 @@ class TestUserRepository:
         query = str(mocked_db.execute.await_args[0][0])
         assert 'SELECT' in query
         assert 'WHERE users.id =' in query
-        assert result == False
\ No newline at end of file
+        assert result == False
+
+    @pytest.mark.asyncio
+    async def test_release_connection(
+        self,
+        mocked_db
+    ):
+        repository = UserRepository(mocked_db)
+
+        mocked_db.in_transaction.return_value = False
+        await repository.release_connection()
+        mocked_db.commit.assert_not_awaited()
+
+        mocked_db.in_transaction.return_value = True
+        await repository.release_connection()
+        mocked_db.commit.assert_awaited_once()
+        mocked_db.rollback.assert_not_awaited()
@@ -0,0 +1,57 @@
+import asyncio
+import pytest
+
+from services.external import AsyncCircuitBreaker,CircuitBreakerConfig,CircuitState
+from services.external.circuit_breaker import OpenCircuitBreakerException
+
+class TestAsyncCircuitBreaker:
+
+    @pytest.fixture
+    def breaker(self):
+        return AsyncCircuitBreaker(
+            'test',
+            CircuitBreakerConfig(
+                failure_threshold=1,
+                reset_timeout_seconds=0,
+                half_open_max_attemps=2,
+                half_open_success_threshold=2
+            )
+        )
+
+    async def fail(self):
+        raise RuntimeError('unavailable')
+
+    @pytest.mark.asyncio
+    async def test_half_open_limits_concurrent_probes(self,breaker):
+        breaker._transition_to(CircuitState.OPEN)
+
+        release = asyncio.Event()
+        started = []
+
+        async def probe():
+            started.append(True)
+            await release.wait()
+            return True
+
+        probes = [asyncio.create_task(breaker.execute(probe)) for _ in range(2)]
+        await asyncio.sleep(0)
+        assert breaker.is_half_open
+
+        # the slots are taken while the first probes still run
+        with pytest.raises(OpenCircuitBreakerException):
+            await breaker.execute(probe)
+        assert len(started) == 2
+
+        release.set()
+        assert await asyncio.gather(*probes) == [True,True]
+        assert breaker.state == CircuitState.CLOSED
+
+    @pytest.mark.asyncio
+    async def test_failed_probe_opens_the_circuit(self,breaker):
+        breaker._transition_to(CircuitState.OPEN)
+
+        with pytest.raises(RuntimeError):
+            await breaker.execute(self.fail)
+
+        assert breaker.is_open
+        assert breaker._half_open_attemps == 0
@@ -0,0 +1,85 @@
+import pytest
+from hashlib import sha256
+from unittest.mock import MagicMock
+
+from schemas import BlobSchema
+from services import BloomFilter,KnownContentCache
+from services.content_hashes import ContentHashFilterRefresher
+
+def content_hash(i:int) -> str:
+    return sha256(str(i).encode()).hexdigest()
+
+class TestBloomFilter:
+
+    def test_membership(self):
+        bloom_filter = BloomFilter(1000,0.01)
+        for i in range(1000):
+            bloom_filter.add(content_hash(i))
+
+        assert len(bloom_filter) == 1000
+        assert all(content_hash(i) in bloom_filter for i in range(1000))
+        false_positives = sum(content_hash(i) in bloom_filter for i in range(1000,11000))
+        assert false_positives < 300
+
+class TestKnownContentCache:
+
+    def blob(self,i:int) -> BlobSchema:
+        return BlobSchema(
+            content_hash=content_hash(i),
+            file_id=f'file_{i}',
+            file_name=f'tracks/{content_hash(i)}.mp3',
+            size=i
+        )
+
+    def test_get_and_put(self):
+        cache = KnownContentCache(2,60)
+        cache.put(self.blob(1))
+        cache.put(self.blob(2))
+
+        assert cache.get(content_hash(1)) == self.blob(1)
+        cache.put(self.blob(3))
+        # the least recently used is evicted
+        assert cache.get(content_hash(2)) is None
+        assert len(cache) == 2
+
+        cache.discard(content_hash(1))
+        assert cache.get(content_hash(1)) is None
+        assert cache.get(content_hash(3)) == self.blob(3)
+        assert cache.hits == 2
+        assert cache.misses == 2
+
+    def test_expiration(self):
+        cache = KnownContentCache(10,-1)
+        cache.put(self.blob(1))
+
+        assert cache.get(content_hash(1)) is None
+        assert len(cache) == 0
+
+class TestContentHashFilterRefresher:
+
+    @pytest.fixture
+    def session_factory(self,mocked_db):
+        factory = MagicMock()
+        factory.return_value.__aenter__.return_value = mocked_db
+        return factory
+
+    @pytest.mark.asyncio
+    async def test_rebuild(self,session_factory):
+        refresher:ContentHashFilterRefresher
+
+        async def scan(session):
+            yield content_hash(1)
+            # a track created by this worker while the table is read
+            refresher.add(content_hash(3))
+            yield content_hash(2)
+
+        refresher = ContentHashFilterRefresher(100,0.01,scan,session_factory,0)
+        refresher.add(content_hash(4))
+        assert not refresher.ready
+
+        assert await refresher.rebuild()
+
+        assert refresher.ready
+        assert all(content_hash(i) in refresher for i in (1,2,3))
+        # deleted from the database since it was added
+        assert content_hash(4) not in refresher
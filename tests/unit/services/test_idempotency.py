@@ -0,0 +1,192 @@
+import asyncio
+import datetime
+import pytest
+import pytest_asyncio
+from unittest.mock import AsyncMock,MagicMock
+from fastapi import FastAPI,HTTPException,Request
+from httpx import ASGITransport,AsyncClient
+
+from services import AuthService,IdempotentResponse,IdempotencyStore,DatabaseIdempotencyStore,IdempotencyMiddleware
+from services import idempotency
+
+class TestIdempotencyStore:
+
+    @pytest.fixture
+    def store(self):
+        return IdempotencyStore(60,1)
+
+    @pytest.mark.asyncio
+    async def test_completed_response_is_replayed(self,store):
+        response = IdempotentResponse(201,[(b'content-type',b'application/json')],b'{}')
+
+        assert await store.claim('key_1','request_1') is None
+        await store.complete('key_1',response)
+
+        assert await store.claim('key_1','request_1') is response
+        with pytest.raises(HTTPException) as ex:
+            await store.claim('key_1','request_2')
+        assert ex.value.status_code == 422
+        assert store.stats()['replayed'] == 1
+
+    @pytest.mark.asyncio
+    async def test_retries_wait_for_the_running_request(self,store):
+        response = IdempotentResponse(201,[],b'{}')
+        assert await store.claim('key_1','request_1') is None
+
+        retries = [asyncio.create_task(store.claim('key_1','request_1')) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        assert not any(retry.done() for retry in retries)
+        await store.complete('key_1',response)
+
+        assert await asyncio.gather(*retries) == [response,response]
+        assert store.stats()['coalesced'] == 2
+
+    @pytest.mark.asyncio
+    async def test_released_key_runs_again(self,store):
+        assert await store.claim('key_1','request_1') is None
+        retry = asyncio.create_task(store.claim('key_1','request_1'))
+        await asyncio.sleep(0.01)
+        await store.complete('key_1',None)
+
+        # the retry takes the key and runs the request
+        assert await retry is None
+        assert store.stats()['running'] == 1
+
+    @pytest.mark.asyncio
+    async def test_slow_request_rejects_its_retries(self):
+        store = IdempotencyStore(60,0.05)
+        assert await store.claim('key_1','request_1') is None
+
+        with pytest.raises(HTTPException) as ex:
+            await store.claim('key_1','request_1')
+        assert ex.value.status_code == 409
+
+    @pytest.mark.asyncio
+    async def test_responses_expire(self):
+        store = IdempotencyStore(0,1)
+        assert await store.claim('key_1','request_1') is None
+        await store.complete('key_1',IdempotentResponse(201,[],b'{}'))
+
+        assert await store.claim('key_1','request_1') is None
+
+class TestDatabaseIdempotencyStore:
+
+    @pytest.mark.asyncio
+    async def test_running_request_only_leases_its_key(self,monkeypatch):
+        repository = MagicMock()
+        repository.claim = AsyncMock(return_value=(True,None))
+        repository.complete = AsyncMock(return_value=True)
+        monkeypatch.setattr(idempotency,'IdempotencyKeyRepository',lambda session:repository)
+        session = MagicMock()
+        session.__aenter__ = AsyncMock(return_value=session)
+        session.__aexit__ = AsyncMock(return_value=None)
+        store = DatabaseIdempotencyStore(lambda:session,86400,1,60)
+        now = datetime.datetime.now(datetime.UTC)
+
+        assert await store.claim('key_1','request_1') is None
+        await store.complete('key_1',IdempotentResponse(201,[(b'content-type',b'application/json')],b'{}'))
+
+        lease = repository.claim.call_args.args[2]
+        expires_at = repository.complete.call_args.args[4]
+        assert datetime.timedelta(seconds=59) < lease - now < datetime.timedelta(seconds=61)
+        assert expires_at - now > datetime.timedelta(hours=23)
+        assert repository.complete.call_args.args[2] == [['content-type','application/json']]
+
+class TestIdempotencyMiddleware:
+
+    @pytest.fixture
+    def store(self):
+        return IdempotencyStore(60,5)
+
+    @pytest.fixture
+    def app(self,store):
+        app = FastAPI()
+        app.state.calls = 0
+        app.state.finish = asyncio.Event()
+        app.state.finish.set()
+
+        @app.post('/upload')
+        async def upload(request:Request):
+            app.state.calls += 1
+            body = await request.body()
+            await app.state.finish.wait()
+            if body == b'fail':
+                raise HTTPException(status_code=503,detail='unavailable')
+            return {'call':app.state.calls,'size':len(body)}
+
+        @app.post('/playlists')
+        async def create_playlist(request:Request):
+            app.state.calls += 1
+            return {'call':app.state.calls,'playlist':await request.json()}
+
+        app.add_middleware(
+            IdempotencyMiddleware,
+            routes=[('POST','/upload',False),('POST','/playlists',True)],
+            store=store
+        )
+        return app
+
+    @pytest_asyncio.fixture
+    async def client(self,app):
+        token = AuthService(None).create_access_token({'sub':'user_1'})
+        async with AsyncClient(
+            base_url='http://test',
+            transport=ASGITransport(app=app),
+            headers={'Authorization':f'Bearer {token}'}
+        ) as client:
+            yield client
+
+    @pytest.mark.asyncio
+    async def test_retries_get_the_first_response(self,app,client):
+        app.state.finish.clear()
+        first = asyncio.create_task(client.post('/upload',content=b'data',headers={'Idempotency-Key':'key_1'}))
+        await asyncio.sleep(0.01)
+        retry = asyncio.create_task(client.post('/upload',content=b'data',headers={'Idempotency-Key':'key_1'}))
+        await asyncio.sleep(0.01)
+        app.state.finish.set()
+
+        first,retry = await first,await retry
+        later = await client.post('/upload',content=b'data',headers={'Idempotency-Key':'key_1'})
+        other = await client.post('/upload',content=b'data',headers={'Idempotency-Key':'key_2'})
+
+        assert app.state.calls == 2
+        assert first.json() == retry.json() == later.json() == {'call':1,'size':4}
+        assert retry.headers['Idempotent-Replayed'] == 'true'
+        assert 'Idempotent-Replayed' not in first.headers
+        assert other.json() == {'call':2,'size':4}
+
+    @pytest.mark.asyncio
+    async def test_key_of_another_request_is_rejected(self,app,client):
+        await client.post('/upload',content=b'data',headers={'Idempotency-Key':'key_1'})
+
+        response = await client.post('/upload',content=b'other data',headers={'Idempotency-Key':'key_1'})
+
+        assert response.status_code == 422
+        assert app.state.calls == 1
+
+    @pytest.mark.asyncio
+    async def test_server_errors_are_not_replayed(self,app,client):
+        first = await client.post('/upload',content=b'fail',headers={'Idempotency-Key':'key_1'})
+        retry = await client.post('/upload',content=b'fail',headers={'Idempotency-Key':'key_1'})
+
+        assert first.status_code == retry.status_code == 503
+        assert app.state.calls == 2
+
+    @pytest.mark.asyncio
+    async def test_requests_without_key_always_run(self,app,client):
+        await client.post('/upload',content=b'data')
+        await client.post('/upload',content=b'data')
+
+        assert app.state.calls == 2
+
+    @pytest.mark.asyncio
+    async def test_small_bodies_identify_their_request(self,app,client):
+        first = await client.post('/playlists',json={'name':'aaa'},headers={'Idempotency-Key':'key_1'})
+        retry = await client.post('/playlists',json={'name':'aaa'},headers={'Idempotency-Key':'key_1'})
+        # same length, different body
+        other = await client.post('/playlists',json={'name':'bbb'},headers={'Idempotency-Key':'key_1'})
+
+        assert first.json() == retry.json() == {'call':1,'playlist':{'name':'aaa'}}
+        assert retry.headers['Idempotent-Replayed'] == 'true'
+        assert other.status_code == 422
+        assert app.state.calls == 1
@@ -0,0 +1,133 @@
+import pytest
+import pytest_asyncio
+from hashlib import sha1,sha256
+from io import BytesIO
+from urllib.parse import parse_qs,unquote,urlsplit
+from fastapi import HTTPException
+
+from schemas import TrackFileSchema
+from services import LocalStorageService,FileValidationResult
+from services.external import UploadStreamValidator,UploadStreamError
+from settings import ENVIRONMENT
+
+class TestLocalStorageService:
+
+    @pytest_asyncio.fixture
+    async def service(self,tmp_path):
+        service = LocalStorageService(tmp_path,'signing key',600)
+        await service.start()
+        yield service
+        await service.stop()
+
+    def validation_result(self,data:bytes) -> FileValidationResult:
+        return FileValidationResult(len(data),sha256(data).hexdigest(),'.mp3','sha1')
+
+    def stream_validator(self,data:bytes,content_hash:str | None=None,size:int | None=None) -> UploadStreamValidator:
+        def check_file_type(header:bytes,extension:str) -> None:
+            if not header.startswith(b'ID3'):
+                raise HTTPException(status_code=400,detail='not an mp3 file')
+        return UploadStreamValidator(
+            check_file_type,
+            len(data) if size is None else size,
+            content_hash or sha256(data).hexdigest(),
+            '.mp3'
+        )
+
+    async def stream(self,data:bytes,chunk_size:int=1000):
+        for start in range(0,len(data),chunk_size):
+            yield data[start:start + chunk_size]
+
+    def download_query(self,url:str):
+        parts = urlsplit(url)
+        query = {key:values[0] for key,values in parse_qs(parts.query).items()}
+        file_name = unquote(parts.path.removeprefix(f'{ENVIRONMENT.GLOBAL_API_PREFIX}/files/'))
+        return file_name,int(query['expires']),query['disposition'],query['signature']
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize('size',[1024,ENVIRONMENT.STREAMING_THRESHOLD + 1])
+    async def test_store_file(self,service,tmp_path,size):
+        data = bytes(range(256)) * (size // 256 + 1)
+        data = data[:size]
+        file = BytesIO(data) if size < ENVIRONMENT.STREAMING_THRESHOLD else open(tmp_path / 'upload','w+b')
+        file.write(data)
+
+        first = await service.store_file(file,self.validation_result(data))
+        second = await service.store_file(file,self.validation_result(data))
+
+        # every copy of the same content is kept in its own file
+        assert first.id != second.id
+        assert first.filename.startswith(f'tracks/{sha256(data).hexdigest()}/')
+        assert service.path(first.filename).read_bytes() == data
+        assert first.size == size
+        assert first.content_type == 'audio/mpeg'
+        assert list((tmp_path / '.incoming').iterdir()) == []
+        file.close()
+
+    @pytest.mark.asyncio
+    async def test_signed_urls(self,service):
+        data = b'data'
+        stored = await service.store_file(BytesIO(data),self.validation_result(data))
+        track = TrackFileSchema(
+            id='track_id',
+            name='my track.mp3',
+            author_name='author',
+            size=len(data),
+            file_name=stored.filename
+        )
+
+        download = await service.get_file(track)
+        file_name,expires,disposition,signature = self.download_query(download.url)
+
+        assert service.open_signed(file_name,expires,disposition,signature) == service.path(stored.filename)
+        assert 'my%20track.mp3' in disposition
+        with pytest.raises(HTTPException) as ex:
+            service.open_signed(file_name,expires,'attachment',signature)
+        assert ex.value.status_code == 403
+        with pytest.raises(HTTPException) as ex:
+            service.open_signed(file_name,expires + 1,disposition,signature)
+        assert ex.value.status_code == 403
+        with pytest.raises(HTTPException) as ex:
+            service.path('../outside.mp3')
+        assert ex.value.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_remove_file(self,service):
+        data = b'data'
+        first = await service.store_file(BytesIO(data),self.validation_result(data))
+        second = await service.store_file(BytesIO(data),self.validation_result(data))
+
+        assert await service.remove_file(first.id,first.filename)
+        # removing it again succeeds, so the job that removes it can be retried
+        assert await service.remove_file(first.id,first.filename)
+
+        assert not service.path(first.filename).exists()
+        assert service.path(second.filename).read_bytes() == data
+
+    @pytest.mark.asyncio
+    async def test_store_stream(self,service,tmp_path):
+        data = b'ID3' + bytes(range(256)) * 40
+
+        stored,validation_result = await service.store_stream(self.stream(data),self.stream_validator(data))
+
+        assert stored.filename.startswith(f'tracks/{sha256(data).hexdigest()}/')
+        assert service.path(stored.filename).read_bytes() == data
+        assert validation_result.hash == sha256(data).hexdigest()
+        assert validation_result.sha1 == sha1(data).hexdigest()
+        assert list((tmp_path / '.incoming').iterdir()) == []
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize('content_hash,size,prefix',[
+        ('0' * 64,None,b'ID3'),
+        (None,1000,b'ID3'),
+        (None,None,b'RIFF')
+    ])
+    async def test_invalid_stream_is_not_stored(self,service,tmp_path,content_hash,size,prefix):
+        data = prefix + bytes(range(256)) * 40
+        validator = self.stream_validator(data,content_hash,size)
+
+        with pytest.raises(UploadStreamError) as ex:
+            await service.store_stream(self.stream(data),validator)
+
+        assert ex.value.status_code == 400
+        assert list((tmp_path / '.incoming').iterdir()) == []
+        assert not (tmp_path / 'tracks').exists()
@@ -0,0 +1,151 @@
+import os
+import threading
+import time
+import pytest
+from hashlib import sha1
+from io import BytesIO
+from typing import Dict, List
+from b2sdk.v2.exception import B2ConnectionError
+
+from services.external import LargeFileStorage,MultipartUploader
+from services.external.multipart_upload import MIN_PART_SIZE
+
+class FakeLargeFileStorage(LargeFileStorage):
+    '''
+    keeps the parts in memory, part numbers in 'failures' fail that many times
+    '''
+
+    def __init__(self,failures:Dict[int,int] | None=None,delay:float=0.01):
+        self.failures = dict(failures or {})
+        self.delay = delay
+        self.parts:Dict[int,bytes] = {}
+        self.attempts:List[int] = []
+        self.canceled:List[str] = []
+        self.finished:List[str] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def start(self,file_name,content_type,file_info):
+        self.file_info = file_info
+        return f'large_{file_name}'
+
+    def upload_part(self,file_id,part_number,data,content_sha1):
+        with self._lock:
+            self.attempts.append(part_number)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight,self.in_flight)
+        try:
+            time.sleep(self.delay)
+            assert sha1(data).hexdigest() == content_sha1
+            if self.failures.get(part_number,0) > 0:
+                self.failures[part_number] -= 1
+                raise B2ConnectionError('connection lost')
+            self.parts[part_number] = data
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def finish(self,file_id,part_sha1s):
+        assert part_sha1s == [sha1(self.parts[number]).hexdigest() for number in sorted(self.parts)]
+        self.finished.append(file_id)
+        return b''.join(self.parts[number] for number in sorted(self.parts))
+
+    def cancel(self,file_id):
+        self.canceled.append(file_id)
+
+class TestMultipartUploader:
+
+    @pytest.fixture
+    def content(self) -> bytes:
+        return os.urandom(MIN_PART_SIZE * 4 + 1024)
+
+    @pytest.mark.asyncio
+    async def test_upload(self,content:bytes):
+        storage = FakeLargeFileStorage()
+        uploader = MultipartUploader(storage,MIN_PART_SIZE,3,retry_delay=0)
+
+        result = await uploader.upload(
+            BytesIO(content),
+            'track.mp3',
+            len(content),
+            'audio/mpeg',
+            'content_sha1'
+        )
+
+        assert result == content
+        assert uploader.count_parts(len(content)) == 5
+        assert sorted(storage.parts) == [1,2,3,4,5]
+        assert 1 < storage.max_in_flight <= 3
+        assert storage.file_info == {'large_file_sha1':'content_sha1'}
+        assert storage.finished == ['large_track.mp3']
+
+    @pytest.mark.asyncio
+    async def test_retries_failed_parts(self,content:bytes):
+        storage = FakeLargeFileStorage(failures={2:2})
+        uploader = MultipartUploader(storage,MIN_PART_SIZE,2,part_retries=2,retry_delay=0)
+
+        result = await uploader.upload(BytesIO(content),'track.mp3',len(content),'audio/mpeg')
+
+        assert result == content
+        assert storage.attempts.count(2) == 3
+        assert all(storage.attempts.count(number) == 1 for number in (1,3,4,5))
+        assert storage.canceled == []
+
+    @pytest.mark.asyncio
+    async def test_cancels_abandoned_uploads(self,content:bytes):
+        storage = FakeLargeFileStorage(failures={1:5})
+        uploader = MultipartUploader(storage,MIN_PART_SIZE,2,part_retries=1,retry_delay=0)
+
+        with pytest.raises(B2ConnectionError):
+            await uploader.upload(BytesIO(content),'track.mp3',len(content),'audio/mpeg')
+
+        assert storage.attempts.count(1) == 2
+        assert storage.canceled == ['large_track.mp3']
+        assert storage.finished == []
+
+    @pytest.mark.asyncio
+    async def test_upload_stream(self,content:bytes):
+        storage = FakeLargeFileStorage()
+        uploader = MultipartUploader(storage,MIN_PART_SIZE,3,retry_delay=0)
+
+        async def stream():
+            # chunks that do not line up with the parts
+            for start in range(0,len(content),300_000):
+                yield content[start:start + 300_000]
+
+        result = await uploader.upload_stream(stream(),'track.mp3','audio/mpeg')
+
+        assert result == content
+        assert [len(storage.parts[number]) for number in sorted(storage.parts)] == [MIN_PART_SIZE] * 4 + [1024]
+        assert storage.file_info == {}
+
+    @pytest.mark.asyncio
+    async def test_failed_stream_cancels_the_upload(self,content:bytes):
+        storage = FakeLargeFileStorage()
+        uploader = MultipartUploader(storage,MIN_PART_SIZE,2,retry_delay=0)
+
+        async def stream():
+            yield content[:MIN_PART_SIZE + 1]
+            raise ValueError('invalid content')
+
+        with pytest.raises(ValueError):
+            await uploader.upload_stream(stream(),'track.mp3','audio/mpeg')
+
+        assert storage.canceled == ['large_track.mp3']
+        assert storage.finished == []
+
+    @pytest.mark.asyncio
+    async def test_rejected_first_part_starts_nothing(self):
+        storage = FakeLargeFileStorage()
+        uploader = MultipartUploader(storage,MIN_PART_SIZE,2,retry_delay=0)
+
+        async def stream():
+            raise ValueError('invalid content')
+            yield b''
+
+        with pytest.raises(ValueError):
+            await uploader.upload_stream(stream(),'track.mp3','audio/mpeg')
+
+        assert not hasattr(storage,'file_info')
+        assert storage.canceled == []
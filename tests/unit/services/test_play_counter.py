@@ -0,0 +1,135 @@
+import pytest
+from unittest.mock import MagicMock
+from sqlalchemy.exc import SQLAlchemyError
+
+from models import Track
+from services import PlayCounter
+
+class TestPlayCounter:
+
+    @pytest.fixture
+    def session_factory(self,mocked_db):
+        factory = MagicMock()
+        factory.return_value.__aenter__.return_value = mocked_db
+        return factory
+
+    def get_counter(self,session_factory,**kwargs) -> PlayCounter:
+        return PlayCounter(
+            Track.__table__,
+            session_factory,
+            **{
+                'flush_interval':60,
+                'flush_size':10,
+                'max_pending':20,
+                **kwargs
+            }
+        )
+
+    @pytest.mark.asyncio
+    async def test_record_merges_plays(self,session_factory,mocked_db):
+        counter = self.get_counter(session_factory)
+
+        for _ in range(3):
+            assert counter.record('track_1')
+        assert counter.record('track_2')
+
+        assert len(counter) == 2
+        assert counter.pending('track_1') == 3
+        assert counter.pending('track_2') == 1
+        mocked_db.execute.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_flush(self,session_factory,mocked_db,mocked_get_execute_result):
+        mocked_db.execute.return_value = mocked_get_execute_result
+        mocked_get_execute_result.scalars.return_value.all.return_value = ['track_1','track_2']
+        counter = self.get_counter(session_factory)
+        counter.record('track_2')
+        counter.record('track_1')
+        counter.record('track_1')
+
+        updated = await counter.flush()
+
+        assert updated == 2
+        mocked_db.execute.assert_awaited_once()
+        query = mocked_db.execute.await_args[0][0]
+        assert 'UPDATE tracks SET plays=(tracks.plays + pending_plays.plays) FROM (VALUES' in str(query)
+        assert 'RETURNING tracks.id' in str(query)
+        assert query.compile().params == {
+            'param_1':'track_1',
+            'param_2':2,
+            'param_3':'track_2',
+            'param_4':1
+        }
+        mocked_db.commit.assert_awaited_once()
+        assert len(counter) == 0
+        assert counter.flushed == 3
+        assert await counter.flush() == 0
+        mocked_db.execute.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_flush_drops_unknown_ids(self,session_factory,mocked_db,mocked_get_execute_result):
+        mocked_db.execute.return_value = mocked_get_execute_result
+        mocked_get_execute_result.scalars.return_value.all.return_value = ['track_1']
+        counter = self.get_counter(session_factory)
+        counter.record('track_1')
+        counter.record('wrong_id')
+        counter.record('wrong_id')
+
+        assert await counter.flush() == 1
+
+        assert len(counter) == 0
+        assert counter.flushed == 1
+        assert counter.unmatched == 2
+
+    @pytest.mark.asyncio
+    async def test_failed_flush_keeps_plays(self,session_factory,mocked_db):
+        mocked_db.execute.side_effect = SQLAlchemyError('connection lost')
+        counter = self.get_counter(session_factory)
+        counter.record('track_1')
+        counter.record('track_1')
+
+        assert await counter.flush() == 0
+
+        assert counter.pending('track_1') == 2
+        assert counter.flushed == 0
+
+    @pytest.mark.asyncio
+    async def test_size_threshold_and_budget(self,session_factory):
+        counter = self.get_counter(session_factory,flush_size=2,max_pending=3)
+
+        assert counter.record('track_1')
+        assert not counter._flush_requested.is_set()
+        assert counter.record('track_2')
+        assert counter._flush_requested.is_set()
+        assert counter.record('track_3')
+        # the budget is full, only already buffered ids are accepted
+        assert not counter.record('track_4')
+        assert counter.record('track_1')
+        assert counter.overflowed == 1
+        assert len(counter) == 3
+
+    @pytest.mark.asyncio
+    async def test_dedup(self,session_factory):
+        counter = self.get_counter(session_factory,dedup_window=60)
+
+        assert counter.record('track_1','user_1')
+        assert counter.record('track_1','user_1')
+        assert counter.record('track_1','user_2')
+        assert counter.record('track_1')
+        assert counter.record('track_1')
+
+        assert counter.pending('track_1') == 4
+        assert counter.deduplicated == 1
+
+    @pytest.mark.asyncio
+    async def test_stop_flushes(self,session_factory,mocked_db,mocked_get_execute_result):
+        mocked_db.execute.return_value = mocked_get_execute_result
+        counter = self.get_counter(session_factory)
+        counter.start()
+        counter.record('track_1')
+
+        await counter.stop()
+
+        mocked_db.execute.assert_awaited_once()
+        mocked_db.commit.assert_awaited_once()
+        assert len(counter) == 0
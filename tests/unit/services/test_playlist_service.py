@@ -4,7 +4,8 @@ from schemas import (
     PlaylistSchema,
     PlaylistCreateSchema,
     PlaylistUpdateSchema,
-    PlaylistPrivateUpdateSchema
+    PlaylistPrivateUpdateSchema,
+    PlaylistStatsSchema
 )
 from services import PlaylistService
 
@@ -55,6 +56,16 @@ class TestPlaylistService:
             tracks=[]
         )
 
+    @pytest.fixture
+    def db_playlist_stats(self,db_playlist):
+        return PlaylistStatsSchema(
+            id=db_playlist.id,
+            likes=1,
+            dislikes=0,
+            loves=0,
+            plays=0
+        )
+
     @pytest.fixture
     def playlist_create(self,db_playlist):
         return PlaylistCreateSchema(
@@ -205,6 +216,7 @@ class TestPlaylistService:
         
         assert result == True
     
+    @pytest.mark.asyncio
     @pytest.mark.parametrize('reaction_type,method_name',[
         ('like','add_like_from_user_to_playlist'),
         ('dislike','add_dislike_from_user_to_playlist'),
@@ -216,17 +228,18 @@ class TestPlaylistService:
         method_name,
         mocked_playlist_repository,
         db_playlist,
+        db_playlist_stats,
         user_id
     ):
         match reaction_type:
             case 'like':
-                mocked_playlist_repository.add_like_from_user_to_playlist.return_value = True
+                mocked_playlist_repository.add_like_from_user_to_playlist.return_value = db_playlist_stats
             
             case 'dislike':
-                mocked_playlist_repository.add_dislike_from_user_to_playlist.return_value = True
+                mocked_playlist_repository.add_dislike_from_user_to_playlist.return_value = db_playlist_stats
 
             case 'love':
-                mocked_playlist_repository.add_love_from_user_to_playlist.return_value = True
+                mocked_playlist_repository.add_love_from_user_to_playlist.return_value = db_playlist_stats
 
         service = PlaylistService(mocked_playlist_repository)
 
@@ -252,8 +265,9 @@ class TestPlaylistService:
                     user_id,
                     db_playlist.id
                 )
-        assert result == True
+        assert result == db_playlist_stats
 
+    @pytest.mark.asyncio
     @pytest.mark.parametrize('reaction_type,method_name',[
         ('like','remove_like_from_user_to_playlist'),
         ('dislike','remove_dislike_from_user_to_playlist'),
@@ -265,17 +279,18 @@ class TestPlaylistService:
         method_name,
         mocked_playlist_repository,
         db_playlist,
+        db_playlist_stats,
         user_id
     ):
         match reaction_type:
             case 'like':
-                mocked_playlist_repository.remove_like_from_user_to_playlist.return_value = True
+                mocked_playlist_repository.remove_like_from_user_to_playlist.return_value = db_playlist_stats
             
             case 'dislike':
-                mocked_playlist_repository.remove_dislike_from_user_to_playlist.return_value = True
+                mocked_playlist_repository.remove_dislike_from_user_to_playlist.return_value = db_playlist_stats
 
             case 'love':
-                mocked_playlist_repository.remove_love_from_user_to_playlist.return_value = True
+                mocked_playlist_repository.remove_love_from_user_to_playlist.return_value = db_playlist_stats
 
         service = PlaylistService(mocked_playlist_repository)
 
@@ -301,7 +316,7 @@ class TestPlaylistService:
                     user_id,
                     db_playlist.id
                 )
-        assert result == True
+        assert result == db_playlist_stats
     
     @pytest.mark.asyncio
     async def test_add_track_to_playlist(
@@ -0,0 +1,80 @@
+import pytest
+
+from services import NGramIndex
+
+class TestNGramIndex:
+
+    def get_index(self) -> NGramIndex:
+        index = NGramIndex(('name','author_name'))
+        index.add('track_1',name='Awaken',author_name='Valley of Wolves')
+        index.add('track_2',name='Wake me up',author_name='Avicii')
+        index.add('track_3',name='Levels',author_name='Avicii')
+        return index
+
+    def test_search(self):
+        index = self.get_index()
+
+        assert sorted(index.search('AVIC')) == ['track_2','track_3'] # type: ignore
+        assert sorted(index.search('wake')) == ['track_1','track_2'] # type: ignore
+        assert index.search('me up',('name',)) == ['track_2']
+        assert index.search('avicii',('name',)) == []
+        assert index.search('of wolves',('author_name',)) == ['track_1']
+        assert index.search('missing') == []
+
+    def test_unanswerable_searches(self):
+        index = self.get_index()
+
+        # shorter than the n-grams
+        assert index.search('wa') is None
+        # too many matches
+        assert index.search('avicii',max_results=1) is None
+
+    def test_update_and_remove(self):
+        index = self.get_index()
+
+        index.add('track_3',name='Hey Brother',author_name='Avicii')
+        assert index.search('levels') == []
+        assert index.search('brother') == ['track_3']
+        assert len(index) == 3
+
+        assert index.remove('track_2')
+        assert not index.remove('track_2')
+        assert index.search('avicii') == ['track_3']
+        assert index.removed == 2
+
+        index.compact()
+        assert index.removed == 0
+        assert len(index) == 2
+        assert index.search('avicii') == ['track_3']
+
+    def test_snapshot(self,tmp_path):
+        index = self.get_index()
+        index.remove('track_1')
+        path = str(tmp_path / 'tracks.json')
+
+        index.save(path)
+        restored = NGramIndex(('name','author_name'))
+
+        assert restored.load(path)
+        assert len(restored) == 2
+        assert sorted(restored.search('avicii')) == ['track_2','track_3'] # type: ignore
+        assert not NGramIndex(('name',)).load(path)
+        assert not restored.load(str(tmp_path / 'missing.json'))
+
+    @pytest.mark.asyncio
+    async def test_build_and_replay_changes(self):
+        async def scan():
+            for row in [('track_1','Awaken','Valley of Wolves'),('track_2','Levels','Avicii')]:
+                yield row
+
+        index = self.get_index()
+        index.record_changes()
+        index.add('track_4',name='Wake up',author_name='Avicii')
+        index.remove('track_1')
+
+        rebuilt = NGramIndex(('name','author_name'))
+        assert await rebuilt.build(scan()) == 2
+        assert index.replay_changes(rebuilt) > 0
+
+        assert 'track_1' not in rebuilt
+        assert sorted(rebuilt.search('avicii')) == ['track_2','track_4'] # type: ignore
@@ -0,0 +1,42 @@
+import pytest
+from fastapi import Depends,FastAPI
+from httpx import ASGITransport,AsyncClient
+
+from services import require_stats_token
+from settings import ENVIRONMENT
+from tools import STATS_TOKEN_HEADER
+
+class TestRequireStatsToken:
+
+    @pytest.fixture
+    def app(self):
+        app = FastAPI()
+
+        @app.get('/stats',dependencies=[Depends(require_stats_token)])
+        async def stats():
+            return {'failed_jobs':[]}
+
+        return app
+
+    async def get(self,app,headers=None):
+        async with AsyncClient(base_url='http://test',transport=ASGITransport(app=app)) as client:
+            return await client.get('/stats',headers=headers)
+
+    @pytest.mark.asyncio
+    async def test_stats_are_hidden_without_token(self,app,monkeypatch):
+        monkeypatch.setattr(ENVIRONMENT,'_stats_token','')
+
+        response = await self.get(app,{STATS_TOKEN_HEADER:''})
+
+        assert response.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_stats_require_the_token(self,app,monkeypatch):
+        monkeypatch.setattr(ENVIRONMENT,'_stats_token','secret')
+
+        missing = await self.get(app)
+        wrong = await self.get(app,{STATS_TOKEN_HEADER:'other'})
+        right = await self.get(app,{STATS_TOKEN_HEADER:'secret'})
+
+        assert missing.status_code == wrong.status_code == 403
+        assert right.json() == {'failed_jobs':[]}
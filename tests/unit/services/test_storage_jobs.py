@@ -0,0 +1,104 @@
+import pytest
+from unittest.mock import AsyncMock,MagicMock
+from sqlalchemy.dialects import postgresql
+
+from models import StorageJobKind,StorageJobStatus
+from services import StorageJobRunner
+
+class TestStorageJobRunner:
+
+    @pytest.fixture
+    def session_factory(self,mocked_db):
+        factory = MagicMock()
+        factory.return_value.__aenter__.return_value = mocked_db
+        return factory
+
+    def get_runner(self,session_factory,handler,**kwargs) -> StorageJobRunner:
+        return StorageJobRunner(
+            {StorageJobKind.REMOVE_FILE:handler},
+            session_factory,
+            **{
+                'workers':1,
+                'batch_size':10,
+                'poll_interval':60,
+                'max_attempts':3,
+                'retry_delay':2,
+                'max_retry_delay':600,
+                'lease':300,
+                'retention':3600,
+                **kwargs
+            }
+        )
+
+    def claimed(self,mocked_db,mocked_get_execute_result,*attempts:int):
+        mocked_db.execute.return_value = mocked_get_execute_result
+        mocked_get_execute_result.all.return_value = [
+            MagicMock(
+                id=f'job_{i}',
+                kind=StorageJobKind.REMOVE_FILE,
+                payload={'file_id':f'file_{i}','file_name':f'tracks/{i}.mp3'},
+                attempts=attempt
+            )
+            for i,attempt in enumerate(attempts)
+        ]
+
+    def finished(self,mocked_db):
+        return [
+            call[0][0].compile(dialect=postgresql.dialect()).params
+            for call in mocked_db.execute.await_args_list[1:]
+        ]
+
+    @pytest.mark.asyncio
+    async def test_run_pending(self,session_factory,mocked_db,mocked_get_execute_result):
+        handler = AsyncMock()
+        self.claimed(mocked_db,mocked_get_execute_result,1,1)
+        runner = self.get_runner(session_factory,handler)
+
+        assert await runner.run_pending() == 2
+
+        query = str(mocked_db.execute.await_args_list[0][0][0].compile(dialect=postgresql.dialect()))
+        assert query.startswith('UPDATE storage_jobs SET attempts=(storage_jobs.attempts +')
+        assert 'FOR UPDATE SKIP LOCKED' in query
+        handler.assert_any_await({'file_id':'file_0','file_name':'tracks/0.mp3'})
+        assert [params['status'] for params in self.finished(mocked_db)] == [StorageJobStatus.DONE] * 2
+        assert runner.completed == 2
+
+    @pytest.mark.asyncio
+    async def test_failed_jobs_are_retried_with_backoff(self,session_factory,mocked_db,mocked_get_execute_result):
+        handler = AsyncMock(side_effect=RuntimeError('storage unavailable'))
+        self.claimed(mocked_db,mocked_get_execute_result,1,3)
+        runner = self.get_runner(session_factory,handler)
+
+        await runner.run_pending()
+
+        retried,failed = self.finished(mocked_db)
+        assert retried['status'] == StorageJobStatus.PENDING
+        assert retried['last_error'] == 'RuntimeError: storage unavailable'
+        assert 'run_after' in retried
+        # the last attempt is not retried
+        assert failed['status'] == StorageJobStatus.FAILED
+        assert 'run_after' not in failed
+        assert runner.retried == 1
+        assert runner.failed == 1
+
+    @pytest.mark.asyncio
+    async def test_failure_handler_runs_once_a_job_gives_up(self,session_factory,mocked_db,mocked_get_execute_result):
+        failure_handler = AsyncMock()
+        self.claimed(mocked_db,mocked_get_execute_result,2,3)
+        runner = self.get_runner(
+            session_factory,
+            AsyncMock(side_effect=RuntimeError('storage unavailable')),
+            failure_handlers={StorageJobKind.REMOVE_FILE:failure_handler}
+        )
+
+        await runner.run_pending()
+
+        failure_handler.assert_awaited_once_with({'file_id':'file_1','file_name':'tracks/1.mp3'})
+
+    def test_retry_delay_is_capped(self,session_factory):
+        runner = self.get_runner(session_factory,AsyncMock(),retry_delay=2,max_retry_delay=10)
+
+        first = runner._next_attempt(1)
+        last = runner._next_attempt(20)
+
+        assert (last - first).total_seconds() <= 10
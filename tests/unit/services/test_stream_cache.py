@@ -0,0 +1,77 @@
+import asyncio
+import pytest
+from typing import IO
+
+from services import TrackFileCache
+
+class TestTrackFileCache:
+
+    @pytest.fixture
+    def cache(self,tmp_path):
+        cache = TrackFileCache(tmp_path,10)
+        cache.start()
+        yield cache
+        cache.stop()
+
+    def filler(self,data:bytes,calls:list):
+        async def fill(target:IO[bytes]) -> None:
+            calls.append(data)
+            await asyncio.sleep(0)
+            target.write(data)
+        return fill
+
+    @pytest.mark.asyncio
+    async def test_concurrent_misses_share_a_fill(self,cache):
+        calls = []
+        fill = self.filler(b'abcd',calls)
+
+        paths = await asyncio.gather(*[cache.acquire('hash_1',fill) for _ in range(3)])
+
+        assert len(calls) == 1
+        assert all(path.read_bytes() == b'abcd' for path in paths)
+        for _ in paths:
+            cache.release('hash_1',4)
+        assert await cache.acquire('hash_1',fill) == paths[0]
+        cache.release('hash_1',4)
+
+        stats = cache.stats()
+        assert stats['misses'] == 1
+        assert stats['coalesced'] == 2
+        assert stats['hits'] == 1
+        assert stats['bytes_served'] == 16
+
+    @pytest.mark.asyncio
+    async def test_least_recently_used_files_are_evicted(self,cache):
+        calls = []
+        first = await cache.acquire('hash_1',self.filler(b'1111',calls))
+        cache.release('hash_1')
+        await cache.acquire('hash_2',self.filler(b'2222',calls))
+        cache.release('hash_2')
+        # served while the cache is full, so it is kept until released
+        await cache.acquire('hash_1',self.filler(b'1111',calls))
+        await cache.acquire('hash_3',self.filler(b'3333',calls))
+        cache.release('hash_3')
+
+        assert len(calls) == 3
+        assert first.exists()
+        assert cache.size == 8
+        assert cache.stats()['evictions'] == 1
+
+        cache.release('hash_1')
+        await cache.acquire('hash_4',self.filler(b'4444',calls))
+        cache.release('hash_4')
+
+        assert not first.exists()
+        assert cache.size == 8
+
+    @pytest.mark.asyncio
+    async def test_failed_fill_is_not_cached(self,cache,tmp_path):
+        async def fill(target:IO[bytes]) -> None:
+            target.write(b'partial')
+            raise RuntimeError('storage unavailable')
+
+        with pytest.raises(RuntimeError):
+            await cache.acquire('hash_1',fill)
+
+        assert len(cache) == 0
+        assert list((cache._directory / '.incoming').iterdir()) == []
@@ -1,11 +1,16 @@
 import pytest
+from unittest.mock import MagicMock
 
-from services import TrackService
+from services import TrackService,TrackSearchMode,NGramIndex
+from services.content_hashes import ContentHashFilterRefresher,KnownContentCache
+from settings import ENVIRONMENT
 from schemas import (
+    BlobSchema,
     TrackSchema,
     TrackUploadSchema,
     TrackUpdateSchema,
-    TrackPrivateUpdateSchema
+    TrackPrivateUpdateSchema,
+    TrackStatsSchema
 )
 
 class TestTrackService:
@@ -37,7 +42,6 @@ class TestTrackService:
     @pytest.fixture
     def track_upload(self):
         return TrackUploadSchema(
-            file_id='file_id',
             name='my track',
             author_name='me',
             content_hash='content_hash'
@@ -47,7 +51,8 @@ class TestTrackService:
     def db_track(self,track_upload):
         return TrackSchema(
             id='track_id',
-            file_id=track_upload.file_id,
+            file_id='file_id',
+            file_name='tracks/content_hash.mp3',
             content_hash=track_upload.content_hash,
             name=track_upload.name,
             author_name=track_upload.author_name,
@@ -60,6 +65,25 @@ class TestTrackService:
             playlists=[]
         )
 
+    @pytest.fixture
+    def blob(self,db_track):
+        return BlobSchema(
+            content_hash=db_track.content_hash,
+            file_id=db_track.file_id,
+            file_name=db_track.file_name,
+            size=db_track.size
+        )
+
+    @pytest.fixture
+    def db_track_stats(self,db_track):
+        return TrackStatsSchema(
+            id=db_track.id,
+            likes=1,
+            dislikes=0,
+            loves=0,
+            plays=0
+        )
+
     @pytest.fixture
     def track_update(self):
         return TrackUpdateSchema(
@@ -74,6 +98,7 @@ class TestTrackService:
         return TrackSchema(
             id=db_track.id,
             file_id=db_track.file_id,
+            file_name=db_track.file_name,
             content_hash=db_track.content_hash,
             uploaded_by=db_track.uploaded_by,
             name=db_track.name,
@@ -98,6 +123,7 @@ class TestTrackService:
         return TrackSchema(
             id=db_track.id,
             file_id=db_track.file_id,
+            file_name=db_track.file_name,
             content_hash=db_track.content_hash,
             uploaded_by=db_track.uploaded_by,
             name=track_private_update.name,
@@ -141,6 +167,28 @@ class TestTrackService:
         mocked_track_repository.get_by_id.assert_awaited_once_with(db_track.id)
         self.assert_tracks_equals(track,db_track)
     
+    @pytest.mark.asyncio
+    async def test_search_tracks_ranked(
+        self,
+        mocked_track_repository,
+        db_track
+    ):
+        mocked_track_repository.rank_tracks_by_text.return_value = [db_track]
+
+        service = TrackService(mocked_track_repository)
+
+        tracks = await service.search_tracks('awaken',10,20,TrackSearchMode.RANKED,'ignored')
+
+        mocked_track_repository.rank_tracks_by_text.assert_awaited_once_with(
+            'awaken',
+            10,
+            20,
+            ENVIRONMENT.SEARCH_RANK_CANDIDATES
+        )
+        mocked_track_repository.search_tracks_by_text.assert_not_awaited()
+        assert len(tracks) == 1
+        self.assert_tracks_equals(tracks[0],db_track)
+    
     @pytest.mark.asyncio
     async def test_update_track(
         self,
@@ -168,15 +216,19 @@ class TestTrackService:
         track_private_update,
         track_private_updated
     ):
-        mocked_track_repository.get_by_id.return_value = db_track
-        mocked_track_repository.update.return_value = track_private_updated
+        mocked_track_repository.update_fields.return_value = track_private_updated
 
         service = TrackService(mocked_track_repository)
 
         track = await service.private_update(db_track.id,track_private_update)
 
-        mocked_track_repository.get_by_id.assert_awaited_once_with(db_track.id)
-        mocked_track_repository.update.assert_awaited_once()
+        # only the given fields are written, in a single statement
+        mocked_track_repository.update_fields.assert_awaited_once_with(
+            db_track.id,
+            name=track_private_update.name,
+            author_name=track_private_update.author_name
+        )
+        mocked_track_repository.update.assert_not_awaited()
         self.assert_tracks_equals(track,track_private_updated)
     
     @pytest.mark.asyncio
@@ -185,15 +237,58 @@ class TestTrackService:
         mocked_track_repository,
         db_track
     ):
-        mocked_track_repository.delete.return_value = True
+        mocked_track_repository.delete_reference.return_value = (True,None)
 
         service = TrackService(mocked_track_repository)
 
         result = await service.delete(db_track.id)
 
-        mocked_track_repository.delete.assert_awaited_once_with(db_track.id)
+        mocked_track_repository.delete_reference.assert_awaited_once_with(db_track.id)
         assert result == True
+
+    @pytest.mark.asyncio
+    async def test_create_track_with_blob(
+        self,
+        mocked_track_repository,
+        db_track,
+        track_upload,
+        blob
+    ):
+        mocked_track_repository.create.return_value = db_track
+
+        service = TrackService(mocked_track_repository)
+
+        await service.create(track_upload,uploaded_by='me')
+        db_instance,db_blob = mocked_track_repository.create.await_args.args
+        assert db_instance.content_hash == track_upload.content_hash
+        assert db_instance.uploaded_by == 'me'
+        assert db_blob is None
+
+        await service.create(track_upload,blob,uploaded_by='me')
+        _,db_blob = mocked_track_repository.create.await_args.args
+        assert db_blob.file_id == blob.file_id
+        assert db_blob.file_name == blob.file_name
+
+    @pytest.mark.asyncio
+    async def test_remove_last_reference(
+        self,
+        mocked_track_repository,
+        db_track,
+        blob
+    ):
+        known_contents = KnownContentCache(10,60)
+        known_contents.put(blob)
+        mocked_track_repository.delete_reference.return_value = (True,blob)
+
+        service = TrackService(mocked_track_repository,known_contents=known_contents)
+
+        deleted,orphan = await service.remove(db_track.id)
+
+        assert deleted
+        assert orphan == blob
+        assert known_contents.get(blob.content_hash) is None
     
+    @pytest.mark.asyncio
     @pytest.mark.parametrize('reaction_type,method_name',[
         ('like','add_like_from_user_to_track'),
         ('dislike','add_dislike_from_user_to_track'),
@@ -205,15 +300,16 @@ class TestTrackService:
         method_name,
         mocked_track_repository,
         db_track,
+        db_track_stats,
         user_id
     ):
         match reaction_type:
             case 'like':
-                mocked_track_repository.add_like_from_user_to_track.return_value = True
+                mocked_track_repository.add_like_from_user_to_track.return_value = db_track_stats
             case 'dislike':
-                mocked_track_repository.add_dislike_from_user_to_track.return_value = True
+                mocked_track_repository.add_dislike_from_user_to_track.return_value = db_track_stats
             case 'love':
-                mocked_track_repository.add_love_from_user_to_track.return_value = True
+                mocked_track_repository.add_love_from_user_to_track.return_value = db_track_stats
             
         service = TrackService(mocked_track_repository)
         method = getattr(service,method_name)
@@ -236,8 +332,9 @@ class TestTrackService:
                     db_track.id
                 )
         
-        assert result == True
+        assert result == db_track_stats
     
+    @pytest.mark.asyncio
     @pytest.mark.parametrize('reaction_type,method_name',[
         ('like','remove_like_from_user_to_track'),
         ('dislike','remove_dislike_from_user_to_track'),
@@ -249,15 +346,16 @@ class TestTrackService:
         method_name,
         mocked_track_repository,
         db_track,
+        db_track_stats,
         user_id
     ):
         match reaction_type:
             case 'like':
-                mocked_track_repository.remove_like_from_user_to_track.return_value = True
+                mocked_track_repository.remove_like_from_user_to_track.return_value = db_track_stats
             case 'dislike':
-                mocked_track_repository.remove_dislike_from_user_to_track.return_value = True
+                mocked_track_repository.remove_dislike_from_user_to_track.return_value = db_track_stats
             case 'love':
-                mocked_track_repository.remove_love_from_user_to_track.return_value = True
+                mocked_track_repository.remove_love_from_user_to_track.return_value = db_track_stats
             
         service = TrackService(mocked_track_repository)
         method = getattr(service,method_name)
@@ -280,4 +378,112 @@ class TestTrackService:
                     db_track.id
                 )
         
-        assert result == True
\ No newline at end of file
+        assert result == db_track_stats
+
+    @pytest.mark.asyncio
+    async def test_search_from_index(
+        self,
+        mocked_track_repository,
+        db_track
+    ):
+        index = NGramIndex(('name','author_name'))
+        index.add(db_track.id,name=db_track.name,author_name=db_track.author_name)
+        mocked_track_repository.get_instances_by_ids.return_value = [db_track]
+
+        service = TrackService(mocked_track_repository,search_index=index)
+
+        tracks = await service.get_tracks_with_name_like(db_track.name[:4],10,0)
+
+        mocked_track_repository.get_instances_by_ids.assert_awaited_once_with([db_track.id],10,0,None)
+        mocked_track_repository.get_tracks_with_name_like.assert_not_awaited()
+        assert len(tracks) == 1
+
+        await service.get_tracks_with_name_like('ab',10,0)
+        mocked_track_repository.get_tracks_with_name_like.assert_awaited_once_with('ab',10,0,None)
+
+    @pytest.mark.asyncio
+    async def test_writes_update_index(
+        self,
+        mocked_track_repository,
+        db_track,
+        track_upload
+    ):
+        index = NGramIndex(('name','author_name'))
+        mocked_track_repository.create.return_value = db_track
+        mocked_track_repository.delete_reference.return_value = (True,None)
+
+        service = TrackService(mocked_track_repository,search_index=index)
+
+        await service.create(track_upload)
+        assert db_track.id in index
+
+        await service.delete(db_track.id)
+        assert db_track.id not in index
+
+    @pytest.mark.asyncio
+    async def test_get_by_content_hash(
+        self,
+        mocked_track_repository,
+        db_track,
+        track_upload
+    ):
+        content_hashes = ContentHashFilterRefresher(100,0.01,MagicMock(),MagicMock(),0)
+        mocked_track_repository.create.return_value = db_track
+        mocked_track_repository.get_by_content_hash.return_value = db_track
+
+        service = TrackService(mocked_track_repository,content_hashes=content_hashes)
+
+        # a new content is answered by the filter
+        assert await service.get_by_content_hash('new_content_hash','me') is None
+        assert await service.get_blob('new_content_hash') is None
+        mocked_track_repository.get_by_content_hash.assert_not_awaited()
+        mocked_track_repository.get_blob.assert_not_awaited()
+
+        await service.create(track_upload)
+        track = await service.get_by_content_hash(track_upload.content_hash,'me')
+
+        self.assert_tracks_equals(track,db_track)
+        mocked_track_repository.get_by_content_hash.assert_awaited_once_with(track_upload.content_hash,'me')
+
+    @pytest.mark.asyncio
+    async def test_find_content(
+        self,
+        mocked_track_repository,
+        db_track,
+        blob
+    ):
+        known_contents = KnownContentCache(10,60)
+        mocked_track_repository.get_blob.return_value = blob
+        mocked_track_repository.get_id_by_content_hash.return_value = None
+
+        service = TrackService(mocked_track_repository,known_contents=known_contents)
+
+        assert await service.find_content(blob.content_hash,'me') == (blob,None)
+        # the track of another user with the content is returned too
+        mocked_track_repository.get_id_by_content_hash.return_value = db_track.id
+        assert await service.find_content(blob.content_hash,'other') == (blob,db_track.id)
+        mocked_track_repository.get_blob.assert_awaited_once_with(blob.content_hash)
+        mocked_track_repository.get_id_by_content_hash.assert_awaited_with(blob.content_hash,'other')
+
+        mocked_track_repository.delete_reference.return_value = (True,blob)
+        await service.delete(db_track.id)
+        mocked_track_repository.get_blob.return_value = None
+        assert await service.find_content(blob.content_hash,'me') is None
+
+    @pytest.mark.asyncio
+    async def test_get_blob_not_stored(
+        self,
+        mocked_track_repository,
+        blob
+    ):
+        known_contents = KnownContentCache(10,60)
+        service = TrackService(mocked_track_repository,known_contents=known_contents)
+
+        mocked_track_repository.get_blob.return_value = blob.model_copy(update={'status':'processing'})
+        assert (await service.get_blob(blob.content_hash)).status == 'processing'
+        # only stored blobs are cached
+        assert known_contents.get(blob.content_hash) is None
+
+        # a failed content is uploaded again
+        mocked_track_repository.get_blob.return_value = blob.model_copy(update={'status':'failed'})
+        assert await service.get_blob(blob.content_hash) is None
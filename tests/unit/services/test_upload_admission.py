@@ -0,0 +1,104 @@
+import asyncio
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI,HTTPException,Request
+from httpx import ASGITransport,AsyncClient
+
+from services import AuthService,UploadAdmissionController,UploadAdmissionMiddleware
+
+class TestUploadAdmissionController:
+
+    def test_limits(self):
+        controller = UploadAdmissionController(3,2,100,7)
+
+        controller.admit('user_1',40)
+        controller.admit('user_1',40)
+        with pytest.raises(HTTPException) as ex:
+            controller.admit('user_1',1)
+        assert ex.value.status_code == 429
+        assert ex.value.headers == {'Retry-After':'7'}
+
+        # over the bytes budget
+        with pytest.raises(HTTPException) as ex:
+            controller.admit('user_2',21)
+        assert ex.value.status_code == 503
+
+        controller.admit('user_2',20)
+        with pytest.raises(HTTPException) as ex:
+            controller.admit('user_3',0)
+        assert ex.value.status_code == 503
+
+        controller.release('user_1',40)
+        controller.admit('user_3',40)
+        assert controller.uploads == 3
+        assert controller.bytes_in_flight == 100
+        assert controller.stats()['rejected'] == 3
+
+    def test_a_large_upload_is_admitted_alone(self):
+        controller = UploadAdmissionController(3,2,100,7)
+
+        controller.admit('user_1',500)
+
+        assert controller.bytes_in_flight == 500
+
+class TestUploadAdmissionMiddleware:
+
+    @pytest.fixture
+    def controller(self):
+        return UploadAdmissionController(1,1,1000,5)
+
+    @pytest.fixture
+    def app(self,controller):
+        app = FastAPI()
+        app.state.started = asyncio.Event()
+        app.state.finish = asyncio.Event()
+
+        @app.post('/upload')
+        async def upload(request:Request):
+            app.state.started.set()
+            body = await request.body()
+            await app.state.finish.wait()
+            return {'size':len(body)}
+
+        app.add_middleware(UploadAdmissionMiddleware,controller=controller,routes=[('POST','/upload',100)])
+        return app
+
+    @pytest_asyncio.fixture
+    async def client(self,app):
+        token = AuthService(None).create_access_token({'sub':'user_1'})
+        async with AsyncClient(
+            base_url='http://test',
+            transport=ASGITransport(app=app),
+            headers={'Authorization':f'Bearer {token}'}
+        ) as client:
+            yield client
+
+    @pytest.mark.asyncio
+    async def test_uploads_are_admitted_before_the_body_is_read(self,app,client,controller):
+        first = asyncio.create_task(client.post('/upload',content=b'x' * 50))
+        await app.state.started.wait()
+
+        second = await client.post('/upload',content=b'x' * 50)
+        too_large = await client.post('/upload',content=b'x' * 101)
+        anonymous = await client.post('/upload',content=b'x',headers={'Authorization':''})
+        app.state.finish.set()
+
+        assert second.status_code == 429
+        assert second.headers['Retry-After'] == '5'
+        assert too_large.status_code == 413
+        assert anonymous.status_code == 401
+        assert (await first).json() == {'size':50}
+        assert controller.uploads == 0
+
+    @pytest.mark.asyncio
+    async def test_body_larger_than_announced_is_cut(self,app,client,controller):
+        async def body():
+            for _ in range(3):
+                yield b'x' * 50
+
+        app.state.finish.set()
+        response = await client.post('/upload',content=body())
+
+        assert response.status_code == 413
+        assert controller.stats()['aborted'] == 1
+        assert controller.uploads == 0
@@ -1,13 +1,18 @@
 import pytest
+from hashlib import sha1,sha256
+from io import BytesIO
+from fastapi import HTTPException
 from unittest.mock import MagicMock,AsyncMock
 import os
 from typing import Tuple
 from fastapi import UploadFile
 import datetime
 import time
+from urllib.parse import quote,unquote
 
 from services.external.upload_download import BackBlazeB2Service
-from schemas import TrackSchema
+from schemas import TrackSchema,TrackFileSchema
+from settings import ENVIRONMENT
 from b2sdk.v2 import Bucket,B2Api,FileVersion
 
 class TestBackBlazeB2Service:
@@ -29,10 +34,6 @@ class TestBackBlazeB2Service:
     def track_name(self):
         return 'Awaken.m4a'
     
-    @pytest.fixture
-    def new_track_name(self):
-        return 'New Name.m4a'
-    
     @pytest.fixture
     def content_type(self):
         return "audio/x-m4a"
@@ -77,26 +78,6 @@ class TestBackBlazeB2Service:
         )
         return result
     
-    @pytest.fixture
-    def track_uploaded_copy(
-        self,
-        new_track_name,
-        content_type,
-        content_sha1,
-        file_size,
-        upload_timestamp
-    ):
-        result = AsyncMock(spec=FileVersion)
-        result.configure_mock(
-            id_='new_file_id',
-            file_name=new_track_name,
-            content_type=content_type,
-            content_sha1=content_sha1,
-            size=file_size,
-            upload_timestamp=upload_timestamp
-        )
-        return result
-    
     @pytest.fixture
     def track(
         self,
@@ -114,6 +95,7 @@ class TestBackBlazeB2Service:
             playlists=[],
             uploaded_by='me',
             file_id='file_id',
+            file_name=track_uploaded.file_name,
             content_hash='hash'
         )
 
@@ -123,18 +105,22 @@ class TestBackBlazeB2Service:
         bucket,
         track_uploaded:FileVersion,
         file_to_upload:UploadFile,
-        track_name:str,
+        filepath:str
     ):
-        
+        with open(filepath,'rb') as f:
+            content = f.read()
+
         def mock_upload(*args,**kwargs):
             return track_uploaded
 
         service = BackBlazeB2Service(True)
         bucket.upload.side_effect = mock_upload
         service._bucket = bucket
-        track,_ = await service.upload_file(file_to_upload,track_name)
+        track,_ = await service.upload_file(file_to_upload)
 
         bucket.upload.assert_called_once()
+        # the stored file is named after its content
+        assert bucket.upload.call_args.kwargs['file_name'] == f'tracks/{sha256(content).hexdigest()}.m4a'
         assert track.id == track_uploaded.id_
         assert track.filename == track_uploaded.file_name
         assert track.content_sha1 == track_uploaded.content_sha1
@@ -146,6 +132,46 @@ class TestBackBlazeB2Service:
         )
         assert track.uploaded_at == uploaded_at
     
+    @pytest.mark.asyncio
+    async def test_upload_file_single_pass_hashes(
+        self,
+        bucket,
+        track_uploaded:FileVersion,
+        file_to_upload:UploadFile,
+        filepath:str
+    ):
+        with open(filepath,'rb') as f:
+            content = f.read()
+
+        service = BackBlazeB2Service(True)
+        bucket.upload.return_value = track_uploaded
+        service._bucket = bucket
+
+        _,content_hash = await service.upload_file(file_to_upload)
+
+        assert content_hash == sha256(content).hexdigest()
+        upload_source = bucket.upload.call_args.kwargs['upload_source']
+        assert upload_source.get_content_sha1() == sha1(content).hexdigest()
+
+    @pytest.mark.asyncio
+    async def test_upload_file_rejects_content_from_header(
+        self,
+        bucket
+    ):
+        data = BytesIO(b'not an audio file' * (ENVIRONMENT.CHUNK_SIZE // 8))
+        file = UploadFile(data,filename='fake.m4a',size=len(data.getvalue()))
+
+        service = BackBlazeB2Service(True)
+        service._bucket = bucket
+
+        with pytest.raises(HTTPException) as error:
+            await service.upload_file(file)
+
+        assert error.value.status_code == 415
+        # only the first chunk was read
+        assert data.tell() <= ENVIRONMENT.CHUNK_SIZE
+        bucket.upload.assert_not_called()
+
     @pytest.mark.asyncio
     async def test_get_file(
         self,
@@ -156,8 +182,7 @@ class TestBackBlazeB2Service:
     ):
         service = BackBlazeB2Service(True)
         bucket.get_download_authorization.return_value='authorization-token'
-        api.get_file_info.return_value = track_uploaded
-        api.get_download_url_for_file_name.return_value = f'http://www.theplaylist.com/{track_uploaded.file_name}'
+        api.get_download_url_for_file_name.side_effect = lambda bucket_name,file_name: f'http://www.theplaylist.com/{file_name}'
 
         service._api = api
         service._bucket = bucket
@@ -165,49 +190,67 @@ class TestBackBlazeB2Service:
         track_download = await service.get_file(track)
 
         bucket.get_download_authorization.assert_called_once()
-        api.get_file_info.assert_called_once()
+        api.get_file_info.assert_not_called()
         api.get_download_url_for_file_name.assert_called_once()
 
         assert track_download.author_name == track.author_name
         assert track_download.name == track.name
         assert track_download.size == track.size
-        assert track_download.url == f'http://www.theplaylist.com/{track_uploaded.file_name}?Authorization=authorization-token'
-
+        url,disposition = track_download.url.split('&b2ContentDisposition=')
+        assert url == f'http://www.theplaylist.com/{track_uploaded.file_name}?Authorization=authorization-token'
+        # the client saves the file with the name of the track
+        assert unquote(disposition) == f'inline; filename="{track.name}"; filename*=UTF-8\'\'{quote(track.name)}'
+    
     @pytest.mark.asyncio
-    async def test_rename_file(
+    async def test_get_file_cached_authorization(
         self,
-        bucket,
+        track:TrackSchema,
         api,
-        track,
-        track_uploaded_copy:FileVersion,
-        track_name,
-        new_track_name,
+        bucket
     ):
-        
-        def mock_copy(*args,**kwargs):
-            return track_uploaded_copy
-        
-        bucket.copy.side_effect = mock_copy
+        service = BackBlazeB2Service(True)
+        bucket.get_download_authorization.return_value='authorization-token'
+        api.get_download_url_for_file_name.side_effect = lambda bucket_name,file_name: f'http://www.theplaylist.com/{file_name}'
+
+        service._api = api
+        service._bucket = bucket
+
+        first_download = await service.get_file(track)
+        second_download = await service.get_file(track)
 
+        bucket.get_download_authorization.assert_called_once()
+        api.get_download_url_for_file_name.assert_called_once()
+        assert first_download.url == second_download.url
+        assert second_download.expires >= ENVIRONMENT.BACKBLAZEB2_URL_LIFETIME - 1
+
+    @pytest.mark.asyncio
+    async def test_get_files(
+        self,
+        api,
+        bucket
+    ):
         service = BackBlazeB2Service(True)
+        bucket.get_download_authorization.side_effect = lambda file_name_prefix,valid_duration_in_seconds: f'token-{file_name_prefix}'
+        api.get_download_url_for_file_name.side_effect = lambda bucket_name,file_name: f'http://www.theplaylist.com/{file_name}'
+
         service._api = api
         service._bucket = bucket
 
-        new_track = await service.rename_file(track.file_id,track_name,new_track_name)
-        bucket.copy.assert_called_once()
-        api.delete_file_version.assert_called_once_with(track.file_id,track_name,True)
+        tracks = [
+            TrackFileSchema(id=f'track_{i}',name=f'track {i}.m4a',author_name='me',size=10,file_name=f'tracks/{i % 3}.m4a')
+            for i in range(9)
+        ]
+        downloads = await service.get_files(tracks)
+
+        assert bucket.get_download_authorization.call_count == 3
+        api.get_file_info.assert_not_called()
+        assert [download.id for download in downloads] == [track.id for track in tracks]
+        for track,download in zip(tracks,downloads):
+            assert download.name == track.name
+            assert download.url.startswith(
+                f'http://www.theplaylist.com/{quote(track.file_name)}?Authorization=token-{track.file_name}&'
+            )
 
-        assert new_track.content_sha1 == track_uploaded_copy.content_sha1
-        assert new_track.content_type == track_uploaded_copy.content_type
-        assert new_track.filename == track_uploaded_copy.file_name
-        assert new_track.id == track_uploaded_copy.id_
-        assert new_track.size == track_uploaded_copy.size
-        uploaded_at = datetime.datetime.fromtimestamp(
-            track_uploaded_copy.upload_timestamp / 1000,
-            datetime.UTC
-        )
-        assert new_track.uploaded_at == uploaded_at
-    
     @pytest.mark.asyncio
     async def test_remove_file(
         self,
@@ -224,4 +267,40 @@ class TestBackBlazeB2Service:
         result = await service.remove_file(track.file_id,track_name)
 
         api.delete_file_version.assert_called_once_with(track.file_id,track_name,True)
-        assert result == True
\ No newline at end of file
+        assert result == True
+
+    @pytest.mark.asyncio
+    async def test_authorize(
+        self,
+        api,
+        bucket
+    ):
+        api.get_bucket_by_id.return_value = bucket
+
+        service = BackBlazeB2Service()
+        service._api = api
+
+        assert service.is_ready == False
+
+        result = await service.authorize()
+
+        api.authorize_account.assert_called_once()
+        api.get_bucket_by_id.assert_called_once()
+        assert result == True
+        assert service.is_ready == True
+        assert service._bucket == bucket
+    
+    @pytest.mark.asyncio
+    async def test_authorize_failure(
+        self,
+        api
+    ):
+        api.authorize_account.side_effect = Exception('connection refused')
+
+        service = BackBlazeB2Service()
+        service._api = api
+
+        result = await service.authorize()
+
+        assert result == False
+        assert service.is_ready == False
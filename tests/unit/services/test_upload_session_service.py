@@ -0,0 +1,125 @@
+import datetime
+import os
+import pytest
+from hashlib import sha1,sha256
+from fastapi import HTTPException
+
+from models import UploadSession
+from schemas import UploadSessionCreateSchema
+from services import UploadSessionService
+from services import upload_session
+from settings import ENVIRONMENT
+
+class TestUploadSessionService:
+
+    @pytest.fixture
+    def content(self) -> bytes:
+        return os.urandom(3000)
+
+    @pytest.fixture
+    def db_session(self,content:bytes,tmp_path,monkeypatch):
+        monkeypatch.setattr(ENVIRONMENT,'_upload_sessions_dir',str(tmp_path))
+        return UploadSession(
+            id='session_id',
+            user_id='user_id',
+            track_name='track',
+            author_name='me',
+            file_name='track.mp3',
+            size=len(content),
+            received=0,
+            expires_at=datetime.datetime.now(datetime.UTC) + datetime.timedelta(hours=1)
+        )
+
+    async def send(self,service:UploadSessionService,db_session:UploadSession,chunk:bytes):
+        session = await service.append('session_id','user_id',db_session.received,chunk) # type: ignore
+        db_session.received = session.received # type: ignore
+        return session
+
+    @pytest.mark.asyncio
+    async def test_upload_in_chunks(
+        self,
+        mocked_upload_session_repository,
+        db_session:UploadSession,
+        content:bytes
+    ):
+        mocked_upload_session_repository.delete_expired.return_value = []
+        mocked_upload_session_repository.create.return_value = db_session
+        mocked_upload_session_repository.lock.return_value = db_session
+        mocked_upload_session_repository.get_by_id.return_value = db_session
+        mocked_upload_session_repository.set_received.return_value = True
+        service = UploadSessionService(mocked_upload_session_repository)
+
+        await service.open_session(
+            UploadSessionCreateSchema(
+                track_name='track',
+                author_name='me',
+                file_name='track.mp3',
+                size=len(content)
+            ),
+            'user_id'
+        )
+        for start in range(0,len(content),1000):
+            session = await self.send(service,db_session,content[start:start + 1000])
+        session,result = await service.finalize('session_id','user_id')
+
+        assert session.received == len(content)
+        assert service.file_path('session_id').read_bytes() == content
+        assert result.size == len(content)
+        assert result.hash == sha256(content).hexdigest()
+        assert result.sha1 == sha1(content).hexdigest()
+        assert result.extension == '.mp3'
+
+    @pytest.mark.asyncio
+    async def test_continue_in_other_worker(
+        self,
+        mocked_upload_session_repository,
+        db_session:UploadSession,
+        content:bytes
+    ):
+        mocked_upload_session_repository.lock.return_value = db_session
+        mocked_upload_session_repository.get_by_id.return_value = db_session
+        mocked_upload_session_repository.set_received.return_value = True
+        service = UploadSessionService(mocked_upload_session_repository)
+        service.file_path('session_id').parent.mkdir(parents=True,exist_ok=True)
+        service.file_path('session_id').touch()
+
+        await self.send(service,db_session,content[:1000])
+        # the hash state only lives in the worker that received the first chunk
+        upload_session._hash_states.clear()
+        await self.send(service,db_session,content[1000:])
+        upload_session._hash_states.clear()
+        _,result = await service.finalize('session_id','user_id')
+
+        assert result.hash == sha256(content).hexdigest()
+        assert result.sha1 == sha1(content).hexdigest()
+
+    @pytest.mark.asyncio
+    async def test_reject_wrong_chunks(
+        self,
+        mocked_upload_session_repository,
+        db_session:UploadSession,
+        content:bytes
+    ):
+        mocked_upload_session_repository.lock.return_value = db_session
+        mocked_upload_session_repository.get_by_id.return_value = db_session
+        service = UploadSessionService(mocked_upload_session_repository)
+
+        with pytest.raises(HTTPException) as exc_info:
+            await service.append('session_id','user_id',100,content[:100])
+        assert exc_info.value.status_code == 409
+        assert exc_info.value.headers == {'Upload-Offset':'0'}
+
+        with pytest.raises(HTTPException) as exc_info:
+            await service.append('session_id','user_id',0,content + b'extra')
+        assert exc_info.value.status_code == 400
+
+        with pytest.raises(HTTPException) as exc_info:
+            await service.append('session_id','other_user',0,content)
+        assert exc_info.value.status_code == 404
+
+        with pytest.raises(HTTPException) as exc_info:
+            await service.finalize('session_id','user_id')
+        assert exc_info.value.status_code == 409
+
+        assert mocked_upload_session_repository.unlock.await_count == 3
+        mocked_upload_session_repository.set_received.assert_not_awaited()
@@ -0,0 +1,48 @@
+import asyncio
+import threading
+import pytest
+from fastapi import HTTPException
+
+from services.external import BoundedWorkerPool
+
+class TestBoundedWorkerPool:
+
+    @pytest.mark.asyncio
+    async def test_run(self):
+        pool = BoundedWorkerPool('test',2,4)
+
+        assert await pool.run(sum,[1,2,3]) == 6
+        assert pool.completed == 1
+        assert pool.running == 0
+        assert pool.queued == 0
+
+        with pytest.raises(ZeroDivisionError):
+            await pool.run(divmod,1,0)
+        assert pool.completed == 2
+        pool.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_rejects_when_full(self):
+        pool = BoundedWorkerPool('test',1,1,retry_after=3)
+        release = threading.Event()
+
+        running = asyncio.create_task(pool.run(release.wait))
+        waiting = asyncio.create_task(pool.run(sum,[1]))
+        await asyncio.sleep(0.01)
+        assert pool.running == 1
+        assert pool.queued == 1
+
+        with pytest.raises(HTTPException) as exc_info:
+            await pool.run(sum,[2])
+        assert exc_info.value.status_code == 503
+        assert exc_info.value.headers == {'Retry-After':'3'}
+        assert pool.rejected == 1
+
+        release.set()
+        assert await running
+        assert await waiting == 1
+        assert pool.completed == 2
+        assert pool.max_wait_time > 0
+        assert pool.wait_time >= pool.max_wait_time
+        assert pool.stats()['rejected'] == 1
+        pool.shutdown()
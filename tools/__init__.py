@@ -1,11 +1,32 @@
 import asyncio
+import json
 import logging
-from typing import Callable,Any
-from fastapi import HTTPException,status
+from base64 import urlsafe_b64decode,urlsafe_b64encode
+from typing import Callable,Any,Sequence
+from urllib.parse import quote
+from fastapi import HTTPException,Response,status
 from functools import wraps
 
 logger = logging.getLogger(__name__)
 
+# response header with the cursor of the next page of a list endpoint
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+# response header with the offset of the next chunk of a resumable upload
+UPLOAD_OFFSET_HEADER = 'Upload-Offset'
+
+# request header with the SHA-256 of a file uploaded as a raw body
+CONTENT_SHA256_HEADER = 'X-Content-SHA256'
+
+# request header that makes the retries of a request get its first response
+IDEMPOTENCY_KEY_HEADER = 'Idempotency-Key'
+
+# response header of a response replayed to a retry
+IDEMPOTENT_REPLAYED_HEADER = 'Idempotent-Replayed'
+
+# request header with the token of the stats endpoints
+STATS_TOKEN_HEADER = 'X-Stats-Token'
+
 def timeout(seconds:int):
     '''
     Docstring for timeout
@@ -32,4 +53,64 @@ def timeout(seconds:int):
         wrapper.timeout_seconds = seconds # type: ignore
         return wrapper
     
-    return decorator
\ No newline at end of file
+    return decorator
+
+def content_disposition(file_name:str,disposition:str='inline') -> str:
+    '''
+    Docstring for content_disposition
+
+    :param file_name: name the client must give to the file, in any language
+    :type file_name: str
+    :param disposition: 'inline' to play the file, 'attachment' to save it
+    :type disposition: str
+    :return: value of a 'Content-Disposition' header with the name as plain ascii for old
+    clients and encoded as UTF-8 (RFC 6266)
+    :rtype: str
+    '''
+    fallback = file_name.encode('ascii','replace').decode().replace('\\','_').replace('"','_')
+    return f"{disposition}; filename=\"{fallback}\"; filename*=UTF-8''{quote(file_name,safe='')}"
+
+def encode_cursor(key:str) -> str:
+    '''
+    Docstring for encode_cursor
+
+    :param key: id of the last result of a page
+    :type key: str
+    :return: opaque cursor pointing right after 'key'
+    :rtype: str
+    '''
+    return urlsafe_b64encode(json.dumps({'id':key}).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor:str) -> str | None:
+    '''
+    Docstring for decode_cursor
+
+    :param cursor: cursor created by 'encode_cursor', empty for the first page
+    :type cursor: str
+    :return: the id of the last result of the previous page
+    :rtype: str | None
+    '''
+    if len(cursor) == 0:
+        return None
+    try:
+        data = urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        return str(json.loads(data)['id'])
+    except (ValueError,KeyError,TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail='Invalid cursor'
+        )
+
+def set_next_cursor(response:Response,results:Sequence[Any],limit:int) -> None:
+    '''
+    Docstring for set_next_cursor
+
+    adds the cursor of the next page to the response headers if the page is full
+
+    :type response: Response
+    :param results: results of the page, each one with an 'id'
+    :type results: Sequence[Any]
+    :type limit: int
+    '''
+    if len(results) > 0 and len(results) >= limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(str(results[-1].id))